@@ -192,6 +192,7 @@ find_mlir_lib(MLIRShape)
 find_mlir_lib(MLIRShapeToStandard)
 find_mlir_lib(MLIRSideEffectInterfaces)
 find_mlir_lib(MLIROpenMP)
+find_mlir_lib(MLIROpenMPToLLVM)
 find_mlir_lib(MLIROptLib)
 find_mlir_lib(MLIRTableGen)
 find_mlir_lib(MLIRTargetLLVMIRModuleTranslation)
@@ -276,6 +277,7 @@ set(MLIRLibs
         ${MLIRSCFTransforms}
         ${MLIRLoopAnalysis}
         ${MLIRLoopLikeInterface}
+        ${MLIROpenMPToLLVM}
         ${MLIROpenMP}
         ${MLIRMlirOptMain}
         ${MLIRSideEffectInterfaces}
@@ -347,6 +349,13 @@ list(APPEND CMAKE_MODULE_PATH "${LLVM_CMAKE_DIR}")
 include(AddLLVM)
 include(TableGen)
 
+# LLVM libraries required to optimize the LLVM IR of a model and compile it
+# to an object file in process, for all the targets llvm-project was built
+# with.
+find_package(LLVM REQUIRED CONFIG PATHS ${LLVM_CMAKE_DIR} NO_DEFAULT_PATH)
+llvm_map_components_to_libnames(LLVMCodeGenLibs
+        ${LLVM_TARGETS_TO_BUILD} Passes)
+
 function(onnx_mlir_tablegen ofn)
   tablegen(MLIR
           ${ARGV}
@@ -11,7 +11,15 @@
 // Helper methods for handling input ONNX models.
 //
 //===----------------------------------------------------------------------===//
+#include <algorithm>
+#include <type_traits>
+
+#include <llvm/ADT/SmallString.h>
 #include <llvm/Support/Endian.h>
+#include <llvm/Support/FileSystem.h>
+#include <llvm/Support/MemoryBuffer.h>
+#include <llvm/Support/Parallel.h>
+#include <llvm/Support/Path.h>
 #include <llvm/Support/SwapByteOrder.h>
 
 #include "src/Builder/FrontendDialectHelper.hpp"
@@ -19,95 +27,216 @@
 
 namespace onnx_mlir {
 
+// Typed data field holding the elements of type T of a tensor. int8 and uint8
+// elements are stored widened in int32_data.
 template <typename T>
-struct TransformValueToONNXData {
-  static const google::protobuf::RepeatedField<T> data(
-      onnx::TensorProto initializer) {
-    return google::protobuf::RepeatedField<T>();
-  }
-};
+struct TransformValueToONNXData {};
 
 template <>
 struct TransformValueToONNXData<double> {
-  static const google::protobuf::RepeatedField<double> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<double> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.double_data();
   }
 };
 
 template <>
 struct TransformValueToONNXData<float> {
-  static const google::protobuf::RepeatedField<float> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<float> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.float_data();
   }
 };
 
 template <>
 struct TransformValueToONNXData<int32_t> {
-  static const google::protobuf::RepeatedField<int32_t> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<int32_t> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.int32_data();
   }
 };
 
 template <>
 struct TransformValueToONNXData<int64_t> {
-  static const google::protobuf::RepeatedField<int64_t> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<int64_t> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.int64_data();
   }
 };
 
 template <>
 struct TransformValueToONNXData<uint8_t> {
-  static const google::protobuf::RepeatedField<int32_t> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<int32_t> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.int32_data();
   }
 };
 
 template <>
 struct TransformValueToONNXData<int8_t> {
-  static const google::protobuf::RepeatedField<int32_t> data(
-      onnx::TensorProto initializer) {
+  static const google::protobuf::RepeatedField<int32_t> &data(
+      const onnx::TensorProto &initializer) {
     return initializer.int32_data();
   }
 };
 
+// Construct an attribute from the raw data of a tensor, which is always in LE.
+// The attribute is built straight from the data on LE systems, while the data
+// is byte swapped in one pass on BE systems.
+static mlir::DenseElementsAttr CreateDenseElmAttrFromRawData(
+    mlir::RankedTensorType tensorType, llvm::ArrayRef<char> rawData) {
+  size_t elmSize = tensorType.getElementTypeBitWidth() / 8;
+  // The buffer of a tensor of a single element, e.g. a scalar, is a splat.
+  bool detectedSplat;
+  if (rawData.size() != tensorType.getNumElements() * elmSize ||
+      !mlir::DenseElementsAttr::isValidRawBuffer(
+          tensorType, rawData, detectedSplat))
+    llvm_unreachable("Tensor data size does not match the tensor shape.");
+
+  if (llvm::support::endian::system_endianness() ==
+      llvm::support::endianness::little)
+    return mlir::DenseElementsAttr::getFromRawBuffer(
+        tensorType, rawData, detectedSplat);
+
+  std::vector<char> swappedData(rawData.size());
+  for (size_t i = 0; i < rawData.size(); i += elmSize)
+    std::reverse_copy(
+        &rawData[i], &rawData[i] + elmSize, swappedData.begin() + i);
+  return mlir::DenseElementsAttr::getFromRawBuffer(
+      tensorType, swappedData, detectedSplat);
+}
+
+// Construct an attribute from a typed data field holding elements of type T,
+// without copying them.
+template <typename T>
+static mlir::DenseElementsAttr CreateDenseElmAttrFromFieldData(
+    mlir::RankedTensorType tensorType,
+    const google::protobuf::RepeatedField<T> &data, std::true_type) {
+  return mlir::DenseElementsAttr::get(
+      tensorType, llvm::makeArrayRef(data.data(), data.size()));
+}
+
+// Construct an attribute from a typed data field holding wider elements than
+// T, which are narrowed to T.
+template <typename T, typename DataT>
+static mlir::DenseElementsAttr CreateDenseElmAttrFromFieldData(
+    mlir::RankedTensorType tensorType,
+    const google::protobuf::RepeatedField<DataT> &data, std::false_type) {
+  std::vector<T> array(data.begin(), data.end());
+  return mlir::DenseElementsAttr::get(tensorType, llvm::makeArrayRef(array));
+}
+
 // Helper method for constructing an array attribute from a model input.
 template <typename T>
-static std::vector<T> CreateArrayAttribute(onnx::TensorProto initializer) {
-  size_t size;
-  if (initializer.raw_data().size()) {
-    // copy & take care of endianness
-    std::vector<char> byteInitializer;
-    std::copy(initializer.raw_data().begin(), initializer.raw_data().end(),
-        back_inserter(byteInitializer));
-    size = initializer.raw_data().size() / sizeof(T);
-    T *arrayPtr = reinterpret_cast<T *>(&byteInitializer[0]);
-    auto array = std::vector<T>(arrayPtr, arrayPtr + size);
-    // Perform byte swap if system endianness is BE.
-    // ONNX tensor content raw data is always in LE.
-    if (llvm::support::endian::system_endianness() !=
-        llvm::support::endianness::little)
-      for (int i = 0; i < array.size(); i++)
-        llvm::sys::swapByteOrder<T>(array[i]);
-
-    return array;
+static mlir::DenseElementsAttr CreateDenseElmAttr(
+    mlir::RankedTensorType tensorType, const onnx::TensorProto &initializer) {
+  if (initializer.raw_data().size())
+    return CreateDenseElmAttrFromRawData(
+        tensorType, llvm::ArrayRef<char>(initializer.raw_data().data(),
+                        initializer.raw_data().size()));
+
+  // No need to take care of endianness.
+  const auto &data = TransformValueToONNXData<T>::data(initializer);
+  using DataT = typename std::decay<decltype(data)>::type::value_type;
+  return CreateDenseElmAttrFromFieldData<T>(
+      tensorType, data, std::is_same<T, DataT>());
+}
+
+// Construct the attribute of a tensor whose data is stored in an external
+// file, see https://github.com/onnx/onnx/blob/master/docs/ExternalData.md.
+// Only the part of the file holding the tensor is memory mapped, and the
+// attribute is built straight from the mapping, so that importing a model does
+// not hold more than one copy of its weights.
+static mlir::DenseElementsAttr externalTensorProtoToDenseElmAttr(
+    mlir::OpBuilder &builder, const onnx::TensorProto &initializer,
+    const std::string &externalDataDir) {
+  std::string location;
+  uint64_t offset = 0;
+  llvm::Optional<uint64_t> length;
+  for (const auto &entry : initializer.external_data()) {
+    if (entry.key() == "location") {
+      location = entry.value();
+    } else if (entry.key() == "offset" || entry.key() == "length") {
+      uint64_t value;
+      if (llvm::StringRef(entry.value()).getAsInteger(10, value)) {
+        llvm::errs() << "Invalid " << entry.key() << " '" << entry.value()
+                     << "' of the external data of a tensor\n";
+        llvm_unreachable("Failed to import the external data of a tensor.");
+      }
+      if (entry.key() == "offset")
+        offset = value;
+      else
+        length = value;
+    }
+  }
+  if (location.empty())
+    llvm_unreachable("Missing location of the external data of a tensor.");
+
+  llvm::SmallString<128> path(externalDataDir);
+  llvm::sys::path::append(path, location);
+  if (!length) {
+    uint64_t fileSize;
+    if (llvm::sys::fs::file_size(path, fileSize) || fileSize < offset) {
+      llvm::errs() << "Cannot read external data file " << path << "\n";
+      llvm_unreachable("Failed to import the external data of a tensor.");
+    }
+    length = fileSize - offset;
+  }
+  auto file = llvm::MemoryBuffer::getFileSlice(path, *length, offset);
+  if (!file) {
+    llvm::errs() << "Cannot read external data file " << path << ": "
+                 << file.getError().message() << "\n";
+    llvm_unreachable("Failed to import the external data of a tensor.");
   }
 
-  // copy, no need to take care of endianness
-  auto data = TransformValueToONNXData<T>::data(initializer);
-  size = data.size();
-  return std::vector<T>(&data[0], &data[0] + size);
+  // Tensors of bools and strings are not stored as arrays of bytes in
+  // DenseElementsAttr.
+  mlir::Type elmType = convertONNXTypeToMLIRType(
+      builder, (onnx::TensorProto_DataType)initializer.data_type());
+  if (!elmType.isIntOrFloat() || elmType.getIntOrFloatBitWidth() % 8 != 0)
+    llvm_unreachable(
+        "Failed to import ONNX TensorProto due to unsupported data types.");
+  llvm::ArrayRef<int64_t> tensorDims(
+      initializer.dims().data(), initializer.dims().size());
+  return CreateDenseElmAttrFromRawData(
+      mlir::RankedTensorType::get(tensorDims, elmType),
+      llvm::ArrayRef<char>(
+          (*file)->getBufferStart(), (*file)->getBufferSize()));
 }
 
 void InitializedTensorMapping::AddMapping(
-    std::string name, onnx::TensorProto tensor) {
+    std::string name, const onnx::TensorProto &tensor) {
   assert(nameToInitializedTensor.count(name) == 0 &&
          "Tensor initializer already mapped.");
-  nameToInitializedTensor.emplace(name, tensor);
+  nameToInitializedTensor.emplace(name, &tensor);
+}
+
+void InitializedTensorMapping::ConvertInitializers(
+    mlir::MLIRContext &context, const std::set<std::string> &usedNames) {
+  // The attributes are written in place, references to the elements of a
+  // std::map are stable.
+  std::vector<std::pair<const onnx::TensorProto *, mlir::DenseElementsAttr *>>
+      pending;
+  for (const auto &nameAndTensor : nameToInitializedTensor) {
+    if (usedNames.count(nameAndTensor.first) == 0)
+      continue;
+    mlir::DenseElementsAttr &attr = nameToAttr[nameAndTensor.first];
+    if (!attr)
+      pending.emplace_back(nameAndTensor.second, &attr);
+  }
+
+  // Attributes and types are uniqued in the context, which is thread safe
+  // when multithreading is enabled.
+  auto convert = [&](const std::pair<const onnx::TensorProto *,
+                     mlir::DenseElementsAttr *> &tensorAndAttr) {
+    mlir::OpBuilder builder(&context);
+    *tensorAndAttr.second = onnxTensorProtoToDenseElmAttr(
+        builder, *tensorAndAttr.first, externalDataDir);
+  };
+  if (context.isMultithreadingEnabled())
+    llvm::parallelForEach(pending.begin(), pending.end(), convert);
+  else
+    std::for_each(pending.begin(), pending.end(), convert);
 }
 
 bool InitializedTensorMapping::ContainKey(std::string name) {
@@ -116,85 +245,57 @@ bool InitializedTensorMapping::ContainKey(std::string name) {
 
 mlir::Value InitializedTensorMapping::EmitInitializerForInputTensor(
     mlir::Location loc, mlir::OpBuilder &builder, const std::string &name) {
-  // Initializer for input.
-  onnx::TensorProto initializer = GetInitializedTensor(name);
-
   // Emit ConstantOp and record the mapping between the input and
   // the constant value.
-  // Create value attribute.
-  mlir::DenseElementsAttr denseElmAttr =
-      onnxTensorProtoToDenseElmAttr(builder, initializer);
+  // Create value attribute, unless the initializer is already converted.
+  mlir::DenseElementsAttr &denseElmAttr = nameToAttr[name];
+  if (!denseElmAttr)
+    denseElmAttr = onnxTensorProtoToDenseElmAttr(
+        builder, GetInitializedTensor(name), externalDataDir);
 
   // Create ConstantOp for dense array.
   return builder.create<mlir::ONNXConstantOp>(
       loc, denseElmAttr.getType(), nullptr, denseElmAttr);
 }
 
-mlir::DenseElementsAttr onnxTensorProtoToDenseElmAttr(
-    mlir::OpBuilder &builder, const onnx::TensorProto &initializer) {
+mlir::DenseElementsAttr onnxTensorProtoToDenseElmAttr(mlir::OpBuilder &builder,
+    const onnx::TensorProto &initializer, const std::string &externalDataDir) {
+  if (initializer.data_location() == onnx::TensorProto::EXTERNAL)
+    return externalTensorProtoToDenseElmAttr(
+        builder, initializer, externalDataDir);
+
   // Tensor dimensions.
   llvm::ArrayRef<int64_t> tensorDims(
       initializer.dims().data(), initializer.dims().size());
-  mlir::DenseElementsAttr denseElmAttr;
   switch (initializer.data_type()) {
-  case (onnx::TensorProto::FLOAT): {
-    const auto &arrayAttrInitializer = CreateArrayAttribute<float>(initializer);
-    auto elmType = builder.getF32Type();
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
-  case (onnx::TensorProto::DOUBLE): {
-    const auto &arrayAttrInitializer =
-        CreateArrayAttribute<double>(initializer);
-    auto elmType = builder.getF64Type();
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
-  case (onnx::TensorProto::INT8): {
-    const auto &arrayAttrInitializer =
-        CreateArrayAttribute<int8_t>(initializer);
-    auto elmType = builder.getIntegerType(8);
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
-  case (onnx::TensorProto::UINT8): {
-    const auto &arrayAttrInitializer =
-        CreateArrayAttribute<uint8_t>(initializer);
-    auto elmType = builder.getIntegerType(8, false);
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
-  case (onnx::TensorProto::INT32): {
-    const auto &arrayAttrInitializer =
-        CreateArrayAttribute<int32_t>(initializer);
-    auto elmType = builder.getIntegerType(32);
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
-  case (onnx::TensorProto::INT64): {
-    const auto &arrayAttrInitializer =
-        CreateArrayAttribute<int64_t>(initializer);
-    auto elmType = builder.getIntegerType(64);
-    auto tensorType = mlir::RankedTensorType::get(tensorDims, elmType);
-    denseElmAttr = mlir::DenseElementsAttr::get(
-        tensorType, llvm::makeArrayRef(arrayAttrInitializer));
-    break;
-  }
+  case (onnx::TensorProto::FLOAT):
+    return CreateDenseElmAttr<float>(
+        mlir::RankedTensorType::get(tensorDims, builder.getF32Type()),
+        initializer);
+  case (onnx::TensorProto::DOUBLE):
+    return CreateDenseElmAttr<double>(
+        mlir::RankedTensorType::get(tensorDims, builder.getF64Type()),
+        initializer);
+  case (onnx::TensorProto::INT8):
+    return CreateDenseElmAttr<int8_t>(
+        mlir::RankedTensorType::get(tensorDims, builder.getIntegerType(8)),
+        initializer);
+  case (onnx::TensorProto::UINT8):
+    return CreateDenseElmAttr<uint8_t>(mlir::RankedTensorType::get(tensorDims,
+                                           builder.getIntegerType(8, false)),
+        initializer);
+  case (onnx::TensorProto::INT32):
+    return CreateDenseElmAttr<int32_t>(
+        mlir::RankedTensorType::get(tensorDims, builder.getIntegerType(32)),
+        initializer);
+  case (onnx::TensorProto::INT64):
+    return CreateDenseElmAttr<int64_t>(
+        mlir::RankedTensorType::get(tensorDims, builder.getIntegerType(64)),
+        initializer);
   default:
     llvm_unreachable(
         "Failed to import ONNX TensorProto due to unsupported data types.");
   }
-  return denseElmAttr;
 }
 
 // Convert type to MLIR type.
@@ -16,6 +16,7 @@
 
 #include <numeric>
 #include <regex>
+#include <set>
 #include <tuple>
 
 #include "mlir/Dialect/StandardOps/IR/Ops.h"
@@ -44,8 +45,20 @@
 namespace onnx_mlir {
 
 struct InitializedTensorMapping {
-  // Add new entry.
-  void AddMapping(std::string name, onnx::TensorProto tensor);
+  // Set the directory where the external data of the tensors are looked up.
+  void SetExternalDataDir(std::string dir) { externalDataDir = dir; }
+
+  // Add new entry. The tensor is referenced, not copied, so it must outlive
+  // the mapping.
+  void AddMapping(std::string name, const onnx::TensorProto &tensor);
+
+  // Convert the tensors added since the last conversion and named in
+  // usedNames to attributes, in parallel when multithreading is enabled in
+  // the context. The conversion of large tensors is a significant part of the
+  // import of a model. The other tensors are converted when they are emitted,
+  // if ever.
+  void ConvertInitializers(
+      mlir::MLIRContext &context, const std::set<std::string> &usedNames);
 
   // Check if input is initialized. Not all inputs are, some of the inputs
   // require input from the user and are not stored inside the ONNX model
@@ -64,20 +77,30 @@ struct InitializedTensorMapping {
       mlir::Location loc, mlir::OpBuilder &builder, const std::string &name);
 
   // Get initialized tensor.
-  onnx::TensorProto &GetInitializedTensor(std::string name) {
+  const onnx::TensorProto &GetInitializedTensor(std::string name) {
     assert(
         nameToInitializedTensor.find(name) != nameToInitializedTensor.end() &&
         "Tensor initializer not found");
-    return nameToInitializedTensor.at(name);
+    return *nameToInitializedTensor.at(name);
   }
 
 private:
   // Mapping from ONNX tensor name to InitializedTensor.
-  std::map<std::string, onnx::TensorProto> nameToInitializedTensor;
+  std::map<std::string, const onnx::TensorProto *> nameToInitializedTensor;
+
+  // Mapping from ONNX tensor name to the attribute holding its value, for the
+  // tensors already converted.
+  std::map<std::string, mlir::DenseElementsAttr> nameToAttr;
+
+  // Directory of the files holding the external data of the tensors.
+  std::string externalDataDir;
 };
 
-mlir::DenseElementsAttr onnxTensorProtoToDenseElmAttr(
-    mlir::OpBuilder &builder, const onnx::TensorProto &initializer);
+// Convert a tensor to an attribute. The locations of external data are
+// relative to `externalDataDir`.
+mlir::DenseElementsAttr onnxTensorProtoToDenseElmAttr(mlir::OpBuilder &builder,
+    const onnx::TensorProto &initializer,
+    const std::string &externalDataDir = "");
 
 mlir::Type convertONNXTypeToMLIRType(
     mlir::OpBuilder &builder_, onnx::TensorProto_DataType onnxType);
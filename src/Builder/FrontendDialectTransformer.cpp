@@ -26,6 +26,7 @@ namespace bstd = mpark;
 
 #include "mlir/IR/BuiltinOps.h"
 #include "onnx/defs/schema.h"
+#include "llvm/Support/Path.h"
 
 #include "src/Interface/HasOnnxSubgraphOpInterface.hpp"
 #include "src/Interface/ResultTypeInferenceOpInterface.hpp"
@@ -72,6 +73,7 @@ public:
   mlir::ModuleOp ImportONNXModel(
       const onnx::ModelProto &model, ImportOptions options) {
     options_ = options;
+    initializedTensors.SetExternalDataDir(options_.externalDataDir);
     SetOpSetImport(model); // Determines which opsets to use.
     importGraph(model.graph());
     return module_;
@@ -278,7 +280,8 @@ private:
           llvm::makeArrayRef(attr.ints().begin(), attr.ints().end()));
       break;
     case onnx::AttributeProto::TENSOR:
-      mlirAttr = onnxTensorProtoToDenseElmAttr(builder_, attr.t());
+      mlirAttr = onnxTensorProtoToDenseElmAttr(
+          builder_, attr.t(), options_.externalDataDir);
       break;
     case onnx::AttributeProto::STRINGS: {
       llvm::SmallVector<mlir::StringRef, 4> vectorStringRef;
@@ -341,6 +344,13 @@ private:
       initializedTensors.AddMapping(
           legalize_name(initializerName), initializer);
     }
+    // Convert the initializers used by the nodes up front, possibly in
+    // parallel, rather than while importing the nodes using them.
+    std::set<std::string> usedNames;
+    for (const auto &node : graph.node())
+      for (const auto &input : node.input())
+        usedNames.insert(legalize_name(input));
+    initializedTensors.ConvertInitializers(context_, usedNames);
 
     // create a function for the graph
     // TODO:
@@ -1108,6 +1118,12 @@ void ImportFrontendModelFile(std::string model_fname,
   auto parse_success = model.ParseFromIstream(&input);
   assert(parse_success && "Onnx Model Parsing Failed.");
 
+  // Locations of external data are relative to the model file.
+  if (options.externalDataDir.empty()) {
+    options.externalDataDir = llvm::sys::path::parent_path(model_fname).str();
+    if (options.externalDataDir.empty())
+      options.externalDataDir = ".";
+  }
   ImportFrontendModel(model, context, module, options);
 }
 
@@ -42,6 +42,10 @@ struct ImportOptions {
   // Use types/shapes in the input-model for translation (for intermediate
   // variables)
   bool useOnnxModelTypes = false;
+  // Directory where the files holding the external data of the tensors are
+  // looked up. ImportFrontendModelFile defaults it to the directory of the
+  // model file.
+  std::string externalDataDir = "";
 };
 
 /*!
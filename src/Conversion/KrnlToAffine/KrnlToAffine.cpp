@@ -13,6 +13,7 @@
 //===----------------------------------------------------------------------===//
 
 #include "mlir/Dialect/Affine/IR/AffineOps.h"
+#include "mlir/Dialect/Affine/Utils.h"
 #include "mlir/Dialect/StandardOps/IR/Ops.h"
 #include "mlir/Pass/Pass.h"
 #include "mlir/Transforms/DialectConversion.h"
@@ -209,6 +210,15 @@ LogicalResult interpretOperation(Operation *op, OpBuilder &builder,
     auto loopRef = unrollOp.loop();
     loopUnrollFull(loopRefToOp[loopRef]);
 
+    opsToErase.insert(op);
+    return success();
+  } else if (auto parallelOp = dyn_cast_or_null<KrnlParallelOp>(op)) {
+    // Only mark the affine for loop here, it is turned into an affine
+    // parallel loop once all the loop transformations have been applied.
+    auto loopRef = parallelOp.loop();
+    loopRefToOp[loopRef].getOperation()->setAttr(
+        KrnlParallelOp::getOperationName(), builder.getUnitAttr());
+
     opsToErase.insert(op);
     return success();
   }
@@ -317,11 +327,26 @@ void ConvertKrnlToAffinePass::runOnFunction() {
   }
   assert(opsToErase.empty());
 
+  // Turn the loops marked as parallel into affine parallel loops. Loops
+  // with a non-unit step or with min/max bounds are kept sequential.
+  SmallVector<AffineForOp, 4> parallelLoops;
+  funcOp->walk([&](AffineForOp forOp) {
+    if (forOp.getOperation()->getAttr(KrnlParallelOp::getOperationName()))
+      parallelLoops.emplace_back(forOp);
+  });
+  for (auto forOp : parallelLoops) {
+    forOp.getOperation()->removeAttr(KrnlParallelOp::getOperationName());
+    if (forOp.getStep() == 1 && forOp.getLowerBoundMap().getNumResults() == 1 &&
+        forOp.getUpperBoundMap().getNumResults() == 1)
+      affineParallelize(forOp);
+  }
+
   ConversionTarget target(getContext());
   target.addIllegalOp<KrnlTerminatorOp>();
   // krnl.dim operations must be lowered prior to this pass.
   target.addIllegalOp<KrnlDimOp>();
   target.addLegalOp<AffineYieldOp>();
+  target.addLegalOp<AffineParallelOp>();
   target.addLegalOp<AffineLoadOp>();
   target.addLegalOp<AffineStoreOp>();
   target.addLegalOp<LoadOp>();
@@ -13,12 +13,14 @@
 //===----------------------------------------------------------------------===//
 
 #include "mlir/Conversion/AffineToStandard/AffineToStandard.h"
+#include "mlir/Conversion/OpenMPToLLVM/ConvertOpenMPToLLVM.h"
 #include "mlir/Conversion/SCFToStandard/SCFToStandard.h"
 #include "mlir/Conversion/ShapeToStandard/ShapeToStandard.h"
 #include "mlir/Conversion/StandardToLLVM/ConvertStandardToLLVMPass.h"
 #include "mlir/Conversion/VectorToLLVM/ConvertVectorToLLVM.h"
 #include "mlir/Dialect/Affine/IR/AffineOps.h"
 #include "mlir/Dialect/LLVMIR/LLVMDialect.h"
+#include "mlir/Dialect/OpenMP/OpenMPDialect.h"
 #include "mlir/Dialect/SCF/SCF.h"
 #include "mlir/Dialect/StandardOps/IR/Ops.h"
 #include "mlir/Dialect/StandardOps/Transforms/Passes.h"
@@ -312,6 +314,119 @@ private:
   }
 };
 
+//===----------------------------------------------------------------------===//
+// KRNL to LLVM: SessionMemoryPoolAllocOpLowering
+//===----------------------------------------------------------------------===//
+
+/// Return true if the value is produced by an alloc marked as a session
+/// memory pool.
+static bool isSessionMemoryPool(Value value) {
+  Operation *defOp = value.getDefiningOp();
+  return defOp && llvm::isa<AllocOp>(defOp) &&
+         defOp->hasAttr(KrnlOpsDialect::getSessionMemoryPoolAttrName());
+}
+
+/// Lower a session memory pool alloc to a call to the runtime, which returns
+/// a buffer kept alive across model invocations:
+///
+///   i8* omMemoryPoolAcquire(i64 size, i64 alignment)
+///
+/// This pattern has a higher benefit than the standard AllocOp lowering so
+/// that it is tried first.
+class SessionMemoryPoolAllocOpLowering : public ConvertToLLVMPattern {
+public:
+  explicit SessionMemoryPoolAllocOpLowering(
+      MLIRContext *context, LLVMTypeConverter &lowering_)
+      : ConvertToLLVMPattern(AllocOp::getOperationName(), context, lowering_,
+            /*benefit=*/2) {}
+
+  LogicalResult matchAndRewrite(Operation *op, ArrayRef<Value> operands,
+      ConversionPatternRewriter &rewriter) const override {
+    if (!op->hasAttr(KrnlOpsDialect::getSessionMemoryPoolAttrName()))
+      return failure();
+
+    auto allocOp = llvm::cast<AllocOp>(op);
+    auto *context = op->getContext();
+    auto loc = op->getLoc();
+    ModuleOp module = op->getParentOfType<ModuleOp>();
+    auto memRefTy = allocOp.getResult().getType().cast<MemRefType>();
+
+    auto llvmI8PtrTy = LLVM::LLVMPointerType::get(IntegerType::get(context, 8));
+    auto llvmI64Ty = IntegerType::get(context, 64);
+    auto acquireRef = getOrInsertExternFunc("omMemoryPoolAcquire", module,
+        LLVM::LLVMFunctionType::get(
+            llvmI8PtrTy, {llvmI64Ty, llvmI64Ty}, /*isVarArg=*/false),
+        rewriter);
+
+    // Memory pools are 1-D i8 MemRefs, the size in bytes is either static or
+    // the only dynamic size operand.
+    Value size =
+        hasAllConstantDimensions(memRefTy)
+            ? createIndexConstant(rewriter, loc, memRefTy.getShape()[0])
+            : operands[0];
+    int64_t alignment = 16;
+    if (IntegerAttr alignmentAttr = allocOp.alignmentAttr())
+      alignment = alignmentAttr.getInt();
+    Value alignmentVal = createIndexConstant(rewriter, loc, alignment);
+
+    Value pool = rewriter
+                     .create<LLVM::CallOp>(loc, ArrayRef<Type>({llvmI8PtrTy}),
+                         acquireRef, ArrayRef<Value>({size, alignmentVal}))
+                     .getResult(0);
+
+    auto structType = typeConverter->convertType(memRefTy);
+    auto memRefDescriptor = MemRefDescriptor::undef(rewriter, loc, structType);
+    memRefDescriptor.setAllocatedPtr(rewriter, loc, pool);
+    memRefDescriptor.setAlignedPtr(rewriter, loc, pool);
+    memRefDescriptor.setOffset(
+        rewriter, loc, createIndexConstant(rewriter, loc, 0));
+    memRefDescriptor.setSize(rewriter, loc, 0, size);
+    memRefDescriptor.setStride(
+        rewriter, loc, 0, createIndexConstant(rewriter, loc, 1));
+
+    rewriter.replaceOp(op, {memRefDescriptor});
+    return success();
+  }
+};
+
+/// Lower the dealloc of a session memory pool to a call to the runtime,
+/// which gives the buffer back to the arena of the calling thread:
+///
+///   void omMemoryPoolRelease(i8* pool, i64 size)
+class SessionMemoryPoolDeallocOpLowering : public ConvertToLLVMPattern {
+public:
+  explicit SessionMemoryPoolDeallocOpLowering(
+      MLIRContext *context, LLVMTypeConverter &lowering_)
+      : ConvertToLLVMPattern(DeallocOp::getOperationName(), context, lowering_,
+            /*benefit=*/2) {}
+
+  LogicalResult matchAndRewrite(Operation *op, ArrayRef<Value> operands,
+      ConversionPatternRewriter &rewriter) const override {
+    if (!isSessionMemoryPool(op->getOperand(0)))
+      return failure();
+
+    auto *context = op->getContext();
+    auto loc = op->getLoc();
+    ModuleOp module = op->getParentOfType<ModuleOp>();
+
+    auto llvmI8PtrTy = LLVM::LLVMPointerType::get(IntegerType::get(context, 8));
+    auto llvmI64Ty = IntegerType::get(context, 64);
+    auto releaseRef = getOrInsertExternFunc("omMemoryPoolRelease", module,
+        LLVM::LLVMFunctionType::get(LLVM::LLVMVoidType::get(context),
+            {llvmI8PtrTy, llvmI64Ty}, /*isVarArg=*/false),
+        rewriter);
+
+    MemRefDescriptor memRefDescriptor(operands[0]);
+    Value pool = memRefDescriptor.allocatedPtr(rewriter, loc);
+    Value size = memRefDescriptor.size(rewriter, loc, 0);
+    rewriter.create<LLVM::CallOp>(
+        loc, ArrayRef<Type>({}), releaseRef, ArrayRef<Value>({pool, size}));
+
+    rewriter.eraseOp(op);
+    return success();
+  }
+};
+
 //===----------------------------------------------------------------------===//
 // KRNL to LLVM: KrnlGlobalOpLowering
 //===----------------------------------------------------------------------===//
@@ -715,6 +830,17 @@ public:
     auto dynEntryPointName = "run_" + staticEntryPointFuncName;
     assert(module.lookupSymbol(dynEntryPointName.str()) == nullptr &&
            "dynamic entry point name is not unique");
+    // Functions returning the JSON description of the inputs and outputs of
+    // the model, named after the static entry point as well.
+    if (auto inSignature = op->getAttrOfType<StringAttr>(
+            KrnlEntryPointOp::getInputSignatureAttrName()))
+      emitStringFunction("input_signature_" + staticEntryPointFuncName.str(),
+          inSignature.getValue(), rewriter, loc, module);
+    if (auto outSignature = op->getAttrOfType<StringAttr>(
+            KrnlEntryPointOp::getOutputSignatureAttrName()))
+      emitStringFunction("output_signature_" + staticEntryPointFuncName.str(),
+          outSignature.getValue(), rewriter, loc, module);
+
     rewriter.eraseOp(op);
     auto dynEntryPointFuncTy =
         LLVM::LLVMFunctionType::get(opaquePtrTy, {opaquePtrTy}, false);
@@ -930,6 +1056,39 @@ private:
     return nullptr;
   }
 
+  // Emit a function taking no argument and returning a pointer to a
+  // null-terminated copy of str:
+  //
+  // i8* <funcName>()
+  //
+  void emitStringFunction(std::string funcName, StringRef str,
+      PatternRewriter &rewriter, const Location &loc, ModuleOp &module) const {
+    auto *context = module.getContext();
+    auto int8Ty = IntegerType::get(context, 8);
+    auto opaquePtrTy = LLVM::LLVMPointerType::get(int8Ty);
+
+    std::string nullTerminatedStr = str.str();
+    nullTerminatedStr.push_back('\0');
+    LLVM::GlobalOp global;
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(module.getBody());
+      global = rewriter.create<LLVM::GlobalOp>(loc,
+          LLVM::LLVMArrayType::get(int8Ty, nullTerminatedStr.size()),
+          /*isConstant=*/true, LLVM::Linkage::Internal, "_" + funcName,
+          rewriter.getStringAttr(nullTerminatedStr));
+    }
+
+    Type funcTy = LLVM::LLVMFunctionType::get(opaquePtrTy, {}, false);
+    auto func = rewriter.create<LLVM::LLVMFuncOp>(loc, funcName, funcTy);
+    OpBuilder::InsertionGuard insertGuard(rewriter);
+    rewriter.setInsertionPointToStart(&createEntryBlock(funcTy, func));
+    Value globalAddr = rewriter.create<LLVM::AddressOfOp>(loc, global);
+    Value strPtr =
+        rewriter.create<LLVM::BitcastOp>(loc, opaquePtrTy, globalAddr);
+    rewriter.create<LLVM::ReturnOp>(loc, ArrayRef<Value>({strPtr}));
+  }
+
   // Helper function to insert an entry block to LLVM function.
   // (TODO): upstream this to MLIR.
   Block &createEntryBlock(
@@ -1172,6 +1331,13 @@ public:
           LLVM::Linkage::External,
           mlir::KrnlPackedConstantOp::getConstPackIsLESymbolName(),
           rewriter.getI8IntegerAttr(packedConstOp.is_le()));
+
+      // The constant pack is embedded unless the compiler driver decides to
+      // keep it in a separate file, in which case it updates this symbol.
+      rewriter.create<LLVM::GlobalOp>(loc, type, /*isConstant=*/true,
+          LLVM::Linkage::External,
+          mlir::KrnlPackedConstantOp::getConstPackIsEmbeddedSymbolName(),
+          rewriter.getI8IntegerAttr(1));
     }
 
     rewriter.eraseOp(op);
@@ -1200,6 +1366,8 @@ void mlir::populateAffineAndKrnlToLLVMConversion(
   patterns.insert<KrnlGlobalOpLowering, KrnlPackedConstOpLowering>(
       ctx, typeConverter);
   patterns.insert<KrnlGetRefOpLowering>(ctx, typeConverter);
+  patterns.insert<SessionMemoryPoolAllocOpLowering,
+      SessionMemoryPoolDeallocOpLowering>(ctx, typeConverter);
   patterns.insert<KrnlMemcpyOpLowering, KrnlEntryPointOpLowering>(ctx);
 
   // Math library functions.
@@ -1236,10 +1404,20 @@ void ConvertKrnlToLLVMPass::runOnOperation() {
   options.emitCWrappers = true;
   LLVMTypeConverter typeConverter(&getContext(), options);
 
+  // The OpenMP parallel regions created for parallel loops are kept, they
+  // are translated together with the LLVM dialect. Only the types of the
+  // values used in their regions are converted.
+  target.addDynamicallyLegalOp<omp::ParallelOp>([&](omp::ParallelOp op) {
+    return typeConverter.isLegal(&op.region());
+  });
+  target.addLegalOp<omp::TerminatorOp>();
+
   // We have a combination of `krnl`, `affine`, and `std` operations. We
   // lower in stages until all the code is in the LLVM dialect.
   OwningRewritePatternList patterns;
   populateAffineAndKrnlToLLVMConversion(patterns, &getContext(), typeConverter);
+  populateOpenMPToLLVMConversionPatterns(
+      &getContext(), typeConverter, patterns);
 
   // We want to completely lower to LLVM, so we use a `FullConversion`. This
   // ensures that only legal operations will remain after the conversion.
@@ -15,6 +15,7 @@
 
 #include "mlir/Dialect/SCF/SCF.h"
 #include "mlir/Dialect/StandardOps/Transforms/FuncConversions.h"
+#include "llvm/Support/JSON.h"
 
 #include "src/Conversion/ONNXToKrnl/ONNXToKrnlCommon.hpp"
 
@@ -24,19 +25,67 @@ using namespace mlir;
 // EntryPoint Op lowering to Krnl Entry Point.
 //===----------------------------------------------------------------------===//
 
+/// Describe tensors as a JSON array holding, for each tensor, an object with
+/// its name (if known), its element type and its shape (if ranked), dynamic
+/// dimensions being -1. For example:
+///   [{"dims":[1,-1],"name":"x","type":"f32"}]
+static std::string getSignature(ArrayRef<Type> types, ArrayAttr names) {
+  llvm::json::Array signature;
+  for (unsigned i = 0; i < types.size(); ++i) {
+    llvm::json::Object tensor;
+    if (names && i < names.size())
+      tensor["name"] = names[i].cast<StringAttr>().getValue().str();
+
+    auto shapedType = types[i].dyn_cast<ShapedType>();
+    Type elementType = shapedType ? shapedType.getElementType() : types[i];
+    std::string typeStr;
+    llvm::raw_string_ostream typeOS(typeStr);
+    elementType.print(typeOS);
+    tensor["type"] = typeOS.str();
+
+    if (shapedType && shapedType.hasRank()) {
+      llvm::json::Array dims;
+      for (int64_t dim : shapedType.getShape())
+        dims.push_back(dim);
+      tensor["dims"] = std::move(dims);
+    }
+    signature.push_back(std::move(tensor));
+  }
+
+  std::string signatureStr;
+  llvm::raw_string_ostream signatureOS(signatureStr);
+  signatureOS << llvm::json::Value(std::move(signature));
+  return signatureOS.str();
+}
+
 class ONNXEntryPointLowering : public OpRewritePattern<ONNXEntryPointOp> {
 public:
   using OpRewritePattern<ONNXEntryPointOp>::OpRewritePattern;
 
   LogicalResult matchAndRewrite(
       ONNXEntryPointOp op, PatternRewriter &rewriter) const override {
-    rewriter.replaceOpWithNewOp<KrnlEntryPointOp>(op,
-        op->getAttrOfType<SymbolRefAttr>(
-            ONNXEntryPointOp::getEntryPointFuncAttrName()),
-        op->getAttrOfType<IntegerAttr>(
-            ONNXEntryPointOp::getNumInputsAttrName()),
-        op->getAttrOfType<IntegerAttr>(
-            ONNXEntryPointOp::getNumOutputsAttrName()));
+    auto funcAttr = op->getAttrOfType<SymbolRefAttr>(
+        ONNXEntryPointOp::getEntryPointFuncAttrName());
+    auto entryPoint =
+        rewriter.replaceOpWithNewOp<KrnlEntryPointOp>(op, funcAttr,
+            op->getAttrOfType<IntegerAttr>(
+                ONNXEntryPointOp::getNumInputsAttrName()),
+            op->getAttrOfType<IntegerAttr>(
+                ONNXEntryPointOp::getNumOutputsAttrName()));
+
+    // Record the signature of the entry point function, so that the runtime
+    // can map tensor names to positions without the original model.
+    auto module = entryPoint->getParentOfType<ModuleOp>();
+    auto func = module.lookupSymbol<FuncOp>(funcAttr.getLeafReference());
+    if (!func)
+      return success();
+    auto funcType = func.getType();
+    entryPoint->setAttr(KrnlEntryPointOp::getInputSignatureAttrName(),
+        rewriter.getStringAttr(getSignature(funcType.getInputs(),
+            func->getAttrOfType<ArrayAttr>("input_names"))));
+    entryPoint->setAttr(KrnlEntryPointOp::getOutputSignatureAttrName(),
+        rewriter.getStringAttr(getSignature(funcType.getResults(),
+            func->getAttrOfType<ArrayAttr>("output_names"))));
     return success();
   }
 };
@@ -49,7 +98,19 @@ public:
 namespace {
 struct FrontendToKrnlLoweringPass
     : public PassWrapper<FrontendToKrnlLoweringPass, OperationPass<ModuleOp>> {
+  FrontendToKrnlLoweringPass() = default;
+  FrontendToKrnlLoweringPass(const FrontendToKrnlLoweringPass &pass)
+      : PassWrapper<FrontendToKrnlLoweringPass, OperationPass<ModuleOp>>() {
+    mcpu = pass.mcpu.getValue();
+  }
+  FrontendToKrnlLoweringPass(std::string targetCpu) { mcpu = targetCpu; }
+
   void runOnOperation() final;
+
+  Option<std::string> mcpu{*this, "mcpu",
+      llvm::cl::desc("Target cpu, used to select the tile sizes of the "
+                     "matrix multiplications."),
+      llvm::cl::init("")};
 };
 } // end anonymous namespace.
 
@@ -88,6 +149,7 @@ void FrontendToKrnlLoweringPass::runOnOperation() {
   // Now that the conversion target has been defined, we just need to provide
   // the set of patterns that will lower the frontend operations.
   OwningRewritePatternList patterns;
+  MatMulTileSizes matMulTileSizes = getMatMulTileSizes(mcpu);
 
   // Convert TensorType to MemRef
   TensorTypeConverter tensorToMemRefConverter;
@@ -115,10 +177,10 @@ void FrontendToKrnlLoweringPass::runOnOperation() {
   // Math
   populateLoweringONNXClipOpPattern(patterns, &getContext());
   populateLoweringONNXElementwiseOpPattern(patterns, &getContext());
-  populateLoweringONNXGemmOpPattern(patterns, &getContext());
+  populateLoweringONNXGemmOpPattern(patterns, &getContext(), matMulTileSizes);
   populateLoweringONNXReductionOpPattern(patterns, &getContext());
   populateLoweringONNXSoftmaxOpPattern(patterns, &getContext());
-  populateLoweringONNXMatMulOpPattern(patterns, &getContext());
+  populateLoweringONNXMatMulOpPattern(patterns, &getContext(), matMulTileSizes);
   populateLoweringONNXLRNOpPattern(patterns, &getContext());
   // Tensor
   populateLoweringONNXReshapeOpPattern(patterns, &getContext());
@@ -139,7 +201,7 @@ void FrontendToKrnlLoweringPass::runOnOperation() {
   populateLoweringONNXTileOpPattern(patterns, &getContext());
   populateLoweringONNXFlattenOpPattern(patterns, &getContext());
   // Neural network
-  populateLoweringONNXConvOpPattern(patterns, &getContext());
+  populateLoweringONNXConvOpPattern(patterns, &getContext(), matMulTileSizes);
   populateLoweringONNXNormalizationOpPattern(patterns, &getContext());
   populateLoweringONNXPoolingOpPattern(patterns, &getContext());
   // Recurrent neural network
@@ -160,6 +222,6 @@ void FrontendToKrnlLoweringPass::runOnOperation() {
   }
 }
 
-std::unique_ptr<Pass> mlir::createLowerToKrnlPass() {
-  return std::make_unique<FrontendToKrnlLoweringPass>();
+std::unique_ptr<Pass> mlir::createLowerToKrnlPass(std::string mcpu) {
+  return std::make_unique<FrontendToKrnlLoweringPass>(mcpu);
 }
@@ -684,6 +684,9 @@ struct ONNXElementwiseUnaryOpLowering : public ConversionPattern {
       // Create iterateOp & get block within iterate op.
       BuildKrnlLoop loops(rewriter, loc, memRefType.getRank());
       loops.createDefineAndIterateOp(X);
+      // The iterations are independent, distribute the outermost loop.
+      if (memRefType.getRank() > 0)
+        loops.parallelize(0);
       Block *iterationBlock = loops.getIterateBlock();
 
       // Insert instructions inside the KernelIterateOp body.
@@ -748,6 +751,9 @@ struct ONNXElementwiseBinaryOpLowering : public ConversionPattern {
       // Create iterateOp & get block within iterate op.
       BuildKrnlLoop loops(rewriter, loc, outputRank);
       loops.createDefineAndIterateOp(alloc);
+      // The iterations are independent, distribute the outermost loop.
+      if (outputRank > 0)
+        loops.parallelize(0);
       Block *iterationBlock = loops.getIterateBlock();
       // Insert instructions inside the KernelIterateOp body.
       rewriter.setInsertionPointToStart(iterationBlock);
@@ -817,6 +823,9 @@ struct ONNXElementwiseVariadicOpLowering : public ConversionPattern {
       // Create iterateOp & get block within iterate op.
       BuildKrnlLoop loops(rewriter, loc, outputRank);
       loops.createDefineAndIterateOp(alloc);
+      // The iterations are independent, distribute the outermost loop.
+      if (outputRank > 0)
+        loops.parallelize(0);
       Block *iterationBlock = loops.getIterateBlock();
       // Insert instructions inside the KernelIterateOp body.
       rewriter.setInsertionPointToStart(iterationBlock);
@@ -20,8 +20,38 @@ using namespace mlir;
 
 template <typename GemmOp>
 struct ONNXGemmOpLowering : public ConversionPattern {
-  ONNXGemmOpLowering(MLIRContext *ctx)
-      : ConversionPattern(GemmOp::getOperationName(), 1, ctx) {}
+  ONNXGemmOpLowering(MLIRContext *ctx, MatMulTileSizes tileSizes)
+      : ConversionPattern(GemmOp::getOperationName(), 1, ctx),
+        tileSizes(tileSizes) {}
+
+  MatMulTileSizes tileSizes;
+
+  // Compute the access functions of A and B for res[n, m] and the reduction
+  // index `k`.
+  void getOperandAccessFcts(ONNXGemmOp gemmOp, IndexExpr n, IndexExpr m,
+      IndexExpr k, SmallVectorImpl<IndexExpr> &aAccessFct,
+      SmallVectorImpl<IndexExpr> &bAccessFct) const {
+    if (gemmOp.transA() != 0)
+      aAccessFct.assign({k, n});
+    else
+      aAccessFct.assign({n, k});
+    if (gemmOp.transB() != 0)
+      bAccessFct.assign({m, k});
+    else
+      bAccessFct.assign({k, m});
+  }
+
+  // Compute the access function of C for res[n, m], using the broadcast rules.
+  void getBiasAccessFct(ONNXGemmOpShapeHelper &shapeHelper,
+      IndexExprContext &context, SmallVectorImpl<IndexExpr> &resAccessFct,
+      SmallVectorImpl<IndexExpr> &cAccessFct) const {
+    for (int x = 2 - shapeHelper.cRank; x < 2; ++x) {
+      // If dim > 1, use loop index, otherwise broadcast on 0's element.
+      IndexExpr dim =
+          context.createSymbolIndexFromParentContext(shapeHelper.cDims[x]);
+      cAccessFct.emplace_back(IndexExpr::select(dim > 1, resAccessFct[x], 0));
+    }
+  }
 
   LogicalResult matchAndRewrite(Operation *op, ArrayRef<Value> operands,
       ConversionPatternRewriter &rewriter) const final {
@@ -49,10 +79,79 @@ struct ONNXGemmOpLowering : public ConversionPattern {
     Value beta = emitConstantOp(rewriter, loc, elementType, betaLit);
     Value zero = emitConstantOp(rewriter, loc, elementType, 0);
 
+    DimsExpr &outputDims = shapeHelper.dimsForOutput(0);
+    IndexExpr reductionDim = shapeHelper.aDims[1];
+    if (isTiledMatMulProfitable(
+            tileSizes, outputDims[0], outputDims[1], reductionDim)) {
+      // Insert res[n,m] = 0.
+      BuildKrnlLoop initLoops(rewriter, loc, 2);
+      initLoops.createDefineOp();
+      initLoops.pushAllBounds(outputDims);
+      initLoops.createIterateOp();
+      auto ipInitLoopRegion = rewriter.saveInsertionPoint();
+      rewriter.setInsertionPointToStart(initLoops.getIterateBlock());
+      rewriter.create<KrnlStoreOp>(
+          loc, zero, alloc, initLoops.getAllInductionVar());
+      rewriter.restoreInsertionPoint(ipInitLoopRegion);
+
+      // Insert res[n,m] += A[n,k] * B[k,m] in the tiled loop nest.
+      Block *tiledBlock = emitTiledMatMulLoops(
+          rewriter, loc, tileSizes, outputDims, reductionDim);
+      auto ipTiledLoopRegion = rewriter.saveInsertionPoint();
+      rewriter.setInsertionPointToStart(tiledBlock);
+      {
+        IndexExpr n =
+            outerContext.createLoopInductionIndex(tiledBlock->getArgument(0));
+        IndexExpr m =
+            outerContext.createLoopInductionIndex(tiledBlock->getArgument(1));
+        IndexExpr k =
+            outerContext.createLoopInductionIndex(tiledBlock->getArgument(2));
+        SmallVector<IndexExpr, 4> resAccessFct({n, m});
+        SmallVector<IndexExpr, 4> aAccessFct, bAccessFct;
+        getOperandAccessFcts(gemmOp, n, m, k, aAccessFct, bAccessFct);
+        Value loadedA =
+            outerContext.createKrnlLoadOp(operandAdaptor.A(), aAccessFct);
+        Value loadedB =
+            outerContext.createKrnlLoadOp(operandAdaptor.B(), bAccessFct);
+        Value loadedY = outerContext.createKrnlLoadOp(alloc, resAccessFct);
+        Value AB = rewriter.create<MulFOp>(loc, loadedA, loadedB);
+        Value accumulated = rewriter.create<AddFOp>(loc, loadedY, AB);
+        outerContext.createKrnlStoreOp(accumulated, alloc, resAccessFct);
+      }
+      rewriter.restoreInsertionPoint(ipTiledLoopRegion);
+
+      // Insert res[n,m] = res[n,m]*alpha + beta*C[...], if needed.
+      if (alphaLit != 1.0 || shapeHelper.hasBias) {
+        BuildKrnlLoop epilogueLoops(rewriter, loc, 2);
+        epilogueLoops.createDefineOp();
+        epilogueLoops.pushAllBounds(outputDims);
+        epilogueLoops.createIterateOp();
+        rewriter.setInsertionPointToStart(epilogueLoops.getIterateBlock());
+        SmallVector<IndexExpr, 4> resAccessFct;
+        outerContext.createLoopInductionIndicesFromArrayValues(
+            epilogueLoops.getAllInductionVar(), resAccessFct);
+        Value Y = outerContext.createKrnlLoadOp(alloc, resAccessFct);
+        if (alphaLit != 1.0)
+          Y = rewriter.create<MulFOp>(loc, alpha, Y);
+        if (shapeHelper.hasBias) {
+          SmallVector<IndexExpr, 4> cAccessFct;
+          getBiasAccessFct(shapeHelper, outerContext, resAccessFct, cAccessFct);
+          Value loadedC =
+              outerContext.createKrnlLoadOp(operandAdaptor.C(), cAccessFct);
+          Value betaC = rewriter.create<MulFOp>(loc, beta, loadedC);
+          Y = rewriter.create<AddFOp>(loc, Y, betaC);
+        }
+        outerContext.createKrnlStoreOp(Y, alloc, resAccessFct);
+      }
+
+      rewriter.replaceOp(op, alloc);
+      return success();
+    }
+
     // Loop iterations N=0 & M-1 going over each of the res[n, m] values.
     BuildKrnlLoop outputLoops(rewriter, loc, 2);
     outputLoops.createDefineOp();
-    outputLoops.pushAllBounds(shapeHelper.dimsForOutput(0));
+    outputLoops.pushAllBounds(outputDims);
     outputLoops.createIterateOp();
     rewriter.setInsertionPointToStart(outputLoops.getIterateBlock());
 
@@ -72,7 +171,7 @@ struct ONNXGemmOpLowering : public ConversionPattern {
     // Create the inner reduction loop.
     BuildKrnlLoop innerLoops(rewriter, loc, 1);
     innerLoops.createDefineOp();
-    innerLoops.pushBounds(0, shapeHelper.aDims[1]);
+    innerLoops.pushBounds(0, reductionDim);
     innerLoops.createIterateOp();
 
     // Now start writing code inside the inner loop: get A & B access functions.
@@ -82,14 +181,7 @@ struct ONNXGemmOpLowering : public ConversionPattern {
       IndexExpr k =
           outerContext.createLoopInductionIndex(innerLoops.getInductionVar(0));
       SmallVector<IndexExpr, 4> aAccessFct, bAccessFct;
-      if (gemmOp.transA() != 0)
-        aAccessFct = {k, n};
-      else
-        aAccessFct = {n, k};
-      if (gemmOp.transB() != 0)
-        bAccessFct = {m, k};
-      else
-        bAccessFct = {k, m};
+      getOperandAccessFcts(gemmOp, n, m, k, aAccessFct, bAccessFct);
       // Add mat mul operation.
       Value loadedA =
           outerContext.createKrnlLoadOp(operandAdaptor.A(), aAccessFct);
@@ -109,14 +201,8 @@ struct ONNXGemmOpLowering : public ConversionPattern {
     // Write code after the completion of the inner loop.
     // Compute the c access function using the broadcast rules.
     SmallVector<IndexExpr, 4> cAccessFct;
-    if (shapeHelper.hasBias) {
-      for (int x = 2 - shapeHelper.cRank; x < 2; ++x) {
-        // If dim > 1, use loop index, otherwise broadcast on 0's element.
-        IndexExpr dim = outerContext.createSymbolIndexFromParentContext(
-            shapeHelper.cDims[x]);
-        cAccessFct.emplace_back(IndexExpr::select(dim > 1, resAccessFct[x], 0));
-      }
-    }
+    if (shapeHelper.hasBias)
+      getBiasAccessFct(shapeHelper, outerContext, resAccessFct, cAccessFct);
 
     // Calculate reduction(AB)*alpha.
     Value alphaAB = rewriter.create<MulFOp>(loc, alpha, loadedAB);
@@ -138,7 +224,7 @@ struct ONNXGemmOpLowering : public ConversionPattern {
   }
 };
 
-void populateLoweringONNXGemmOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx) {
-  patterns.insert<ONNXGemmOpLowering<ONNXGemmOp>>(ctx);
+void populateLoweringONNXGemmOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes) {
+  patterns.insert<ONNXGemmOpLowering<ONNXGemmOp>>(ctx, tileSizes);
 }
@@ -18,8 +18,49 @@
 using namespace mlir;
 
 struct ONNXMatMulOpLowering : public ConversionPattern {
-  ONNXMatMulOpLowering(MLIRContext *ctx)
-      : ConversionPattern(mlir::ONNXMatMulOp::getOperationName(), 1, ctx) {}
+  ONNXMatMulOpLowering(MLIRContext *ctx, MatMulTileSizes tileSizes)
+      : ConversionPattern(mlir::ONNXMatMulOp::getOperationName(), 1, ctx),
+        tileSizes(tileSizes) {}
+
+  MatMulTileSizes tileSizes;
+
+  // Compute the access functions of A and B for the output element at
+  // `resAccessFct` and the reduction index `k`.
+  void getOperandAccessFcts(ONNXMatMulOpShapeHelper &shapeHelper,
+      SmallVectorImpl<IndexExpr> &resAccessFct, IndexExpr k,
+      SmallVectorImpl<IndexExpr> &aAccessFct,
+      SmallVectorImpl<IndexExpr> &bAccessFct) const {
+    int outerloopNum = resAccessFct.size();
+    int aRank = shapeHelper.aDims.size();
+    int bRank = aRank; // Add for better readability.
+    for (int i = 0; i < aRank; ++i) {
+      // Add index if dim is not a padded dimension.
+      if (!shapeHelper.aPadDims[i]) {
+        // For A, reduction index is last
+        if (i == aRank - 1) {
+          aAccessFct.emplace_back(k);
+        } else {
+          aAccessFct.emplace_back(resAccessFct[i]);
+        }
+      }
+      if (!shapeHelper.bPadDims[i]) {
+        // For B, reduction index is second to last.
+        if (i == bRank - 2) {
+          bAccessFct.emplace_back(k);
+        } else if (i == outerloopNum) {
+          // When the rank of A 1D, then the output lost one dimension.
+          // E,g, (5) x (10, 5, 4) -> padded (1, 5) x (10, 5, 4) = (10, 1, 4).
+          // But we drop the "1" so its really (10, 4). When processing the
+          // last dim of the reduction (i=2 here), we would normally access
+          // output[2] but it does not exist, because we lost a dim in the
+          // output due to 1D A.
+          bAccessFct.emplace_back(resAccessFct[i - 1]);
+        } else {
+          bAccessFct.emplace_back(resAccessFct[i]);
+        }
+      }
+    }
+  }
 
   LogicalResult matchAndRewrite(Operation *op, ArrayRef<Value> operands,
       ConversionPatternRewriter &rewriter) const final {
@@ -44,10 +85,58 @@ struct ONNXMatMulOpLowering : public ConversionPattern {
     Value zero = emitConstantOp(rewriter, loc, elementType, 0);
 
     // Non-reduction loop iterations: output-rank.
-    int outerloopNum = shapeHelper.dimsForOutput(0).size();
+    DimsExpr &outputDims = shapeHelper.dimsForOutput(0);
+    int outerloopNum = outputDims.size();
+    int aRank = shapeHelper.aDims.size();
+    IndexExpr reductionDim = shapeHelper.aDims[aRank - 1];
+
+    // Products of matrices are computed tile by tile, directly in res.
+    bool isMatrixProduct =
+        operandAdaptor.A().getType().cast<ShapedType>().getRank() >= 2 &&
+        operandAdaptor.B().getType().cast<ShapedType>().getRank() >= 2;
+    if (isMatrixProduct &&
+        isTiledMatMulProfitable(tileSizes, outputDims[outerloopNum - 2],
+            outputDims[outerloopNum - 1], reductionDim)) {
+      // Insert res[...] = 0.
+      BuildKrnlLoop initLoops(rewriter, loc, outerloopNum);
+      initLoops.createDefineOp();
+      initLoops.pushAllBounds(outputDims);
+      initLoops.createIterateOp();
+      auto ipInitLoopRegion = rewriter.saveInsertionPoint();
+      rewriter.setInsertionPointToStart(initLoops.getIterateBlock());
+      rewriter.create<KrnlStoreOp>(
+          loc, zero, alloc, initLoops.getAllInductionVar());
+      rewriter.restoreInsertionPoint(ipInitLoopRegion);
+
+      // Insert res[...] += A[...] * B[...] in the tiled loop nest.
+      Block *tiledBlock = emitTiledMatMulLoops(
+          rewriter, loc, tileSizes, outputDims, reductionDim);
+      rewriter.setInsertionPointToStart(tiledBlock);
+      SmallVector<IndexExpr, 4> resAccessFct;
+      outerContext.createLoopInductionIndicesFromArrayValues(
+          tiledBlock->getArguments().take_front(outerloopNum), resAccessFct);
+      IndexExpr k = outerContext.createLoopInductionIndex(
+          tiledBlock->getArgument(outerloopNum));
+      SmallVector<IndexExpr, 4> aAccessFct, bAccessFct;
+      getOperandAccessFcts(
+          shapeHelper, resAccessFct, k, aAccessFct, bAccessFct);
+
+      Value loadedA =
+          outerContext.createKrnlLoadOp(operandAdaptor.A(), aAccessFct);
+      Value loadedB =
+          outerContext.createKrnlLoadOp(operandAdaptor.B(), bAccessFct);
+      Value loadedY = outerContext.createKrnlLoadOp(alloc, resAccessFct);
+      Value AB = rewriter.create<MulFOp>(loc, loadedA, loadedB);
+      Value accumulated = rewriter.create<AddFOp>(loc, loadedY, AB);
+      outerContext.createKrnlStoreOp(accumulated, alloc, resAccessFct);
+
+      rewriter.replaceOp(op, alloc);
+      return success();
+    }
+
     BuildKrnlLoop outputLoops(rewriter, loc, outerloopNum);
     outputLoops.createDefineOp();
-    outputLoops.pushAllBounds(shapeHelper.dimsForOutput(0));
+    outputLoops.pushAllBounds(outputDims);
     outputLoops.createIterateOp();
     rewriter.setInsertionPointToStart(outputLoops.getIterateBlock());
 
@@ -64,9 +153,7 @@ struct ONNXMatMulOpLowering : public ConversionPattern {
     // Create the inner reduction loop; trip count is last dim of A.
     BuildKrnlLoop innerLoops(rewriter, loc, 1);
     innerLoops.createDefineOp();
-    int aRank = shapeHelper.aDims.size();
-    int bRank = aRank; // Add for better readability.
-    innerLoops.pushBounds(0, shapeHelper.aDims[aRank - 1]);
+    innerLoops.pushBounds(0, reductionDim);
     innerLoops.createIterateOp();
 
     // Now start writing code inside the inner loop: get A & B access functions.
@@ -76,33 +163,7 @@ struct ONNXMatMulOpLowering : public ConversionPattern {
     IndexExpr k =
         outerContext.createLoopInductionIndex(innerLoops.getInductionVar(0));
     SmallVector<IndexExpr, 4> aAccessFct, bAccessFct;
-    for (int i = 0; i < aRank; ++i) {
-      // Add index if dim is not a padded dimension.
-      if (!shapeHelper.aPadDims[i]) {
-        // For A, reduction index is last
-        if (i == aRank - 1) {
-          aAccessFct.emplace_back(k);
-        } else {
-          aAccessFct.emplace_back(resAccessFct[i]);
-        }
-      }
-      if (!shapeHelper.bPadDims[i]) {
-        // For B, reduction index is second to last.
-        if (i == bRank - 2) {
-          bAccessFct.emplace_back(k);
-        } else if (i == outerloopNum) {
-          // When the rank of A 1D, then the output lost one dimension.
-          // E,g, (5) x (10, 5, 4) -> padded (1, 5) x (10, 5, 4) = (10, 1, 4).
-          // But we drop the "1" so its really (10, 4). When processing the
-          // last dim of the reduction (i=2 here), we would normally access
-          // output[2] but it does not exist, because we lost a dim in the
-          // output due to 1D A.
-          bAccessFct.emplace_back(resAccessFct[i - 1]);
-        } else {
-          bAccessFct.emplace_back(resAccessFct[i]);
-        }
-      }
-    }
+    getOperandAccessFcts(shapeHelper, resAccessFct, k, aAccessFct, bAccessFct);
 
     // Add mat mul operation.
     Value loadedA =
@@ -127,7 +188,7 @@ struct ONNXMatMulOpLowering : public ConversionPattern {
   }
 };
 
-void populateLoweringONNXMatMulOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx) {
-  patterns.insert<ONNXMatMulOpLowering>(ctx);
+void populateLoweringONNXMatMulOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes) {
+  patterns.insert<ONNXMatMulOpLowering>(ctx, tileSizes);
 }
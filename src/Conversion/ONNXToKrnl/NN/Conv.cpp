@@ -13,10 +13,119 @@
 //
 //===----------------------------------------------------------------------===//
 
+#include "mlir/Dialect/SCF/SCF.h"
+
 #include "src/Conversion/ONNXToKrnl/ONNXToKrnlCommon.hpp"
 
 using namespace mlir;
 
+// Minimum number of input and output channels of a convolution lowered to
+// matrix multiplications. Below it, copying the data into the layout of the
+// matrix multiplications costs more than the tiled loops save.
+static const int64_t kMinChannelsForMatMulConv = 16;
+
+enum class ConvAlgorithm { Direct, Im2Col, Winograd };
+
+// Select the algorithm used to lower a convolution. Direct loops are used for
+// grouped convolutions, dynamic shapes other than the batch size and small
+// channel counts. 3x3 kernels with unit strides use the Winograd algorithm,
+// other kernels an im2col transform followed by a matrix multiplication.
+ConvAlgorithm selectConvAlgorithm(ONNXConvOp convOp, MemRefType inputType,
+    MemRefType kernelType, MemRefType resultType, ArrayRef<int64_t> strides,
+    bool isDilated) {
+  if (convOp.group() != 1)
+    return ConvAlgorithm::Direct;
+  if (!kernelType.hasStaticShape())
+    return ConvAlgorithm::Direct;
+  for (int i = 1; i < inputType.getRank(); ++i)
+    if (inputType.isDynamicDim(i) || resultType.isDynamicDim(i))
+      return ConvAlgorithm::Direct;
+
+  auto kernelShape = kernelType.getShape();
+  if (kernelShape[0] < kMinChannelsForMatMulConv ||
+      kernelShape[1] < kMinChannelsForMatMulConv)
+    return ConvAlgorithm::Direct;
+
+  bool isUnitStride = llvm::all_of(strides, [](int64_t s) { return s == 1; });
+  if (kernelShape.size() == 4 && kernelShape[2] == 3 && kernelShape[3] == 3 &&
+      isUnitStride && !isDilated)
+    return ConvAlgorithm::Winograd;
+  return ConvAlgorithm::Im2Col;
+}
+
+// Row-major linear index of `indices` in an array of static dimensions `dims`.
+IndexExpr linearizeIndices(
+    ArrayRef<IndexExpr> indices, ArrayRef<int64_t> dims) {
+  IndexExpr linearIndex = indices[0];
+  for (unsigned i = 1; i < indices.size(); ++i)
+    linearIndex = linearIndex * dims[i] + indices[i];
+  return linearIndex;
+}
+
+// Conjunction of the conditions `lhs` and `rhs`, `lhs` may be null.
+Value andConditions(
+    ConversionPatternRewriter &rewriter, Location loc, Value lhs, Value rhs) {
+  if (!lhs)
+    return rhs;
+  return rewriter.create<AndOp>(loc, lhs, rhs);
+}
+
+// 1-D transforms of the Winograd algorithm F(2, 3), see emitWinogradConv.
+// Kernel transform G g, from 3 to 4 values.
+SmallVector<Value, 4> transformWinogradKernel(
+    ConversionPatternRewriter &rewriter, Location loc, ArrayRef<Value> g,
+    Value half) {
+  Value g02 = rewriter.create<AddFOp>(loc, g[0], g[2]);
+  Value sum = rewriter.create<AddFOp>(loc, g02, g[1]);
+  Value diff = rewriter.create<SubFOp>(loc, g02, g[1]);
+  return {g[0], rewriter.create<MulFOp>(loc, half, sum),
+      rewriter.create<MulFOp>(loc, half, diff), g[2]};
+}
+
+// Data transform B^T d, from 4 to 4 values.
+SmallVector<Value, 4> transformWinogradData(
+    ConversionPatternRewriter &rewriter, Location loc, ArrayRef<Value> d) {
+  return {rewriter.create<SubFOp>(loc, d[0], d[2]),
+      rewriter.create<AddFOp>(loc, d[1], d[2]),
+      rewriter.create<SubFOp>(loc, d[2], d[1]),
+      rewriter.create<SubFOp>(loc, d[1], d[3])};
+}
+
+// Output transform A^T m, from 4 to 2 values.
+SmallVector<Value, 4> transformWinogradOutput(
+    ConversionPatternRewriter &rewriter, Location loc, ArrayRef<Value> m) {
+  Value m012 = rewriter.create<AddFOp>(
+      loc, rewriter.create<AddFOp>(loc, m[0], m[1]), m[2]);
+  Value m123 = rewriter.create<SubFOp>(
+      loc, rewriter.create<SubFOp>(loc, m[1], m[2]), m[3]);
+  return {m012, m123};
+}
+
+// Apply the 1-D transform `transform` to the columns, then to the rows, of
+// the square tile `tile` of `size` x `size` values stored in row-major order.
+SmallVector<Value, 16> transformWinogradTile(ArrayRef<Value> tile, int64_t size,
+    function_ref<SmallVector<Value, 4>(ArrayRef<Value>)> transform) {
+  // Transform the columns: columns[j][o] is the o-th value of column j.
+  SmallVector<SmallVector<Value, 4>, 4> columns;
+  for (int64_t j = 0; j < size; ++j) {
+    SmallVector<Value, 4> column;
+    for (int64_t i = 0; i < size; ++i)
+      column.emplace_back(tile[i * size + j]);
+    columns.emplace_back(transform(column));
+  }
+  // Transform the rows of the result.
+  int64_t transformedSize = columns[0].size();
+  SmallVector<Value, 16> result;
+  for (int64_t o = 0; o < transformedSize; ++o) {
+    SmallVector<Value, 4> row;
+    for (int64_t j = 0; j < size; ++j)
+      row.emplace_back(columns[j][o]);
+    SmallVector<Value, 4> transformedRow = transform(row);
+    result.append(transformedRow.begin(), transformedRow.end());
+  }
+  return result;
+}
+
 std::vector<int64_t> getDilations(ONNXConvOp poolOp) {
   std::vector<int64_t> dilations;
   auto dilationsAttribute = poolOp.dilationsAttr();
@@ -34,8 +143,439 @@ std::vector<int64_t> getDilations(ONNXConvOp poolOp) {
 }
 
 struct ONNXConvOpLowering : public ConversionPattern {
-  ONNXConvOpLowering(MLIRContext *ctx)
-      : ConversionPattern(mlir::ONNXConvOp::getOperationName(), 1, ctx) {}
+  ONNXConvOpLowering(MLIRContext *ctx, MatMulTileSizes tileSizes)
+      : ConversionPattern(mlir::ONNXConvOp::getOperationName(), 1, ctx),
+        tileSizes(tileSizes) {}
+
+  MatMulTileSizes tileSizes;
+
+  // Lower the convolution to a matrix multiplication (im2col):
+  //
+  // D (NxCxD1x...xDdim) x K (MxCxK1x...xKdim) -> R (NxMxR1x...xRdim)
+  //
+  // The kernels are viewed as a M x (C*K1*...*Kdim) matrix, and the input is
+  // copied into a N x (C*K1*...*Kdim) x (R1*...*Rdim) array, whose columns
+  // hold the convolution windows, zero padded:
+  //
+  //   col[n][c, k1, ..., kdim][r1, ..., rdim] =
+  //       D[n][c][r1 * s1 + k1 * d1 - pt1]...[rdim * sdim + kdim * ddim -
+  //       ptdim]
+  //
+  // The output is then computed by the tiled matrix multiplication
+  //   res[n][m][r1, ..., rdim] = sum(K[m][c, k1, ..., kdim] * col[n][...][...])
+  // and copied into R, adding the bias.
+  void emitIm2ColConv(ConversionPatternRewriter &rewriter, Location loc,
+      Value inputOperand, Value kernelOperand, Value biasOperand, Value alloc,
+      ArrayRef<int64_t> pads, ArrayRef<int64_t> strides,
+      ArrayRef<int64_t> dilations) const {
+    auto inputShape = inputOperand.getType().cast<MemRefType>().getShape();
+    auto kernelShape = kernelOperand.getType().cast<MemRefType>().getShape();
+    auto resultType = alloc.getType().cast<MemRefType>();
+    auto resultShape = resultType.getShape();
+    Type elementType = resultType.getElementType();
+    bool hasBias = !biasOperand.getType().isa<NoneType>();
+    int spatialRank = kernelShape.size() - 2;
+    int64_t numKernels = kernelShape[0];
+    int64_t numChannels = kernelShape[1];
+    int64_t windowSize = 1;
+    int64_t numWindows = 1;
+    for (int i = 0; i < spatialRank; ++i) {
+      windowSize *= kernelShape[i + 2];
+      numWindows *= resultShape[i + 2];
+    }
+    int64_t reductionSize = numChannels * windowSize;
+    ArrayRef<int64_t> kernelDims = kernelShape.drop_front(2);
+    ArrayRef<int64_t> resultDims = resultShape.drop_front(2);
+
+    IndexExprContext ieContext(&rewriter, loc);
+    Value zero = emitConstantOp(rewriter, loc, elementType, 0);
+
+    // The batch size, dimension 0 of every array, may be dynamic.
+    Value colMatrix = insertAllocAndDealloc(
+        MemRefType::get(
+            {inputShape[0], reductionSize, numWindows}, elementType),
+        loc, rewriter, /*insertDealloc=*/true, inputOperand);
+    Value kernelMatrix = insertAllocAndDealloc(
+        MemRefType::get({numKernels, reductionSize}, elementType), loc,
+        rewriter, /*insertDealloc=*/true);
+    Value resultMatrix = insertAllocAndDealloc(
+        MemRefType::get({inputShape[0], numKernels, numWindows}, elementType),
+        loc, rewriter, /*insertDealloc=*/true, inputOperand);
+
+    // 1. Copy the convolution windows into the columns of col.
+    BuildKrnlLoop colLoops(rewriter, loc, 2 + 2 * spatialRank);
+    colLoops.createDefineOp();
+    colLoops.pushBounds(0, inputOperand, 0);
+    colLoops.pushBounds(0, numChannels);
+    for (int i = 0; i < spatialRank; ++i)
+      colLoops.pushBounds(0, kernelDims[i]);
+    for (int i = 0; i < spatialRank; ++i)
+      colLoops.pushBounds(0, resultDims[i]);
+    colLoops.createIterateOp();
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(colLoops.getIterateBlock());
+      IndexExpr n =
+          ieContext.createLoopInductionIndex(colLoops.getInductionVar(0));
+      IndexExpr c =
+          ieContext.createLoopInductionIndex(colLoops.getInductionVar(1));
+      SmallVector<IndexExpr, 4> dataIndices = {n, c};
+      SmallVector<IndexExpr, 4> kernelIndices, windowIndices;
+      Value isInBounds;
+      for (int i = 0; i < spatialRank; ++i) {
+        IndexExpr k =
+            ieContext.createLoopInductionIndex(colLoops.getInductionVar(2 + i));
+        IndexExpr r = ieContext.createLoopInductionIndex(
+            colLoops.getInductionVar(2 + spatialRank + i));
+        int64_t dilation = dilations.empty() ? 1 : dilations[i];
+        IndexExpr h = r * strides[i] + k * dilation - pads[i];
+        // Windows overlapping the padding read zeros.
+        if (pads[i] > 0 || pads[i + spatialRank] > 0) {
+          IndexExpr lastIndex =
+              ieContext.createLiteralIndex(inputShape[i + 2] - 1);
+          for (IndexExpr cond : {h >= 0, h <= lastIndex}) {
+            isInBounds =
+                andConditions(rewriter, loc, isInBounds, cond.getValue());
+          }
+          h = h.clamp(ieContext.createLiteralIndex(0), lastIndex);
+        }
+        dataIndices.emplace_back(h);
+        kernelIndices.emplace_back(k);
+        windowIndices.emplace_back(r);
+      }
+      Value data = ieContext.createKrnlLoadOp(inputOperand, dataIndices);
+      if (isInBounds)
+        data = rewriter.create<SelectOp>(loc, isInBounds, data, zero);
+      SmallVector<IndexExpr, 4> colIndices = {n,
+          c * windowSize + linearizeIndices(kernelIndices, kernelDims),
+          linearizeIndices(windowIndices, resultDims)};
+      ieContext.createKrnlStoreOp(data, colMatrix, colIndices);
+    }
+
+    // 2. Copy the kernels into the rows of the kernel matrix.
+    BuildKrnlLoop kernelLoops(rewriter, loc, 2 + spatialRank);
+    kernelLoops.createDefineAndIterateOp(kernelOperand);
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(kernelLoops.getIterateBlock());
+      SmallVector<IndexExpr, 4> kernelIndices;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          kernelLoops.getAllInductionVar(), kernelIndices);
+      Value weight = ieContext.createKrnlLoadOp(kernelOperand, kernelIndices);
+      SmallVector<IndexExpr, 4> matrixIndices = {kernelIndices[0],
+          linearizeIndices(llvm::makeArrayRef(kernelIndices).drop_front(1),
+              kernelShape.drop_front(1))};
+      ieContext.createKrnlStoreOp(weight, kernelMatrix, matrixIndices);
+    }
+
+    // 3. Multiply the kernel matrix by col.
+    BuildKrnlLoop initLoops(rewriter, loc, 3);
+    initLoops.createDefineAndIterateOp(resultMatrix);
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(initLoops.getIterateBlock());
+      rewriter.create<KrnlStoreOp>(
+          loc, zero, resultMatrix, initLoops.getAllInductionVar());
+    }
+    SmallVector<IndexExpr, 4> matMulDims = {
+        ieContext.createDimIndexFromShapedType(inputOperand, 0),
+        ieContext.createLiteralIndex(numKernels),
+        ieContext.createLiteralIndex(numWindows)};
+    Block *matMulBlock = emitTiledMatMulLoops(rewriter, loc, tileSizes,
+        matMulDims, ieContext.createLiteralIndex(reductionSize));
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(matMulBlock);
+      SmallVector<IndexExpr, 4> ivs;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          matMulBlock->getArguments(), ivs);
+      IndexExpr n = ivs[0], m = ivs[1], r = ivs[2], k = ivs[3];
+      SmallVector<IndexExpr, 4> kernelIndices = {m, k};
+      SmallVector<IndexExpr, 4> colIndices = {n, k, r};
+      SmallVector<IndexExpr, 4> resultIndices = {n, m, r};
+      Value loadedKernel =
+          ieContext.createKrnlLoadOp(kernelMatrix, kernelIndices);
+      Value loadedCol = ieContext.createKrnlLoadOp(colMatrix, colIndices);
+      Value loadedResult =
+          ieContext.createKrnlLoadOp(resultMatrix, resultIndices);
+      Value product = rewriter.create<MulFOp>(loc, loadedKernel, loadedCol);
+      Value sum = rewriter.create<AddFOp>(loc, loadedResult, product);
+      ieContext.createKrnlStoreOp(sum, resultMatrix, resultIndices);
+    }
+
+    // 4. Copy the result into R, adding the bias.
+    BuildKrnlLoop outputLoops(rewriter, loc, 2 + spatialRank);
+    outputLoops.createDefineAndIterateOp(alloc);
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(outputLoops.getIterateBlock());
+      SmallVector<IndexExpr, 4> outputIndices;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          outputLoops.getAllInductionVar(), outputIndices);
+      SmallVector<IndexExpr, 4> resultIndices = {outputIndices[0],
+          outputIndices[1],
+          linearizeIndices(
+              llvm::makeArrayRef(outputIndices).drop_front(2), resultDims)};
+      Value result = ieContext.createKrnlLoadOp(resultMatrix, resultIndices);
+      if (hasBias) {
+        SmallVector<IndexExpr, 4> biasIndices = {outputIndices[1]};
+        Value bias = ieContext.createKrnlLoadOp(biasOperand, biasIndices);
+        result = rewriter.create<AddFOp>(loc, result, bias);
+      }
+      ieContext.createKrnlStoreOp(result, alloc, outputIndices);
+    }
+  }
+
+  // Lower a 2-D convolution with 3x3 kernels and unit strides to the Winograd
+  // algorithm F(2x2, 3x3). Each 2x2 tile y of the output of a channel is
+  // computed from the 4x4 tile d of the input overlapping it, and the 3x3
+  // kernel g, with 16 multiplications instead of 36:
+  //
+  //   y = A^T [(G g G^T) . (B^T d B)] A
+  //
+  //   G = | 1    0    0  |   B^T = | 1  0 -1  0 |   A^T = | 1  1  1  0 |
+  //       | 1/2  1/2  1/2|         | 0  1  1  0 |         | 0  1 -1 -1 |
+  //       | 1/2 -1/2  1/2|         | 0 -1  1  0 |
+  //       | 0    0    1  |         | 0  1  0 -1 |
+  //
+  // The 16 elements of the element-wise product are summed over the input
+  // channels by 16 independent tiled matrix multiplications:
+  //
+  //   P[n][e][m][t] = sum(U[e][m][c] * V[n][e][c][t])
+  //
+  // where U holds the transformed kernels, V the transformed input tiles and
+  // t runs over the 2x2 output tiles.
+  void emitWinogradConv(ConversionPatternRewriter &rewriter, Location loc,
+      Value inputOperand, Value kernelOperand, Value biasOperand, Value alloc,
+      ArrayRef<int64_t> pads) const {
+    auto inputShape = inputOperand.getType().cast<MemRefType>().getShape();
+    auto kernelShape = kernelOperand.getType().cast<MemRefType>().getShape();
+    auto resultType = alloc.getType().cast<MemRefType>();
+    auto resultShape = resultType.getShape();
+    Type elementType = resultType.getElementType();
+    bool hasBias = !biasOperand.getType().isa<NoneType>();
+    int64_t numKernels = kernelShape[0];
+    int64_t numChannels = kernelShape[1];
+    // Number of tiles along the spatial dimensions.
+    int64_t numTileRows = (resultShape[2] + 1) / 2;
+    int64_t numTileCols = (resultShape[3] + 1) / 2;
+    int64_t numTiles = numTileRows * numTileCols;
+
+    IndexExprContext ieContext(&rewriter, loc);
+    Value zero = emitConstantOp(rewriter, loc, elementType, 0);
+    Value half = emitConstantOp(rewriter, loc, elementType, 0.5);
+
+    // The batch size, dimension 0 of V, P and the input, may be dynamic.
+    Value kernelTransform = insertAllocAndDealloc(
+        MemRefType::get({16, numKernels, numChannels}, elementType), loc,
+        rewriter, /*insertDealloc=*/true);
+    Value dataTransform = insertAllocAndDealloc(
+        MemRefType::get(
+            {inputShape[0], 16, numChannels, numTiles}, elementType),
+        loc, rewriter, /*insertDealloc=*/true, inputOperand);
+    Value product = insertAllocAndDealloc(
+        MemRefType::get({inputShape[0], 16, numKernels, numTiles}, elementType),
+        loc, rewriter, /*insertDealloc=*/true, inputOperand);
+
+    // 1. U[e][m][c] = (G g G^T)[e], g = K[m][c].
+    BuildKrnlLoop kernelLoops(rewriter, loc, 2);
+    kernelLoops.createDefineOp();
+    kernelLoops.pushBounds(0, numKernels);
+    kernelLoops.pushBounds(0, numChannels);
+    kernelLoops.createIterateOp();
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(kernelLoops.getIterateBlock());
+      IndexExpr m =
+          ieContext.createLoopInductionIndex(kernelLoops.getInductionVar(0));
+      IndexExpr c =
+          ieContext.createLoopInductionIndex(kernelLoops.getInductionVar(1));
+      SmallVector<Value, 9> kernelTile;
+      for (int64_t i = 0; i < 3; ++i)
+        for (int64_t j = 0; j < 3; ++j) {
+          SmallVector<IndexExpr, 4> kernelIndices = {m, c,
+              ieContext.createLiteralIndex(i), ieContext.createLiteralIndex(j)};
+          kernelTile.emplace_back(
+              ieContext.createKrnlLoadOp(kernelOperand, kernelIndices));
+        }
+      SmallVector<Value, 16> transformed =
+          transformWinogradTile(kernelTile, 3, [&](ArrayRef<Value> g) {
+            return transformWinogradKernel(rewriter, loc, g, half);
+          });
+      for (int64_t e = 0; e < 16; ++e) {
+        SmallVector<IndexExpr, 4> transformIndices = {
+            ieContext.createLiteralIndex(e), m, c};
+        ieContext.createKrnlStoreOp(
+            transformed[e], kernelTransform, transformIndices);
+      }
+    }
+
+    // 2. V[n][e][c][t] = (B^T d B)[e], d = the input tile of t, zero padded.
+    BuildKrnlLoop dataLoops(rewriter, loc, 4);
+    dataLoops.createDefineOp();
+    dataLoops.pushBounds(0, inputOperand, 0);
+    dataLoops.pushBounds(0, numChannels);
+    dataLoops.pushBounds(0, numTileRows);
+    dataLoops.pushBounds(0, numTileCols);
+    dataLoops.createIterateOp();
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(dataLoops.getIterateBlock());
+      SmallVector<IndexExpr, 4> ivs;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          dataLoops.getAllInductionVar(), ivs);
+      IndexExpr n = ivs[0], c = ivs[1], tileRow = ivs[2], tileCol = ivs[3];
+
+      // Positions of the rows and columns of the tile in the input, and
+      // whether they fall into the padding, if they can.
+      auto getTileIndices = [&](IndexExpr tileIndex, int64_t numTiles,
+                                int64_t pad, int64_t dimSize,
+                                SmallVectorImpl<IndexExpr> &indices,
+                                SmallVectorImpl<Value> &inBounds) {
+        IndexExpr lastIndex = ieContext.createLiteralIndex(dimSize - 1);
+        for (int64_t i = 0; i < 4; ++i) {
+          IndexExpr index = tileIndex * 2 + (i - pad);
+          Value isInBounds;
+          if (i - pad < 0) {
+            isInBounds = (index >= 0).getValue();
+            index = index.clamp(ieContext.createLiteralIndex(0), lastIndex);
+          }
+          if (2 * (numTiles - 1) + i - pad > dimSize - 1) {
+            isInBounds = andConditions(
+                rewriter, loc, isInBounds, (index <= lastIndex).getValue());
+            index = index.clamp(ieContext.createLiteralIndex(0), lastIndex);
+          }
+          indices.emplace_back(index);
+          inBounds.emplace_back(isInBounds);
+        }
+      };
+      SmallVector<IndexExpr, 4> rowIndices, colIndices;
+      SmallVector<Value, 4> rowInBounds, colInBounds;
+      getTileIndices(tileRow, numTileRows, pads[0], inputShape[2], rowIndices,
+          rowInBounds);
+      getTileIndices(tileCol, numTileCols, pads[1], inputShape[3], colIndices,
+          colInBounds);
+
+      SmallVector<Value, 16> dataTile;
+      for (int64_t i = 0; i < 4; ++i)
+        for (int64_t j = 0; j < 4; ++j) {
+          SmallVector<IndexExpr, 4> dataIndices = {
+              n, c, rowIndices[i], colIndices[j]};
+          Value data = ieContext.createKrnlLoadOp(inputOperand, dataIndices);
+          Value isInBounds = rowInBounds[i];
+          if (colInBounds[j])
+            isInBounds =
+                andConditions(rewriter, loc, isInBounds, colInBounds[j]);
+          if (isInBounds)
+            data = rewriter.create<SelectOp>(loc, isInBounds, data, zero);
+          dataTile.emplace_back(data);
+        }
+      SmallVector<Value, 16> transformed =
+          transformWinogradTile(dataTile, 4, [&](ArrayRef<Value> d) {
+            return transformWinogradData(rewriter, loc, d);
+          });
+      IndexExpr t = tileRow * numTileCols + tileCol;
+      for (int64_t e = 0; e < 16; ++e) {
+        SmallVector<IndexExpr, 4> transformIndices = {
+            n, ieContext.createLiteralIndex(e), c, t};
+        ieContext.createKrnlStoreOp(
+            transformed[e], dataTransform, transformIndices);
+      }
+    }
+
+    // 3. P[n][e][m][t] = sum(U[e][m][c] * V[n][e][c][t]).
+    BuildKrnlLoop initLoops(rewriter, loc, 4);
+    initLoops.createDefineAndIterateOp(product);
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(initLoops.getIterateBlock());
+      rewriter.create<KrnlStoreOp>(
+          loc, zero, product, initLoops.getAllInductionVar());
+    }
+    SmallVector<IndexExpr, 4> matMulDims = {
+        ieContext.createDimIndexFromShapedType(inputOperand, 0),
+        ieContext.createLiteralIndex(16),
+        ieContext.createLiteralIndex(numKernels),
+        ieContext.createLiteralIndex(numTiles)};
+    Block *matMulBlock = emitTiledMatMulLoops(rewriter, loc, tileSizes,
+        matMulDims, ieContext.createLiteralIndex(numChannels));
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(matMulBlock);
+      SmallVector<IndexExpr, 4> ivs;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          matMulBlock->getArguments(), ivs);
+      IndexExpr n = ivs[0], e = ivs[1], m = ivs[2], t = ivs[3], c = ivs[4];
+      SmallVector<IndexExpr, 4> kernelIndices = {e, m, c};
+      SmallVector<IndexExpr, 4> dataIndices = {n, e, c, t};
+      SmallVector<IndexExpr, 4> productIndices = {n, e, m, t};
+      Value loadedKernel =
+          ieContext.createKrnlLoadOp(kernelTransform, kernelIndices);
+      Value loadedData = ieContext.createKrnlLoadOp(dataTransform, dataIndices);
+      Value loadedProduct = ieContext.createKrnlLoadOp(product, productIndices);
+      Value sum = rewriter.create<AddFOp>(loc, loadedProduct,
+          rewriter.create<MulFOp>(loc, loadedKernel, loadedData));
+      ieContext.createKrnlStoreOp(sum, product, productIndices);
+    }
+
+    // 4. y = A^T P[n][.][m][t] A + bias, dropping the parts of the last tiles
+    // beyond the output.
+    BuildKrnlLoop outputLoops(rewriter, loc, 4);
+    outputLoops.createDefineOp();
+    outputLoops.pushBounds(0, inputOperand, 0);
+    outputLoops.pushBounds(0, numKernels);
+    outputLoops.pushBounds(0, numTileRows);
+    outputLoops.pushBounds(0, numTileCols);
+    outputLoops.createIterateOp();
+    {
+      OpBuilder::InsertionGuard insertGuard(rewriter);
+      rewriter.setInsertionPointToStart(outputLoops.getIterateBlock());
+      SmallVector<IndexExpr, 4> ivs;
+      ieContext.createLoopInductionIndicesFromArrayValues(
+          outputLoops.getAllInductionVar(), ivs);
+      IndexExpr n = ivs[0], m = ivs[1], tileRow = ivs[2], tileCol = ivs[3];
+      IndexExpr t = tileRow * numTileCols + tileCol;
+      SmallVector<Value, 16> productTile;
+      for (int64_t e = 0; e < 16; ++e) {
+        SmallVector<IndexExpr, 4> productIndices = {
+            n, ieContext.createLiteralIndex(e), m, t};
+        productTile.emplace_back(
+            ieContext.createKrnlLoadOp(product, productIndices));
+      }
+      SmallVector<Value, 16> outputTile =
+          transformWinogradTile(productTile, 4, [&](ArrayRef<Value> p) {
+            return transformWinogradOutput(rewriter, loc, p);
+          });
+      Value bias;
+      if (hasBias) {
+        SmallVector<IndexExpr, 4> biasIndices = {m};
+        bias = ieContext.createKrnlLoadOp(biasOperand, biasIndices);
+      }
+      for (int64_t i = 0; i < 2; ++i)
+        for (int64_t j = 0; j < 2; ++j) {
+          OpBuilder::InsertionGuard storeGuard(rewriter);
+          IndexExpr row = tileRow * 2 + i;
+          IndexExpr col = tileCol * 2 + j;
+          // Odd output sizes only use the first row or column of the last
+          // tile.
+          Value isInBounds;
+          if (i == 1 && resultShape[2] % 2 != 0)
+            isInBounds = (row < resultShape[2]).getValue();
+          if (j == 1 && resultShape[3] % 2 != 0)
+            isInBounds = andConditions(
+                rewriter, loc, isInBounds, (col < resultShape[3]).getValue());
+          if (isInBounds) {
+            auto ifOp = rewriter.create<scf::IfOp>(loc, isInBounds, false);
+            rewriter.setInsertionPointToStart(&ifOp.thenRegion().front());
+          }
+          Value result = outputTile[i * 2 + j];
+          if (hasBias)
+            result = rewriter.create<AddFOp>(loc, result, bias);
+          SmallVector<IndexExpr, 4> outputIndices = {n, m, row, col};
+          ieContext.createKrnlStoreOp(result, alloc, outputIndices);
+        }
+    }
+  }
 
   LogicalResult matchAndRewrite(Operation *op, ArrayRef<Value> operands,
       ConversionPatternRewriter &rewriter) const final {
@@ -83,6 +623,25 @@ struct ONNXConvOpLowering : public ConversionPattern {
       alloc = insertAllocAndDealloc(
           memRefType, loc, rewriter, insertDealloc, {inputOperand});
 
+    // Convolutions with many channels are lowered to matrix multiplications.
+    switch (
+        selectConvAlgorithm(convOp, inputOperand.getType().cast<MemRefType>(),
+            kernelOperand.getType().cast<MemRefType>(), memRefType, strides,
+            isDilated)) {
+    case ConvAlgorithm::Im2Col:
+      emitIm2ColConv(rewriter, loc, inputOperand, kernelOperand, biasOperand,
+          alloc, pads, strides, dilations);
+      rewriter.replaceOp(op, alloc);
+      return success();
+    case ConvAlgorithm::Winograd:
+      emitWinogradConv(
+          rewriter, loc, inputOperand, kernelOperand, biasOperand, alloc, pads);
+      rewriter.replaceOp(op, alloc);
+      return success();
+    case ConvAlgorithm::Direct:
+      break;
+    }
+
     // R = Conv(D, K)
     //
     // The input/output shapes will look like this:
@@ -379,7 +938,7 @@ struct ONNXConvOpLowering : public ConversionPattern {
   }
 };
 
-void populateLoweringONNXConvOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx) {
-  patterns.insert<ONNXConvOpLowering>(ctx);
+void populateLoweringONNXConvOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes) {
+  patterns.insert<ONNXConvOpLowering>(ctx, tileSizes);
 }
@@ -13,6 +13,8 @@
 //
 //===----------------------------------------------------------------------===//
 
+#include "llvm/ADT/StringSwitch.h"
+
 #include "src/Conversion/ONNXToKrnl/ONNXToKrnlCommon.hpp"
 
 /// Check if all operands are scalar values at compile time.
@@ -353,3 +355,106 @@ Value getDimOrConstant(ConversionPatternRewriter &rewriter, Location loc,
   }
   return dimVal;
 }
+
+//===----------------------------------------------------------------------===//
+// Tiling of matrix multiplications.
+//===----------------------------------------------------------------------===//
+
+MatMulTileSizes getMatMulTileSizes(StringRef mcpu) {
+  // Tiles of B (k x m) are sized to stay in the L2 cache and rows of tiles of
+  // B to stay in the L1 cache, the unrolled loop matches the vector registers.
+  return llvm::StringSwitch<MatMulTileSizes>(mcpu)
+      .Cases("z14", "z15", "arch12", "arch13", MatMulTileSizes{64, 128, 512, 8})
+      .Cases("skylake-avx512", "cascadelake", "cooperlake", "icelake-server",
+          MatMulTileSizes{32, 128, 256, 16})
+      .Default(MatMulTileSizes{32, 64, 256, 8});
+}
+
+bool isTiledMatMulProfitable(
+    const MatMulTileSizes &tileSizes, IndexExpr n, IndexExpr m, IndexExpr k) {
+  // A matrix multiplication fitting in a single tile gains nothing from the
+  // blocking.
+  auto exceedsTile = [](IndexExpr dim, int64_t tileSize) {
+    return !dim.isLiteral() || dim.getLiteral() > tileSize;
+  };
+  return exceedsTile(n, tileSizes.n) || exceedsTile(m, tileSizes.m) ||
+         exceedsTile(k, tileSizes.k);
+}
+
+Block *emitTiledMatMulLoops(ConversionPatternRewriter &rewriter, Location loc,
+    const MatMulTileSizes &tileSizes, SmallVectorImpl<IndexExpr> &outputDims,
+    IndexExpr reductionDim) {
+  int outputRank = outputDims.size();
+  assert(outputRank >= 2 && "Expected at least 2 output dimensions.");
+  std::vector<Value> originalLoops;
+  defineLoops(rewriter, loc, originalLoops, outputRank + 1);
+
+  // Tiles larger than a static dimension are shrunk to the dimension.
+  auto clampTile = [](IndexExpr dim, int64_t tileSize) {
+    if (dim.isLiteral() && dim.getLiteral() > 0 && dim.getLiteral() < tileSize)
+      return dim.getLiteral();
+    return tileSize;
+  };
+  IndexExpr mDim = outputDims[outputRank - 1];
+  int64_t tileN = clampTile(outputDims[outputRank - 2], tileSizes.n);
+  int64_t tileM = clampTile(mDim, tileSizes.m);
+  int64_t tileK = clampTile(reductionDim, tileSizes.k);
+
+  Type loopType = LoopType::get(rewriter.getContext());
+  auto blockLoop = [&](Value loop, int64_t tileSize) {
+    return rewriter.create<KrnlBlockOp>(
+        loc, loopType, loopType, loop, rewriter.getI64IntegerAttr(tileSize));
+  };
+  auto nBlock = blockLoop(originalLoops[outputRank - 2], tileN);
+  auto mBlock = blockLoop(originalLoops[outputRank - 1], tileM);
+  auto kBlock = blockLoop(originalLoops[outputRank], tileK);
+
+  // Loops of the band in nest order, with their position once permuted: the
+  // tile loops over n, m and k go outside, the intra-tile loops over n, k and
+  // m inside, so that B and the output are accessed with a unit stride.
+  SmallVector<Value, 8> band = {
+      nBlock.loop_block(), nBlock.loop_local(), mBlock.loop_block()};
+  SmallVector<int64_t, 8> permutation = {0, 3, 1};
+  // The intra-tile loop over m can only be unrolled if its trip count is a
+  // constant, i.e. if the tiles evenly divide the dimension.
+  Value unrolledLoop;
+  if (mDim.isLiteral() && mDim.getLiteral() % tileM == 0 &&
+      tileSizes.unrollM > 1 && tileM % tileSizes.unrollM == 0) {
+    auto unrollBlock = blockLoop(mBlock.loop_local(), tileSizes.unrollM);
+    band.append({unrollBlock.loop_block(), unrollBlock.loop_local(),
+        kBlock.loop_block(), kBlock.loop_local()});
+    permutation.append({5, 6, 2, 4});
+    unrolledLoop = unrollBlock.loop_local();
+  } else {
+    band.append(
+        {mBlock.loop_local(), kBlock.loop_block(), kBlock.loop_local()});
+    permutation.append({5, 2, 4});
+  }
+  rewriter.create<KrnlPermuteOp>(
+      loc, band, rewriter.getI64ArrayAttr(permutation));
+  if (unrolledLoop)
+    rewriter.create<KrnlUnrollOp>(loc, unrolledLoop);
+  // Batches are independent from each other.
+  if (outputRank > 2)
+    rewriter.create<KrnlParallelOp>(loc, originalLoops[0]);
+
+  // Iterate over the batches, then over the band.
+  SmallVector<Value, 8> optimizedLoops(
+      originalLoops.begin(), originalLoops.begin() + outputRank - 2);
+  optimizedLoops.append(band.begin(), band.end());
+  KrnlIterateOperandPack pack(rewriter, originalLoops, optimizedLoops);
+  for (IndexExpr dim : outputDims) {
+    pack.pushConstantBound(0);
+    if (dim.isLiteral())
+      pack.pushConstantBound(dim.getLiteral());
+    else
+      pack.pushOperandBound(dim.getValue());
+  }
+  pack.pushConstantBound(0);
+  if (reductionDim.isLiteral())
+    pack.pushConstantBound(reductionDim.getLiteral());
+  else
+    pack.pushOperandBound(reductionDim.getValue());
+  auto iterateOp = rewriter.create<KrnlIterateOp>(loc, pack);
+  return &iterateOp.bodyRegion().front();
+}
@@ -105,6 +105,39 @@ int64_t ArrayAttrIntVal(ArrayAttr a, int i);
 Value getDimOrConstant(ConversionPatternRewriter &rewriter, Location loc,
     Value operand, int64_t axis, Type type);
 
+//===----------------------------------------------------------------------===//
+// Tiling of matrix multiplications.
+//===----------------------------------------------------------------------===//
+
+/// Tile sizes used for the loops of a matrix multiplication res[n, m] +=
+/// A[n, k] * B[k, m]. The loop over m is further blocked by `unrollM`, and
+/// the resulting innermost loop is fully unrolled.
+struct MatMulTileSizes {
+  int64_t n;
+  int64_t m;
+  int64_t k;
+  int64_t unrollM;
+};
+
+/// Get the tile sizes of matrix multiplications for the target cpu `mcpu`.
+/// Unknown cpus get a conservative default.
+MatMulTileSizes getMatMulTileSizes(StringRef mcpu);
+
+/// Check if a matrix multiplication of the given sizes is worth tiling, i.e.
+/// if one of its dimensions is dynamic or exceeds its tile size.
+bool isTiledMatMulProfitable(
+    const MatMulTileSizes &tileSizes, IndexExpr n, IndexExpr m, IndexExpr k);
+
+/// Emit a tiled loop nest for a matrix multiplication whose output has the
+/// dimensions `outputDims` and whose reduction has `reductionDim` iterations.
+/// The loops over the two innermost output dimensions and the reduction are
+/// blocked by `tileSizes`, and the outermost batch loop, if any, is parallel.
+/// Return the body of the loop nest, whose induction variables are the output
+/// indices followed by the reduction index.
+Block *emitTiledMatMulLoops(ConversionPatternRewriter &rewriter, Location loc,
+    const MatMulTileSizes &tileSizes, SmallVectorImpl<IndexExpr> &outputDims,
+    IndexExpr reductionDim);
+
 //===----------------------------------------------------------------------===//
 // This is to get a scalar operation of a given type for a specific operation.
 //===----------------------------------------------------------------------===//
@@ -201,14 +234,14 @@ void populateLoweringONNXClipOpPattern(
 void populateLoweringONNXElementwiseOpPattern(
     OwningRewritePatternList &patterns, MLIRContext *ctx);
 
-void populateLoweringONNXGemmOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx);
+void populateLoweringONNXGemmOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes);
 
 void populateLoweringONNXLRNOpPattern(
     OwningRewritePatternList &patterns, MLIRContext *ctx);
 
-void populateLoweringONNXMatMulOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx);
+void populateLoweringONNXMatMulOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes);
 
 void populateLoweringONNXReductionOpPattern(
     OwningRewritePatternList &patterns, MLIRContext *ctx);
@@ -218,8 +251,8 @@ void populateLoweringONNXSoftmaxOpPattern(
 
 // `NN` directory methods:
 
-void populateLoweringONNXConvOpPattern(
-    OwningRewritePatternList &patterns, MLIRContext *ctx);
+void populateLoweringONNXConvOpPattern(OwningRewritePatternList &patterns,
+    MLIRContext *ctx, MatMulTileSizes tileSizes);
 
 void populateLoweringONNXNormalizationOpPattern(
     OwningRewritePatternList &patterns, MLIRContext *ctx);
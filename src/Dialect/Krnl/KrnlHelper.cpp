@@ -330,6 +330,19 @@ void BuildKrnlLoop::createDefineAndIterateOp(Value memRefOperand) {
   createIterateOp();
 }
 
+void BuildKrnlLoop::parallelize(int originalLoopIndex) {
+  // Loop definition operation is mandatory.
+  assert(createdDefineOp && "Must create define op before parallelizing.");
+  assert(originalLoopIndex >= 0 && originalLoopIndex < originalLoopNum &&
+         "Original loop index is out of bounds.");
+
+  // Keep the parallel operation ahead of the iteration operation, if any.
+  OpBuilder::InsertionGuard guard(rewriter);
+  if (createdIterateOp)
+    rewriter.setInsertionPoint(iterBlock->getParentOp());
+  rewriter.create<KrnlParallelOp>(loc, originalLoops[originalLoopIndex]);
+}
+
 BlockArgument &BuildKrnlLoop::getInductionVar(int originalLoopIndex) {
   // Check if loop iteration variable is within bounds.
   assert(originalLoopIndex >= 0 && originalLoopIndex < originalLoopNum &&
@@ -197,6 +197,10 @@ public:
   // MemRef operand.
   void createDefineAndIterateOp(Value memRefOperand);
 
+  // Mark the (original) loop associated with the given index as parallel.
+  // The loop iterations must be free of dependences on each other.
+  void parallelize(int originalLoopIndex);
+
   // Get the (original loop) induction variable associated with the given
   // index. Use the index returned when pushing the bounds.
   BlockArgument &getInductionVar(int originalLoopIndex);
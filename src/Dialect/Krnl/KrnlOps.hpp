@@ -32,6 +32,12 @@ public:
   KrnlOpsDialect(MLIRContext *context);
   static StringRef getDialectNamespace() { return "krnl"; }
 
+  /// Unit attribute marking a memory pool alloc whose buffer is kept alive
+  /// by the runtime across invocations of the model.
+  static StringRef getSessionMemoryPoolAttrName() {
+    return "krnl.session_pool";
+  }
+
   /// Parse a type registered to this dialect.
   Type parseType(DialectAsmParser &parser) const override {
     if (succeeded(parser.parseOptionalKeyword("loop")))
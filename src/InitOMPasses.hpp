@@ -58,11 +58,35 @@ void initOMPasses() {
         return mlir::createKrnlOptimizeMemoryPoolsPass();
       });
 
+  mlir::registerPass("session-memory-pools",
+      "Keep memory pools alive across model invocations.",
+      []() -> std::unique_ptr<mlir::Pass> {
+        return mlir::createKrnlSessionMemoryPoolsPass();
+      });
+
+  mlir::registerPass("fuse-elementwise-loops",
+      "Fuse element-wise loop nests into the loop nests using their results.",
+      []() -> std::unique_ptr<mlir::Pass> {
+        return mlir::createKrnlFuseElementwiseLoopsPass();
+      });
+
   mlir::registerPass("convert-krnl-to-affine", "Lower Krnl dialect.",
       []() -> std::unique_ptr<mlir::Pass> {
         return mlir::createConvertKrnlToAffinePass();
       });
 
+  mlir::registerPass("vectorize-innermost-loops",
+      "Vectorize the innermost affine loops for the target cpu.",
+      []() -> std::unique_ptr<mlir::Pass> {
+        return mlir::createVectorizeInnermostLoopsPass();
+      });
+
+  mlir::registerPass("convert-parallel-loops-to-openmp",
+      "Distribute parallel loops among OpenMP threads.",
+      []() -> std::unique_ptr<mlir::Pass> {
+        return mlir::createConvertParallelLoopsToOpenMPPass();
+      });
+
   mlir::registerPass("convert-onnx-to-krnl",
       "Lower frontend ops to Krnl dialect.",
       []() -> std::unique_ptr<mlir::Pass> {
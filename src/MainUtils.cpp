@@ -12,15 +12,29 @@
 //
 //===----------------------------------------------------------------------===//
 
+#include <chrono>
 #include <cstdio>
 #include <cstdlib>
 #include <fcntl.h>
+#include <map>
+#include <mutex>
 #include <regex>
+#include <set>
 #include <string>
 #include <vector>
 
+#include <llvm/ADT/StringExtras.h>
+#include <llvm/IR/LegacyPassManager.h>
 #include <llvm/Support/FileSystem.h>
+#include <llvm/Support/Host.h>
+#include <llvm/Support/JSON.h>
+#include <llvm/Support/MemoryBuffer.h>
+#include <llvm/Support/Process.h>
 #include <llvm/Support/Program.h>
+#include <llvm/Support/SHA1.h>
+#include <llvm/Support/TargetRegistry.h>
+#include <llvm/Support/TargetSelect.h>
+#include <llvm/Target/TargetMachine.h>
 #include <mlir/Dialect/LLVMIR/LLVMDialect.h>
 #include <mlir/IR/SymbolTable.h>
 
@@ -30,6 +44,7 @@
 #ifdef _WIN32
 #include <io.h>
 #else
+#include <sys/resource.h>
 #include <unistd.h>
 #endif
 
@@ -72,6 +87,48 @@ llvm::cl::opt<string> mcpu("mcpu", llvm::cl::desc("Target cpu"),
     llvm::cl::value_desc("<llvm cpu value>"), llvm::cl::cat(OnnxMlirOptions),
     llvm::cl::ValueRequired);
 
+llvm::cl::opt<bool> sessionMemoryPools("sessionMemoryPools",
+    llvm::cl::desc("keep memory pools alive across model invocations, "
+                   "with one arena per calling thread"),
+    llvm::cl::init(false), llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<bool> externalConstPack("externalConstPack",
+    llvm::cl::desc("store the packed constants in a separate .bin file next "
+                   "to the emitted library, memory mapped by the runtime, "
+                   "instead of embedding them into the library"),
+    llvm::cl::init(false), llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<bool> parallel("parallel",
+    llvm::cl::desc("distribute the loops marked as parallel among OpenMP "
+                   "threads, the emitted library then requires libomp"),
+    llvm::cl::init(false), llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<bool> vectorizeReductions("vectorizeReductions",
+    llvm::cl::desc("also vectorize the floating-point sum and product "
+                   "reductions of innermost loops, computing them as per-lane "
+                   "partial results; like fast-math reassociation, this may "
+                   "change the float results slightly"),
+    llvm::cl::init(false), llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<bool> compileStats("compileStats",
+    llvm::cl::desc("report the wall time of the import, of each pass and of "
+                   "each external tool, and the maximum resident set size "
+                   "reached so far when they end, as a table on stdout and "
+                   "as JSON in <output>.stats.json"),
+    llvm::cl::init(false), llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<string> compileCacheDir("compileCacheDir",
+    llvm::cl::desc("directory caching the libraries and jars compiled for "
+                   "the same model, options and compiler, disabled if not set "
+                   "or when the constants are kept in a separate file"),
+    llvm::cl::value_desc("path"), llvm::cl::init(""),
+    llvm::cl::cat(OnnxMlirOptions));
+
+llvm::cl::opt<unsigned> compileCacheSize("compileCacheSize",
+    llvm::cl::desc("maximum number of entries of the compilation cache, the "
+                   "least recently used ones are evicted first"),
+    llvm::cl::init(64), llvm::cl::cat(OnnxMlirOptions));
+
 // Runtime directory contains all the libraries, jars, etc. that are
 // necessary for running onnx-mlir. It's resolved in the following order:
 //
@@ -108,32 +165,136 @@ string getRuntimeDir() {
   return llvm::StringRef(instDir).str();
 }
 
-// onnx-mlir currently requires llvm tools llc and opt and they are assumed
-// to be under llvm-project/build/bin. This doesn't work with the case where
-// llvm-project has been installed system wide (typically under /usr/local/...)
-// and its source has been removed.
-//
-// To account for this scenario, we first search for the tools in the same
-// directory where onnx-mlir is run. If they are found, it  means both onnx-mlir
-// and llvm-project have been installed system wide under the same directory,
-// so we get them from that directory (typically /usr/local/bin). Otherwise,
-// at least one of onnx-mlir and llvm-project has not been installed system
-// wide. In this case, getToolPath returns an empty string and we will fallback
-// to llvm-project/build/bin.
-//
-// Note that this will not work if both onnx-mlir and llvm-project have been
-// installed system wide but to different places and their sources have been
-// removed. So we force CMAKE_INSTALL_PREFIX to be the same as that of
-// llvm-project.
-string getToolPath(string tool) {
-  string execDir = llvm::sys::path::parent_path(kExecPath).str();
-  llvm::SmallString<8> toolPath(execDir);
-  llvm::sys::path::append(toolPath, tool);
-  string p = llvm::StringRef(toolPath).str();
-  if (llvm::sys::fs::can_execute(p))
-    return p;
-  else
-    return string();
+// Wall time of a compilation step, and maximum resident set size reached so
+// far when the step ended. The steps running several times, such as function
+// passes, are accumulated.
+struct CompileStat {
+  string name;
+  double seconds;
+  int64_t maxRSSSoFarBytes;
+};
+std::vector<CompileStat> compileStatList;
+std::mutex compileStatMutex;
+
+void recordCompileStat(string name, double seconds, int64_t maxRSSSoFarBytes) {
+  std::lock_guard<std::mutex> lock(compileStatMutex);
+  for (auto &stat : compileStatList)
+    if (stat.name == name) {
+      stat.seconds += seconds;
+      stat.maxRSSSoFarBytes = std::max(stat.maxRSSSoFarBytes, maxRSSSoFarBytes);
+      return;
+    }
+  compileStatList.emplace_back(CompileStat{name, seconds, maxRSSSoFarBytes});
+}
+
+// Return the maximum resident set size reached so far by onnx-mlir, or by the
+// largest of the external tools it has run. The operating system only keeps
+// this high-water mark for the lifetime of the process, so the memory used by
+// a single step cannot be told apart from the one used by the earlier steps.
+int64_t getMaxRSSSoFarBytes(bool externalTools) {
+#ifdef _WIN32
+  return 0;
+#else
+  struct rusage usage;
+  if (getrusage(externalTools ? RUSAGE_CHILDREN : RUSAGE_SELF, &usage))
+    return 0;
+#ifdef __APPLE__
+  return usage.ru_maxrss;
+#else
+  return usage.ru_maxrss * 1024;
+#endif
+#endif
+}
+
+// Record the wall time of a compilation step between the construction and the
+// destruction of the timer.
+class CompileStatTimer {
+  string name;
+  bool externalTool;
+  std::chrono::steady_clock::time_point start;
+
+public:
+  CompileStatTimer(string name, bool externalTool = false)
+      : name(std::move(name)), externalTool(externalTool),
+        start(std::chrono::steady_clock::now()) {}
+
+  ~CompileStatTimer() {
+    if (!compileStats)
+      return;
+    std::chrono::duration<double> elapsed =
+        std::chrono::steady_clock::now() - start;
+    recordCompileStat(name, elapsed.count(), getMaxRSSSoFarBytes(externalTool));
+  }
+};
+
+// Pass instrumentation recording the wall time of each pass.
+class CompileStatInstrumentation : public mlir::PassInstrumentation {
+  // The adaptors running nested pass managers on the functions are skipped,
+  // their time being that of the passes they run.
+  static bool isAdaptor(mlir::Pass *pass) {
+    return pass->getName().contains("OpToOpPassAdaptor");
+  }
+
+  // Function passes run on several functions, possibly in parallel.
+  std::mutex mutex;
+  std::map<std::pair<mlir::Pass *, mlir::Operation *>,
+      std::chrono::steady_clock::time_point>
+      startTimes;
+
+  void recordPass(mlir::Pass *pass, mlir::Operation *op) {
+    std::chrono::steady_clock::time_point start;
+    {
+      std::lock_guard<std::mutex> lock(mutex);
+      start = startTimes[{pass, op}];
+      startTimes.erase({pass, op});
+    }
+    std::chrono::duration<double> elapsed =
+        std::chrono::steady_clock::now() - start;
+    recordCompileStat(pass->getName().str(), elapsed.count(),
+        getMaxRSSSoFarBytes(/*externalTools=*/false));
+  }
+
+public:
+  void runBeforePass(mlir::Pass *pass, mlir::Operation *op) override {
+    if (isAdaptor(pass))
+      return;
+    std::lock_guard<std::mutex> lock(mutex);
+    startTimes[{pass, op}] = std::chrono::steady_clock::now();
+  }
+
+  void runAfterPass(mlir::Pass *pass, mlir::Operation *op) override {
+    if (!isAdaptor(pass))
+      recordPass(pass, op);
+  }
+
+  void runAfterPassFailed(mlir::Pass *pass, mlir::Operation *op) override {
+    if (!isAdaptor(pass))
+      recordPass(pass, op);
+  }
+};
+
+// Print the compilation statistics as a table and write them as JSON.
+void printCompileStats(string outputBaseName) {
+  printf("%-60s %12s %22s\n", "Step", "Time (s)", "Max RSS so far (MB)");
+  llvm::json::Array jsonStats;
+  for (const auto &stat : compileStatList) {
+    printf("%-60s %12.3f %22.1f\n", stat.name.c_str(), stat.seconds,
+        stat.maxRSSSoFarBytes / (1024.0 * 1024.0));
+    jsonStats.push_back(
+        llvm::json::Object{{"name", stat.name}, {"seconds", stat.seconds},
+            {"max_rss_so_far_bytes", stat.maxRSSSoFarBytes}});
+  }
+
+  string statsPath = outputBaseName + ".stats.json";
+  error_code error;
+  llvm::raw_fd_ostream statsStream(statsPath, error, llvm::sys::fs::F_None);
+  if (error) {
+    fprintf(stderr, "Cannot write %s: %s\n", statsPath.c_str(),
+        error.message().c_str());
+    return;
+  }
+  statsStream << llvm::json::Value(std::move(jsonStats)) << "\n";
+  printf("Compilation statistics written to: \n\t%s\n\n", statsPath.c_str());
 }
 
 // Helper struct to make command construction and execution easy & readable.
@@ -184,6 +345,8 @@ struct Command {
     if (verbose)
       cout << llvm::join(argsRef, " ") << "\n";
 
+    CompileStatTimer timer(llvm::sys::path::filename(_path).str(),
+        /*externalTool=*/true);
     std::string errMsg;
     int rc = llvm::sys::ExecuteAndWait(_path, llvm::makeArrayRef(argsRef),
         /*Env=*/None, /*Redirects=*/None,
@@ -227,8 +390,53 @@ void LoadMLIR(string inputFilename, mlir::MLIRContext &context,
   }
 }
 
+// Keep the constant pack in a separate binary file, which the runtime reads
+// from the directory of the library (or from the working directory on
+// Windows) instead of the library itself. The file name is recorded in the
+// module being compiled.
+void genConstPackFile(const mlir::OwningModuleRef &module,
+    string constPackFilePath, string outputBaseName) {
+  llvm::SmallVector<char, 10> permConstPackFileName(
+      constPackFilePath.begin(), constPackFilePath.end());
+  llvm::sys::path::replace_extension(permConstPackFileName, "bin");
+  std::string permConstPackFileNameStr(
+      permConstPackFileName.begin(), permConstPackFileName.end());
+  auto constPackFileName = llvm::sys::path::filename(outputBaseName) + "." +
+                           llvm::sys::path::filename(permConstPackFileNameStr);
+#ifdef _WIN32
+  llvm::SmallString<8> constPackFileDest(constPackFileName.str());
+#else
+  llvm::SmallString<8> constPackFileDest(
+      llvm::sys::path::parent_path(outputBaseName));
+  llvm::sys::path::append(constPackFileDest, constPackFileName.str());
+#endif
+  // The constant pack is created in the temporary directory, which may not be
+  // on the same file system, so copy it rather than renaming it.
+  if (std::error_code ec =
+          llvm::sys::fs::copy_file(constPackFilePath, constPackFileDest)) {
+    fprintf(stderr, "Cannot copy %s to %s: %s\n", constPackFilePath.c_str(),
+        constPackFileDest.c_str(), ec.message().c_str());
+    exit(1);
+  }
+
+  mlir::Builder builder(*module);
+  (*module)
+      .lookupSymbol<mlir::LLVM::GlobalOp>(
+          mlir::KrnlPackedConstantOp::getConstPackFileNameSymbolName())
+      .valueAttr(builder.getStringAttr(constPackFileName.str()));
+  (*module)
+      .lookupSymbol<mlir::LLVM::GlobalOp>(
+          mlir::KrnlPackedConstantOp::getConstPackFileNameStrLenSymbolName())
+      .valueAttr(builder.getI64IntegerAttr(constPackFileName.str().size()));
+  (*module)
+      .lookupSymbol<mlir::LLVM::GlobalOp>(
+          mlir::KrnlPackedConstantOp::getConstPackIsEmbeddedSymbolName())
+      .valueAttr(builder.getI8IntegerAttr(0));
+}
+
 void genConstPackObj(const mlir::OwningModuleRef &module,
-    llvm::Optional<string> &constPackObjPath, string outputBaseName) {
+    llvm::Optional<string> &constPackObjPath, string outputBaseName,
+    bool external) {
   // Extract constant pack file name, which is embedded as a symbol in the
   // module being compiled.
   auto constPackFilePathSym = (*module).lookupSymbol<mlir::LLVM::GlobalOp>(
@@ -239,6 +447,13 @@ void genConstPackObj(const mlir::OwningModuleRef &module,
                                .str();
   llvm::FileRemover constPackRemover(constPackFilePath);
 
+  // Like on Windows, constPackObjPath is not set when the constant pack is
+  // kept in a separate file.
+  if (external) {
+    genConstPackFile(module, constPackFilePath, outputBaseName);
+    return;
+  }
+
 #if __APPLE__
   // Create a empty stub file, compile it to an empty obj file.
   llvm::SmallVector<char, 20> stubSrcPath;
@@ -289,6 +504,19 @@ void genConstPackObj(const mlir::OwningModuleRef &module,
       .appendStr(constPackObjPath.getValue())
       .exec();
 
+  // Move the data into a page aligned read-only section, so the runtime can
+  // use the constants in place and processes loading the same library share
+  // their physical pages. Setting the alignment requires GNU binutils 2.33 or
+  // later; with an older objcopy the runtime copies the pack instead.
+  redefineSym.resetArgs();
+  if (kObjCopyHasSetSectionAlignment)
+    redefineSym.appendList({"--set-section-alignment", ".data=4096"});
+  redefineSym
+      .appendList({"--rename-section",
+          ".data=.rodata,alloc,load,readonly,data,contents"})
+      .appendStr(constPackObjPath.getValue())
+      .exec();
+
 #else
   /* The final constant pack object file on Windows is NOT embedded into
    * the shared library but rather is kept in a separate .bin file. So
@@ -296,74 +524,77 @@ void genConstPackObj(const mlir::OwningModuleRef &module,
    * the caller (compileModuleToSharedLibrary and compileModuleToJniJar)
    * won't put it into llvm::FileRemover.
    */
-  llvm::SmallVector<char, 10> permConstPackFileName(
-      constPackFilePath.begin(), constPackFilePath.end());
-  llvm::sys::path::replace_extension(permConstPackFileName, "bin");
-  std::string permConstPackFileNameStr(
-      permConstPackFileName.begin(), permConstPackFileName.end());
-  auto constPackFileName = llvm::sys::path::filename(outputBaseName) + "." +
-                           llvm::sys::path::filename(permConstPackFileNameStr);
-  llvm::sys::fs::rename(constPackFilePath, constPackFileName);
-
-  mlir::Builder builder(*module);
-  (*module)
-      .lookupSymbol<mlir::LLVM::GlobalOp>(
-          mlir::KrnlPackedConstantOp::getConstPackFileNameSymbolName())
-      .valueAttr(builder.getStringAttr(constPackFileName.str()));
-  (*module)
-      .lookupSymbol<mlir::LLVM::GlobalOp>(
-          mlir::KrnlPackedConstantOp::getConstPackFileNameStrLenSymbolName())
-      .valueAttr(builder.getI64IntegerAttr(constPackFileName.str().size()));
+  genConstPackFile(module, constPackFilePath, outputBaseName);
 #endif
 }
 
-string getTargetOptions() {
-  string targetOptions = "";
-  if (mtriple != "")
-    targetOptions = "--mtriple=" + mtriple;
-  if (mcpu != "")
-    targetOptions += " --mcpu=" + mcpu;
-  return targetOptions;
-}
-
-// Write LLVM optimized bitcode.
-void genLLVMBitcode(const mlir::OwningModuleRef &module,
-    string optimizedBitcodePath, string outputBaseName) {
-  error_code error;
-
-  // Write bitcode to a file.
-  string unoptimizedBitcodePath = outputBaseName + ".unoptimized.bc";
-  llvm::FileRemover unoptimzedBitcodeRemover(unoptimizedBitcodePath);
+// Create the target machine for the target triple and cpu given on the command
+// line, or for the host if none is given.
+std::unique_ptr<llvm::TargetMachine> createTargetMachine() {
+  llvm::InitializeAllTargetInfos();
+  llvm::InitializeAllTargets();
+  llvm::InitializeAllTargetMCs();
+  llvm::InitializeAllAsmPrinters();
+
+  string targetTriple = (mtriple != "") ? mtriple.getValue()
+                                        : llvm::sys::getDefaultTargetTriple();
+  string errMsg;
+  const llvm::Target *target =
+      llvm::TargetRegistry::lookupTarget(targetTriple, errMsg);
+  if (!target) {
+    fprintf(stderr, "Error message: %s\n", errMsg.c_str());
+    llvm_unreachable("Target lookup failed.");
+  }
 
-  llvm::raw_fd_ostream moduleBitcodeStream(
-      unoptimizedBitcodePath, error, llvm::sys::fs::F_None);
+  return std::unique_ptr<llvm::TargetMachine>(
+      target->createTargetMachine(targetTriple, mcpu, /*Features=*/"",
+          llvm::TargetOptions(), llvm::Reloc::PIC_));
+}
 
+// Optimize the LLVM IR of the module and compile it to an object file. Both
+// steps run in process, as `opt -O3` and `llc -filetype=obj` would.
+void genModelObject(const mlir::OwningModuleRef &module, string modelObjPath) {
   llvm::LLVMContext llvmContext;
-  llvm::WriteBitcodeToFile(*mlir::translateModuleToLLVMIR(*module, llvmContext),
-      moduleBitcodeStream);
-  moduleBitcodeStream.flush();
-
-  // Use the LLVM's 'opt' command to optimize the bitcode.
-  string optPath = getToolPath("opt");
-  Command optBitcode(/*exePath=*/!optPath.empty() ? optPath : kOptPath);
-  optBitcode.appendStr("-O3")
-      .appendStr(getTargetOptions())
-      .appendList({"-o", optimizedBitcodePath})
-      .appendStr(unoptimizedBitcodePath)
-      .exec();
-}
+  std::unique_ptr<llvm::Module> llvmModule;
+  {
+    CompileStatTimer timer("Translation to LLVM IR");
+    llvmModule = mlir::translateModuleToLLVMIR(*module, llvmContext);
+  }
+  if (!llvmModule)
+    llvm_unreachable("Translation to LLVM IR failed.");
+
+  std::unique_ptr<llvm::TargetMachine> targetMachine = createTargetMachine();
+  llvmModule->setTargetTriple(targetMachine->getTargetTriple().str());
+  llvmModule->setDataLayout(targetMachine->createDataLayout());
+
+  // Optimize the LLVM IR.
+  auto optimize = mlir::makeOptimizingTransformer(
+      /*optLevel=*/3, /*sizeLevel=*/0, targetMachine.get());
+  {
+    CompileStatTimer timer("LLVM IR optimization");
+    if (auto err = optimize(llvmModule.get())) {
+      llvm::logAllUnhandledErrors(
+          std::move(err), llvm::errs(), "Error message: ");
+      llvm_unreachable("LLVM IR optimization failed.");
+    }
+  }
 
-// Compile LLVM bitcode to object file.
-void genModelObject(const mlir::OwningModuleRef &module, string bitcodePath,
-    string modelObjPath) {
-  string llcPath = getToolPath("llc");
-  Command llvmToObj(/*exePath=*/!llcPath.empty() ? llcPath : kLlcPath);
-  llvmToObj.appendStr("-filetype=obj")
-      .appendStr("-relocation-model=pic")
-      .appendStr(getTargetOptions())
-      .appendList({"-o", modelObjPath})
-      .appendStr(bitcodePath)
-      .exec();
+  // Compile the LLVM IR to an object file.
+  error_code error;
+  llvm::raw_fd_ostream modelObjStream(
+      modelObjPath, error, llvm::sys::fs::F_None);
+  if (error) {
+    fprintf(stderr, "Error message: %s\n", error.message().c_str());
+    llvm_unreachable("Cannot open the object file.");
+  }
+
+  llvm::legacy::PassManager codeGenPasses;
+  if (targetMachine->addPassesToEmitFile(
+          codeGenPasses, modelObjStream, nullptr, llvm::CGFT_ObjectFile))
+    llvm_unreachable("Target cannot emit object files.");
+  CompileStatTimer timer("LLVM code generation");
+  codeGenPasses.run(*llvmModule);
+  modelObjStream.flush();
 }
 
 void genJniObject(const mlir::OwningModuleRef &module, string jniSharedLibPath,
@@ -372,6 +603,22 @@ void genJniObject(const mlir::OwningModuleRef &module, string jniSharedLibPath,
   ar.appendStr("x").appendStr(jniSharedLibPath).appendStr(jniObjPath).exec();
 }
 
+// Append the libraries required by the compilation options to the runtime
+// libraries linked into the model library.
+std::vector<string> getModelLibs(std::vector<string> libs) {
+#ifdef __linux__
+  // The runtime looks up the external constant pack file next to the model
+  // library with dladdr, which is in libdl on Linux only.
+  libs.emplace_back("-ldl");
+#endif
+  if (parallel) {
+    if (!kOmpLibDir.empty())
+      libs.emplace_back("-L" + kOmpLibDir);
+    libs.emplace_back("-lomp");
+  }
+  return libs;
+}
+
 // Link everything into a shared object.
 void genSharedLib(const mlir::OwningModuleRef &module,
     string modelSharedLibPath, std::vector<string> opts,
@@ -408,36 +655,30 @@ void compileModuleToSharedLibrary(
     const mlir::OwningModuleRef &module, std::string outputBaseName) {
 
   llvm::Optional<string> constPackObjPath;
-  genConstPackObj(module, constPackObjPath, outputBaseName);
-  llvm::FileRemover constPackObjRemover(constPackObjPath.getValue());
-
-  string bitcodePath = outputBaseName + ".bc";
-  genLLVMBitcode(module, bitcodePath, outputBaseName);
-  llvm::FileRemover bitcodeRemover(bitcodePath);
+  genConstPackObj(module, constPackObjPath, outputBaseName, externalConstPack);
+  llvm::FileRemover constPackObjRemover(constPackObjPath.getValueOr(""));
 
   string modelObjPath = outputBaseName + ".o";
-  genModelObject(module, bitcodePath, modelObjPath);
+  genModelObject(module, modelObjPath);
   llvm::FileRemover modelObjRemover(modelObjPath);
 
   string modelSharedLibPath = outputBaseName + ".so";
   genSharedLib(module, modelSharedLibPath, {"-shared", "-fPIC"},
       {constPackObjPath.getValueOr(""), modelObjPath},
-      {"-lEmbeddedDataLoader", "-lcruntime"});
+      getModelLibs({"-lEmbeddedDataLoader", "-lcruntime"}));
 }
 
 void compileModuleToJniJar(
     const mlir::OwningModuleRef &module, std::string outputBaseName) {
 
   llvm::Optional<string> constPackObjPath;
-  genConstPackObj(module, constPackObjPath, outputBaseName);
-  llvm::FileRemover constPackObjRemover(constPackObjPath.getValue());
-
-  string bitcodePath = outputBaseName + ".bc";
-  genLLVMBitcode(module, bitcodePath, outputBaseName);
-  llvm::FileRemover bitcodeRemover(bitcodePath);
+  // The model library is extracted from the jar at runtime, so the constant
+  // pack is always embedded into it.
+  genConstPackObj(module, constPackObjPath, outputBaseName, /*external=*/false);
+  llvm::FileRemover constPackObjRemover(constPackObjPath.getValueOr(""));
 
   string modelObjPath = outputBaseName + ".o";
-  genModelObject(module, bitcodePath, modelObjPath);
+  genModelObject(module, modelObjPath);
   llvm::FileRemover modelObjRemover(modelObjPath);
 
   string jniSharedLibPath = getRuntimeDir() + "/libjniruntime.a";
@@ -449,17 +690,192 @@ void compileModuleToJniJar(
   genSharedLib(module, modelSharedLibPath,
       {"-shared", "-fPIC", "-z", "noexecstack"},
       {constPackObjPath.getValueOr(""), modelObjPath, jniObjPath},
-      {"-lEmbeddedDataLoader", "-lcruntime", "-ljniruntime"});
+      getModelLibs({"-lEmbeddedDataLoader", "-lcruntime", "-ljniruntime"}));
   llvm::FileRemover modelSharedLibRemover(modelSharedLibPath);
 
   string modelJniJarPath = outputBaseName + ".jar";
   genJniJar(module, modelSharedLibPath, modelJniJarPath);
 }
 
+namespace {
+// Return the extension of the file emitted for the emission target.
+string getEmittedFileExtension(EmissionTargetType emissionTarget) {
+  return (emissionTarget == EmitJNI) ? ".jar" : ".so";
+}
+
+// Hash the files holding the external data of the tensors of the graph and of
+// its subgraphs, each file once. Return false if one of them cannot be read.
+bool hashExternalData(llvm::SHA1 &hasher, const onnx::GraphProto &graph,
+    llvm::StringRef externalDataDir, std::set<string> &hashedLocations) {
+  auto hashTensor = [&](const onnx::TensorProto &tensor) {
+    if (tensor.data_location() != onnx::TensorProto::EXTERNAL)
+      return true;
+    for (const auto &entry : tensor.external_data()) {
+      if (entry.key() != "location" ||
+          !hashedLocations.insert(entry.value()).second)
+        continue;
+      llvm::SmallString<128> path(externalDataDir);
+      llvm::sys::path::append(path, entry.value());
+      auto dataBuffer = llvm::MemoryBuffer::getFile(path);
+      if (!dataBuffer)
+        return false;
+      hasher.update(entry.value() + "\n");
+      hasher.update((*dataBuffer)->getBuffer());
+    }
+    return true;
+  };
+
+  for (const auto &initializer : graph.initializer())
+    if (!hashTensor(initializer))
+      return false;
+  for (const auto &node : graph.node()) {
+    for (const auto &attr : node.attribute()) {
+      if (attr.has_t() && !hashTensor(attr.t()))
+        return false;
+      for (const auto &tensor : attr.tensors())
+        if (!hashTensor(tensor))
+          return false;
+      if (attr.has_g() &&
+          !hashExternalData(hasher, attr.g(), externalDataDir, hashedLocations))
+        return false;
+      for (const auto &subgraph : attr.graphs())
+        if (!hashExternalData(
+                hasher, subgraph, externalDataDir, hashedLocations))
+          return false;
+    }
+  }
+  return true;
+}
+
+// Return the path of the compilation cache entry for the input file and the
+// emission target, or None if the compilation cannot be cached. The entry is
+// named after a hash of the input file, of the external data files of an ONNX
+// model, of the options affecting the emitted code and of the size and
+// modification time of the compiler executable, which stand for its version.
+llvm::Optional<string> getCompileCachePath(
+    string inputFilename, EmissionTargetType emissionTarget) {
+  if (compileCacheDir == "" || externalConstPack)
+    return llvm::None;
+  if (emissionTarget != EmitLib && emissionTarget != EmitJNI)
+    return llvm::None;
+#ifdef _WIN32
+  // The constants are always kept in a separate file on Windows.
+  return llvm::None;
+#endif
+
+  auto inputBuffer = llvm::MemoryBuffer::getFile(inputFilename);
+  if (!inputBuffer)
+    return llvm::None;
+  llvm::sys::fs::file_status compilerStatus;
+  if (llvm::sys::fs::status(kExecPath, compilerStatus))
+    return llvm::None;
+
+  llvm::SHA1 hasher;
+  hasher.update((*inputBuffer)->getBuffer());
+  if (llvm::sys::path::extension(inputFilename) == ".onnx") {
+    onnx::ModelProto model;
+    if (!model.ParseFromArray(
+            (*inputBuffer)->getBufferStart(), (*inputBuffer)->getBufferSize()))
+      return llvm::None;
+    // Locations of external data are relative to the model file.
+    string externalDataDir = llvm::sys::path::parent_path(inputFilename).str();
+    if (externalDataDir.empty())
+      externalDataDir = ".";
+    std::set<string> hashedLocations;
+    if (!hashExternalData(
+            hasher, model.graph(), externalDataDir, hashedLocations))
+      return llvm::None;
+  }
+  std::vector<string> keyOptions = {std::to_string(compilerStatus.getSize()),
+      std::to_string(
+          compilerStatus.getLastModificationTime().time_since_epoch().count()),
+      std::to_string(emissionTarget), mtriple, mcpu,
+      std::to_string(preserveLocations), std::to_string(useOnnxModelTypes),
+      std::to_string(sessionMemoryPools), std::to_string(parallel),
+      std::to_string(vectorizeReductions)};
+  for (const auto &option : keyOptions)
+    hasher.update(option + "\n");
+
+  llvm::SmallString<8> cachePath(compileCacheDir.getValue());
+  llvm::sys::path::append(
+      cachePath, llvm::toHex(hasher.final(), /*LowerCase=*/true) +
+                     getEmittedFileExtension(emissionTarget));
+  return llvm::StringRef(cachePath).str();
+}
+
+// Remove the least recently used entries of the compilation cache until it
+// holds at most compileCacheSize entries.
+void evictFromCompileCache() {
+  std::vector<std::pair<llvm::sys::TimePoint<>, string>> entries;
+  std::error_code error;
+  for (llvm::sys::fs::directory_iterator it(compileCacheDir, error), end;
+      it != end && !error; it.increment(error)) {
+    auto extension = llvm::sys::path::extension(it->path());
+    if (extension != ".so" && extension != ".jar")
+      continue;
+    auto status = it->status();
+    if (status)
+      entries.emplace_back(status->getLastModificationTime(), it->path());
+  }
+
+  if (entries.size() <= compileCacheSize)
+    return;
+  llvm::sort(entries);
+  for (size_t i = 0; i < entries.size() - compileCacheSize; ++i)
+    llvm::sys::fs::remove(entries[i].second);
+}
+} // namespace
+
+bool loadFromCompileCache(string inputFilename, string outputBaseName,
+    EmissionTargetType emissionTarget) {
+  auto cachePath = getCompileCachePath(inputFilename, emissionTarget);
+  if (!cachePath || !llvm::sys::fs::exists(cachePath.getValue()))
+    return false;
+
+  string outputPath = outputBaseName + getEmittedFileExtension(emissionTarget);
+  if (llvm::sys::fs::copy_file(cachePath.getValue(), outputPath))
+    return false;
+
+  // Mark the entry as the most recently used one.
+  int fd;
+  if (!llvm::sys::fs::openFileForWrite(cachePath.getValue(), fd,
+          llvm::sys::fs::CD_OpenExisting, llvm::sys::fs::OF_Append)) {
+    llvm::sys::fs::setLastAccessAndModificationTime(
+        fd, std::chrono::system_clock::now());
+    llvm::sys::Process::SafelyCloseFileDescriptor(fd);
+  }
+
+  printf(
+      "%s has been reused from the compilation cache.\n", outputPath.c_str());
+  return true;
+}
+
+void storeInCompileCache(string inputFilename, string outputBaseName,
+    EmissionTargetType emissionTarget) {
+  auto cachePath = getCompileCachePath(inputFilename, emissionTarget);
+  if (!cachePath || llvm::sys::fs::create_directories(compileCacheDir))
+    return;
+
+  // Copy the emitted file under a temporary name first, so that concurrent
+  // compilations never see a partially written entry.
+  llvm::SmallString<8> tempPath;
+  if (llvm::sys::fs::createUniqueFile(
+          cachePath.getValue() + ".%%%%%%.tmp", tempPath))
+    return;
+  llvm::FileRemover tempRemover(tempPath);
+  string outputPath = outputBaseName + getEmittedFileExtension(emissionTarget);
+  if (llvm::sys::fs::copy_file(outputPath, tempPath) ||
+      llvm::sys::fs::rename(tempPath, cachePath.getValue()))
+    return;
+
+  evictFromCompileCache();
+}
+
 void registerDialects(mlir::MLIRContext &context) {
   // Load our Dialect in this MLIR Context.
   context.getOrLoadDialect<mlir::AffineDialect>();
   context.getOrLoadDialect<mlir::LLVM::LLVMDialect>();
+  context.getOrLoadDialect<mlir::omp::OpenMPDialect>();
   context.getOrLoadDialect<mlir::scf::SCFDialect>();
   context.getOrLoadDialect<mlir::StandardOpsDialect>();
   context.getOrLoadDialect<mlir::shape::ShapeDialect>();
@@ -482,12 +898,15 @@ void addONNXToMLIRPasses(mlir::PassManager &pm) {
 }
 
 void addONNXToKrnlPasses(mlir::PassManager &pm) {
-  pm.addPass(mlir::createLowerToKrnlPass());
+  pm.addPass(mlir::createLowerToKrnlPass(mcpu));
   pm.addPass(mlir::createPackKrnlGlobalConstantsPass());
   // An additional pass of canonicalization is helpful because lowering
   // from ONNX dialect to Standard dialect exposes additional canonicalization
   // oppertunities.
   pm.addPass(mlir::createCanonicalizerPass());
+  // Fuse chains of element-wise operations into single loop nests, before
+  // their intermediate results are bundled into memory pools.
+  pm.addNestedPass<FuncOp>(mlir::createKrnlFuseElementwiseLoopsPass());
   pm.addNestedPass<FuncOp>(createDisconnectKrnlDimFromAllocPass());
 
   // TODO: make this pass optional:
@@ -496,16 +915,20 @@ void addONNXToKrnlPasses(mlir::PassManager &pm) {
   pm.addPass(mlir::createCanonicalizerPass());
   pm.addNestedPass<FuncOp>(mlir::createKrnlOptimizeMemoryPoolsPass());
   pm.addPass(mlir::createCanonicalizerPass());
+  if (sessionMemoryPools)
+    pm.addNestedPass<FuncOp>(mlir::createKrnlSessionMemoryPoolsPass());
 }
 
 void addKrnlToAffinePasses(mlir::PassManager &pm) {
   pm.addNestedPass<FuncOp>(mlir::createConvertKrnlToAffinePass());
-  // Fuse loops in Affine dialect.
-  //  pm.addPass(mlir::createLoopFusionPass());
+  pm.addNestedPass<FuncOp>(
+      mlir::createVectorizeInnermostLoopsPass(mcpu, vectorizeReductions));
 }
 
 void addKrnlToLLVMPasses(mlir::PassManager &pm) {
   pm.addPass(mlir::createLowerAffinePass());
+  if (parallel)
+    pm.addPass(mlir::createConvertParallelLoopsToOpenMPPass());
   pm.addPass(mlir::createLowerToCFGPass());
   pm.addPass(mlir::createConvertKrnlToLLVMPass());
   pm.addPass(mlir::createCanonicalizerPass());
@@ -524,8 +947,10 @@ void processInputFile(string inputFilename, EmissionTargetType emissionTarget,
   if (inputIsONNX) {
     ImportOptions options;
     options.useOnnxModelTypes = useOnnxModelTypes;
+    CompileStatTimer timer("ImportFrontendModelFile");
     ImportFrontendModelFile(inputFilename, context, module, options);
   } else {
+    CompileStatTimer timer("LoadMLIR");
     LoadMLIR(inputFilename, context, module);
   }
 }
@@ -626,9 +1051,13 @@ int compileModule(mlir::OwningModuleRef &module, mlir::MLIRContext &context,
     addKrnlToLLVMPasses(pm);
 
   mlir::applyPassManagerCLOptions(pm);
+  if (compileStats)
+    pm.addInstrumentation(std::make_unique<CompileStatInstrumentation>());
   if (mlir::failed(pm.run(*module)))
     return 4;
 
   emitOutputFiles(outputBaseName, emissionTarget, context, module);
+  if (compileStats)
+    printCompileStats(outputBaseName);
   return 0;
 }
@@ -86,3 +86,13 @@ void emitOutputFiles(std::string outputBaseName,
 
 int compileModule(mlir::OwningModuleRef &module, mlir::MLIRContext &context,
     std::string outputBaseName, EmissionTargetType targetType);
+
+// Copy the library or jar compiled previously for the same input file and
+// options from the compilation cache. Returns false on a cache miss.
+bool loadFromCompileCache(std::string inputFilename, std::string outputBaseName,
+    EmissionTargetType emissionTarget);
+
+// Add the library or jar compiled for the input file to the compilation
+// cache.
+void storeInCompileCache(std::string inputFilename, std::string outputBaseName,
+    EmissionTargetType emissionTarget);
@@ -15,6 +15,7 @@
 #pragma once
 
 #include <memory>
+#include <string>
 
 namespace mlir {
 class Pass;
@@ -41,12 +42,27 @@ std::unique_ptr<Pass> createKrnlBundleMemoryPoolsPass();
 /// Pass for optimizing memory pools.
 std::unique_ptr<Pass> createKrnlOptimizeMemoryPoolsPass();
 
+/// Pass for keeping memory pools alive across model invocations.
+std::unique_ptr<Pass> createKrnlSessionMemoryPoolsPass();
+
+/// Pass for fusing element-wise loop nests.
+std::unique_ptr<Pass> createKrnlFuseElementwiseLoopsPass();
+
 /// Add pass for lowering to Krnl IR.
-std::unique_ptr<Pass> createLowerToKrnlPass();
+std::unique_ptr<Pass> createLowerToKrnlPass(std::string mcpu = "");
 
 /// Pass for lowering frontend dialects to Krnl IR dialect.
 std::unique_ptr<Pass> createConvertKrnlToAffinePass();
 
+/// Pass for vectorizing the innermost loops for the target cpu. Reductions
+/// are only vectorized if vectorizeReductions is set, since this reassociates
+/// them.
+std::unique_ptr<Pass> createVectorizeInnermostLoopsPass(
+    std::string mcpu = "", bool vectorizeReductions = false);
+
+/// Pass for distributing parallel loops among OpenMP threads.
+std::unique_ptr<Pass> createConvertParallelLoopsToOpenMPPass();
+
 /// Pass for lowering krnl.dim operations to standard dialect.
 std::unique_ptr<Pass> createDisconnectKrnlDimFromAllocPass();
 
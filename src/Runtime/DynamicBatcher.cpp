@@ -0,0 +1,206 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===--------- DynamicBatcher.cpp - DynamicBatcher Implementation ---------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains implementations of DynamicBatcher class, which coalesces
+// concurrent inference requests into a single run of a model compiled with a
+// dynamic leading (batch) dimension.
+//
+//===----------------------------------------------------------------------===//
+
+#include <cstring>
+#include <stdexcept>
+#include <string>
+
+#include "DynamicBatcher.hpp"
+
+namespace onnx_mlir {
+
+// Number of rows of a request, i.e. the leading dimension of its inputs.
+static int64_t getNumRows(const std::vector<OMTensorUniquePtr> &ins) {
+  if (ins.empty() || omTensorGetRank(ins[0].get()) == 0)
+    return 1;
+  return omTensorGetShape(ins[0].get())[0];
+}
+
+// Whether two requests have inputs differing only by their leading dimension.
+static bool areCoalescable(const std::vector<OMTensorUniquePtr> &lhs,
+    const std::vector<OMTensorUniquePtr> &rhs) {
+  if (lhs.size() != rhs.size())
+    return false;
+  for (size_t i = 0; i < lhs.size(); i++) {
+    auto *l = lhs[i].get();
+    auto *r = rhs[i].get();
+    if (omTensorGetDataType(l) != omTensorGetDataType(r) ||
+        omTensorGetRank(l) != omTensorGetRank(r) || omTensorGetRank(l) == 0)
+      return false;
+    for (int d = 1; d < omTensorGetRank(l); d++)
+      if (omTensorGetShape(l)[d] != omTensorGetShape(r)[d])
+        return false;
+  }
+  return true;
+}
+
+// Create a tensor shaped like tensor, but with numRows as leading dimension.
+static OMTensor *createWithNumRows(OMTensor *tensor, int64_t numRows) {
+  std::vector<int64_t> shape(omTensorGetShape(tensor),
+      omTensorGetShape(tensor) + omTensorGetRank(tensor));
+  shape[0] = numRows;
+  auto *result = omTensorCreateEmpty(
+      shape.data(), shape.size(), omTensorGetDataType(tensor));
+  if (!result)
+    throw std::runtime_error("DynamicBatcher: cannot allocate tensor");
+  return result;
+}
+
+DynamicBatcher::DynamicBatcher(ExecutionSession &session, int64_t maxBatchSize,
+    int64_t windowInMicroseconds)
+    : _session(session), _maxBatchSize(maxBatchSize),
+      _window(windowInMicroseconds) {
+  if (maxBatchSize <= 0)
+    throw std::invalid_argument(
+        "DynamicBatcher: the maximum batch size must be positive");
+  if (windowInMicroseconds < 0)
+    throw std::invalid_argument(
+        "DynamicBatcher: the batching window must not be negative");
+  _dispatcher = std::thread(&DynamicBatcher::dispatchLoop, this);
+}
+
+DynamicBatcher::~DynamicBatcher() {
+  {
+    std::lock_guard<std::mutex> lock(_mutex);
+    _stopping = true;
+  }
+  _condition.notify_all();
+  _dispatcher.join();
+}
+
+std::vector<OMTensorUniquePtr> DynamicBatcher::run(
+    std::vector<OMTensorUniquePtr> ins) {
+  Request request{std::move(ins)};
+  auto outputs = request.outputs.get_future();
+  {
+    std::lock_guard<std::mutex> lock(_mutex);
+    request.enqueueTime = std::chrono::steady_clock::now();
+    _queue.emplace_back(&request);
+  }
+  _condition.notify_all();
+  // Rethrow the error of the model run, if any.
+  return outputs.get();
+}
+
+void DynamicBatcher::dispatchLoop() {
+  while (true) {
+    std::vector<Request *> requests;
+    {
+      std::unique_lock<std::mutex> lock(_mutex);
+      _condition.wait(lock, [this] { return _stopping || !_queue.empty(); });
+      // Pending requests are run before the dispatcher exits.
+      if (_queue.empty())
+        return;
+      // Gather requests until the window of the front request closes or the
+      // batch is full. The window opens when the request is queued, not when
+      // the dispatcher gets to it, so that the time spent running previous
+      // batches counts against it.
+      auto deadline = _queue.front()->enqueueTime + _window;
+      _condition.wait_until(lock, deadline, [this] {
+        return _stopping || getNumCoalescableRows() >= _maxBatchSize;
+      });
+      requests = takeCoalescableRequests();
+    }
+    runCoalesced(requests);
+  }
+}
+
+int64_t DynamicBatcher::getNumCoalescableRows() {
+  int64_t numRows = getNumRows(_queue.front()->inputs);
+  for (size_t i = 1; i < _queue.size(); i++) {
+    int64_t requestRows = getNumRows(_queue[i]->inputs);
+    if (numRows + requestRows > _maxBatchSize)
+      break;
+    if (areCoalescable(_queue.front()->inputs, _queue[i]->inputs))
+      numRows += requestRows;
+  }
+  return numRows;
+}
+
+std::vector<DynamicBatcher::Request *>
+DynamicBatcher::takeCoalescableRequests() {
+  // The front request is always taken, even if it exceeds the maximum batch
+  // size on its own.
+  std::vector<Request *> requests = {_queue.front()};
+  _queue.pop_front();
+  int64_t numRows = getNumRows(requests[0]->inputs);
+  for (auto it = _queue.begin(); it != _queue.end();) {
+    int64_t requestRows = getNumRows((*it)->inputs);
+    if (numRows + requestRows > _maxBatchSize)
+      break;
+    if (areCoalescable(requests[0]->inputs, (*it)->inputs)) {
+      numRows += requestRows;
+      requests.emplace_back(*it);
+      it = _queue.erase(it);
+    } else {
+      it++;
+    }
+  }
+  return requests;
+}
+
+void DynamicBatcher::runCoalesced(const std::vector<Request *> &requests) {
+  try {
+    if (requests.size() == 1) {
+      requests[0]->outputs.set_value(
+          _session.run(std::move(requests[0]->inputs)));
+      return;
+    }
+
+    // Concatenate the inputs of all the requests along the leading dimension.
+    // Inputs are expected to be contiguous.
+    int64_t numRows = 0;
+    for (auto *request : requests)
+      numRows += getNumRows(request->inputs);
+    std::vector<OMTensorUniquePtr> ins;
+    for (size_t i = 0; i < requests[0]->inputs.size(); i++) {
+      auto *in = createWithNumRows(requests[0]->inputs[i].get(), numRows);
+      ins.emplace_back(OMTensorUniquePtr(in, omTensorDestroy));
+      auto *dst = static_cast<char *>(omTensorGetDataPtr(in));
+      for (auto *request : requests) {
+        auto *part = request->inputs[i].get();
+        memcpy(dst, omTensorGetDataPtr(part), omTensorGetBufferSize(part));
+        dst += omTensorGetBufferSize(part);
+      }
+    }
+
+    auto outs = _session.run(std::move(ins));
+
+    // Split the outputs back along the leading dimension.
+    std::vector<std::vector<OMTensorUniquePtr>> splitOuts(requests.size());
+    for (size_t i = 0; i < outs.size(); i++) {
+      auto *out = outs[i].get();
+      if (omTensorGetRank(out) == 0 || omTensorGetShape(out)[0] != numRows)
+        throw std::runtime_error("DynamicBatcher: output " + std::to_string(i) +
+                                 " has no leading batch dimension");
+      int64_t rowSize = omTensorGetBufferSize(out) / numRows;
+      auto *src = static_cast<char *>(omTensorGetDataPtr(out));
+      for (size_t r = 0; r < requests.size(); r++) {
+        int64_t requestRows = getNumRows(requests[r]->inputs);
+        auto *part = createWithNumRows(out, requestRows);
+        splitOuts[r].emplace_back(OMTensorUniquePtr(part, omTensorDestroy));
+        memcpy(omTensorGetDataPtr(part), src, requestRows * rowSize);
+        src += requestRows * rowSize;
+      }
+    }
+    for (size_t r = 0; r < requests.size(); r++)
+      requests[r]->outputs.set_value(std::move(splitOuts[r]));
+  } catch (...) {
+    for (auto *request : requests)
+      request->outputs.set_exception(std::current_exception());
+  }
+}
+} // namespace onnx_mlir
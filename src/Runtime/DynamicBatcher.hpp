@@ -0,0 +1,83 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===----------- DynamicBatcher.hpp - DynamicBatcher Declaration ----------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains declaration of DynamicBatcher class, which coalesces
+// concurrent inference requests into a single run of a model compiled with a
+// dynamic leading (batch) dimension.
+//
+//===----------------------------------------------------------------------===//
+
+#pragma once
+
+#include <chrono>
+#include <condition_variable>
+#include <deque>
+#include <future>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include "ExecutionSession.hpp"
+
+namespace onnx_mlir {
+
+// Requests submitted through run() within a time window are concatenated along
+// their leading dimension, executed by one call to the model, and the outputs
+// are split back to the callers. Requests are only coalesced if their inputs
+// have the same number, element types and non-leading dimensions. Every model
+// output must have a leading dimension equal to the total batch size.
+class DynamicBatcher {
+public:
+  // A batch is executed as soon as it holds maxBatchSize rows, or at the
+  // latest windowInMicroseconds after its first request arrived. Throw
+  // std::invalid_argument if maxBatchSize is not positive or the window is
+  // negative.
+  DynamicBatcher(ExecutionSession &session, int64_t maxBatchSize,
+      int64_t windowInMicroseconds);
+
+  // Run all the pending requests, then stop the dispatcher.
+  ~DynamicBatcher();
+
+  // Submit one request and block until its outputs are available. Can be
+  // called concurrently from multiple threads.
+  std::vector<OMTensorUniquePtr> run(std::vector<OMTensorUniquePtr> ins);
+
+private:
+  struct Request {
+    std::vector<OMTensorUniquePtr> inputs;
+    std::promise<std::vector<OMTensorUniquePtr>> outputs;
+    // Time at which the request was queued, opening its batching window.
+    std::chrono::steady_clock::time_point enqueueTime;
+  };
+
+  void dispatchLoop();
+
+  // Number of rows of the requests that can be coalesced with the front
+  // request of the queue, without exceeding the maximum batch size.
+  int64_t getNumCoalescableRows();
+
+  // Remove the front request and the requests that can be coalesced with it
+  // from the queue.
+  std::vector<Request *> takeCoalescableRequests();
+
+  // Execute the requests as one model run and fulfill their promises.
+  void runCoalesced(const std::vector<Request *> &requests);
+
+  ExecutionSession &_session;
+  int64_t _maxBatchSize;
+  std::chrono::microseconds _window;
+
+  std::deque<Request *> _queue;
+  std::mutex _mutex;
+  std::condition_variable _condition;
+  bool _stopping = false;
+  std::thread _dispatcher;
+};
+} // namespace onnx_mlir
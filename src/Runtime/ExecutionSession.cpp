@@ -13,6 +13,8 @@
 //
 //===----------------------------------------------------------------------===//
 
+#include <condition_variable>
+#include <cstdlib>
 #include <iostream>
 #include <memory>
 #include <sstream>
@@ -23,7 +25,8 @@
 namespace onnx_mlir {
 
 ExecutionSession::ExecutionSession(
-    std::string sharedLibPath, std::string entryPointName) {
+    std::string sharedLibPath, std::string entryPointName, int numThreads)
+    : _numThreads(numThreads) {
   // Adapted from https://www.tldp.org/HOWTO/html_single/C++-dlopen/.
   _sharedLibraryHandle = dlopen(sharedLibPath.c_str(), RTLD_LAZY);
   if (!_sharedLibraryHandle) {
@@ -44,11 +47,58 @@ ExecutionSession::ExecutionSession(
     dlclose(_sharedLibraryHandle);
     throw std::runtime_error(errStr.str());
   }
+
+  // The signature functions are named after the dynamic entry point,
+  // run_<graph> becoming input_signature_<graph> and output_signature_<graph>.
+  if (entryPointName.rfind("run_", 0) == 0) {
+    auto graphName = entryPointName.substr(4);
+    auto inputSignatureName = "input_signature_" + graphName;
+    _inputSignatureFunc = (signatureFuncType)dlsym(
+        _sharedLibraryHandle, inputSignatureName.c_str());
+    auto outputSignatureName = "output_signature_" + graphName;
+    _outputSignatureFunc = (signatureFuncType)dlsym(
+        _sharedLibraryHandle, outputSignatureName.c_str());
+    dlerror();
+  }
+
+  _setNumThreadsFunc =
+      (setNumThreadsFuncType)dlsym(_sharedLibraryHandle, "omSetNumThreads");
+  dlerror();
+
+  // The memory pools cached by the model library are tied to the sessions
+  // using it, so that they are released before the library is unloaded.
+  if (auto createMemoryPool = (memoryPoolFuncType)dlsym(
+          _sharedLibraryHandle, "omMemoryPoolCreate")) {
+    createMemoryPool();
+    _destroyMemoryPoolFunc =
+        (memoryPoolFuncType)dlsym(_sharedLibraryHandle, "omMemoryPoolDestroy");
+  }
+  dlerror();
+
+  // Load the constant pack of the model, possibly mapping it from a separate
+  // file, at session creation rather than during the first inference.
+  typedef void *(*constPoolFuncType)(int64_t);
+  if (auto loadConstPool = (constPoolFuncType)dlsym(
+          _sharedLibraryHandle, "getEmbeddedConstPool"))
+    loadConstPool(0);
+  dlerror();
 }
 
-std::vector<std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>>
-ExecutionSession::run(
-    std::vector<std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>> ins) {
+std::vector<OMTensorUniquePtr> ExecutionSession::unwrapOutput(
+    OMTensorList *wrappedOutput) {
+  std::vector<OMTensorUniquePtr> outs;
+  for (size_t i = 0; i < omTensorListGetSize(wrappedOutput); i++) {
+    outs.emplace_back(OMTensorUniquePtr(
+        omTensorListGetOmtByIndex(wrappedOutput, i), omTensorDestroy));
+  }
+  // The OMTensor array of an output list is allocated by the entry point.
+  free(omTensorListGetOmtArray(wrappedOutput));
+  free(wrappedOutput);
+  return outs;
+}
+
+std::vector<OMTensorUniquePtr> ExecutionSession::run(
+    std::vector<OMTensorUniquePtr> ins) {
 
   std::vector<OMTensor *> omts;
   for (const auto &inOmt : ins)
@@ -57,14 +107,90 @@ ExecutionSession::run(
 
   auto *wrappedOutput = _entryPointFunc(wrappedInput);
 
-  std::vector<std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>> outs;
+  // The input OMTensors remain owned by ins.
+  free(wrappedInput);
+  return unwrapOutput(wrappedOutput);
+}
 
-  for (size_t i = 0; i < omTensorListGetSize(wrappedOutput); i++) {
-    outs.emplace_back(std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>(
-        omTensorListGetOmtByIndex(wrappedOutput, i), omTensorDestroy));
+std::string ExecutionSession::inputSignature() const {
+  if (!_inputSignatureFunc)
+    throw std::runtime_error("Model library does not provide its signature");
+  return _inputSignatureFunc();
+}
+
+std::string ExecutionSession::outputSignature() const {
+  if (!_outputSignatureFunc)
+    throw std::runtime_error("Model library does not provide its signature");
+  return _outputSignatureFunc();
+}
+
+void ExecutionSession::setIntraOpNumThreads(int numThreads) {
+  if (!_setNumThreadsFunc)
+    throw std::runtime_error(
+        "Model library does not support setting the number of threads");
+  _setNumThreadsFunc(numThreads);
+}
+
+std::vector<std::vector<OMTensorUniquePtr>> ExecutionSession::runBatch(
+    std::vector<std::vector<OMTensorUniquePtr>> batch, bool parallel) {
+  std::vector<std::vector<OMTensor *>> omts(batch.size());
+  std::vector<OMTensorList *> wrappedInputs;
+  for (size_t i = 0; i < batch.size(); i++) {
+    for (const auto &inOmt : batch[i])
+      omts[i].emplace_back(inOmt.get());
+    wrappedInputs.emplace_back(
+        omTensorListCreate(omts[i].data(), omts[i].size()));
+  }
+
+  auto wrappedOutputs = runEntryPoint(wrappedInputs, parallel);
+
+  std::vector<std::vector<OMTensorUniquePtr>> outs;
+  for (size_t i = 0; i < batch.size(); i++) {
+    free(wrappedInputs[i]);
+    outs.emplace_back(unwrapOutput(wrappedOutputs[i]));
   }
-  return std::move(outs);
+  return outs;
 }
 
-ExecutionSession::~ExecutionSession() { dlclose(_sharedLibraryHandle); }
+std::vector<OMTensorList *> ExecutionSession::runEntryPoint(
+    const std::vector<OMTensorList *> &wrappedInputs, bool parallel) {
+  std::vector<OMTensorList *> wrappedOutputs(wrappedInputs.size(), nullptr);
+  if (!parallel || wrappedInputs.size() <= 1) {
+    for (size_t i = 0; i < wrappedInputs.size(); i++)
+      wrappedOutputs[i] = _entryPointFunc(wrappedInputs[i]);
+    return wrappedOutputs;
+  }
+
+  // Each worker writes its own slot of wrappedOutputs, the caller waits for
+  // all of them to be done.
+  std::mutex mutex;
+  std::condition_variable allDone;
+  size_t numPending = wrappedInputs.size();
+  auto &pool = getThreadPool();
+  for (size_t i = 0; i < wrappedInputs.size(); i++) {
+    pool.enqueue([&, i]() {
+      wrappedOutputs[i] = _entryPointFunc(wrappedInputs[i]);
+      std::lock_guard<std::mutex> lock(mutex);
+      if (--numPending == 0)
+        allDone.notify_one();
+    });
+  }
+  std::unique_lock<std::mutex> lock(mutex);
+  allDone.wait(lock, [&] { return numPending == 0; });
+  return wrappedOutputs;
+}
+
+ThreadPool &ExecutionSession::getThreadPool() {
+  std::call_once(_poolCreated,
+      [this]() { _pool = std::make_unique<ThreadPool>(_numThreads); });
+  return *_pool;
+}
+
+ExecutionSession::~ExecutionSession() {
+  // Wait for the pending runs before unloading the model library.
+  _pool.reset();
+  if (_destroyMemoryPoolFunc)
+    _destroyMemoryPoolFunc();
+  dlclose(_sharedLibraryHandle);
+}
 } // namespace onnx_mlir
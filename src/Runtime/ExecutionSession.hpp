@@ -18,29 +18,96 @@
 #include <cassert>
 #include <dlfcn.h>
 #include <memory>
+#include <mutex>
 #include <string>
+#include <vector>
 
 #include "OnnxMlirRuntime.h"
+#include "ThreadPool.hpp"
 
 namespace onnx_mlir {
 
 typedef OMTensorList *(*entryPointFuncType)(OMTensorList *);
+typedef const char *(*signatureFuncType)();
+typedef void (*setNumThreadsFuncType)(int32_t);
+typedef void (*memoryPoolFuncType)();
 
+// Use custom deleter since forward declared OMTensor hides destructor
+typedef std::unique_ptr<OMTensor, decltype(&omTensorDestroy)> OMTensorUniquePtr;
+
+// An ExecutionSession may be shared by several threads: run() can be called
+// concurrently, on the same session or on different sessions loading the same
+// model library. Every invocation of the compiled entry point allocates its
+// own intermediate and output buffers, and only reads its inputs and the
+// model constants. Callers must not modify input tensors while a run using
+// them is in progress.
 class ExecutionSession {
 public:
-  ExecutionSession(std::string sharedLibPath, std::string entryPointName);
+  // numThreads is the number of worker threads used by parallel runs, 0
+  // meaning one per hardware thread. The workers are created on first use.
+  ExecutionSession(std::string sharedLibPath, std::string entryPointName,
+      int numThreads = 0);
+
+  std::vector<OMTensorUniquePtr> run(std::vector<OMTensorUniquePtr>);
+
+  // Run N independent inferences in one call and return their N output lists
+  // in the same order. If parallel is set, the inferences are distributed over
+  // the worker threads of the session.
+  std::vector<std::vector<OMTensorUniquePtr>> runBatch(
+      std::vector<std::vector<OMTensorUniquePtr>>, bool parallel = false);
 
-  // Use custom deleter since forward declared OMTensor hides destructor
-  std::vector<std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>> run(
-      std::vector<std::unique_ptr<OMTensor, decltype(&omTensorDestroy)>>);
+  // Describe the model inputs (resp. outputs) as a JSON array holding, in
+  // order, an object per tensor with its "name", its element "type" (e.g.
+  // "f32") and its "dims", dynamic dimensions being -1. Throw if the model
+  // library does not provide its signature.
+  std::string inputSignature() const;
+  std::string outputSignature() const;
+
+  // Set the number of threads executing each parallel loop of a model
+  // compiled with --parallel, 0 selecting the OpenMP default. The setting is
+  // shared by all the sessions of the model library. Throw if the model
+  // library does not support it.
+  void setIntraOpNumThreads(int numThreads);
 
   ~ExecutionSession();
 
 protected:
+  // Call the entry point once per input list, and return the output lists in
+  // the same order. The input lists are left untouched.
+  std::vector<OMTensorList *> runEntryPoint(
+      const std::vector<OMTensorList *> &wrappedInputs, bool parallel);
+
+  // Take the ownership of the OMTensors of an output list, and release the
+  // list.
+  static std::vector<OMTensorUniquePtr> unwrapOutput(
+      OMTensorList *wrappedOutput);
+
+  // Worker threads of the session, created on first use.
+  ThreadPool &getThreadPool();
+
   // Handler to the shared library file being loaded.
   void *_sharedLibraryHandle = nullptr;
 
   // Entry point function.
   entryPointFuncType _entryPointFunc = nullptr;
+
+  // Functions returning the input and output signatures, null if the model
+  // library does not provide them.
+  signatureFuncType _inputSignatureFunc = nullptr;
+  signatureFuncType _outputSignatureFunc = nullptr;
+
+  // Function setting the number of threads of the parallel loops, null if
+  // the model library does not provide it.
+  setNumThreadsFuncType _setNumThreadsFunc = nullptr;
+
+  // Function releasing the memory pools cached by the model library for this
+  // session, null if the model library does not cache memory pools.
+  memoryPoolFuncType _destroyMemoryPoolFunc = nullptr;
+
+  // Number of worker threads, 0 meaning one per hardware thread.
+  int _numThreads;
+
+  std::unique_ptr<ThreadPool> _pool;
+  std::once_flag _poolCreated;
 };
 } // namespace onnx_mlir
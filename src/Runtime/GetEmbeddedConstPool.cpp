@@ -15,6 +15,7 @@
 
 #include "GetEmbeddedConstPool.h"
 
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -36,52 +37,69 @@ void checkEndianness() {
   }
 }
 
+extern const char constPackIsEmbedded;
+extern char constPackFileName[];
+extern int64_t constPackFileNameStrLen;
+
 #if __APPLE__
 #include <mach-o/getsect.h>
 extern const struct mach_header_64 _mh_dylib_header;
 
-void *getEmbeddedConstPool(int64_t size_in_byte) {
-  checkEndianness();
+// The constant pack is used in place from the section of the library it is
+// embedded in, so its pages are shared by every process loading the library.
+static void *getEmbeddedSection(int64_t size_in_byte) {
   size_t size = size_in_byte;
-  unsigned char *data =
-      getsectiondata(&_mh_dylib_header, "binary", "param", &size);
-  float *data_ptr = (float *)data;
-  void *buffer = malloc(size);
-  memcpy(buffer, data, size);
-  return buffer;
+  return getsectiondata(&_mh_dylib_header, "binary", "param", &size);
 }
 
 #elif __linux__
-extern char _binary_param_bin_start;
-extern char _binary_param_bin_end;
-
-void *getEmbeddedConstPool(int64_t _) {
-  checkEndianness();
-  auto size = (unsigned int)(&_binary_param_bin_end - &_binary_param_bin_start);
+// Weak, since the section does not exist when the constant pack is kept in a
+// separate file.
+extern char _binary_param_bin_start __attribute__((weak));
+extern char _binary_param_bin_end __attribute__((weak));
+
+// The constant pack is used in place from the read-only section of the
+// library it is embedded in, so its pages are shared by every process loading
+// the library. The section is only page aligned when the model was compiled
+// with GNU binutils 2.33 or later, otherwise the pack is copied into a buffer
+// aligned like it used to be. The size of the pack is given by the section,
+// the size passed by the caller is not relied on since sessions preload the
+// pack without knowing it.
+static void *getEmbeddedSection(int64_t _) {
+  if ((uintptr_t)&_binary_param_bin_start % 4096 == 0)
+    return &_binary_param_bin_start;
+  size_t size = &_binary_param_bin_end - &_binary_param_bin_start;
   void *buffer = malloc(size);
   memcpy(buffer, &_binary_param_bin_start, size);
   return buffer;
 }
 
 #else
+static void *getEmbeddedSection(int64_t _) { return NULL; }
+#endif
 
-extern char constPackFileName[];
-extern int64_t constPackFileNameStrLen;
-
-void *getEmbeddedConstPool(int64_t _) {
-  checkEndianness();
+#ifdef _WIN32
+// The constant pack file is read from the working directory.
+static char *getConstPackFilePath() {
   char *fname = (char *)calloc(1, constPackFileNameStrLen + 1);
   memcpy(fname, constPackFileName, constPackFileNameStrLen);
+  return fname;
+}
 
+static void *loadConstPackFile(const char *fname) {
   // Adapted from https://stackoverflow.com/a/22059317 .
   FILE *fileptr;
   char *buffer;
   long filelen;
 
   fileptr = fopen(fname, "rb"); // Open the file in binary mode
-  fseek(fileptr, 0, SEEK_END);  // Jump to the end of the file
-  filelen = ftell(fileptr);     // Get the current byte offset in the file
-  rewind(fileptr);              // Jump back to the beginning of the file
+  if (!fileptr) {
+    fprintf(stderr, "Cannot open constant pack file %s.\n", fname);
+    exit(1);
+  }
+  fseek(fileptr, 0, SEEK_END); // Jump to the end of the file
+  filelen = ftell(fileptr);    // Get the current byte offset in the file
+  rewind(fileptr);             // Jump back to the beginning of the file
 
   buffer = (char *)malloc(filelen * sizeof(char)); // Enough memory for the file
   fread(buffer, filelen, 1, fileptr);              // Read in the entire file
@@ -89,4 +107,66 @@ void *getEmbeddedConstPool(int64_t _) {
 
   return (void *)buffer;
 }
-#endif
\ No newline at end of file
+
+#else
+#include <dlfcn.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+// The constant pack file is read from the directory of the library holding
+// the model, so that the library can be loaded from anywhere.
+static char *getConstPackFilePath() {
+  Dl_info info;
+  size_t dirLen = 0;
+  if (dladdr((void *)constPackFileName, &info) && info.dli_fname) {
+    const char *slash = strrchr(info.dli_fname, '/');
+    if (slash)
+      dirLen = slash - info.dli_fname + 1;
+  }
+  char *fname = (char *)calloc(1, dirLen + constPackFileNameStrLen + 1);
+  memcpy(fname, info.dli_fname, dirLen);
+  memcpy(fname + dirLen, constPackFileName, constPackFileNameStrLen);
+  return fname;
+}
+
+// The constant pack file is memory mapped read-only, so that its pages are
+// loaded on demand and shared by every process using the same file.
+static void *loadConstPackFile(const char *fname) {
+  int fd = open(fname, O_RDONLY);
+  struct stat st;
+  if (fd < 0 || fstat(fd, &st)) {
+    fprintf(stderr, "Cannot open constant pack file %s.\n", fname);
+    exit(1);
+  }
+  // An empty constant pack cannot be mapped, nothing is read from it anyway.
+  static char emptyConstPack[1];
+  void *buffer = emptyConstPack;
+  if (st.st_size > 0) {
+    buffer = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    if (buffer == MAP_FAILED) {
+      fprintf(stderr, "Cannot map constant pack file %s.\n", fname);
+      exit(1);
+    }
+  }
+  close(fd);
+  return buffer;
+}
+#endif
+
+static void *loadConstPool(int64_t size_in_byte) {
+  if (constPackIsEmbedded)
+    return getEmbeddedSection(size_in_byte);
+  char *fname = getConstPackFilePath();
+  void *buffer = loadConstPackFile(fname);
+  free(fname);
+  return buffer;
+}
+
+void *getEmbeddedConstPool(int64_t size_in_byte) {
+  // The model calls this function on every invocation. The constant pack is
+  // loaded once, the initialization of a static local being thread-safe.
+  static void *constPool = (checkEndianness(), loadConstPool(size_in_byte));
+  return constPool;
+}
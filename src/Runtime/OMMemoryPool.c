@@ -0,0 +1,231 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------------ OMMemoryPool.c - Session Memory Pool Runtime ------------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains the implementation of memory pools kept alive across
+// invocations of a compiled model. Every thread calling into the model owns
+// an arena holding a small number of pool buffers. A buffer released at the
+// end of an invocation is handed out again by the next invocation on the same
+// thread, which removes the large malloc/free pairs (and the page faults of
+// touching fresh memory) from every inference.
+//
+// Users of the model library, such as ExecutionSession, bracket their use
+// with omMemoryPoolCreate and omMemoryPoolDestroy. When the last of them is
+// destroyed, the cached buffers of all threads are freed and the thread exit
+// handler is unregistered, so that the library can then be unloaded.
+//
+//===----------------------------------------------------------------------===//
+
+#if !defined(_WIN32) && !defined(_POSIX_C_SOURCE)
+#define _POSIX_C_SOURCE 200112L
+#endif
+
+#include <stdint.h>
+#include <stdlib.h>
+
+#ifdef _WIN32
+#include <malloc.h>
+#else
+#include <pthread.h>
+#endif
+
+#include "OMMemoryPool.h"
+
+static void *alignedAlloc(int64_t size, int64_t alignment) {
+  if (alignment < (int64_t)sizeof(void *))
+    alignment = sizeof(void *);
+  if (size <= 0)
+    size = 1;
+#ifdef _WIN32
+  return _aligned_malloc((size_t)size, (size_t)alignment);
+#else
+  void *ptr = NULL;
+  if (posix_memalign(&ptr, (size_t)alignment, (size_t)size))
+    return NULL;
+  return ptr;
+#endif
+}
+
+static void alignedFree(void *ptr) {
+#ifdef _WIN32
+  _aligned_free(ptr);
+#else
+  free(ptr);
+#endif
+}
+
+#ifdef _WIN32
+
+// No per-thread arena on Windows, pools are allocated on every invocation.
+void omMemoryPoolCreate(void) {}
+
+void omMemoryPoolDestroy(void) {}
+
+void *omMemoryPoolAcquire(int64_t size, int64_t alignment) {
+  return alignedAlloc(size, alignment);
+}
+
+void omMemoryPoolRelease(void *pool, int64_t size) { alignedFree(pool); }
+
+#else
+
+// Number of pool buffers cached per thread. A model typically bundles its
+// internal MemRefs into one static and a few dynamic memory pools.
+#define OM_MEMORY_POOL_ARENA_SLOTS 8
+
+typedef struct {
+  void *ptr;
+  int64_t capacity;
+  int inUse;
+} OMMemoryPoolSlot;
+
+typedef struct OMMemoryPoolArena {
+  OMMemoryPoolSlot slots[OM_MEMORY_POOL_ARENA_SLOTS];
+  // Next arena in the list of the arenas of all threads.
+  struct OMMemoryPoolArena *next;
+} OMMemoryPoolArena;
+
+// Protects the thread key, the list of arenas and the number of sessions.
+static pthread_mutex_t poolMutex = PTHREAD_MUTEX_INITIALIZER;
+static pthread_key_t arenaKey;
+static int arenaKeyCreated = 0;
+static OMMemoryPoolArena *arenas = NULL;
+static int numSessions = 0;
+
+/* Free the cached pool buffers of an arena, and the arena. Buffers still in
+ * use are freed when they are released. */
+static void freeArena(OMMemoryPoolArena *arena) {
+  for (int i = 0; i < OM_MEMORY_POOL_ARENA_SLOTS; i++)
+    if (!arena->slots[i].inUse)
+      alignedFree(arena->slots[i].ptr);
+  free(arena);
+}
+
+/* Free the arena of a thread when it exits. */
+static void destroyArena(void *arg) {
+  OMMemoryPoolArena *arena = (OMMemoryPoolArena *)arg;
+  pthread_mutex_lock(&poolMutex);
+  for (OMMemoryPoolArena **it = &arenas; *it; it = &(*it)->next)
+    if (*it == arena) {
+      *it = arena->next;
+      break;
+    }
+  pthread_mutex_unlock(&poolMutex);
+  freeArena(arena);
+}
+
+/* Return the arena of the calling thread, NULL if it has none. If create is
+ * set, a missing arena is created. */
+static OMMemoryPoolArena *getArena(int create) {
+  OMMemoryPoolArena *arena = NULL;
+  pthread_mutex_lock(&poolMutex);
+  if (!arenaKeyCreated && create &&
+      pthread_key_create(&arenaKey, destroyArena) == 0)
+    arenaKeyCreated = 1;
+  if (arenaKeyCreated) {
+    arena = (OMMemoryPoolArena *)pthread_getspecific(arenaKey);
+    if (!arena && create) {
+      arena = (OMMemoryPoolArena *)calloc(1, sizeof(OMMemoryPoolArena));
+      if (arena && pthread_setspecific(arenaKey, arena)) {
+        free(arena);
+        arena = NULL;
+      }
+      if (arena) {
+        arena->next = arenas;
+        arenas = arena;
+      }
+    }
+  }
+  pthread_mutex_unlock(&poolMutex);
+  return arena;
+}
+
+void omMemoryPoolCreate(void) {
+  pthread_mutex_lock(&poolMutex);
+  numSessions++;
+  pthread_mutex_unlock(&poolMutex);
+}
+
+void omMemoryPoolDestroy(void) {
+  pthread_mutex_lock(&poolMutex);
+  if (numSessions > 0 && --numSessions == 0) {
+    // Threads exiting from now on no longer call destroyArena, whose code
+    // may be unloaded.
+    if (arenaKeyCreated) {
+      pthread_key_delete(arenaKey);
+      arenaKeyCreated = 0;
+    }
+    while (arenas) {
+      OMMemoryPoolArena *arena = arenas;
+      arenas = arena->next;
+      freeArena(arena);
+    }
+  }
+  pthread_mutex_unlock(&poolMutex);
+}
+
+static int fits(OMMemoryPoolSlot *slot, int64_t size, int64_t alignment) {
+  return slot->ptr && slot->capacity >= size &&
+         (alignment <= 1 || ((uintptr_t)slot->ptr % (uintptr_t)alignment) == 0);
+}
+
+void *omMemoryPoolAcquire(int64_t size, int64_t alignment) {
+  OMMemoryPoolArena *arena = getArena(/*create=*/1);
+  if (!arena)
+    return alignedAlloc(size, alignment);
+
+  // Reuse the smallest free buffer large enough for the request.
+  OMMemoryPoolSlot *best = NULL;
+  OMMemoryPoolSlot *freeSlot = NULL;
+  for (int i = 0; i < OM_MEMORY_POOL_ARENA_SLOTS; i++) {
+    OMMemoryPoolSlot *slot = &arena->slots[i];
+    if (slot->inUse)
+      continue;
+    if (fits(slot, size, alignment)) {
+      if (!best || slot->capacity < best->capacity)
+        best = slot;
+    } else if (!freeSlot || !slot->ptr ||
+               (freeSlot->ptr && slot->capacity < freeSlot->capacity)) {
+      // Prefer empty slots, then the smallest cached buffer to replace.
+      freeSlot = slot;
+    }
+  }
+  if (best) {
+    best->inUse = 1;
+    return best->ptr;
+  }
+
+  // All slots are in use, fall back to an untracked allocation.
+  if (!freeSlot)
+    return alignedAlloc(size, alignment);
+
+  // Grow: replace the buffer of a free slot with a new one.
+  alignedFree(freeSlot->ptr);
+  freeSlot->ptr = alignedAlloc(size, alignment);
+  freeSlot->capacity = freeSlot->ptr ? size : 0;
+  freeSlot->inUse = freeSlot->ptr != NULL;
+  return freeSlot->ptr;
+}
+
+void omMemoryPoolRelease(void *pool, int64_t size) {
+  (void)size;
+  if (!pool)
+    return;
+  OMMemoryPoolArena *arena = getArena(/*create=*/0);
+  if (arena)
+    for (int i = 0; i < OM_MEMORY_POOL_ARENA_SLOTS; i++)
+      if (arena->slots[i].ptr == pool) {
+        arena->slots[i].inUse = 0;
+        return;
+      }
+  // Not cached by this thread.
+  alignedFree(pool);
+}
+
+#endif
@@ -0,0 +1,69 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------- OMMemoryPool.h - Session Memory Pool API Declarations --------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains runtime API declarations to acquire and release memory
+// pools that are kept alive across invocations of a compiled model.
+//
+//===----------------------------------------------------------------------===//
+
+#pragma once
+
+#include <stdint.h>
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Register a user of the memory pools, such as an ExecutionSession.
+ *
+ * Memory pools can be acquired without any registered user, but then their
+ * cached buffers are only freed when threads exit.
+ */
+void omMemoryPoolCreate(void);
+
+/**
+ * Unregister a user of the memory pools registered by omMemoryPoolCreate.
+ *
+ * When the last user is unregistered, the cached pools of all threads are
+ * freed and no thread exit handler of the model library remains, so that the
+ * library can be unloaded. No model invocation may be in progress.
+ */
+void omMemoryPoolDestroy(void);
+
+/**
+ * Acquire a memory pool of at least size bytes, aligned to alignment bytes.
+ *
+ * Each calling thread owns its own arena of cached memory pools, so a pool
+ * released by a previous invocation on the same thread is handed out again
+ * without going through the system allocator. Concurrent callers never share
+ * a pool.
+ *
+ * @param size, size of the memory pool in bytes
+ * @param alignment, alignment of the memory pool in bytes, a power of two
+ * @return pointer to the memory pool, NULL if the allocation failed
+ */
+void *omMemoryPoolAcquire(int64_t size, int64_t alignment);
+
+/**
+ * Release a memory pool acquired by omMemoryPoolAcquire on the same thread.
+ *
+ * The pool is cached in the arena of the calling thread for the next
+ * invocation. Cached pools are freed when the thread exits, or when the last
+ * user registered by omMemoryPoolCreate is unregistered.
+ *
+ * @param pool, pointer to the memory pool
+ * @param size, size in bytes the memory pool was acquired with
+ */
+void omMemoryPoolRelease(void *pool, int64_t size);
+
+#ifdef __cplusplus
+}
+#endif
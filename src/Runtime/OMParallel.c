@@ -0,0 +1,39 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===---------------- OMParallel.c - Parallel Loop Runtime ----------------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains the implementation of the runtime setting read by the
+// parallel loops of a compiled model, when compiled with --parallel, to size
+// their OpenMP parallel regions.
+//
+//===----------------------------------------------------------------------===//
+
+#include <stdint.h>
+
+#include "OMParallel.h"
+
+static int32_t numThreadsSetting = 0;
+
+void omSetNumThreads(int32_t numThreads) {
+  if (numThreads < 0)
+    numThreads = 0;
+#if defined(__GNUC__) || defined(__clang__)
+  __atomic_store_n(&numThreadsSetting, numThreads, __ATOMIC_RELAXED);
+#else
+  numThreadsSetting = numThreads;
+#endif
+}
+
+int32_t omGetNumThreads(void) {
+#if defined(__GNUC__) || defined(__clang__)
+  return __atomic_load_n(&numThreadsSetting, __ATOMIC_RELAXED);
+#else
+  return numThreadsSetting;
+#endif
+}
@@ -0,0 +1,44 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------------ OMParallel.h - Parallel Loop API Declarations -----------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains runtime API declarations to control the number of
+// threads executing the parallel loops of a compiled model.
+//
+//===----------------------------------------------------------------------===//
+
+#pragma once
+
+#include <stdint.h>
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Set the number of threads executing each parallel loop of the model.
+ *
+ * The setting is shared by all the callers of the model library and applies
+ * to the invocations started after the call.
+ *
+ * @param numThreads, number of threads, 0 (the default) selecting the OpenMP
+ * runtime default, e.g. OMP_NUM_THREADS or one per hardware thread
+ */
+void omSetNumThreads(int32_t numThreads);
+
+/**
+ * Get the number of threads executing each parallel loop of the model.
+ *
+ * @return number of threads, 0 if the OpenMP runtime default is used
+ */
+int32_t omGetNumThreads(void);
+
+#ifdef __cplusplus
+}
+#endif
@@ -20,10 +20,201 @@
 
 namespace onnx_mlir {
 
+PyExecutionSession::~PyExecutionSession() {
+  // Pending asynchronous runs need the GIL to deliver their results, so it is
+  // released while waiting for them to complete.
+  py::gil_scoped_release release;
+  _batcher.reset();
+  _pool.reset();
+}
+
 std::vector<py::array> PyExecutionSession::pyRun(
     const std::vector<py::array> &inputsPyArray) {
   assert(_entryPointFunc && "Entry point not loaded.");
 
+  auto omts = pyArraysToOmts(inputsPyArray);
+  auto *wrappedInput = omTensorListCreate(&omts[0], omts.size());
+  OMTensorList *wrappedOutput;
+  {
+    // The compiled model does not touch any Python object, so the GIL is
+    // released while it runs to let other Python threads make progress,
+    // including threads running inferences concurrently. The numpy arrays
+    // backing the inputs are kept alive by inputsPyArray.
+    py::gil_scoped_release release;
+    wrappedOutput = _entryPointFunc(wrappedInput);
+  }
+
+  // Input OMTensors only borrow the numpy buffers (unless a copy was made
+  // when wrapping them, in which case they own it), so they can be released
+  // right away. The OMTensor array itself is owned by the omts vector.
+  omTensorListDestroy(wrappedInput);
+
+  return omtListToPyArrays(wrappedOutput);
+}
+
+std::vector<py::array> PyExecutionSession::pyRunDict(
+    const py::dict &inputsPyDict) {
+  if (_inputNames.empty())
+    for (auto input : pyInputSignature())
+      _inputNames.emplace_back(input["name"].cast<std::string>());
+
+  if (inputsPyDict.size() != _inputNames.size())
+    throw py::value_error("Expect " + std::to_string(_inputNames.size()) +
+                          " inputs, got " +
+                          std::to_string(inputsPyDict.size()) + ".");
+  std::vector<py::array> inputsPyArray;
+  for (const auto &name : _inputNames) {
+    if (!inputsPyDict.contains(name))
+      throw py::key_error("Missing input '" + name + "'.");
+    inputsPyArray.emplace_back(inputsPyDict[name.c_str()].cast<py::array>());
+  }
+  return pyRun(inputsPyArray);
+}
+
+py::list PyExecutionSession::pyInputSignature() {
+  return signatureToPyList(inputSignature());
+}
+
+py::list PyExecutionSession::pyOutputSignature() {
+  return signatureToPyList(outputSignature());
+}
+
+std::vector<std::vector<py::array>> PyExecutionSession::pyRunBatch(
+    const std::vector<std::vector<py::array>> &batchPyArray, bool parallel) {
+  assert(_entryPointFunc && "Entry point not loaded.");
+
+  std::vector<std::vector<OMTensor *>> omts;
+  std::vector<OMTensorList *> wrappedInputs;
+  for (const auto &inputsPyArray : batchPyArray)
+    omts.emplace_back(pyArraysToOmts(inputsPyArray));
+  for (auto &inputOmts : omts)
+    wrappedInputs.emplace_back(
+        omTensorListCreate(inputOmts.data(), inputOmts.size()));
+
+  std::vector<OMTensorList *> wrappedOutputs;
+  {
+    // See pyRun, the numpy arrays are kept alive by batchPyArray.
+    py::gil_scoped_release release;
+    wrappedOutputs = runEntryPoint(wrappedInputs, parallel);
+  }
+
+  for (auto *wrappedInput : wrappedInputs)
+    omTensorListDestroy(wrappedInput);
+
+  // Take the ownership of the outputs of all the runs before converting any
+  // of them, so that the outputs not converted yet are released if a run
+  // failed or a conversion throws.
+  std::vector<std::vector<OMTensorUniquePtr>> outs;
+  outs.reserve(wrappedOutputs.size());
+  for (auto *wrappedOutput : wrappedOutputs)
+    if (wrappedOutput)
+      outs.emplace_back(unwrapOutput(wrappedOutput));
+  if (outs.size() != wrappedOutputs.size())
+    throw std::runtime_error("The model run failed.");
+
+  std::vector<std::vector<py::array>> outputPyArrays;
+  for (auto &runOuts : outs)
+    outputPyArrays.emplace_back(omtsToPyArrays(runOuts));
+  return outputPyArrays;
+}
+
+void PyExecutionSession::pyEnableDynamicBatching(
+    int64_t maxBatchSize, int64_t windowInMicroseconds) {
+  auto batcher = std::make_unique<DynamicBatcher>(
+      *this, maxBatchSize, windowInMicroseconds);
+  // A previous batcher completes its pending requests before being destroyed,
+  // do not block other Python threads meanwhile.
+  py::gil_scoped_release release;
+  _batcher.swap(batcher);
+  batcher.reset();
+}
+
+std::vector<py::array> PyExecutionSession::pyRunCoalesced(
+    const std::vector<py::array> &inputsPyArray) {
+  if (!_batcher)
+    throw std::runtime_error("Dynamic batching is not enabled.");
+
+  std::vector<OMTensorUniquePtr> ins;
+  for (auto *omt : pyArraysToOmts(inputsPyArray))
+    ins.emplace_back(OMTensorUniquePtr(omt, omTensorDestroy));
+
+  std::vector<OMTensorUniquePtr> outs;
+  {
+    // See pyRun, the numpy arrays are kept alive by inputsPyArray.
+    py::gil_scoped_release release;
+    outs = _batcher->run(std::move(ins));
+  }
+
+  return omtsToPyArrays(outs);
+}
+
+py::object PyExecutionSession::pyRunAsync(
+    const std::vector<py::array> &inputsPyArray) {
+  assert(_entryPointFunc && "Entry point not loaded.");
+
+  // Holds everything an asynchronous run needs until it completes. Python
+  // objects are only created and destroyed with the GIL held.
+  struct PendingRun {
+    std::vector<py::array> inputsPyArray;
+    std::vector<OMTensor *> omts;
+    py::object future;
+  };
+
+  auto future = py::module::import("concurrent.futures").attr("Future")();
+  auto *pending =
+      new PendingRun{inputsPyArray, pyArraysToOmts(inputsPyArray), future};
+
+  getThreadPool().enqueue([this, pending]() {
+    {
+      py::gil_scoped_acquire acquire;
+      // The run was cancelled while waiting in the queue.
+      if (!pending->future.attr("set_running_or_notify_cancel")()
+              .cast<bool>()) {
+        for (auto *omt : pending->omts)
+          omTensorDestroy(omt);
+        delete pending;
+        return;
+      }
+    }
+
+    // An exception must not escape a thread of the pool, it is delivered
+    // through the future instead.
+    auto *wrappedInput =
+        omTensorListCreate(&pending->omts[0], pending->omts.size());
+    OMTensorList *wrappedOutput = nullptr;
+    std::string error = "The model run failed.";
+    try {
+      wrappedOutput = _entryPointFunc(wrappedInput);
+    } catch (const std::exception &e) {
+      error = e.what();
+    }
+
+    py::gil_scoped_acquire acquire;
+    std::unique_ptr<PendingRun> completed(pending);
+    omTensorListDestroy(wrappedInput);
+    try {
+      if (!wrappedOutput)
+        throw std::runtime_error(error);
+      completed->future.attr("set_result")(omtListToPyArrays(wrappedOutput));
+    } catch (py::error_already_set &e) {
+      completed->future.attr("set_exception")(e.value());
+    } catch (const std::exception &e) {
+      completed->future.attr("set_exception")(
+          py::module::import("builtins").attr("RuntimeError")(e.what()));
+    }
+  });
+
+  return future;
+}
+
+py::object PyExecutionSession::pyRunAsyncio(
+    const std::vector<py::array> &inputsPyArray) {
+  return py::module::import("asyncio").attr("wrap_future")(
+      pyRunAsync(inputsPyArray));
+}
+
+std::vector<OMTensor *> PyExecutionSession::pyArraysToOmts(
+    const std::vector<py::array> &inputsPyArray) {
   std::vector<OMTensor *> omts;
   for (auto inputPyArray : inputsPyArray) {
     assert(inputPyArray.flags() && py::array::c_style &&
@@ -82,56 +273,109 @@ std::vector<py::array> PyExecutionSession::pyRun(
     omts.emplace_back(inputOMTensor);
   }
 
-  auto *wrappedInput = omTensorListCreate(&omts[0], omts.size());
-  auto *wrappedOutput = _entryPointFunc(wrappedInput);
+  return omts;
+}
+
+std::vector<py::array> PyExecutionSession::omtListToPyArrays(
+    OMTensorList *wrappedOutput) {
+  // The entry point returns no list when the model run fails.
+  if (!wrappedOutput)
+    throw std::runtime_error("The model run failed.");
+
+  auto outs = unwrapOutput(wrappedOutput);
+  return omtsToPyArrays(outs);
+}
 
+std::vector<py::array> PyExecutionSession::omtsToPyArrays(
+    std::vector<OMTensorUniquePtr> &omts) {
   std::vector<py::array> outputPyArrays;
-  for (int i = 0; i < omTensorListGetSize(wrappedOutput); i++) {
-    auto *omt = omTensorListGetOmtByIndex(wrappedOutput, i);
-    auto shape = std::vector<int64_t>(
-        omTensorGetShape(omt), omTensorGetShape(omt) + omTensorGetRank(omt));
-
-    // https://numpy.org/devdocs/user/basics.types.html
-    py::dtype dtype;
-    if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::FLOAT)
-      dtype = py::dtype("float32");
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::UINT8)
-      dtype = py::dtype("uint8");
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT8)
-      dtype = py::dtype("int8");
-    else if (omTensorGetDataType(omt) ==
-             (OM_DATA_TYPE)onnx::TensorProto::UINT16)
-      dtype = py::dtype("uint16");
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT16)
-      dtype = py::dtype("int16");
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT32)
-      dtype = py::dtype("int32");
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT64)
-      dtype = py::dtype("int64");
-    // TODO(tjingrant) wait for Tong's input for how to represent string.
-    else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::BOOL)
-      dtype = py::dtype("bool_");
-    else if (omTensorGetDataType(omt) ==
-             (OM_DATA_TYPE)onnx::TensorProto::FLOAT16)
-      dtype = py::dtype("float32");
-    else if (omTensorGetDataType(omt) ==
-             (OM_DATA_TYPE)onnx::TensorProto::DOUBLE)
-      dtype = py::dtype("float64");
-    else if (omTensorGetDataType(omt) ==
-             (OM_DATA_TYPE)onnx::TensorProto::UINT32)
-      dtype = py::dtype("uint32");
-    else if (omTensorGetDataType(omt) ==
-             (OM_DATA_TYPE)onnx::TensorProto::UINT64)
-      dtype = py::dtype("uint64");
-    else {
-      fprintf(stderr, "Unsupported ONNX type in OMTensor.");
-      exit(1);
+  for (auto &omt : omts)
+    outputPyArrays.emplace_back(omtToPyArray(omt));
+  return outputPyArrays;
+}
+
+py::list PyExecutionSession::signatureToPyList(const std::string &signature) {
+  // Element types are recorded as MLIR types.
+  static const std::map<std::string, std::string> mlirToNumpyTypes = {
+      {"f16", "float16"}, {"f32", "float32"}, {"f64", "float64"},
+      {"i1", "bool_"}, {"i8", "int8"}, {"i16", "int16"}, {"i32", "int32"},
+      {"i64", "int64"}, {"ui8", "uint8"}, {"ui16", "uint16"},
+      {"ui32", "uint32"}, {"ui64", "uint64"}};
+
+  py::list tensors;
+  for (auto tensor : py::module::import("json").attr("loads")(signature)) {
+    py::dict tensorPyDict;
+    tensorPyDict["name"] = tensor.attr("get")("name", "");
+    auto type = tensor["type"].cast<std::string>();
+    auto numpyType = mlirToNumpyTypes.find(type);
+    if (numpyType != mlirToNumpyTypes.end())
+      tensorPyDict["dtype"] = py::dtype(numpyType->second);
+    else
+      tensorPyDict["dtype"] = type;
+    if (tensor.contains("dims")) {
+      py::list shape;
+      for (auto dim : tensor["dims"])
+        shape.append(dim.cast<int64_t>() < 0 ? py::none() : dim);
+      tensorPyDict["shape"] = py::tuple(shape);
+    } else {
+      tensorPyDict["shape"] = py::none();
     }
+    tensors.append(tensorPyDict);
+  }
+  return tensors;
+}
+
+py::array PyExecutionSession::omtToPyArray(OMTensorUniquePtr &ownedOmt) {
+  OMTensor *omt = ownedOmt.get();
+  auto shape = std::vector<int64_t>(
+      omTensorGetShape(omt), omTensorGetShape(omt) + omTensorGetRank(omt));
 
-    outputPyArrays.emplace_back(
-        py::array(dtype, shape, omTensorGetDataPtr(omt)));
+  // https://numpy.org/devdocs/user/basics.types.html
+  py::dtype dtype;
+  if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::FLOAT)
+    dtype = py::dtype("float32");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::UINT8)
+    dtype = py::dtype("uint8");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT8)
+    dtype = py::dtype("int8");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::UINT16)
+    dtype = py::dtype("uint16");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT16)
+    dtype = py::dtype("int16");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT32)
+    dtype = py::dtype("int32");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::INT64)
+    dtype = py::dtype("int64");
+  // TODO(tjingrant) wait for Tong's input for how to represent string.
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::BOOL)
+    dtype = py::dtype("bool_");
+  // The output buffer is handed to numpy as is, so the element size of the
+  // numpy dtype must match the element size of the OMTensor.
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::FLOAT16)
+    dtype = py::dtype("float16");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::DOUBLE)
+    dtype = py::dtype("float64");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::UINT32)
+    dtype = py::dtype("uint32");
+  else if (omTensorGetDataType(omt) == (OM_DATA_TYPE)onnx::TensorProto::UINT64)
+    dtype = py::dtype("uint64");
+  else {
+    fprintf(stderr, "Unsupported ONNX type in OMTensor.");
+    exit(1);
   }
 
-  return outputPyArrays;
+  // OMTensor strides are expressed in number of elements, numpy strides in
+  // number of bytes.
+  auto strides = std::vector<int64_t>(
+      omTensorGetStrides(omt), omTensorGetStrides(omt) + omTensorGetRank(omt));
+  for (auto &stride : strides)
+    stride *= dtype.itemsize();
+
+  // Wrap the output buffer without copying it. The capsule becomes the base
+  // object of the numpy array and takes over ownership of the OMTensor, so
+  // the buffer is released once the array is garbage collected.
+  py::capsule owner(ownedOmt.release(),
+      [](void *ptr) { omTensorDestroy(reinterpret_cast<OMTensor *>(ptr)); });
+  return py::array(dtype, shape, strides, omTensorGetDataPtr(omt), owner);
 }
 } // namespace onnx_mlir
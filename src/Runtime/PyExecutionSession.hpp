@@ -19,21 +19,98 @@
 
 namespace py = pybind11;
 
+#include "DynamicBatcher.hpp"
 #include "ExecutionSession.hpp"
 
 namespace onnx_mlir {
 
 class PyExecutionSession : public onnx_mlir::ExecutionSession {
 public:
-  PyExecutionSession(std::string sharedLibPath, std::string entryPointName)
-      : onnx_mlir::ExecutionSession(sharedLibPath, entryPointName){};
+  PyExecutionSession(
+      std::string sharedLibPath, std::string entryPointName, int numThreads = 0)
+      : onnx_mlir::ExecutionSession(
+            sharedLibPath, entryPointName, numThreads) {};
+
+  ~PyExecutionSession();
 
   std::vector<py::array> pyRun(const std::vector<py::array> &inputsPyArray);
+
+  // Run the model with its inputs keyed by name, see pyInputSignature.
+  std::vector<py::array> pyRunDict(const py::dict &inputsPyDict);
+
+  // Describe the model inputs (resp. outputs) as a list holding, in order, a
+  // dict per tensor with its "name", its numpy "dtype" and its "shape", None
+  // standing for dynamic dimensions. See ExecutionSession::inputSignature.
+  py::list pyInputSignature();
+  py::list pyOutputSignature();
+
+  // Run N independent inferences in one call, see ExecutionSession::runBatch.
+  std::vector<std::vector<py::array>> pyRunBatch(
+      const std::vector<std::vector<py::array>> &batchPyArray, bool parallel);
+
+  // Coalesce the requests submitted through pyRunCoalesced, see
+  // DynamicBatcher.
+  void pyEnableDynamicBatching(
+      int64_t maxBatchSize, int64_t windowInMicroseconds);
+
+  // Run one request, coalesced with the concurrent requests of other threads.
+  std::vector<py::array> pyRunCoalesced(
+      const std::vector<py::array> &inputsPyArray);
+
+  // Run the model on a worker thread of the session and return a
+  // concurrent.futures.Future resolving to the list of outputs.
+  py::object pyRunAsync(const std::vector<py::array> &inputsPyArray);
+
+  // Same as pyRunAsync, but return an asyncio future awaitable from the
+  // running event loop.
+  py::object pyRunAsyncio(const std::vector<py::array> &inputsPyArray);
+
+private:
+  // Wrap numpy arrays into OMTensors. The OMTensors borrow the numpy buffers
+  // whenever possible.
+  std::vector<OMTensor *> pyArraysToOmts(
+      const std::vector<py::array> &inputsPyArray);
+
+  // Wrap the OMTensors of an output list into numpy arrays, transferring the
+  // ownership of the OMTensors to the numpy arrays. The list is destroyed.
+  std::vector<py::array> omtListToPyArrays(OMTensorList *wrappedOutput);
+
+  // Wrap OMTensors into numpy arrays, see omtToPyArray. If a conversion
+  // throws, the OMTensors not converted yet remain owned by omts.
+  std::vector<py::array> omtsToPyArrays(std::vector<OMTensorUniquePtr> &omts);
+
+  // Wrap an OMTensor into a numpy array, which takes over its ownership.
+  py::array omtToPyArray(OMTensorUniquePtr &omt);
+
+  // Convert a JSON signature to the list returned by pyInputSignature.
+  py::list signatureToPyList(const std::string &signature);
+
+  // Names of the model inputs in order, read from the input signature on
+  // first use by pyRunDict.
+  std::vector<std::string> _inputNames;
+
+  // Coalescing layer used by pyRunCoalesced, null until enabled.
+  std::unique_ptr<DynamicBatcher> _batcher;
 };
 } // namespace onnx_mlir
 
 PYBIND11_MODULE(PyRuntime, m) {
   py::class_<onnx_mlir::PyExecutionSession>(m, "ExecutionSession")
-      .def(py::init<const std::string &, const std::string &>())
-      .def("run", &onnx_mlir::PyExecutionSession::pyRun);
+      .def(py::init<const std::string &, const std::string &, int>(),
+          py::arg("path"), py::arg("entry_point"), py::arg("num_threads") = 0)
+      .def("run", &onnx_mlir::PyExecutionSession::pyRun)
+      .def("run", &onnx_mlir::PyExecutionSession::pyRunDict)
+      .def("input_signature", &onnx_mlir::PyExecutionSession::pyInputSignature)
+      .def(
+          "output_signature", &onnx_mlir::PyExecutionSession::pyOutputSignature)
+      .def("set_intra_op_num_threads",
+          &onnx_mlir::PyExecutionSession::setIntraOpNumThreads)
+      .def("run_batch", &onnx_mlir::PyExecutionSession::pyRunBatch,
+          py::arg("batch"), py::arg("parallel") = false)
+      .def("enable_dynamic_batching",
+          &onnx_mlir::PyExecutionSession::pyEnableDynamicBatching,
+          py::arg("max_batch_size"), py::arg("window_us"))
+      .def("run_coalesced", &onnx_mlir::PyExecutionSession::pyRunCoalesced)
+      .def("run_async", &onnx_mlir::PyExecutionSession::pyRunAsync)
+      .def("run_asyncio", &onnx_mlir::PyExecutionSession::pyRunAsyncio);
 }
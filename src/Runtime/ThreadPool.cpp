@@ -0,0 +1,63 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===-------------- ThreadPool.cpp - ThreadPool Implementation ------------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains implementations of ThreadPool class, a fixed size pool of
+// worker threads used by the runtime to execute model inferences in the
+// background.
+//
+//===----------------------------------------------------------------------===//
+
+#include <algorithm>
+
+#include "ThreadPool.hpp"
+
+namespace onnx_mlir {
+
+ThreadPool::ThreadPool(size_t numThreads) {
+  if (numThreads == 0)
+    numThreads = std::max(1u, std::thread::hardware_concurrency());
+  for (size_t i = 0; i < numThreads; i++)
+    _workers.emplace_back(&ThreadPool::workerLoop, this);
+}
+
+ThreadPool::~ThreadPool() {
+  {
+    std::lock_guard<std::mutex> lock(_mutex);
+    _stopping = true;
+  }
+  _condition.notify_all();
+  for (auto &worker : _workers)
+    worker.join();
+}
+
+void ThreadPool::enqueue(std::function<void()> task) {
+  {
+    std::lock_guard<std::mutex> lock(_mutex);
+    _tasks.emplace(std::move(task));
+  }
+  _condition.notify_one();
+}
+
+void ThreadPool::workerLoop() {
+  while (true) {
+    std::function<void()> task;
+    {
+      std::unique_lock<std::mutex> lock(_mutex);
+      _condition.wait(lock, [this] { return _stopping || !_tasks.empty(); });
+      // Pending tasks are drained before the workers exit.
+      if (_tasks.empty())
+        return;
+      task = std::move(_tasks.front());
+      _tasks.pop();
+    }
+    task();
+  }
+}
+} // namespace onnx_mlir
@@ -0,0 +1,52 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===---------------- ThreadPool.hpp - ThreadPool Declaration -------------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file contains declaration of ThreadPool class, a fixed size pool of
+// worker threads used by the runtime to execute model inferences in the
+// background.
+//
+//===----------------------------------------------------------------------===//
+
+#pragma once
+
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <queue>
+#include <thread>
+#include <vector>
+
+namespace onnx_mlir {
+
+class ThreadPool {
+public:
+  // Create a pool with numThreads workers. If numThreads is 0, one worker per
+  // hardware thread is created.
+  explicit ThreadPool(size_t numThreads = 0);
+
+  // Run all the pending tasks, then join the workers.
+  ~ThreadPool();
+
+  // Schedule a task for execution by one of the workers.
+  void enqueue(std::function<void()> task);
+
+  // Number of worker threads.
+  size_t size() const { return _workers.size(); }
+
+private:
+  void workerLoop();
+
+  std::vector<std::thread> _workers;
+  std::queue<std::function<void()>> _tasks;
+  std::mutex _mutex;
+  std::condition_variable _condition;
+  bool _stopping = false;
+};
+} // namespace onnx_mlir
@@ -68,6 +68,7 @@ int main(int argc, char **argv) {
   registry.insert<mlir::linalg::LinalgDialect>();
   registry.insert<mlir::AffineDialect>();
   registry.insert<mlir::LLVM::LLVMDialect>();
+  registry.insert<mlir::omp::OpenMPDialect>();
   registry.insert<mlir::scf::SCFDialect>();
   registry.insert<mlir::StandardOpsDialect>();
   registry.insert<mlir::vector::VectorDialect>();
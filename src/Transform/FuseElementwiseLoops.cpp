@@ -0,0 +1,241 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------ FuseElementwiseLoops.cpp - Fuse element-wise loop nests -------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// Each element-wise operation is lowered to its own loop nest writing its own
+// result array, so a chain such as Add -> Mul -> Relu makes one pass over
+// memory per operation. This pass fuses a producer loop nest into the loop
+// nest consuming its result:
+//
+//   %A = alloc()
+//   krnl.iterate(...) with (... -> %i = ..., ... -> %j = ...) {
+//     %x = krnl.load %X[%i, %j]
+//     %a = exp %x
+//     krnl.store %a, %A[%i, %j]
+//   }
+//   krnl.iterate(...) with (... -> %k = ..., ... -> %l = ...) {
+//     %a = krnl.load %A[%c0, %l]
+//     ...
+//   }
+//
+// becomes
+//
+//   krnl.iterate(...) with (... -> %k = ..., ... -> %l = ...) {
+//     %x = krnl.load %X[%c0, %l]
+//     %a = exp %x
+//     ...
+//   }
+//
+// i.e. the computation of the producer is inlined at the place where its
+// result is loaded, with the indices of the load, which also covers
+// broadcasts. The producer nest and its result array are then removed.
+//
+// A producer is fused when:
+// - every iteration writes the element of its result at the induction
+//   variables, and its body only loads and computes without side effects,
+// - its result is loaded once, in the body of an element-wise loop nest
+//   following it in the same block, and is otherwise only deallocated or
+//   queried for its dimensions,
+// - the arrays it loads from are not written between the two nests.
+//
+//===----------------------------------------------------------------------===//
+
+#include "mlir/Dialect/StandardOps/IR/Ops.h"
+#include "mlir/IR/BlockAndValueMapping.h"
+#include "mlir/Interfaces/SideEffectInterfaces.h"
+#include "mlir/Pass/Pass.h"
+
+#include "src/Dialect/Krnl/KrnlOps.hpp"
+#include "src/Pass/Passes.hpp"
+
+using namespace mlir;
+
+namespace {
+
+/// Return the store of the body of an element-wise loop nest, i.e. a nest
+/// whose iterations each write the element of an array at the induction
+/// variables, or null if the nest is not element-wise.
+KrnlStoreOp getElementwiseStore(KrnlIterateOp iterateOp) {
+  Block &body = iterateOp.bodyRegion().front();
+  KrnlStoreOp storeOp;
+  for (Operation &op : body.without_terminator()) {
+    if (auto store = dyn_cast<KrnlStoreOp>(op)) {
+      if (storeOp)
+        return KrnlStoreOp();
+      storeOp = store;
+    }
+  }
+  if (!storeOp || storeOp.getMemRefType().getRank() != body.getNumArguments())
+    return KrnlStoreOp();
+  for (auto indexAndArg : llvm::zip(storeOp.getIndices(), body.getArguments()))
+    if (std::get<0>(indexAndArg) != std::get<1>(indexAndArg))
+      return KrnlStoreOp();
+  return storeOp;
+}
+
+/// Check if the operation reads memory at most.
+bool isSideEffectFree(Operation *op) {
+  if (isa<KrnlLoadOp>(op))
+    return true;
+  if (op->getNumRegions() != 0)
+    return false;
+  auto effectInterface = dyn_cast<MemoryEffectOpInterface>(op);
+  if (!effectInterface)
+    return false;
+  SmallVector<MemoryEffects::EffectInstance, 1> effects;
+  effectInterface.getEffects(effects);
+  return effects.empty();
+}
+
+/// Check if `memref` is only read by the operations of `block` between `begin`
+/// and `end`, both included.
+bool isUnchangedBetween(
+    Value memref, Block *block, Operation *begin, Operation *end) {
+  for (Operation *user : memref.getUsers()) {
+    if (isa<KrnlLoadOp, LoadOp, DimOp, ReturnOp>(user))
+      continue;
+    Operation *ancestor = block->findAncestorOpInBlock(*user);
+    if (!ancestor ||
+        (!ancestor->isBeforeInBlock(begin) && !end->isBeforeInBlock(ancestor)))
+      return false;
+  }
+  return true;
+}
+
+/// Replace the dimensions queried on the result of `allocOp` by the sizes of
+/// the allocation.
+void replaceDimsOfAlloc(AllocOp allocOp) {
+  auto memRefType = allocOp.getType();
+  for (Operation *user :
+      llvm::make_early_inc_range(allocOp.getResult().getUsers())) {
+    auto dimOp = dyn_cast<DimOp>(user);
+    if (!dimOp)
+      continue;
+    int64_t index = dimOp.getConstantIndex().getValue();
+    Value size;
+    if (memRefType.isDynamicDim(index)) {
+      size = allocOp.getOperand(memRefType.getDynamicDimIndex(index));
+    } else {
+      OpBuilder builder(dimOp);
+      size = builder.create<ConstantIndexOp>(
+          dimOp.getLoc(), memRefType.getDimSize(index));
+    }
+    dimOp.replaceAllUsesWith(size);
+    dimOp.erase();
+  }
+}
+
+/// Try to fuse the element-wise loop nest `producer` into the loop nest
+/// consuming its result.
+bool fuseIntoConsumer(KrnlIterateOp producer) {
+  KrnlStoreOp storeOp = getElementwiseStore(producer);
+  if (!storeOp)
+    return false;
+  Block &producerBody = producer.bodyRegion().front();
+  for (Operation &op : producerBody.without_terminator())
+    if (&op != storeOp.getOperation() && !isSideEffectFree(&op))
+      return false;
+
+  // The loops must only be scheduled by this nest.
+  auto defineOp = producer.getOperand(0).getDefiningOp<KrnlDefineLoopsOp>();
+  if (!defineOp)
+    return false;
+  for (Operation *user : defineOp.getOperation()->getUsers())
+    if (user != producer.getOperation() && !isa<KrnlParallelOp>(user))
+      return false;
+
+  // The result must be an array only loaded by one element-wise nest.
+  Value result = storeOp.getMemRef();
+  auto allocOp = result.getDefiningOp<AllocOp>();
+  if (!allocOp || !allocOp.getType().getAffineMaps().empty())
+    return false;
+  Block *block = producer.getOperation()->getBlock();
+  KrnlLoadOp loadOp;
+  SmallVector<Operation *, 2> deallocs;
+  for (Operation *user : result.getUsers()) {
+    if (user == storeOp.getOperation())
+      continue;
+    if (auto dimOp = dyn_cast<DimOp>(user)) {
+      if (!dimOp.getConstantIndex().hasValue())
+        return false;
+    } else if (isa<DeallocOp>(user)) {
+      deallocs.emplace_back(user);
+    } else if (auto load = dyn_cast<KrnlLoadOp>(user)) {
+      if (loadOp)
+        return false;
+      loadOp = load;
+    } else {
+      return false;
+    }
+  }
+  if (!loadOp)
+    return false;
+  auto consumer = dyn_cast<KrnlIterateOp>(loadOp.getOperation()->getParentOp());
+  if (!consumer || consumer.getOperation()->getBlock() != block ||
+      !producer.getOperation()->isBeforeInBlock(consumer) ||
+      !getElementwiseStore(consumer))
+    return false;
+
+  // The inputs of the producer must not change before they are loaded in the
+  // consumer.
+  for (Operation &op : producerBody)
+    if (auto inputLoad = dyn_cast<KrnlLoadOp>(op))
+      if (!isUnchangedBetween(inputLoad.getMemRef(), block, producer, consumer))
+        return false;
+
+  // Compute the element of the result where it is loaded.
+  OpBuilder builder(loadOp);
+  BlockAndValueMapping mapping;
+  for (auto argAndIndex :
+      llvm::zip(producerBody.getArguments(), loadOp.getIndices()))
+    mapping.map(std::get<0>(argAndIndex), std::get<1>(argAndIndex));
+  for (Operation &op : producerBody.without_terminator())
+    if (&op != storeOp.getOperation())
+      builder.clone(op, mapping);
+  loadOp.replaceAllUsesWith(mapping.lookupOrDefault(storeOp.getValueToStore()));
+  loadOp.erase();
+
+  // Remove the producer and its result.
+  producer.erase();
+  for (Operation *user :
+      llvm::make_early_inc_range(defineOp.getOperation()->getUsers()))
+    user->erase();
+  defineOp.erase();
+  for (Operation *dealloc : deallocs)
+    dealloc->erase();
+  replaceDimsOfAlloc(allocOp);
+  allocOp.erase();
+  return true;
+}
+
+/*!
+ *  Function pass that fuses element-wise loop nests.
+ */
+class KrnlFuseElementwiseLoopsPass
+    : public PassWrapper<KrnlFuseElementwiseLoopsPass, FunctionPass> {
+public:
+  void runOnFunction() override {
+    auto function = getFunction();
+
+    // Nests are visited in order, so that a consumer which absorbed its
+    // producer can itself be fused into the next consumer of a chain.
+    SmallVector<KrnlIterateOp, 16> nests;
+    function.walk([&](KrnlIterateOp iterateOp) {
+      if (iterateOp.getNumOptimizedLoops() > 0)
+        nests.emplace_back(iterateOp);
+    });
+    for (auto nest : nests)
+      fuseIntoConsumer(nest);
+  }
+};
+} // namespace
+
+std::unique_ptr<Pass> mlir::createKrnlFuseElementwiseLoopsPass() {
+  return std::make_unique<KrnlFuseElementwiseLoopsPass>();
+}
@@ -26,7 +26,14 @@
 #include "src/Dialect/ONNX/ONNXOps.hpp"
 #include "src/Pass/Passes.hpp"
 
+#include <algorithm>
+#include <array>
+#include <climits>
+#include <cmath>
+#include <cstring>
+#include <limits>
 #include <math.h>
+#include <type_traits>
 
 using namespace mlir;
 
@@ -37,21 +44,30 @@ namespace {
 //===----------------------------------------------------------------------===//
 // There is currently support for adding constant propagation for unary and
 // binary athythmetic ops (binary ops support broadcast). To add an operation,
-// you simply have to add a templated method on how to compute the result in
-// terms of one or two inputs. Values comes as Attribtues, and return is also an
-// Attribute. In that function, presumably you will need different methods to
-// handle int / float / strings... Note that these methods cannot fail. It is
-// your responsablitity to tests for which data type are supported in the rules
-// directly. Specific type restrictions can be added in the DRR files.
+// you simply have to add a specialization of ElementWiseBinaryOpImpl or
+// ElementWiseUnaryOpImpl computing the result for one element of C++ type T
+// (float, double or integers of the width and signedness of the element
+// type). Constants are not processed element by element as Attributes: their
+// data is read into typed buffers, the operation is computed over the whole
+// buffers, and a single DenseElementsAttr is built from the result buffer.
+// Note that these methods cannot fail. It is your responsablitity to tests for
+// which data type are supported in the rules directly. Specific type
+// restrictions can be added in the DRR files.
 
 // The methods are:
 //
-// ComputeConstPropElementwiseBinary and ComputeConstPropElementwiseUnary
+// ConstPropElementwiseBinary and ConstPropElementwiseUnary
 // and they need to be tempalted wtih an ONNX Operation (presuably).
 //
 // Then you need to add rules on how to transform the patterns; look into
 // ConstProp.td for example.
 //
+// Operations with optional or variadic operands (Slice, Concat, Gather, MatMul
+// and Gemm), and Cast, which is not folded when the conversion of an element
+// is undefined, are rewritten by C++ patterns instead. Those whose result or
+// computation can be much larger than their operands are only folded up to
+// the limits given by the options of the pass.
+//
 
 /// A helper function to contruct a RankedTensorType from a ShapedType.
 RankedTensorType constructRankedTensorType(ShapedType type) {
@@ -60,173 +76,281 @@ RankedTensorType constructRankedTensorType(ShapedType type) {
 }
 
 //===----------------------------------------------------------------------===//
-// Code to perform constant propagation for binary in presence of broadcast.
+// Typed buffers holding the elements of dense attributes.
 //===----------------------------------------------------------------------===//
 
-// Template to generate binary operation results. It takes as inupt
-// the element type as well as the two element attributes for the
-// operation, and return the result of the operation, also as an
-// attribute.
+/// Call `fn` with a value of the C++ type used to compute on elements of type
+/// `elementType`. 16-bit floats are computed as floats and booleans as bytes.
+template <typename Fn>
+void dispatchOnElementType(Type elementType, Fn &&fn) {
+  if (elementType.isF64())
+    return fn(double());
+  if (elementType.isa<FloatType>())
+    return fn(float());
+  auto intType = elementType.dyn_cast<IntegerType>();
+  assert(intType && "constant propagation: unknown data type");
+  bool isUnsigned = intType.isUnsigned();
+  switch (intType.getWidth()) {
+  case 1:
+    return fn(uint8_t());
+  case 8:
+    return isUnsigned ? fn(uint8_t()) : fn(int8_t());
+  case 16:
+    return isUnsigned ? fn(uint16_t()) : fn(int16_t());
+  case 32:
+    return isUnsigned ? fn(uint32_t()) : fn(int32_t());
+  case 64:
+    return isUnsigned ? fn(uint64_t()) : fn(int64_t());
+  }
+  llvm_unreachable("constant propagation: unknown integer width");
+}
 
-template <typename OP>
-Attribute ComputeConstPropElementwiseBinary(PatternRewriter &rewriter,
-    Type elementType, Attribute lhsAttr, Attribute secondAttr) {
-  llvm_unreachable("unkonwn operation");
+/// Check if the elements of type `elementType` are stored in the raw data of
+/// a dense attribute with the representation of the C++ type T.
+template <typename T>
+bool hasRawDataOfType(Type elementType) {
+  return !elementType.isInteger(1) &&
+         elementType.getIntOrFloatBitWidth() == sizeof(T) * CHAR_BIT;
 }
 
-template <>
-Attribute ComputeConstPropElementwiseBinary<ONNXAddOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute lhsAttr,
-    Attribute secondAttr) {
-  if (elementType.isa<FloatType>()) {
-    double lhsVal = lhsAttr.cast<FloatAttr>().getValueAsDouble();
-    double rhsVal = secondAttr.cast<FloatAttr>().getValueAsDouble();
-    double res = lhsVal + rhsVal;
-    // Could use the APFloat interface to emulate the results, are ok to simply
-    // perform them in the highest possible precision.
-    return rewriter.getFloatAttr(elementType, res);
-  }
-  if (elementType.isa<IntegerType>()) {
-    uint64_t lhsVal = lhsAttr.cast<IntegerAttr>().getInt();
-    uint64_t rhsVal = secondAttr.cast<IntegerAttr>().getInt();
-    uint64_t res = lhsVal + rhsVal;
-    return rewriter.getIntegerAttr(elementType, res);
+/// Return the elements of `attr` as a buffer of T. A splat attribute has a
+/// buffer of one element. The buffer points to the data of the attribute when
+/// it is stored as T, otherwise the elements are converted into `storage`.
+template <typename T>
+ArrayRef<T> getElementBuffer(DenseElementsAttr attr, std::vector<T> &storage) {
+  Type elementType = attr.getType().getElementType();
+  size_t size = attr.isSplat() ? 1 : attr.getNumElements();
+  if (hasRawDataOfType<T>(elementType)) {
+    ArrayRef<char> rawData = attr.getRawData();
+    if (reinterpret_cast<uintptr_t>(rawData.data()) % alignof(T) == 0)
+      return ArrayRef<T>(reinterpret_cast<const T *>(rawData.data()), size);
+    storage.resize(size);
+    std::memcpy(storage.data(), rawData.data(), size * sizeof(T));
+    return storage;
   }
-  llvm_unreachable("constant propagation for AddOp: unkonwn data type");
-}
 
-template <>
-Attribute ComputeConstPropElementwiseBinary<ONNXSubOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute lhsAttr,
-    Attribute secondAttr) {
+  storage.reserve(size);
   if (elementType.isa<FloatType>()) {
-    double lhsVal = lhsAttr.cast<FloatAttr>().getValueAsDouble();
-    double rhsVal = secondAttr.cast<FloatAttr>().getValueAsDouble();
-    double res = lhsVal - rhsVal;
-    return rewriter.getFloatAttr(elementType, res);
+    for (APFloat value : attr.getValues<APFloat>()) {
+      if (storage.size() == size)
+        break;
+      bool losesInfo;
+      value.convert(
+          APFloat::IEEEdouble(), APFloat::rmNearestTiesToEven, &losesInfo);
+      storage.emplace_back(value.convertToDouble());
+    }
+  } else {
+    for (bool value : attr.getValues<bool>()) {
+      if (storage.size() == size)
+        break;
+      storage.emplace_back(value);
+    }
   }
-  if (elementType.isa<IntegerType>()) {
-    uint64_t lhsVal = lhsAttr.cast<IntegerAttr>().getInt();
-    uint64_t rhsVal = secondAttr.cast<IntegerAttr>().getInt();
-    uint64_t res = lhsVal - rhsVal;
-    return rewriter.getIntegerAttr(elementType, res);
+  return storage;
+}
+
+/// Create a dense attribute of type `type` from a buffer of T, which has one
+/// element for a splat.
+template <typename T>
+DenseElementsAttr createDenseElementsAttr(
+    RankedTensorType type, ArrayRef<T> buffer) {
+  Type elementType = type.getElementType();
+  if (hasRawDataOfType<T>(elementType))
+    return DenseElementsAttr::getFromRawBuffer(type,
+        ArrayRef<char>(reinterpret_cast<const char *>(buffer.data()),
+            buffer.size() * sizeof(T)),
+        /*isSplatBuffer=*/buffer.size() == 1);
+
+  if (auto floatType = elementType.dyn_cast<FloatType>()) {
+    std::vector<APFloat> values;
+    values.reserve(buffer.size());
+    for (T value : buffer) {
+      APFloat apValue((double)value);
+      bool losesInfo;
+      apValue.convert(floatType.getFloatSemantics(),
+          APFloat::rmNearestTiesToEven, &losesInfo);
+      values.emplace_back(apValue);
+    }
+    return DenseElementsAttr::get(type, llvm::makeArrayRef(values));
   }
-  llvm_unreachable("constant propagation for SubOp: unkonwn data type");
+  SmallVector<bool, 64> values(buffer.begin(), buffer.end());
+  return DenseElementsAttr::get(type, llvm::makeArrayRef(values));
 }
 
-template <>
-Attribute ComputeConstPropElementwiseBinary<ONNXMulOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute lhsAttr,
-    Attribute secondAttr) {
-  if (elementType.isa<FloatType>()) {
-    double lhsVal = lhsAttr.cast<FloatAttr>().getValueAsDouble();
-    double rhsVal = secondAttr.cast<FloatAttr>().getValueAsDouble();
-    double res = lhsVal * rhsVal;
-    return rewriter.getFloatAttr(elementType, res);
+/// Return the strides, in elements, of a buffer holding a tensor of shape
+/// `shape` in row-major order, when it is read as a tensor of shape `resShape`
+/// by broadcast: the dimensions of `shape` are aligned with the trailing
+/// dimensions of `resShape`, and the missing dimensions and the dimensions of
+/// size 1 have a stride of 0. All the strides of a splat are 0.
+SmallVector<int64_t, 4> getBroadcastStrides(
+    ArrayRef<int64_t> shape, ArrayRef<int64_t> resShape, bool isSplat) {
+  assert(shape.size() <= resShape.size() && "incompatible ranks");
+  SmallVector<int64_t, 4> strides(resShape.size(), 0);
+  if (isSplat)
+    return strides;
+  int64_t stride = 1;
+  for (int i = shape.size() - 1, j = resShape.size() - 1; i >= 0; --i, --j) {
+    if (shape[i] != 1) {
+      assert(shape[i] == resShape[j] && "incompatible sizes");
+      strides[j] = stride;
+    }
+    stride *= shape[i];
   }
-  if (elementType.isa<IntegerType>()) {
-    uint64_t lhsVal = lhsAttr.cast<IntegerAttr>().getInt();
-    uint64_t rhsVal = secondAttr.cast<IntegerAttr>().getInt();
-    uint64_t res = lhsVal * rhsVal;
-    return rewriter.getIntegerAttr(elementType, res);
+  return strides;
+}
+
+/// Return the strides, in elements, of a buffer holding a tensor of shape
+/// `shape` in row-major order.
+SmallVector<int64_t, 4> getRowMajorStrides(ArrayRef<int64_t> shape) {
+  return getBroadcastStrides(shape, shape, /*isSplat=*/false);
+}
+
+/// Iterate over the elements of a tensor of shape `shape` in row-major order,
+/// along with the corresponding elements of N buffers read with the given
+/// strides from the given offsets. The outer dimensions are walked here, and
+/// `fn(resOffset, offsets, size)` processes the `size` elements of each row
+/// of the innermost dimension, so that it can be a tight loop.
+template <size_t N, typename Fn>
+void forEachRow(ArrayRef<int64_t> shape,
+    std::array<ArrayRef<int64_t>, N> strides, std::array<int64_t, N> offsets,
+    Fn &&fn) {
+  int64_t numElements = ShapedType::getNumElements(shape);
+  if (numElements == 0)
+    return;
+  if (shape.empty())
+    return fn(0, offsets, 1);
+
+  int64_t rowSize = shape.back();
+  int64_t outerRank = shape.size() - 1;
+  SmallVector<int64_t, 4> indices(outerRank, 0);
+  for (int64_t resOffset = 0; resOffset < numElements; resOffset += rowSize) {
+    fn(resOffset, offsets, rowSize);
+    // Move to the next row.
+    for (int64_t d = outerRank - 1; d >= 0; --d) {
+      for (size_t k = 0; k < N; ++k)
+        offsets[k] += strides[k][d];
+      if (++indices[d] < shape[d])
+        break;
+      for (size_t k = 0; k < N; ++k)
+        offsets[k] -= strides[k][d] * shape[d];
+      indices[d] = 0;
+    }
   }
-  llvm_unreachable("constant propagation for MulOp: unkonwn data type");
 }
 
-template <>
-Attribute ComputeConstPropElementwiseBinary<ONNXDivOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute lhsAttr,
-    Attribute secondAttr) {
-  if (elementType.isa<FloatType>()) {
-    double lhsVal = lhsAttr.cast<FloatAttr>().getValueAsDouble();
-    double rhsVal = secondAttr.cast<FloatAttr>().getValueAsDouble();
-    assert(rhsVal != 0 && "division by a zero");
-    double res = lhsVal / rhsVal;
-    return rewriter.getFloatAttr(elementType, res);
+/// Copy the elements of a tensor of shape `resShape` read from `buffer` with
+/// the given strides and offset into a new buffer, in row-major order.
+template <typename T>
+std::vector<T> copyStrided(ArrayRef<int64_t> resShape, ArrayRef<T> buffer,
+    ArrayRef<int64_t> strides, int64_t offset) {
+  std::vector<T> res(ShapedType::getNumElements(resShape));
+  int64_t innerStride = resShape.empty() ? 0 : strides.back();
+  forEachRow<1>(resShape, {strides}, {offset},
+      [&](int64_t resOffset, std::array<int64_t, 1> offsets, int64_t size) {
+        T *out = res.data() + resOffset;
+        const T *in = buffer.data() + offsets[0];
+        if (innerStride == 1)
+          std::copy(in, in + size, out);
+        else
+          for (int64_t i = 0; i < size; ++i)
+            out[i] = in[i * innerStride];
+      });
+  return res;
+}
+
+//===----------------------------------------------------------------------===//
+// Code to perform constant propagation for binary in presence of broadcast.
+//===----------------------------------------------------------------------===//
+
+/// Integer arithmetic is computed on unsigned integers, so that it wraps
+/// around on overflow like the compiled model does.
+template <typename T, typename Enable = void>
+struct WrappingType {
+  using type = T;
+};
+
+template <typename T>
+struct WrappingType<T,
+    typename std::enable_if<std::is_integral<T>::value &&
+                            !std::is_same<T, bool>::value>::type> {
+  using type = typename std::make_unsigned<T>::type;
+};
+
+// Template to generate binary operation results. It takes as input the two
+// elements of C++ type T of the operation, and returns the result of the
+// operation.
+
+template <typename OP, typename T>
+struct ElementWiseBinaryOpImpl {
+  static T impl(T lhs, T rhs) { llvm_unreachable("unkonwn operation"); }
+};
+
+template <typename T>
+struct ElementWiseBinaryOpImpl<ONNXAddOp, T> {
+  static T impl(T lhs, T rhs) {
+    using U = typename WrappingType<T>::type;
+    return (T)((U)lhs + (U)rhs);
   }
-  if (elementType.isa<IntegerType>()) {
-    uint64_t lhsVal = lhsAttr.cast<IntegerAttr>().getInt();
-    uint64_t rhsVal = secondAttr.cast<IntegerAttr>().getInt();
-    assert(rhsVal != 0 && "division by a zero");
-    uint64_t res = lhsVal / rhsVal;
-    return rewriter.getIntegerAttr(elementType, res);
+};
+
+template <typename T>
+struct ElementWiseBinaryOpImpl<ONNXSubOp, T> {
+  static T impl(T lhs, T rhs) {
+    using U = typename WrappingType<T>::type;
+    return (T)((U)lhs - (U)rhs);
   }
-  llvm_unreachable("constant propagation for DivOp: unkonwn data type");
-}
-// Recursively process one dimension in the rank of the two references. There
-// can be one of 3 cases.
-// 1) We have fully defined accesses for both operands, launch the computations.
-// 2) One of the two has a higher number of unprocessed ranks, which is hte case
-// when we have to broadcast the whole lower-dim reference with respect to the
-// other. Iterate over each value of the higher ranked reference, keeping the
-// reference of the lower ranked reference constant.
-// 3) Both references have the same rank, we still do broadcast if one of the
-// dimension size is equal to 1.
+};
 
-template <typename ElementwiseBinaryOp>
-void RecurseConstPropElementwiseBinary(PatternRewriter &rewriter,
-    std::vector<Attribute> &resVector, DenseElementsAttr lhsAttr,
-    DenseElementsAttr rhsAttr, SmallVector<uint64_t, 4> &lhsIndices,
-    SmallVector<uint64_t, 4> &rhsIndices, int lhsFreeRank, int rhsFreeRank) {
-  if (lhsFreeRank == 0) {
-    // Fully defined ranks.
-    assert(
-        rhsFreeRank == 0 && "expect both to recurse to zero at the same time");
-    auto lhsElementAttr = lhsAttr.getValue(ArrayRef<uint64_t>(lhsIndices));
-    auto rhsElementAttr = rhsAttr.getValue(ArrayRef<uint64_t>(rhsIndices));
-    auto elementaryType = lhsAttr.getType().getElementType();
-    auto res = ComputeConstPropElementwiseBinary<ElementwiseBinaryOp>(
-        rewriter, elementaryType, lhsElementAttr, rhsElementAttr);
-    resVector.emplace_back(res);
-  } else if (lhsFreeRank > rhsFreeRank) {
-    // Initial broadcast from lhs.
-    auto lhsShape = lhsAttr.getType().getShape();
-    int lhsRank = lhsShape.size();
-    int lhsIndex = lhsRank - lhsFreeRank;
-    int lhsSize = lhsAttr.getType().getShape()[lhsIndex];
-    for (int i = 0; i < lhsSize; ++i) {
-      lhsIndices[lhsIndex] = i;
-      RecurseConstPropElementwiseBinary<ElementwiseBinaryOp>(rewriter,
-          resVector, lhsAttr, rhsAttr, lhsIndices, rhsIndices, lhsFreeRank - 1,
-          rhsFreeRank);
-    }
-  } else if (lhsFreeRank < rhsFreeRank) {
-    // Initial broadcast from rhs.
-    auto rhsShape = rhsAttr.getType().getShape();
-    int rhsRank = rhsShape.size();
-    int rhsIndex = rhsRank - rhsFreeRank;
-    int rhsSize = rhsAttr.getType().getShape()[rhsIndex];
-    for (int i = 0; i < rhsSize; ++i) {
-      rhsIndices[rhsIndex] = i;
-      RecurseConstPropElementwiseBinary<ElementwiseBinaryOp>(rewriter,
-          resVector, lhsAttr, rhsAttr, lhsIndices, rhsIndices, lhsFreeRank,
-          rhsFreeRank - 1);
-    }
-  } else {
-    // No initial broadcast, but if one element has size 1 and the other is
-    // greater than one, then we also have broadcast.
-    auto lhsShape = lhsAttr.getType().getShape();
-    int lhsRank = lhsShape.size();
-    int lhsIndex = lhsRank - lhsFreeRank;
-    int lhsSize = lhsAttr.getType().getShape()[lhsIndex];
-    auto rhsShape = rhsAttr.getType().getShape();
-    int rhsRank = rhsShape.size();
-    int rhsIndex = rhsRank - rhsFreeRank;
-    int rhsSize = rhsAttr.getType().getShape()[rhsIndex];
-    assert((lhsSize == 1 || rhsSize == 1 || lhsSize == rhsSize) &&
-           "incompatible sizes");
-    int size = std::max(lhsSize, rhsSize);
-    lhsIndices[lhsIndex] = rhsIndices[rhsIndex] = 0;
-    for (int i = 0; i < size; ++i) {
-      if (lhsSize > 1)
-        lhsIndices[lhsIndex] = i;
-      if (rhsSize > 1)
-        rhsIndices[rhsIndex] = i;
-      RecurseConstPropElementwiseBinary<ElementwiseBinaryOp>(rewriter,
-          resVector, lhsAttr, rhsAttr, lhsIndices, rhsIndices, lhsFreeRank - 1,
-          rhsFreeRank - 1);
-    }
+template <typename T>
+struct ElementWiseBinaryOpImpl<ONNXMulOp, T> {
+  static T impl(T lhs, T rhs) {
+    using U = typename WrappingType<T>::type;
+    return (T)((U)lhs * (U)rhs);
+  }
+};
+
+template <typename T>
+struct ElementWiseBinaryOpImpl<ONNXDivOp, T> {
+  static T impl(T lhs, T rhs) {
+    assert(rhs != 0 && "division by a zero");
+    return lhs / rhs;
   }
+};
+
+/// Compute a binary operation over two buffers read with the given strides.
+/// The innermost loop is specialized for the usual stride patterns, so that
+/// the compiler vectorizes it.
+template <typename ElementwiseBinaryOp, typename T>
+std::vector<T> ComputeConstPropElementwiseBinary(ArrayRef<int64_t> resShape,
+    ArrayRef<T> lhs, ArrayRef<int64_t> lhsStrides, ArrayRef<T> rhs,
+    ArrayRef<int64_t> rhsStrides) {
+  using Impl = ElementWiseBinaryOpImpl<ElementwiseBinaryOp, T>;
+  std::vector<T> res(ShapedType::getNumElements(resShape));
+  int64_t lhsInnerStride = resShape.empty() ? 0 : lhsStrides.back();
+  int64_t rhsInnerStride = resShape.empty() ? 0 : rhsStrides.back();
+  forEachRow<2>(resShape, {lhsStrides, rhsStrides}, {0, 0},
+      [&](int64_t resOffset, std::array<int64_t, 2> offsets, int64_t size) {
+        T *out = res.data() + resOffset;
+        const T *lhsIn = lhs.data() + offsets[0];
+        const T *rhsIn = rhs.data() + offsets[1];
+        if (lhsInnerStride == 1 && rhsInnerStride == 1) {
+          for (int64_t i = 0; i < size; ++i)
+            out[i] = Impl::impl(lhsIn[i], rhsIn[i]);
+        } else if (lhsInnerStride == 1 && rhsInnerStride == 0) {
+          T rhsVal = rhsIn[0];
+          for (int64_t i = 0; i < size; ++i)
+            out[i] = Impl::impl(lhsIn[i], rhsVal);
+        } else if (lhsInnerStride == 0 && rhsInnerStride == 1) {
+          T lhsVal = lhsIn[0];
+          for (int64_t i = 0; i < size; ++i)
+            out[i] = Impl::impl(lhsVal, rhsIn[i]);
+        } else {
+          for (int64_t i = 0; i < size; ++i)
+            out[i] = Impl::impl(
+                lhsIn[i * lhsInnerStride], rhsIn[i * rhsInnerStride]);
+        }
+      });
+  return res;
 }
 
 // Process the constant operands, perform the operation with broadcast, and
@@ -238,86 +362,62 @@ DenseElementsAttr ConstPropElementwiseBinary(PatternRewriter &rewriter,
       lhsAttr.dyn_cast_or_null<mlir::DenseElementsAttr>();
   DenseElementsAttr rhsDenseAttr =
       rhsAttr.dyn_cast_or_null<mlir::DenseElementsAttr>();
-  assert((lhsDenseAttr && lhsDenseAttr) && "expected dense attributes");
+  assert((lhsDenseAttr && rhsDenseAttr) && "expected dense attributes");
   assert(resOperand.getType().cast<ShapedType>().hasRank() &&
          "expected ranked tensor");
   RankedTensorType resType =
       constructRankedTensorType(resOperand.getType().cast<ShapedType>());
-  auto lhsRank = lhsDenseAttr.getType().getShape().size();
-  auto rhsRank = rhsDenseAttr.getType().getShape().size();
-  SmallVector<uint64_t, 4> lhsIndices(lhsRank, 0);
-  SmallVector<uint64_t, 4> rhsIndices(rhsRank, 0);
-  std::vector<Attribute> resVector;
-  RecurseConstPropElementwiseBinary<ElementwiseBinaryOp>(rewriter, resVector,
-      lhsDenseAttr, rhsDenseAttr, lhsIndices, rhsIndices, lhsRank, rhsRank);
-  ArrayRef<Attribute> resRef(resVector);
-  return DenseElementsAttr::get(resType, resRef);
+  ArrayRef<int64_t> resShape = resType.getShape();
+  SmallVector<int64_t, 4> lhsStrides = getBroadcastStrides(
+      lhsDenseAttr.getType().getShape(), resShape, lhsDenseAttr.isSplat());
+  SmallVector<int64_t, 4> rhsStrides = getBroadcastStrides(
+      rhsDenseAttr.getType().getShape(), resShape, rhsDenseAttr.isSplat());
+
+  DenseElementsAttr res;
+  dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+    using T = decltype(dummy);
+    std::vector<T> lhsStorage, rhsStorage;
+    ArrayRef<T> lhs = getElementBuffer(lhsDenseAttr, lhsStorage);
+    ArrayRef<T> rhs = getElementBuffer(rhsDenseAttr, rhsStorage);
+    // A splat result is computed once.
+    if (lhsDenseAttr.isSplat() && rhsDenseAttr.isSplat()) {
+      T value =
+          ElementWiseBinaryOpImpl<ElementwiseBinaryOp, T>::impl(lhs[0], rhs[0]);
+      res = createDenseElementsAttr(resType, llvm::makeArrayRef(value));
+      return;
+    }
+    std::vector<T> resBuffer =
+        ComputeConstPropElementwiseBinary<ElementwiseBinaryOp, T>(
+            resShape, lhs, lhsStrides, rhs, rhsStrides);
+    res = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+  });
+  return res;
 }
 
 //===----------------------------------------------------------------------===//
 // Code to perform constant propagation for unary operation.
 //===----------------------------------------------------------------------===//
 
-template <typename OP>
-Attribute ComputeConstPropElementwiseUnary(
-    PatternRewriter &rewriter, Type elementType, Attribute attr) {
-  llvm_unreachable("unkonwn operation");
-}
-
-template <>
-Attribute ComputeConstPropElementwiseUnary<ONNXNegOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute attr) {
-  if (elementType.isa<FloatType>()) {
-    double val = attr.cast<FloatAttr>().getValueAsDouble();
-    double res = -val;
-    return rewriter.getFloatAttr(elementType, res);
-  }
-  if (elementType.isa<IntegerType>()) {
-    uint64_t val = attr.cast<IntegerAttr>().getInt();
-    uint64_t res = -val;
-    return rewriter.getIntegerAttr(elementType, res);
-  }
-  llvm_unreachable("constant propagation for NegOp: unkonwn data type");
-}
+template <typename OP, typename T>
+struct ElementWiseUnaryOpImpl {
+  static T impl(T val) { llvm_unreachable("unkonwn operation"); }
+};
 
-template <>
-Attribute ComputeConstPropElementwiseUnary<ONNXSqrtOp>(
-    PatternRewriter &rewriter, Type elementType, Attribute attr) {
-  if (elementType.isa<FloatType>()) {
-    double val = attr.cast<FloatAttr>().getValueAsDouble();
-    double res = sqrt(val);
-    return rewriter.getFloatAttr(elementType, res);
+template <typename T>
+struct ElementWiseUnaryOpImpl<ONNXNegOp, T> {
+  static T impl(T val) {
+    using U = typename WrappingType<T>::type;
+    return (T)((U)0 - (U)val);
   }
-  llvm_unreachable("constant propagation for SqrtOp: unkonwn data type");
-}
+};
 
-template <typename ElementwiseUnaryOp>
-void RecurseConstPropElementwiseUnary(PatternRewriter &rewriter,
-    std::vector<Attribute> &resVector, DenseElementsAttr attr,
-    SmallVector<uint64_t, 4> &indices, int freeRank) {
-  if (freeRank == 0) {
-    // Fully defined ranks.
-    auto elementAttr = attr.getValue(ArrayRef<uint64_t>(indices));
-    auto elementaryType = attr.getType().getElementType();
-    auto res = ComputeConstPropElementwiseUnary<ElementwiseUnaryOp>(
-        rewriter, elementaryType, elementAttr);
-    resVector.emplace_back(res);
-  } else {
-    // Recurse.
-    auto shape = attr.getType().getShape();
-    int rank = shape.size();
-    int index = rank - freeRank;
-    int size = attr.getType().getShape()[index];
-    for (int i = 0; i < size; ++i) {
-      indices[index] = i;
-      RecurseConstPropElementwiseUnary<ElementwiseUnaryOp>(
-          rewriter, resVector, attr, indices, freeRank - 1);
-    }
-  }
-}
+template <typename T>
+struct ElementWiseUnaryOpImpl<ONNXSqrtOp, T> {
+  static T impl(T val) { return sqrt(val); }
+};
 
-// Process the constant operands, perform the operation with broadcast, and
-// generate the new constant operation.
+// Process the constant operand, perform the operation, and generate the new
+// constant operation.
 template <typename ElementwiseUnaryOp>
 DenseElementsAttr ConstPropElementwiseUnary(
     PatternRewriter &rewriter, Value resOperand, Attribute attr) {
@@ -328,41 +428,25 @@ DenseElementsAttr ConstPropElementwiseUnary(
          "expected ranked tensor");
   RankedTensorType resType =
       constructRankedTensorType(resOperand.getType().cast<ShapedType>());
-  auto rank = denseAttr.getType().getShape().size();
-  SmallVector<uint64_t, 4> indices(rank, 0);
-  std::vector<Attribute> resVector;
-  RecurseConstPropElementwiseUnary<ElementwiseUnaryOp>(
-      rewriter, resVector, denseAttr, indices, rank);
-  ArrayRef<Attribute> resRef(resVector);
-  return DenseElementsAttr::get(resType, resRef);
+
+  DenseElementsAttr res;
+  dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+    using T = decltype(dummy);
+    std::vector<T> storage;
+    ArrayRef<T> buffer = getElementBuffer(denseAttr, storage);
+    // A splat keeps a buffer of one element.
+    std::vector<T> resBuffer(buffer.size());
+    std::transform(buffer.begin(), buffer.end(), resBuffer.begin(),
+        ElementWiseUnaryOpImpl<ElementwiseUnaryOp, T>::impl);
+    res = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+  });
+  return res;
 }
 
 //===----------------------------------------------------------------------===//
 // Code to perform constant propagation for transpose.
 //===----------------------------------------------------------------------===//
 
-void RecurseConstPropTranspose(PatternRewriter &rewriter,
-    std::vector<Attribute> &resVector, DenseElementsAttr attr,
-    SmallVector<uint64_t, 4> &indices, SmallVector<uint64_t, 4> &perm,
-    int freeRank) {
-  if (freeRank == 0) {
-    // Fully defined ranks.
-    auto res = attr.getValue(ArrayRef<uint64_t>(indices));
-    resVector.emplace_back(res);
-  } else {
-    // Recurse.
-    auto shape = attr.getType().getShape();
-    int rank = shape.size();
-    int index = perm[rank - freeRank];
-    int size = attr.getType().getShape()[index];
-    for (int i = 0; i < size; ++i) {
-      indices[index] = i;
-      RecurseConstPropTranspose(
-          rewriter, resVector, attr, indices, perm, freeRank - 1);
-    }
-  }
-}
-
 DenseElementsAttr ConstPropTranspose(PatternRewriter &rewriter,
     Value resOperand, Attribute attr, ArrayAttr permAttr) {
   // Read dense attribute, the constant tensor we are transforming.
@@ -371,20 +455,28 @@ DenseElementsAttr ConstPropTranspose(PatternRewriter &rewriter,
   assert(denseAttr && "expected dense attribute");
   RankedTensorType resType =
       constructRankedTensorType(resOperand.getType().cast<ShapedType>());
-  auto rank = denseAttr.getType().getShape().size();
-  // Read permute vector.
-  SmallVector<uint64_t, 4> perm;
+  if (denseAttr.isSplat())
+    return denseAttr.reshape(resType);
+
+  // Read permute vector, and read the input in the permuted order of its
+  // dimensions.
   assert(permAttr && "permute attribute expected to be defined here");
+  SmallVector<int64_t, 4> inputStrides =
+      getRowMajorStrides(denseAttr.getType().getShape());
+  SmallVector<int64_t, 4> strides;
   for (auto permVal : permAttr.getValue())
-    perm.emplace_back(permVal.cast<IntegerAttr>().getInt());
-  // Init indice vector.
-  SmallVector<uint64_t, 4> indices(rank, 0);
-  std::vector<Attribute> resVector;
-  // Copy using permute order.
-  RecurseConstPropTranspose(
-      rewriter, resVector, denseAttr, indices, perm, rank);
-  ArrayRef<Attribute> resRef(resVector);
-  return DenseElementsAttr::get(resType, resRef);
+    strides.emplace_back(inputStrides[permVal.cast<IntegerAttr>().getInt()]);
+
+  DenseElementsAttr res;
+  dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+    using T = decltype(dummy);
+    std::vector<T> storage;
+    ArrayRef<T> buffer = getElementBuffer(denseAttr, storage);
+    std::vector<T> resBuffer =
+        copyStrided(resType.getShape(), buffer, strides, /*offset=*/0);
+    res = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+  });
+  return res;
 }
 
 //===----------------------------------------------------------------------===//
@@ -400,49 +492,14 @@ DenseElementsAttr ConstPropUnsqueeze(
   RankedTensorType resType =
       constructRankedTensorType(resOperand.getType().cast<ShapedType>());
 
-  // Unqueeze does not change the order of access, so just copy the whole data.
-  std::vector<Attribute> resVector;
-  for (auto value : denseAttr.getValues<Attribute>()) {
-    resVector.emplace_back(value);
-  }
-
-  ArrayRef<Attribute> resRef(resVector);
-  return DenseElementsAttr::get(resType, resRef);
+  // Unqueeze does not change the order of access, so just reuse the data.
+  return denseAttr.reshape(resType);
 }
 
 //===----------------------------------------------------------------------===//
 // Code to perform constant propagation for split.
 //===----------------------------------------------------------------------===//
 
-void RecurseConstPropSplit(PatternRewriter &rewriter,
-    std::vector<Attribute> &resVector, DenseElementsAttr attr,
-    SmallVector<uint64_t, 4> &indices, uint64_t splitAxis, uint64_t axisOffset,
-    uint64_t axisSize, int freeRank) {
-  if (freeRank == 0) {
-    // Fully defined ranks.
-    Attribute res = attr.getValue(ArrayRef<uint64_t>(indices));
-    resVector.emplace_back(res);
-  } else {
-    // Recurse.
-    ArrayRef<int64_t> shape = attr.getType().getShape();
-    int rank = shape.size();
-    int index = rank - freeRank;
-    int start, size;
-    if (index == splitAxis) {
-      start = axisOffset;
-      size = axisSize;
-    } else {
-      start = 0;
-      size = attr.getType().getShape()[index];
-    }
-    for (int i = start; i < start + size; ++i) {
-      indices[index] = i;
-      RecurseConstPropSplit(rewriter, resVector, attr, indices, splitAxis,
-          axisOffset, axisSize, freeRank - 1);
-    }
-  }
-}
-
 DenseElementsAttr ConstPropSplit(PatternRewriter &rewriter, Value resOperand,
     Attribute attr, IntegerAttr axisAttr, ArrayAttr splitAttr,
     unsigned resIndex) {
@@ -452,7 +509,9 @@ DenseElementsAttr ConstPropSplit(PatternRewriter &rewriter, Value resOperand,
   assert(denseAttr && "expected dense attribute");
   RankedTensorType resType =
       constructRankedTensorType(resOperand.getType().cast<ShapedType>());
-  unsigned rank = denseAttr.getType().getShape().size();
+  if (denseAttr.isSplat())
+    return DenseElementsAttr::get(resType, denseAttr.getSplatValue());
+
   // Read split axis.
   uint64_t splitAxis = axisAttr.getValue().getSExtValue();
   // Read split vector.
@@ -461,17 +520,26 @@ DenseElementsAttr ConstPropSplit(PatternRewriter &rewriter, Value resOperand,
   for (Attribute splitVal : splitAttr.getValue())
     splits.emplace_back(splitVal.cast<IntegerAttr>().getInt());
   // Compute the range of elements of interest in the given axis.
-  uint64_t axisOffset = 0, axisSize = splits[resIndex];
+  uint64_t axisOffset = 0;
   for (int i = 0; i < resIndex; ++i)
     axisOffset += splits[i];
-  // Init indice vector.
-  SmallVector<uint64_t, 4> indices(rank, -1);
-  std::vector<Attribute> resVector;
-  // Copy.
-  RecurseConstPropSplit(rewriter, resVector, denseAttr, indices, splitAxis,
-      axisOffset, axisSize, rank);
-  ArrayRef<Attribute> resRef(resVector);
-  return DenseElementsAttr::get(resType, resRef);
+
+  // The result is read from the input with the same strides, starting at the
+  // offset of the range in the split axis.
+  SmallVector<int64_t, 4> strides =
+      getRowMajorStrides(denseAttr.getType().getShape());
+  int64_t offset = axisOffset * strides[splitAxis];
+
+  DenseElementsAttr res;
+  dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+    using T = decltype(dummy);
+    std::vector<T> storage;
+    ArrayRef<T> buffer = getElementBuffer(denseAttr, storage);
+    std::vector<T> resBuffer =
+        copyStrided(resType.getShape(), buffer, strides, offset);
+    res = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+  });
+  return res;
 }
 
 class ConstPropSplitPattern : public OpRewritePattern<ONNXSplitOp> {
@@ -542,6 +610,579 @@ public:
   }
 };
 
+//===----------------------------------------------------------------------===//
+// Code to perform constant propagation for reshape.
+//===----------------------------------------------------------------------===//
+
+DenseElementsAttr ConstPropReshape(
+    PatternRewriter &rewriter, Value resOperand, Attribute attr) {
+  // Read dense attribute, the constant tensor we are transforming.
+  DenseElementsAttr denseAttr =
+      attr.dyn_cast_or_null<mlir::DenseElementsAttr>();
+  assert(denseAttr && "expected dense attribute");
+  RankedTensorType resType =
+      constructRankedTensorType(resOperand.getType().cast<ShapedType>());
+
+  // Reshape does not change the order of the elements, so just reuse the data.
+  return denseAttr.reshape(resType);
+}
+
+//===----------------------------------------------------------------------===//
+// Code to perform constant propagation for operations with several constant
+// operands.
+//===----------------------------------------------------------------------===//
+// These operations are rewritten by C++ patterns, since some of their
+// operands are optional or variadic. The results of Concat and Gather and the
+// computation of MatMul and Gemm can be much larger than their constant
+// operands, so they are only folded up to the limits given to the pass. Cast
+// is rewritten by a C++ pattern too, since it is not folded when the
+// conversion of an element is undefined.
+
+/// Check if constant propagation supports elements of type `elementType`.
+bool isSupportedElementType(Type elementType) {
+  if (elementType.isa<FloatType>())
+    return true;
+  auto intType = elementType.dyn_cast<IntegerType>();
+  if (!intType)
+    return false;
+  unsigned width = intType.getWidth();
+  return width == 1 || width == 8 || width == 16 || width == 32 || width == 64;
+}
+
+/// Check if `value` is a tensor of static shape with supported elements.
+bool isStaticSupportedTensor(Value value) {
+  auto type = value.getType().dyn_cast<RankedTensorType>();
+  return type && type.hasStaticShape() &&
+         isSupportedElementType(type.getElementType());
+}
+
+/// Return the dense attribute holding the value of `value` if it is defined
+/// by a dense constant, or null otherwise.
+DenseElementsAttr getDenseConstant(Value value) {
+  auto constOp = dyn_cast_or_null<ONNXConstantOp>(value.getDefiningOp());
+  if (!constOp || constOp.sparse_valueAttr())
+    return DenseElementsAttr();
+  return constOp.valueAttr().dyn_cast_or_null<DenseElementsAttr>();
+}
+
+/// Return the elements of an integer dense attribute as int64_t.
+SmallVector<int64_t, 4> getInt64Values(DenseElementsAttr attr) {
+  SmallVector<int64_t, 4> values;
+  for (APInt value : attr.getValues<APInt>())
+    values.emplace_back(value.getSExtValue());
+  return values;
+}
+
+/// Return the elements of `attr` as a buffer of T like getElementBuffer, but
+/// with all the elements of a splat.
+template <typename T>
+ArrayRef<T> getFullElementBuffer(
+    DenseElementsAttr attr, std::vector<T> &storage) {
+  if (!attr.isSplat())
+    return getElementBuffer(attr, storage);
+  std::vector<T> splatStorage;
+  T value = getElementBuffer(attr, splatStorage)[0];
+  storage.assign(attr.getNumElements(), value);
+  return storage;
+}
+
+/// Check if a tensor of shape `shape` can be broadcast to shape `resShape`.
+bool isBroadcastableTo(ArrayRef<int64_t> shape, ArrayRef<int64_t> resShape) {
+  if (shape.size() > resShape.size())
+    return false;
+  for (int i = shape.size() - 1, j = resShape.size() - 1; i >= 0; --i, --j)
+    if (shape[i] != 1 && shape[i] != resShape[j])
+      return false;
+  return true;
+}
+
+/// Accumulate into the M x N row-major matrix `out` the product of the M x K
+/// matrix `a` and the K x N matrix `b`, read with the given row and column
+/// strides. The innermost loop walks a row of `b` and of the result, so that
+/// the compiler vectorizes it when `b` is read in row-major order.
+template <typename T>
+void accumulateMatMul(T *out, const T *a, int64_t aRowStride,
+    int64_t aColStride, const T *b, int64_t bRowStride, int64_t bColStride,
+    int64_t M, int64_t N, int64_t K) {
+  using Add = ElementWiseBinaryOpImpl<ONNXAddOp, T>;
+  using Mul = ElementWiseBinaryOpImpl<ONNXMulOp, T>;
+  for (int64_t i = 0; i < M; ++i) {
+    T *outRow = out + i * N;
+    for (int64_t k = 0; k < K; ++k) {
+      T aik = a[i * aRowStride + k * aColStride];
+      const T *bRow = b + k * bRowStride;
+      if (bColStride == 1) {
+        for (int64_t j = 0; j < N; ++j)
+          outRow[j] = Add::impl(outRow[j], Mul::impl(aik, bRow[j]));
+      } else {
+        for (int64_t j = 0; j < N; ++j)
+          outRow[j] =
+              Add::impl(outRow[j], Mul::impl(aik, bRow[j * bColStride]));
+      }
+    }
+  }
+}
+
+/// Check if the conversion of `value` to the C++ type U is defined. The
+/// conversion of a floating point value to an integer is undefined for NaN and
+/// when its integral part is out of the range of the integer, e.g. when it is
+/// negative and the integer is unsigned. The conversion to a narrower floating
+/// point type is undefined for values out of its range, and infinite values
+/// are rejected as well. NaN stays NaN.
+template <typename U, typename T>
+bool isConversionDefined(T value) {
+  if (!std::is_floating_point<T>::value)
+    return true;
+  if (std::is_floating_point<U>::value) {
+    if (sizeof(U) >= sizeof(T) || std::isnan(value))
+      return true;
+    return std::abs(value) <= std::numeric_limits<U>::max();
+  }
+  double lower = (double)std::numeric_limits<U>::min() - 1.0;
+  double upper = (double)std::numeric_limits<U>::max() + 1.0;
+  return value > lower && value < upper;
+}
+
+class ConstPropCastPattern : public OpRewritePattern<ONNXCastOp> {
+public:
+  using OpRewritePattern<ONNXCastOp>::OpRewritePattern;
+
+  LogicalResult matchAndRewrite(
+      ONNXCastOp op, PatternRewriter &rewriter) const override {
+    Value res = op.output();
+    if (!isStaticSupportedTensor(res) || !isStaticSupportedTensor(op.input()))
+      return failure();
+    DenseElementsAttr inputAttr = getDenseConstant(op.input());
+    if (!inputAttr)
+      return failure();
+
+    Type elementType = inputAttr.getType().getElementType();
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    Type resElementType = resType.getElementType();
+    bool toBool = resElementType.isInteger(1);
+    DenseElementsAttr resAttr;
+    dispatchOnElementType(elementType, [&](auto dummy) {
+      using T = decltype(dummy);
+      std::vector<T> storage;
+      ArrayRef<T> buffer = getElementBuffer(inputAttr, storage);
+      dispatchOnElementType(resElementType, [&](auto resDummy) {
+        using U = decltype(resDummy);
+        if (!toBool && llvm::any_of(buffer, [](T value) {
+              return !isConversionDefined<U>(value);
+            }))
+          return;
+        // A splat keeps a buffer of one element.
+        std::vector<U> resBuffer(buffer.size());
+        std::transform(buffer.begin(), buffer.end(), resBuffer.begin(),
+            [&](T value) { return toBool ? (U)(value != 0) : (U)value; });
+        resAttr =
+            createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+      });
+    });
+    if (!resAttr)
+      return failure();
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+};
+
+class ConstPropSlicePattern : public OpRewritePattern<ONNXSliceOp> {
+public:
+  using OpRewritePattern<ONNXSliceOp>::OpRewritePattern;
+
+  LogicalResult matchAndRewrite(
+      ONNXSliceOp op, PatternRewriter &rewriter) const override {
+    Value res = op.output();
+    if (!isStaticSupportedTensor(res))
+      return failure();
+    DenseElementsAttr dataAttr = getDenseConstant(op.data());
+    DenseElementsAttr startsAttr = getDenseConstant(op.starts());
+    if (!dataAttr || !startsAttr)
+      return failure();
+    // Axes and steps are optional.
+    DenseElementsAttr axesAttr, stepsAttr;
+    if (!op.axes().getType().isa<NoneType>() &&
+        !(axesAttr = getDenseConstant(op.axes())))
+      return failure();
+    if (!op.steps().getType().isa<NoneType>() &&
+        !(stepsAttr = getDenseConstant(op.steps())))
+      return failure();
+
+    ArrayRef<int64_t> shape = dataAttr.getType().getShape();
+    int64_t rank = shape.size();
+    SmallVector<int64_t, 4> starts = getInt64Values(startsAttr);
+    SmallVector<int64_t, 4> axes, steps;
+    if (axesAttr) {
+      axes = getInt64Values(axesAttr);
+    } else {
+      for (int64_t i = 0; i < (int64_t)starts.size(); ++i)
+        axes.emplace_back(i);
+    }
+    if (stepsAttr)
+      steps = getInt64Values(stepsAttr);
+    else
+      steps.resize(starts.size(), 1);
+    if (axes.size() != starts.size() || steps.size() != starts.size())
+      return failure();
+
+    // The result, whose shape is already inferred, is read from the data
+    // starting at the first sliced elements, with the strides multiplied by
+    // the steps.
+    SmallVector<int64_t, 4> strides = getRowMajorStrides(shape);
+    int64_t offset = 0;
+    for (unsigned i = 0; i < starts.size(); ++i) {
+      int64_t axis = axes[i] < 0 ? axes[i] + rank : axes[i];
+      if (axis < 0 || axis >= rank || steps[i] == 0)
+        return failure();
+      int64_t dim = shape[axis];
+      int64_t start = starts[i] < 0 ? starts[i] + dim : starts[i];
+      start =
+          std::max<int64_t>(0, std::min(start, steps[i] > 0 ? dim : dim - 1));
+      offset += start * strides[axis];
+      strides[axis] *= steps[i];
+    }
+
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    DenseElementsAttr resAttr;
+    if (dataAttr.isSplat()) {
+      resAttr = DenseElementsAttr::get(resType, dataAttr.getSplatValue());
+    } else {
+      dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+        using T = decltype(dummy);
+        std::vector<T> storage;
+        ArrayRef<T> buffer = getElementBuffer(dataAttr, storage);
+        std::vector<T> resBuffer =
+            copyStrided(resType.getShape(), buffer, strides, offset);
+        resAttr =
+            createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+      });
+    }
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+};
+
+class ConstPropConcatPattern : public OpRewritePattern<ONNXConcatOp> {
+public:
+  ConstPropConcatPattern(MLIRContext *context, int64_t maxNumElements)
+      : OpRewritePattern<ONNXConcatOp>(context),
+        maxNumElements(maxNumElements) {}
+
+  LogicalResult matchAndRewrite(
+      ONNXConcatOp op, PatternRewriter &rewriter) const override {
+    Value res = op.concat_result();
+    if (!isStaticSupportedTensor(res))
+      return failure();
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    if (resType.getNumElements() > maxNumElements)
+      return rewriter.notifyMatchFailure(op, "result is too large to fold");
+    SmallVector<DenseElementsAttr, 4> inputAttrs;
+    for (Value input : op.inputs()) {
+      DenseElementsAttr inputAttr = getDenseConstant(input);
+      if (!inputAttr ||
+          inputAttr.getType().getElementType() != resType.getElementType())
+        return failure();
+      inputAttrs.emplace_back(inputAttr);
+    }
+
+    // The result is made of the rows of the inputs following the axis, taken
+    // in turn from each input for every index of the outer dimensions.
+    ArrayRef<int64_t> resShape = resType.getShape();
+    int64_t axis = op.axis() < 0 ? op.axis() + resType.getRank() : op.axis();
+    int64_t numOuter = ShapedType::getNumElements(resShape.take_front(axis));
+    int64_t innerSize =
+        ShapedType::getNumElements(resShape.drop_front(axis + 1));
+
+    DenseElementsAttr resAttr;
+    dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+      using T = decltype(dummy);
+      std::vector<std::vector<T>> storages(inputAttrs.size());
+      SmallVector<ArrayRef<T>, 4> buffers;
+      SmallVector<int64_t, 4> chunkSizes;
+      for (unsigned i = 0; i < inputAttrs.size(); ++i) {
+        buffers.emplace_back(getFullElementBuffer(inputAttrs[i], storages[i]));
+        chunkSizes.emplace_back(
+            inputAttrs[i].getType().getDimSize(axis) * innerSize);
+      }
+      std::vector<T> resBuffer;
+      resBuffer.reserve(resType.getNumElements());
+      for (int64_t o = 0; o < numOuter; ++o) {
+        for (unsigned i = 0; i < buffers.size(); ++i) {
+          const T *chunk = buffers[i].data() + o * chunkSizes[i];
+          resBuffer.insert(resBuffer.end(), chunk, chunk + chunkSizes[i]);
+        }
+      }
+      resAttr = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+    });
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+
+private:
+  int64_t maxNumElements;
+};
+
+class ConstPropGatherPattern : public OpRewritePattern<ONNXGatherOp> {
+public:
+  ConstPropGatherPattern(MLIRContext *context, int64_t maxNumElements)
+      : OpRewritePattern<ONNXGatherOp>(context),
+        maxNumElements(maxNumElements) {}
+
+  LogicalResult matchAndRewrite(
+      ONNXGatherOp op, PatternRewriter &rewriter) const override {
+    Value res = op.output();
+    if (!isStaticSupportedTensor(res))
+      return failure();
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    if (resType.getNumElements() > maxNumElements)
+      return rewriter.notifyMatchFailure(op, "result is too large to fold");
+    DenseElementsAttr dataAttr = getDenseConstant(op.data());
+    DenseElementsAttr indicesAttr = getDenseConstant(op.indices());
+    if (!dataAttr || !indicesAttr ||
+        dataAttr.getType().getElementType() != resType.getElementType())
+      return failure();
+
+    // Negative indices count from the end of the axis, and out of range
+    // indices are left to fail at runtime.
+    ArrayRef<int64_t> dataShape = dataAttr.getType().getShape();
+    int64_t axis =
+        op.axis() < 0 ? op.axis() + (int64_t)dataShape.size() : op.axis();
+    int64_t axisDim = dataShape[axis];
+    SmallVector<int64_t, 4> indices = getInt64Values(indicesAttr);
+    for (int64_t &index : indices) {
+      if (index < 0)
+        index += axisDim;
+      if (index < 0 || index >= axisDim)
+        return failure();
+    }
+
+    DenseElementsAttr resAttr;
+    if (dataAttr.isSplat()) {
+      resAttr = DenseElementsAttr::get(resType, dataAttr.getSplatValue());
+    } else {
+      // The result is made of the rows of the data following the axis, taken
+      // at each index for every index of the outer dimensions.
+      int64_t numOuter = ShapedType::getNumElements(dataShape.take_front(axis));
+      int64_t innerSize =
+          ShapedType::getNumElements(dataShape.drop_front(axis + 1));
+      assert(numOuter * (int64_t)indices.size() * innerSize ==
+                 resType.getNumElements() &&
+             "unexpected result shape");
+      dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+        using T = decltype(dummy);
+        std::vector<T> storage;
+        ArrayRef<T> buffer = getElementBuffer(dataAttr, storage);
+        std::vector<T> resBuffer;
+        resBuffer.reserve(resType.getNumElements());
+        for (int64_t o = 0; o < numOuter; ++o) {
+          for (int64_t index : indices) {
+            const T *row = buffer.data() + (o * axisDim + index) * innerSize;
+            resBuffer.insert(resBuffer.end(), row, row + innerSize);
+          }
+        }
+        resAttr =
+            createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+      });
+    }
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+
+private:
+  int64_t maxNumElements;
+};
+
+class ConstPropMatMulPattern : public OpRewritePattern<ONNXMatMulOp> {
+public:
+  ConstPropMatMulPattern(MLIRContext *context, int64_t maxMatMulSize)
+      : OpRewritePattern<ONNXMatMulOp>(context), maxMatMulSize(maxMatMulSize) {}
+
+  LogicalResult matchAndRewrite(
+      ONNXMatMulOp op, PatternRewriter &rewriter) const override {
+    Value res = op.Y();
+    if (!isStaticSupportedTensor(res))
+      return failure();
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    DenseElementsAttr aAttr = getDenseConstant(op.A());
+    DenseElementsAttr bAttr = getDenseConstant(op.B());
+    if (!aAttr || !bAttr ||
+        aAttr.getType().getElementType() != resType.getElementType() ||
+        bAttr.getType().getElementType() != resType.getElementType())
+      return failure();
+
+    // A 1-D A is a row vector, and a 1-D B a column vector. The other
+    // operands are stacks of matrices, and their batch dimensions are
+    // broadcast.
+    SmallVector<int64_t, 4> aShape(
+        aAttr.getType().getShape().begin(), aAttr.getType().getShape().end());
+    SmallVector<int64_t, 4> bShape(
+        bAttr.getType().getShape().begin(), bAttr.getType().getShape().end());
+    if (aShape.empty() || bShape.empty())
+      return failure();
+    if (aShape.size() == 1)
+      aShape.insert(aShape.begin(), 1);
+    if (bShape.size() == 1)
+      bShape.emplace_back(1);
+    int64_t M = aShape[aShape.size() - 2];
+    int64_t K = aShape.back();
+    int64_t N = bShape.back();
+    if (bShape[bShape.size() - 2] != K)
+      return failure();
+    ArrayRef<int64_t> aBatchShape = makeArrayRef(aShape).drop_back(2);
+    ArrayRef<int64_t> bBatchShape = makeArrayRef(bShape).drop_back(2);
+    SmallVector<int64_t, 4> batchShape(
+        std::max(aBatchShape.size(), bBatchShape.size()), 1);
+    for (ArrayRef<int64_t> operandBatchShape : {aBatchShape, bBatchShape})
+      for (int i = operandBatchShape.size() - 1, j = batchShape.size() - 1;
+          i >= 0; --i, --j)
+        if (operandBatchShape[i] != 1)
+          batchShape[j] = operandBatchShape[i];
+    if (!isBroadcastableTo(aBatchShape, batchShape) ||
+        !isBroadcastableTo(bBatchShape, batchShape))
+      return failure();
+    int64_t numBatches = ShapedType::getNumElements(batchShape);
+    if (numBatches * M * N != resType.getNumElements())
+      return failure();
+    if (numBatches * M * N * K > maxMatMulSize)
+      return rewriter.notifyMatchFailure(op, "product is too large to fold");
+
+    // The batch strides are counted in matrices, and then in elements. An
+    // extra dimension of size 1 lets forEachRow visit every batch.
+    SmallVector<int64_t, 4> aStrides =
+        getBroadcastStrides(aBatchShape, batchShape, /*isSplat=*/false);
+    SmallVector<int64_t, 4> bStrides =
+        getBroadcastStrides(bBatchShape, batchShape, /*isSplat=*/false);
+    for (int64_t &stride : aStrides)
+      stride *= M * K;
+    for (int64_t &stride : bStrides)
+      stride *= K * N;
+    batchShape.emplace_back(1);
+    aStrides.emplace_back(0);
+    bStrides.emplace_back(0);
+
+    DenseElementsAttr resAttr;
+    dispatchOnElementType(resType.getElementType(), [&](auto dummy) {
+      using T = decltype(dummy);
+      std::vector<T> aStorage, bStorage;
+      ArrayRef<T> a = getFullElementBuffer(aAttr, aStorage);
+      ArrayRef<T> b = getFullElementBuffer(bAttr, bStorage);
+      std::vector<T> resBuffer(resType.getNumElements(), T(0));
+      forEachRow<2>(batchShape, {aStrides, bStrides}, {0, 0},
+          [&](int64_t batch, std::array<int64_t, 2> offsets, int64_t) {
+            accumulateMatMul(resBuffer.data() + batch * M * N,
+                a.data() + offsets[0], K, 1, b.data() + offsets[1], N, 1, M, N,
+                K);
+          });
+      resAttr = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+    });
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+
+private:
+  int64_t maxMatMulSize;
+};
+
+class ConstPropGemmPattern : public OpRewritePattern<ONNXGemmOp> {
+public:
+  ConstPropGemmPattern(MLIRContext *context, int64_t maxMatMulSize)
+      : OpRewritePattern<ONNXGemmOp>(context), maxMatMulSize(maxMatMulSize) {}
+
+  LogicalResult matchAndRewrite(
+      ONNXGemmOp op, PatternRewriter &rewriter) const override {
+    Value res = op.Y();
+    if (!isStaticSupportedTensor(res))
+      return failure();
+    RankedTensorType resType = res.getType().cast<RankedTensorType>();
+    Type elementType = resType.getElementType();
+    DenseElementsAttr aAttr = getDenseConstant(op.A());
+    DenseElementsAttr bAttr = getDenseConstant(op.B());
+    if (!aAttr || !bAttr || aAttr.getType().getElementType() != elementType ||
+        bAttr.getType().getElementType() != elementType)
+      return failure();
+    // C is optional.
+    DenseElementsAttr cAttr;
+    if (!op.C().getType().isa<NoneType>() &&
+        (!(cAttr = getDenseConstant(op.C())) ||
+            cAttr.getType().getElementType() != elementType))
+      return failure();
+    // Integer Gemm is only folded when it does not scale.
+    float alpha = op.alpha().convertToFloat();
+    float beta = op.beta().convertToFloat();
+    if (!elementType.isa<FloatType>() && (alpha != 1.0 || beta != 1.0))
+      return failure();
+
+    // A is M x K, or K x M if transposed, and B is K x N, or N x K if
+    // transposed. They are read with the strides of their transposition.
+    ArrayRef<int64_t> aShape = aAttr.getType().getShape();
+    ArrayRef<int64_t> bShape = bAttr.getType().getShape();
+    if (aShape.size() != 2 || bShape.size() != 2)
+      return failure();
+    bool transA = op.transA() != 0;
+    bool transB = op.transB() != 0;
+    int64_t M = transA ? aShape[1] : aShape[0];
+    int64_t K = transA ? aShape[0] : aShape[1];
+    int64_t N = transB ? bShape[0] : bShape[1];
+    if ((transB ? bShape[1] : bShape[0]) != K)
+      return failure();
+    SmallVector<int64_t, 2> resShape = {M, N};
+    if (resType.getShape() != makeArrayRef(resShape) ||
+        (cAttr && !isBroadcastableTo(cAttr.getType().getShape(), resShape)))
+      return failure();
+    if (M * N * K > maxMatMulSize)
+      return rewriter.notifyMatchFailure(op, "product is too large to fold");
+    int64_t aRowStride = transA ? 1 : K;
+    int64_t aColStride = transA ? M : 1;
+    int64_t bRowStride = transB ? 1 : N;
+    int64_t bColStride = transB ? K : 1;
+
+    DenseElementsAttr resAttr;
+    dispatchOnElementType(elementType, [&](auto dummy) {
+      using T = decltype(dummy);
+      using Add = ElementWiseBinaryOpImpl<ONNXAddOp, T>;
+      using Mul = ElementWiseBinaryOpImpl<ONNXMulOp, T>;
+      std::vector<T> aStorage, bStorage;
+      ArrayRef<T> a = getFullElementBuffer(aAttr, aStorage);
+      ArrayRef<T> b = getFullElementBuffer(bAttr, bStorage);
+      std::vector<T> resBuffer(M * N, T(0));
+      accumulateMatMul(resBuffer.data(), a.data(), aRowStride, aColStride,
+          b.data(), bRowStride, bColStride, M, N, K);
+      if (alpha != 1.0)
+        for (T &value : resBuffer)
+          value = Mul::impl((T)alpha, value);
+      if (cAttr) {
+        // C is broadcast to the result.
+        std::vector<T> cStorage;
+        ArrayRef<T> c = getElementBuffer(cAttr, cStorage);
+        SmallVector<int64_t, 4> cStrides = getBroadcastStrides(
+            cAttr.getType().getShape(), resShape, cAttr.isSplat());
+        forEachRow<1>(resShape, {cStrides}, {0},
+            [&](int64_t resOffset, std::array<int64_t, 1> offsets,
+                int64_t size) {
+              T *out = resBuffer.data() + resOffset;
+              const T *cIn = c.data() + offsets[0];
+              int64_t cInnerStride = cStrides.back();
+              for (int64_t i = 0; i < size; ++i)
+                out[i] = Add::impl(
+                    out[i], Mul::impl((T)beta, cIn[i * cInnerStride]));
+            });
+      }
+      resAttr = createDenseElementsAttr(resType, llvm::makeArrayRef(resBuffer));
+    });
+    rewriter.replaceOpWithNewOp<ONNXConstantOp>(
+        op, resType, /*sparse_value=*/Attribute(), /*dense_value=*/resAttr);
+    return success();
+  }
+
+private:
+  int64_t maxMatMulSize;
+};
+
 //===----------------------------------------------------------------------===//
 // Pattern definition.
 //===----------------------------------------------------------------------===//
@@ -554,7 +1195,23 @@ public:
 
 struct ConstPropONNXToONNXPass
     : public PassWrapper<ConstPropONNXToONNXPass, FunctionPass> {
+  ConstPropONNXToONNXPass() = default;
+  ConstPropONNXToONNXPass(const ConstPropONNXToONNXPass &pass)
+      : PassWrapper<ConstPropONNXToONNXPass, FunctionPass>() {
+    maxNumElements = pass.maxNumElements.getValue();
+    maxMatMulSize = pass.maxMatMulSize.getValue();
+  }
+
   void runOnFunction() final;
+
+  Option<int64_t> maxNumElements{*this, "max-num-elements",
+      llvm::cl::desc("Maximum number of elements of a constant built by "
+                     "folding Concat or Gather."),
+      llvm::cl::init(1 << 24)};
+  Option<int64_t> maxMatMulSize{*this, "max-matmul-size",
+      llvm::cl::desc("Maximum number of multiply-adds of a MatMul or Gemm "
+                     "folded into a constant."),
+      llvm::cl::init(1 << 26)};
 };
 } // end anonymous namespace.
 
@@ -568,6 +1225,11 @@ void ConstPropONNXToONNXPass::runOnFunction() {
   OwningRewritePatternList patterns;
   populateWithGenerated(context, patterns);
   patterns.insert<ConstPropSplitPattern>(&getContext());
+  patterns.insert<ConstPropCastPattern, ConstPropSlicePattern>(&getContext());
+  patterns.insert<ConstPropConcatPattern, ConstPropGatherPattern>(
+      &getContext(), maxNumElements);
+  patterns.insert<ConstPropMatMulPattern, ConstPropGemmPattern>(
+      &getContext(), maxMatMulSize);
 
   applyPatternsAndFoldGreedily(function, std::move(patterns));
 } // end anonymous namespace
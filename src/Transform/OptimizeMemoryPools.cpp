@@ -11,12 +11,15 @@
 // For certain cases the number of individual memory allocations required for
 // all internal tensors is large and needs to be mitigated. This pass optimizes
 // the internal MemRef static and dynamic memory pools emitted by the
-// BundleMemoryPool pass.
+// BundleMemoryPool pass: krnl.getref operations whose live ranges do not
+// intersect are assigned overlapping slots of the memory pool, which is then
+// shrunk to the peak memory in use.
 //
 //===----------------------------------------------------------------------===//
 
 #include "mlir/Dialect/Affine/IR/AffineOps.h"
 #include "mlir/Dialect/StandardOps/IR/Ops.h"
+#include "mlir/Interfaces/SideEffectInterfaces.h"
 #include "mlir/Pass/Pass.h"
 #include "mlir/Transforms/DialectConversion.h"
 #include "llvm/ADT/SetVector.h"
@@ -36,37 +39,6 @@ namespace {
 typedef std::map<Block *, llvm::SmallSet<int64_t, 16>>
     BlockToCompactedAlignments;
 
-/// Get the total size in bytes used by the getref operations associated
-/// with a given memory pool.
-int64_t getAllocGetRefTotalSize(AllocOp *allocOp) {
-  auto parentBlock = allocOp->getOperation()->getBlock();
-
-  int64_t totalSize = 0;
-  SmallVector<KrnlGetRefOp, 4> seenGetRefs;
-  parentBlock->walk([&totalSize, &seenGetRefs, allocOp](KrnlGetRefOp op) {
-    // If krnl.getref operation uses a different mempool then exit.
-    if (op.mempool() != allocOp->getResult())
-      return;
-
-    // Check that the krnl.getref operation has not already been counted.
-    // We must make sure we count the memory footprint of getref operations
-    // sharing a slot only once.
-    for (auto getRef : seenGetRefs)
-      if (op.offset() == getRef.offset())
-        return;
-
-    // Footprint has not been counted yet. Add it to totalSize.
-    // auto result = allocOp->getResult();
-    // if (op.getOperands()[0] == result)
-    totalSize += getMemRefSizeInBytes(op.getResult());
-
-    // Act krnl.getref operation as seen.
-    seenGetRefs.emplace_back(op);
-  });
-
-  return totalSize;
-}
-
 /// Returns a list of operations in the current block that use the getref.
 std::vector<Operation *> getGetRefStores(KrnlGetRefOp *getRef) {
   auto parentBlock = getRef->getOperation()->getBlock();
@@ -401,6 +373,150 @@ bool checkLiveRangesIntersect(
   return false;
 }
 
+/// Returns true if the slots used by two lists of getrefs sharing an offset
+/// must not overlap in the memory pool, i.e. if their live ranges intersect
+/// or if their uses are not disjoint.
+bool slotsInterfere(SmallVectorImpl<KrnlGetRefOp> &firstSlot,
+    SmallVectorImpl<KrnlGetRefOp> &secondSlot) {
+  // Getrefs without uses do not have a live range.
+  SmallVector<KrnlGetRefOp, 4> firstGetRefList;
+  for (auto getRef : firstSlot)
+    if (!getRef.getResult().use_empty())
+      firstGetRefList.emplace_back(getRef);
+  SmallVector<KrnlGetRefOp, 4> secondGetRefList;
+  for (auto getRef : secondSlot)
+    if (!getRef.getResult().use_empty())
+      secondGetRefList.emplace_back(getRef);
+  if (firstGetRefList.empty() || secondGetRefList.empty())
+    return false;
+
+  for (auto secondGetRef : secondGetRefList)
+    if (getRefUsesAreNotUsedBySameOp(firstGetRefList, secondGetRef) ||
+        checkLiveRangesIntersect(firstGetRefList, secondGetRef))
+      return true;
+
+  return !getRefUsesAreMutuallyDisjoint(firstGetRefList, secondGetRefList);
+}
+
+/// Assign an offset inside the memory pool to each slot, given by the list of
+/// its distinct getrefs. The slots are visited in program order and each one
+/// is placed at the lowest offset where it does not overlap any of the already
+/// placed slots it interferes with. This is a first-fit colouring of the
+/// interval graph of the slot live ranges which, unlike the slot reuse
+/// pattern, also lets slots of different sizes share memory. Returns the size
+/// of the memory pool needed by the assignment.
+int64_t assignSlotOffsets(SmallVectorImpl<KrnlGetRefOp> &distinctGetRefs,
+    SmallVectorImpl<int64_t> &slotOffsets) {
+  SmallVector<SmallVector<KrnlGetRefOp, 4>, 4> slots;
+  SmallVector<int64_t, 4> slotSizes;
+  for (auto getRefOp : distinctGetRefs) {
+    slots.emplace_back(getAllGetRefWithSameOffset(&getRefOp));
+    int64_t slotSize = 0;
+    for (auto getRef : slots.back())
+      slotSize = std::max(slotSize, getMemRefSizeInBytes(getRef.getResult()));
+    slotSizes.emplace_back(slotSize);
+  }
+
+  int64_t poolSize = 0;
+  for (unsigned i = 0; i < slots.size(); ++i) {
+    // Memory ranges occupied by the interfering slots placed so far.
+    SmallVector<std::pair<int64_t, int64_t>, 4> occupiedRanges;
+    for (unsigned j = 0; j < i; ++j)
+      if (slotsInterfere(slots[j], slots[i]))
+        occupiedRanges.emplace_back(
+            slotOffsets[j], slotOffsets[j] + slotSizes[j]);
+    llvm::sort(occupiedRanges);
+
+    // Find the first gap large enough to hold the slot.
+    int64_t offset = 0;
+    for (auto range : occupiedRanges) {
+      if (offset + slotSizes[i] <= range.first)
+        break;
+      offset = std::max(offset, range.second);
+    }
+
+    slotOffsets.emplace_back(offset);
+    poolSize = std::max(poolSize, offset + slotSizes[i]);
+  }
+
+  return poolSize;
+}
+
+/// Returns true if two values are computed in the same way, i.e. if they are
+/// the same value or the same result of equivalent side-effect free operations
+/// applied to equivalent operands.
+bool areEquivalentValues(Value first, Value second) {
+  if (first == second)
+    return true;
+
+  Operation *firstOp = first.getDefiningOp();
+  Operation *secondOp = second.getDefiningOp();
+  if (!firstOp || !secondOp || firstOp->getNumRegions() != 0 ||
+      !MemoryEffectOpInterface::hasNoEffect(firstOp))
+    return false;
+
+  if (first.cast<OpResult>().getResultNumber() !=
+          second.cast<OpResult>().getResultNumber() ||
+      !OperationEquivalence::isEquivalentTo(
+          firstOp, secondOp, OperationEquivalence::IgnoreOperands))
+    return false;
+
+  for (auto operands :
+      llvm::zip(firstOp->getOperands(), secondOp->getOperands()))
+    if (!areEquivalentValues(std::get<0>(operands), std::get<1>(operands)))
+      return false;
+
+  return true;
+}
+
+/// Returns true if two getrefs return MemRefs whose sizes in bytes are
+/// symbolically equal: same shape, same element size and equivalent dynamic
+/// sizes.
+bool haveEquivalentSizes(KrnlGetRefOp firstGetRef, KrnlGetRefOp secondGetRef) {
+  auto firstType = firstGetRef.getResult().getType().cast<MemRefType>();
+  auto secondType = secondGetRef.getResult().getType().cast<MemRefType>();
+  if (firstType.getShape() != secondType.getShape() ||
+      getMemRefEltSizeInBytes(firstType) != getMemRefEltSizeInBytes(secondType))
+    return false;
+
+  for (auto sizes :
+      llvm::zip(firstGetRef.getDynamicSizes(), secondGetRef.getDynamicSizes()))
+    if (!areEquivalentValues(std::get<0>(sizes), std::get<1>(sizes)))
+      return false;
+
+  return true;
+}
+
+/// Returns true if the value is available before the operation, which is in
+/// the top level block of a function.
+bool isDefinedBefore(Value value, Operation *op) {
+  Operation *definingOp = value.getDefiningOp();
+  if (!definingOp)
+    return value.getParentBlock() == op->getBlock();
+  return definingOp->getBlock() == op->getBlock() &&
+         definingOp->isBeforeInBlock(op);
+}
+
+/// Emit the computation of the size in bytes of the MemRef returned by a
+/// getref, using the dynamic sizes of the getref.
+Value emitGetRefSizeInBytes(
+    PatternRewriter &rewriter, Location loc, KrnlGetRefOp getRef) {
+  auto memRefType = getRef.getResult().getType().cast<MemRefType>();
+  Value size = emitConstantOp(rewriter, loc, rewriter.getIndexType(),
+      getMemRefEltSizeInBytes(memRefType));
+
+  auto dynamicSizes = getRef.getDynamicSizes();
+  int64_t dynDimIdx = 0;
+  for (auto dimSize : memRefType.getShape()) {
+    Value dim = (dimSize < 0) ? dynamicSizes[dynDimIdx++]
+                              : emitConstantOp(rewriter, loc,
+                                    rewriter.getIndexType(), dimSize);
+    size = rewriter.create<MulIOp>(loc, size, dim);
+  }
+
+  return size;
+}
+
 //===----------------------------------------------------------------------===//
 // Rewrite patterns.
 //===----------------------------------------------------------------------===//
@@ -633,6 +749,17 @@ public:
 //  %5 = "krnl.getref"(%1, 0)
 //  %6 = "krnl.getref"(%1, 0)
 //
+// The slots are not simply laid out one after the other: a slot can overlap
+// the memory of any slot whose live range does not intersect its own, which
+// lets slots of different sizes share memory. For example, if %2 (400 bytes)
+// and %3 (40 bytes) are live at the same time, and %3 and %4 (200 bytes) are
+// live at the same time, but %2 and %4 are not:
+//
+//  %1 = alloc() : memref<440xi8>
+//  %2 = "krnl.getref"(%1, 0)
+//  %3 = "krnl.getref"(%1, 400)
+//  %4 = "krnl.getref"(%1, 0)
+//
 class KrnlCompactStaticMemoryPools : public OpRewritePattern<AllocOp> {
 public:
   using OpRewritePattern<AllocOp>::OpRewritePattern;
@@ -683,8 +810,12 @@ public:
     if (!llvm::dyn_cast_or_null<FuncOp>(parentBlock->getParentOp()))
       return failure();
 
-    // Compute size of all krnl.getref operations that use this memory pool.
-    int64_t usedMemory = getAllocGetRefTotalSize(&allocOp);
+    // Compute the offset of each slot in the compacted memory pool and the
+    // size of all krnl.getref operations that use it.
+    SmallVector<KrnlGetRefOp, 4> distinctGetRefs =
+        getAllDistinctGetRefsForAlloc(&allocOp);
+    SmallVector<int64_t, 4> slotOffsets;
+    int64_t usedMemory = assignSlotOffsets(distinctGetRefs, slotOffsets);
 
     assert(usedMemory <= memPoolShape[0] &&
            "Used memory exceeds allocated memory.");
@@ -704,29 +835,16 @@ public:
         loc, newStaticMemPoolType, allocOp.alignmentAttr());
     newStaticMemPool.getOperation()->moveBefore(allocOp);
 
-    // Changes are required, memory pool needs to be compacted.
-    SmallVector<KrnlGetRefOp, 4> distinctGetRefs =
-        getAllDistinctGetRefsForAlloc(&allocOp);
-
-    // Size of all distinct getrefs:
-    int64_t distinctGRSize = 0;
-    for (auto getRefOp : distinctGetRefs) {
-      distinctGRSize += getMemRefSizeInBytes(getRefOp.getResult());
-    }
-    assert(distinctGRSize == usedMemory &&
-           "Size of all distinct getrefs must match the total used memory");
-
     // Each krnl.getref using the alloc needs to be re-emitted with the new
     // static memory pool and the new offset.
-    int64_t currentOffset = 0;
     std::vector<std::pair<KrnlGetRefOp, KrnlGetRefOp>> oldToNewGetRef;
-    for (auto getRefOp : distinctGetRefs) {
-      // Emit the current offset inside the static memory pool.
-      auto newOffset = rewriter.create<ConstantOp>(loc,
-          rewriter.getIntegerAttr(rewriter.getIntegerType(64), currentOffset));
+    for (auto getRefAndOffset : llvm::zip(distinctGetRefs, slotOffsets)) {
+      KrnlGetRefOp getRefOp = std::get<0>(getRefAndOffset);
 
-      // Size of current getref.
-      int64_t currentGetRefSize = getMemRefSizeInBytes(getRefOp.getResult());
+      // Emit the offset of the slot inside the static memory pool.
+      auto newOffset = rewriter.create<ConstantOp>(
+          loc, rewriter.getIntegerAttr(
+                   rewriter.getIntegerType(64), std::get<1>(getRefAndOffset)));
 
       // Get all getRefs which share the same memory slot.
       SmallVector<KrnlGetRefOp, 4> sameSlotGetRefs =
@@ -743,14 +861,8 @@ public:
         oldToNewGetRef.emplace_back(
             std::pair<KrnlGetRefOp, KrnlGetRefOp>(oldGetRef, newGetRefOp));
       }
-
-      // Update offset.
-      currentOffset += currentGetRefSize;
     }
 
-    assert(currentOffset == usedMemory &&
-           "Size total used memory must match the last offset.");
-
     for (auto getRefPair : oldToNewGetRef)
       rewriter.replaceOp(getRefPair.first, getRefPair.second.getResult());
 
@@ -767,12 +879,161 @@ public:
   }
 };
 
+// This pattern reuses slots inside a dynamic memory pool. The size of the
+// slots of a dynamic memory pool is only known at runtime, so a slot can only
+// be reused by a krnl.getref whose size is symbolically equal to the size of
+// the slot i.e. it has the same shape, the same element type size and its
+// dynamic sizes are computed in the same way. The memory pool is re-emitted
+// with a size computation which only accounts for the remaining slots.
+//
+// Example:
+//
+// Unoptimized:
+//  %1 = alloc(%size) : memref<?xi8>
+//  %2 = "krnl.getref"(%1, %offset0, %d0) : memref<?x10xf32>
+//  %3 = "krnl.getref"(%1, %offset1, %d1) : memref<?x10xf32>
+//  %4 = "krnl.getref"(%1, %offset2, %d2) : memref<?x10xf32>
+//
+// where %d0, %d1 and %d2 are all computed as `dim %arg0, 0` and the live
+// range of %2 does not intersect the live range of %4.
+//
+// Optimized:
+//  %s0 = muli %c40, %d0
+//  %s1 = muli %c40, %d1
+//  %size = addi %s0, %s1
+//  %1 = alloc(%size) : memref<?xi8>
+//  %2 = "krnl.getref"(%1, 0, %d0) : memref<?x10xf32>
+//  %3 = "krnl.getref"(%1, %s0, %d1) : memref<?x10xf32>
+//  %4 = "krnl.getref"(%1, 0, %d2) : memref<?x10xf32>
+//
+class KrnlOptimizeDynamicMemoryPools : public OpRewritePattern<AllocOp> {
+public:
+  using OpRewritePattern<AllocOp>::OpRewritePattern;
+
+  BlockToCompactedAlignments *blockToDynamicPoolAlignments;
+  KrnlOptimizeDynamicMemoryPools(MLIRContext *context,
+      BlockToCompactedAlignments *_blockToDynamicPoolAlignments)
+      : OpRewritePattern<AllocOp>(context) {
+    blockToDynamicPoolAlignments = _blockToDynamicPoolAlignments;
+  }
+
+  LogicalResult matchAndRewrite(
+      AllocOp allocOp, PatternRewriter &rewriter) const override {
+    auto loc = allocOp.getLoc();
+
+    auto memPoolType = allocOp.getResult().getType().dyn_cast<MemRefType>();
+    auto memPoolShape = memPoolType.getShape();
+
+    // Only handle alloc ops that return a dynamic shaped MemRef.
+    if (hasAllConstantDimensions(memPoolType))
+      return failure();
+
+    // Dynamic memory pool type must be byte.
+    if (getMemRefEltSizeInBytes(memPoolType) != 1)
+      return failure();
+
+    // Rank of the dynamic memory pool must be 1.
+    if (memPoolShape.size() != 1)
+      return failure();
+
+    // The memory pool must be bundled i.e. participate in more than one
+    // getRef.
+    if (getAllocGetRefNum(&allocOp) < 2)
+      return failure();
+
+    // Get parent block.
+    Block *parentBlock = allocOp.getOperation()->getBlock();
+
+    // Get alignment.
+    int64_t alignment = getAllocAlignment(allocOp);
+
+    // Check if this block has already been optimized for current alignment.
+    // If it has then skip its processing.
+    if (blockToDynamicPoolAlignments->count(parentBlock) > 0 &&
+        blockToDynamicPoolAlignments->at(parentBlock).count(alignment) > 0)
+      return failure();
+
+    // If this is not the top block, fail.
+    if (!llvm::dyn_cast_or_null<FuncOp>(parentBlock->getParentOp()))
+      return failure();
+
+    // Group the slots of the memory pool. A slot joins the first group of
+    // slots with the same symbolic size with which it does not interfere.
+    SmallVector<KrnlGetRefOp, 4> distinctGetRefs =
+        getAllDistinctGetRefsForAlloc(&allocOp);
+    SmallVector<SmallVector<KrnlGetRefOp, 4>, 4> slotGroups;
+    for (auto getRefOp : distinctGetRefs) {
+      // The sizes of the slot must be available where the memory pool is
+      // allocated.
+      for (auto dynamicSize : getRefOp.getDynamicSizes())
+        if (!isDefinedBefore(dynamicSize, allocOp))
+          return failure();
+
+      SmallVector<KrnlGetRefOp, 4> slot = getAllGetRefWithSameOffset(&getRefOp);
+      bool reusesSlot = false;
+      for (auto &group : slotGroups) {
+        if (!haveEquivalentSizes(group[0], getRefOp) ||
+            slotsInterfere(group, slot))
+          continue;
+        group.append(slot.begin(), slot.end());
+        reusesSlot = true;
+        break;
+      }
+      if (!reusesSlot)
+        slotGroups.emplace_back(slot);
+    }
+
+    // No slot can be reused.
+    if (slotGroups.size() == distinctGetRefs.size())
+      return failure();
+
+    // Emit the offsets of the remaining slots and the size of the new memory
+    // pool.
+    Value memPoolSize =
+        emitConstantOp(rewriter, loc, rewriter.getIndexType(), 0);
+    SmallVector<Value, 4> slotOffsets;
+    for (auto &group : slotGroups) {
+      slotOffsets.emplace_back(rewriter.create<IndexCastOp>(
+          loc, memPoolSize, rewriter.getIntegerType(64)));
+      memPoolSize = rewriter.create<AddIOp>(
+          loc, memPoolSize, emitGetRefSizeInBytes(rewriter, loc, group[0]));
+    }
+
+    AllocOp newDynamicMemPool = rewriter.create<AllocOp>(
+        loc, memPoolType, memPoolSize, allocOp.alignmentAttr());
+
+    // Each krnl.getref using the alloc needs to be re-emitted with the new
+    // dynamic memory pool and the offset of its slot.
+    for (auto groupAndOffset : llvm::zip(slotGroups, slotOffsets)) {
+      for (auto oldGetRef : std::get<0>(groupAndOffset)) {
+        auto newGetRefOp = rewriter.create<KrnlGetRefOp>(loc,
+            oldGetRef.getResult().getType(), newDynamicMemPool,
+            std::get<1>(groupAndOffset), oldGetRef.getDynamicSizes());
+        newGetRefOp.getOperation()->moveBefore(oldGetRef);
+        rewriter.replaceOp(oldGetRef, newGetRefOp.getResult());
+      }
+    }
+
+    rewriter.replaceOp(allocOp, newDynamicMemPool.getResult());
+
+    // Update optimized flag.
+    if (blockToDynamicPoolAlignments->count(parentBlock) == 0)
+      blockToDynamicPoolAlignments->insert(
+          std::pair<Block *, llvm::SmallSet<int64_t, 16>>(
+              parentBlock, llvm::SmallSet<int64_t, 16>()));
+    blockToDynamicPoolAlignments->at(parentBlock).insert(alignment);
+
+    return success();
+  }
+};
+
 /*!
  *  Function pass that optimizes memory pools.
  */
 class KrnlOptimizeMemoryPoolsPass
     : public PassWrapper<KrnlOptimizeMemoryPoolsPass, FunctionPass> {
   BlockToCompactedAlignments blockToStaticPoolAlignments;
+  BlockToCompactedAlignments blockToDynamicPoolAlignments;
 
 public:
   void runOnFunction() override {
@@ -784,6 +1045,8 @@ public:
         &getContext(), &blockToStaticPoolAlignments);
     patterns.insert<KrnlCompactStaticMemoryPools>(
         &getContext(), &blockToStaticPoolAlignments);
+    patterns.insert<KrnlOptimizeDynamicMemoryPools>(
+        &getContext(), &blockToDynamicPoolAlignments);
 
     applyPatternsAndFoldGreedily(function, std::move(patterns));
   }
@@ -0,0 +1,172 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------ ParallelLoopsToOpenMP.cpp - Run parallel loops on threads -----===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This pass distributes the outermost scf.parallel loops, which come from the
+// loops marked by krnl.parallel, among the threads of an OpenMP parallel
+// region. The iteration space of the first dimension of the loop is split
+// into one contiguous chunk per thread:
+//
+//   %setting = call @omGetNumThreads() : () -> i32
+//   %default = call @omp_get_max_threads() : () -> i32
+//   %numThreads = select (%setting > 0), %setting, %default : i32
+//   omp.parallel num_threads(%numThreads : i32) {
+//     %tid = call @omp_get_thread_num() : () -> i32
+//     %nth = call @omp_get_num_threads() : () -> i32
+//     ... chunk = ceildiv(ceildiv(ub - lb, step), nth)
+//     ... begin = lb + tid * chunk * step, end = min(ub, begin + chunk * step)
+//     scf.parallel (%i, ...) = (begin, ...) to (end, ...) step (...) {
+//       ...
+//     }
+//     omp.terminator
+//   }
+//
+// The remaining scf.parallel loops are executed sequentially by each thread
+// when lowered to the CFG. The number of threads is given by the runtime and
+// can be set with omSetNumThreads, 0 selects the OpenMP default.
+//
+//===----------------------------------------------------------------------===//
+
+#include "mlir/Dialect/OpenMP/OpenMPDialect.h"
+#include "mlir/Dialect/SCF/SCF.h"
+#include "mlir/Dialect/StandardOps/IR/Ops.h"
+#include "mlir/Pass/Pass.h"
+
+#include "src/Pass/Passes.hpp"
+
+using namespace mlir;
+
+namespace {
+
+/// Return a declaration of the external function `name` of type `() -> i32`,
+/// inserting it into the module if needed.
+FuncOp getOrInsertI32Func(ModuleOp module, StringRef name) {
+  if (auto func = module.lookupSymbol<FuncOp>(name))
+    return func;
+  Builder builder(module.getContext());
+  auto funcType = builder.getFunctionType({}, {builder.getIntegerType(32)});
+  auto func = FuncOp::create(module.getLoc(), name, funcType);
+  func.setPrivate();
+  module.push_back(func);
+  return func;
+}
+
+Value callI32Func(OpBuilder &builder, Location loc, FuncOp func) {
+  auto callOp = builder.create<CallOp>(loc, func, ValueRange());
+  return builder.create<IndexCastOp>(
+      loc, callOp.getResult(0), builder.getIndexType());
+}
+
+/// Check if the loop is nested in a loop that is already distributed.
+bool isNestedInParallelLoop(scf::ParallelOp loop) {
+  Operation *parent = loop.getParentOp();
+  while (parent) {
+    if (isa<scf::ParallelOp>(parent) || isa<omp::ParallelOp>(parent))
+      return true;
+    parent = parent->getParentOp();
+  }
+  return false;
+}
+
+void distributeLoop(scf::ParallelOp loop, FuncOp getNumThreadsFunc,
+    FuncOp maxThreadsFunc, FuncOp threadNumFunc, FuncOp numThreadsFunc) {
+  Location loc = loop.getLoc();
+  OpBuilder builder(loop);
+
+  // A setting of 0 selects the OpenMP default, which a num_threads clause of 0
+  // would not give.
+  Value zero = builder.create<ConstantIntOp>(loc, 0, /*width=*/32);
+  Value setting =
+      builder.create<CallOp>(loc, getNumThreadsFunc, ValueRange()).getResult(0);
+  Value defaultNumThreads =
+      builder.create<CallOp>(loc, maxThreadsFunc, ValueRange()).getResult(0);
+  Value isSet = builder.create<CmpIOp>(loc, CmpIPredicate::sgt, setting, zero);
+  Value numThreads =
+      builder.create<SelectOp>(loc, isSet, setting, defaultNumThreads);
+  auto parallelOp = builder.create<omp::ParallelOp>(loc,
+      /*if_expr_var=*/Value(), /*num_threads_var=*/numThreads,
+      /*default_val=*/nullptr, /*private_vars=*/ValueRange(),
+      /*firstprivate_vars=*/ValueRange(), /*shared_vars=*/ValueRange(),
+      /*copyin_vars=*/ValueRange(), /*proc_bind_val=*/nullptr);
+  Block *body = builder.createBlock(&parallelOp.region());
+  builder.setInsertionPointToStart(body);
+
+  // Compute the chunk of the first dimension owned by this thread.
+  Value tid = callI32Func(builder, loc, threadNumFunc);
+  Value nth = callI32Func(builder, loc, numThreadsFunc);
+  Value one = builder.create<ConstantIndexOp>(loc, 1);
+  Value lb = loop.lowerBound()[0];
+  Value ub = loop.upperBound()[0];
+  Value step = loop.step()[0];
+  Value range = builder.create<SubIOp>(loc, ub, lb);
+  Value tripCount = builder.create<SignedDivIOp>(loc,
+      builder.create<SubIOp>(
+          loc, builder.create<AddIOp>(loc, range, step), one),
+      step);
+  Value chunk = builder.create<SignedDivIOp>(loc,
+      builder.create<SubIOp>(
+          loc, builder.create<AddIOp>(loc, tripCount, nth), one),
+      nth);
+  Value chunkRange = builder.create<MulIOp>(loc, chunk, step);
+  Value begin = builder.create<AddIOp>(
+      loc, lb, builder.create<MulIOp>(loc, tid, chunkRange));
+  Value chunkEnd = builder.create<AddIOp>(loc, begin, chunkRange);
+  Value isLast = builder.create<CmpIOp>(loc, CmpIPredicate::slt, ub, chunkEnd);
+  Value end = builder.create<SelectOp>(loc, isLast, ub, chunkEnd);
+
+  // Iterate over the chunk, the body is moved into the new loop.
+  SmallVector<Value, 4> lbs(loop.lowerBound());
+  SmallVector<Value, 4> ubs(loop.upperBound());
+  lbs[0] = begin;
+  ubs[0] = end;
+  auto chunkLoop = builder.create<scf::ParallelOp>(loc, lbs, ubs, loop.step());
+  chunkLoop.region().takeBody(loop.region());
+  builder.create<omp::TerminatorOp>(loc);
+
+  loop.erase();
+}
+
+/*!
+ *  Module pass that distributes the parallel loops among OpenMP threads.
+ */
+class ConvertParallelLoopsToOpenMPPass
+    : public PassWrapper<ConvertParallelLoopsToOpenMPPass,
+          OperationPass<ModuleOp>> {
+public:
+  void getDependentDialects(DialectRegistry &registry) const override {
+    registry.insert<omp::OpenMPDialect>();
+  }
+
+  void runOnOperation() override {
+    auto module = getOperation();
+
+    // Only outermost loops without reductions are distributed.
+    SmallVector<scf::ParallelOp, 4> loops;
+    module.walk([&](scf::ParallelOp loop) {
+      if (loop.getNumResults() == 0 && loop.getNumLoops() > 0 &&
+          !isNestedInParallelLoop(loop))
+        loops.emplace_back(loop);
+    });
+    if (loops.empty())
+      return;
+
+    auto getNumThreadsFunc = getOrInsertI32Func(module, "omGetNumThreads");
+    auto maxThreadsFunc = getOrInsertI32Func(module, "omp_get_max_threads");
+    auto threadNumFunc = getOrInsertI32Func(module, "omp_get_thread_num");
+    auto numThreadsFunc = getOrInsertI32Func(module, "omp_get_num_threads");
+    for (auto loop : loops)
+      distributeLoop(loop, getNumThreadsFunc, maxThreadsFunc, threadNumFunc,
+          numThreadsFunc);
+  }
+};
+} // namespace
+
+std::unique_ptr<Pass> mlir::createConvertParallelLoopsToOpenMPPass() {
+  return std::make_unique<ConvertParallelLoopsToOpenMPPass>();
+}
@@ -0,0 +1,68 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------ SessionMemoryPools.cpp - Keep memory pools across calls -------===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// The memory pools created by the EnableMemoryPool and BundleMemoryPools
+// passes are allocated and freed on every invocation of the model. This pass
+// marks such memory pools so that they are lowered to runtime calls which
+// hand out an arena that is kept alive across invocations. The runtime keeps
+// one arena per calling thread, so concurrent callers never share an arena.
+//
+//===----------------------------------------------------------------------===//
+
+#include "mlir/Dialect/StandardOps/IR/Ops.h"
+#include "mlir/Pass/Pass.h"
+
+#include "src/Dialect/Krnl/KrnlOps.hpp"
+#include "src/Pass/Passes.hpp"
+
+using namespace mlir;
+
+namespace {
+
+/// Check if the alloc is a memory pool i.e. a 1-D i8 buffer whose only uses
+/// are krnl.getref operations and its own dealloc.
+bool isMemoryPool(AllocOp allocOp) {
+  auto memRefType = allocOp.getResult().getType().cast<MemRefType>();
+  if (memRefType.getRank() != 1 || !memRefType.getAffineMaps().empty() ||
+      !memRefType.getElementType().isInteger(8))
+    return false;
+
+  bool hasGetRef = false;
+  for (Operation *user : allocOp.getResult().getUsers()) {
+    if (llvm::isa<KrnlGetRefOp>(user))
+      hasGetRef = true;
+    else if (!llvm::isa<DeallocOp>(user))
+      return false;
+  }
+  return hasGetRef;
+}
+
+/*!
+ *  Function pass that marks memory pools as session memory pools.
+ */
+class KrnlSessionMemoryPoolsPass
+    : public PassWrapper<KrnlSessionMemoryPoolsPass, FunctionPass> {
+public:
+  void runOnFunction() override {
+    auto function = getFunction();
+    auto unitAttr = UnitAttr::get(&getContext());
+
+    function.walk([&](AllocOp allocOp) {
+      if (isMemoryPool(allocOp))
+        allocOp.getOperation()->setAttr(
+            KrnlOpsDialect::getSessionMemoryPoolAttrName(), unitAttr);
+    });
+  }
+};
+} // namespace
+
+std::unique_ptr<Pass> mlir::createKrnlSessionMemoryPoolsPass() {
+  return std::make_unique<KrnlSessionMemoryPoolsPass>();
+}
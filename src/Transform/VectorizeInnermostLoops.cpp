@@ -0,0 +1,603 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===---- VectorizeInnermostLoops.cpp - Vectorize innermost affine loops --===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This pass vectorizes the innermost affine.for loops produced by the lowering
+// of the Krnl loops, using vectors as wide as the vector registers of the
+// target cpu. A loop
+//
+//   affine.for %i = lb to ub {
+//     %a = affine.load %A[%j, %i]
+//     %b = affine.load %B[%j]
+//     %c = addf %a, %b
+//     affine.store %c, %C[%j, %i]
+//   }
+//
+// is split into a vector loop over the iterations which fill whole vectors
+// and a scalar loop over the remaining ones:
+//
+//   affine.for %i = lb to lb + (ub - lb) floordiv VL * VL step VL {
+//     %a = affine.vector_load %A[%j, %i]
+//     %b = affine.load %B[%j]
+//     %vb = vector.broadcast %b
+//     %c = addf %a, %vb
+//     affine.vector_store %c, %C[%j, %i]
+//   }
+//   affine.for %i = lb + (ub - lb) floordiv VL * VL to ub {
+//     ...
+//   }
+//
+// The loops vectorized are those whose iterations
+// - load and store the arrays either at the same element for all the
+//   iterations or at consecutive elements along the innermost dimension,
+// - compute with element-wise operations of the standard dialect, and
+// - store each array at the same elements they load from it, or, if the
+//   reductions option is set, accumulate into a single element with addf or
+//   mulf. Such reductions are computed in a vector of partial results carried
+//   by the vector loop, reduced after it. This reassociates the floating-point
+//   additions or multiplications, so the results may differ slightly from the
+//   ones of the sequential loop, like with fast-math reassociation.
+//
+//===----------------------------------------------------------------------===//
+
+#include "mlir/Analysis/LoopAnalysis.h"
+#include "mlir/Dialect/Affine/IR/AffineOps.h"
+#include "mlir/Dialect/StandardOps/IR/Ops.h"
+#include "mlir/Dialect/Vector/VectorOps.h"
+#include "mlir/IR/BlockAndValueMapping.h"
+#include "mlir/Interfaces/SideEffectInterfaces.h"
+#include "mlir/Pass/Pass.h"
+#include "llvm/ADT/MapVector.h"
+#include "llvm/ADT/StringSwitch.h"
+
+#include "src/Pass/Passes.hpp"
+
+using namespace mlir;
+
+namespace {
+
+/// Width in bits of the vector registers of the target cpu.
+int64_t getVectorRegisterWidth(StringRef mcpu) {
+  return llvm::StringSwitch<int64_t>(mcpu)
+      .Cases("z13", "z14", "z15", "arch11", "arch12", "arch13", 128)
+      .Cases("haswell", "broadwell", "skylake", "core-avx2", "znver1", "znver2",
+          256)
+      .Cases("skylake-avx512", "cascadelake", "cooperlake", "icelake-client",
+          "icelake-server", "tigerlake", 512)
+      .Default(128);
+}
+
+/// Access of a load or a store, with its map composed with the affine.apply
+/// operations computing its indices.
+struct LoopAccess {
+  Value memref;
+  AffineMap map;
+  SmallVector<Value, 4> operands;
+
+  bool operator==(const LoopAccess &other) const {
+    return memref == other.memref && map == other.map &&
+           operands == other.operands;
+  }
+};
+
+enum class AccessPattern {
+  // The same element is accessed by all the iterations.
+  Invariant,
+  // Consecutive elements along the innermost dimension are accessed by
+  // consecutive iterations.
+  Contiguous,
+  Other
+};
+
+template <typename AccessOp>
+LoopAccess getLoopAccess(AccessOp accessOp) {
+  LoopAccess access;
+  access.memref = accessOp.getMemRef();
+  access.map = accessOp.getAffineMap();
+  access.operands.assign(
+      accessOp.getMapOperands().begin(), accessOp.getMapOperands().end());
+  fullyComposeAffineMapAndOperands(&access.map, &access.operands);
+  canonicalizeMapAndOperands(&access.map, &access.operands);
+  return access;
+}
+
+AccessPattern getAccessPattern(const LoopAccess &access, AffineForOp loop) {
+  Value iv = loop.getInductionVar();
+  AffineMap map = access.map;
+  Optional<AffineExpr> ivExpr;
+  for (auto operand : llvm::enumerate(access.operands)) {
+    if (operand.value() == iv) {
+      unsigned pos = operand.index();
+      ivExpr =
+          pos < map.getNumDims()
+              ? getAffineDimExpr(pos, map.getContext())
+              : getAffineSymbolExpr(pos - map.getNumDims(), map.getContext());
+    } else if (!loop.isDefinedOutsideOfLoop(operand.value())) {
+      return AccessPattern::Other;
+    }
+  }
+  if (!ivExpr)
+    return AccessPattern::Invariant;
+
+  auto dependsOnIV = [&](AffineExpr expr) {
+    if (auto dim = ivExpr->dyn_cast<AffineDimExpr>())
+      return expr.isFunctionOfDim(dim.getPosition());
+    return expr.isFunctionOfSymbol(
+        ivExpr->cast<AffineSymbolExpr>().getPosition());
+  };
+  ArrayRef<AffineExpr> results = map.getResults();
+  if (results.empty() ||
+      llvm::any_of(results.drop_back(),
+          [&](AffineExpr expr) { return dependsOnIV(expr); }))
+    return AccessPattern::Other;
+  AffineExpr offset = simplifyAffineExpr(
+      results.back() - *ivExpr, map.getNumDims(), map.getNumSymbols());
+  return dependsOnIV(offset) ? AccessPattern::Other : AccessPattern::Contiguous;
+}
+
+/// Check if the operation computes element-wise and can be applied to vectors
+/// as is.
+bool isVectorizableOp(Operation *op) {
+  return isa<AddFOp, SubFOp, MulFOp, DivFOp, NegFOp, AbsFOp, CeilFOp, FloorFOp,
+      ExpOp, LogOp, SqrtOp, CmpFOp, SelectOp, AddIOp, SubIOp, MulIOp, AndOp,
+      OrOp, XOrOp, CmpIOp>(op);
+}
+
+bool isSideEffectFree(Operation *op) {
+  if (op->getNumRegions() != 0)
+    return false;
+  auto effectInterface = dyn_cast<MemoryEffectOpInterface>(op);
+  if (!effectInterface)
+    return false;
+  SmallVector<MemoryEffects::EffectInstance, 1> effects;
+  effectInterface.getEffects(effects);
+  return effects.empty();
+}
+
+/// A reduction into a single element of an array:
+///   %x = affine.load %A[...]
+///   %y = addf %x, %v
+///   affine.store %y, %A[...]
+struct Reduction {
+  AffineLoadOp loadOp;
+  Operation *combiner;
+  AffineStoreOp storeOp;
+  LoopAccess access;
+  // Vector of partial results, as computed so far in the vector loop body.
+  Value partialResults;
+};
+
+/// Vectorization of an innermost loop.
+class LoopVectorizer {
+public:
+  LoopVectorizer(
+      AffineForOp loop, int64_t registerWidth, bool vectorizeReductions)
+      : loop(loop), registerWidth(registerWidth),
+        vectorizeReductions(vectorizeReductions) {}
+
+  /// Check if the loop can be vectorized and compute the vector length.
+  bool analyze();
+
+  /// Emit the vector loop and turn the loop into the remainder loop.
+  void vectorize();
+
+private:
+  // How the values of the loop body are vectorized.
+  enum class ValueKind {
+    // Same value for all the iterations, kept as a scalar.
+    Uniform,
+    // Index depending on the induction variable, kept as a scalar computed
+    // for the first iteration of the vector.
+    Index,
+    // Vector of the values of consecutive iterations.
+    Vector,
+    // Element loaded by a reduction.
+    Reduction
+  };
+
+  void analyzeReductions();
+  bool analyzeDependences();
+  ValueKind getKind(Value value);
+  Value getVector(OpBuilder &builder, Value value);
+
+  AffineForOp loop;
+  AffineForOp vectorLoop;
+  int64_t registerWidth;
+  bool vectorizeReductions;
+  int64_t vectorLength = 0;
+  DenseMap<Value, ValueKind> kinds;
+  DenseMap<Operation *, AccessPattern> accessPatterns;
+  SmallVector<Reduction, 2> reductions;
+  BlockAndValueMapping scalarMapping;
+  DenseMap<Value, Value> vectorMapping;
+};
+
+LoopVectorizer::ValueKind LoopVectorizer::getKind(Value value) {
+  auto kind = kinds.find(value);
+  if (kind != kinds.end())
+    return kind->second;
+  return ValueKind::Uniform;
+}
+
+void LoopVectorizer::analyzeReductions() {
+  for (auto storeOp : loop.getBody()->getOps<AffineStoreOp>()) {
+    LoopAccess access = getLoopAccess(storeOp);
+    if (getAccessPattern(access, loop) != AccessPattern::Invariant)
+      continue;
+    Operation *combiner = storeOp.getValueToStore().getDefiningOp();
+    if (!combiner || !isa<AddFOp, MulFOp>(combiner) ||
+        combiner->getBlock() != loop.getBody() ||
+        !combiner->getResult(0).hasOneUse())
+      continue;
+    for (Value operand : combiner->getOperands()) {
+      auto loadOp = operand.getDefiningOp<AffineLoadOp>();
+      if (loadOp && loadOp.getOperation()->getBlock() == loop.getBody() &&
+          loadOp.getResult().hasOneUse() && getLoopAccess(loadOp) == access) {
+        reductions.push_back({loadOp, combiner, storeOp, access, Value()});
+        break;
+      }
+    }
+  }
+}
+
+bool LoopVectorizer::analyzeDependences() {
+  // The arrays stored into must be accessed at a single element by each
+  // iteration, so that the iterations of a vector are independent.
+  llvm::MapVector<Value, SmallVector<Operation *, 2>> accesses;
+  bool hasStore = false;
+  for (Operation &op : loop.getBody()->without_terminator()) {
+    if (auto loadOp = dyn_cast<AffineLoadOp>(op))
+      accesses[loadOp.getMemRef()].emplace_back(&op);
+    else if (auto storeOp = dyn_cast<AffineStoreOp>(op))
+      accesses[storeOp.getMemRef()].emplace_back(&op);
+  }
+  for (auto &memRefAndAccesses : accesses) {
+    auto &memRefAccesses = memRefAndAccesses.second;
+    if (llvm::none_of(memRefAccesses,
+            [](Operation *op) { return isa<AffineStoreOp>(op); }))
+      continue;
+    hasStore = true;
+    auto isReduced = [&](Operation *op) {
+      return llvm::any_of(reductions, [&](Reduction &reduction) {
+        return reduction.loadOp.getOperation() == op ||
+               reduction.storeOp.getOperation() == op;
+      });
+    };
+    if (isReduced(memRefAccesses.front())) {
+      if (memRefAccesses.size() != 2 || !isReduced(memRefAccesses.back()))
+        return false;
+      continue;
+    }
+    auto getAccess = [](Operation *op) {
+      if (auto loadOp = dyn_cast<AffineLoadOp>(op))
+        return getLoopAccess(loadOp);
+      return getLoopAccess(cast<AffineStoreOp>(op));
+    };
+    LoopAccess firstAccess = getAccess(memRefAccesses.front());
+    for (Operation *op : memRefAccesses)
+      if (accessPatterns[op] != AccessPattern::Contiguous ||
+          !(getAccess(op) == firstAccess))
+        return false;
+  }
+  return hasStore;
+}
+
+bool LoopVectorizer::analyze() {
+  if (loop.getStep() != 1 || loop.getNumResults() != 0 ||
+      loop.getLowerBoundMap().getNumResults() != 1 ||
+      loop.getUpperBoundMap().getNumResults() != 1)
+    return false;
+
+  if (vectorizeReductions)
+    analyzeReductions();
+  auto getReduction = [&](Operation *op) -> Reduction * {
+    for (Reduction &reduction : reductions)
+      if (reduction.loadOp.getOperation() == op || reduction.combiner == op ||
+          reduction.storeOp.getOperation() == op)
+        return &reduction;
+    return nullptr;
+  };
+
+  kinds[loop.getInductionVar()] = ValueKind::Index;
+  unsigned maxBitWidth = 0;
+  auto addVectorType = [&](Type type) {
+    if (!type.isIntOrFloat())
+      return false;
+    if (!type.isInteger(1))
+      maxBitWidth = std::max(maxBitWidth, type.getIntOrFloatBitWidth());
+    return true;
+  };
+
+  for (Operation &op : loop.getBody()->without_terminator()) {
+    if (auto loadOp = dyn_cast<AffineLoadOp>(op)) {
+      AccessPattern pattern = getAccessPattern(getLoopAccess(loadOp), loop);
+      accessPatterns[&op] = pattern;
+      if (getReduction(&op)) {
+        kinds[loadOp.getResult()] = ValueKind::Reduction;
+        continue;
+      }
+      if (pattern == AccessPattern::Other)
+        return false;
+      if (pattern == AccessPattern::Contiguous) {
+        if (!addVectorType(loadOp.getType()))
+          return false;
+        kinds[loadOp.getResult()] = ValueKind::Vector;
+      }
+      continue;
+    }
+
+    if (auto storeOp = dyn_cast<AffineStoreOp>(op)) {
+      AccessPattern pattern = getAccessPattern(getLoopAccess(storeOp), loop);
+      accessPatterns[&op] = pattern;
+      if (getReduction(&op))
+        continue;
+      if (pattern != AccessPattern::Contiguous ||
+          !addVectorType(storeOp.getValueToStore().getType()) ||
+          getKind(storeOp.getValueToStore()) == ValueKind::Index)
+        return false;
+      continue;
+    }
+
+    bool hasIndexOperand = false, hasVectorOperand = false;
+    for (Value operand : op.getOperands()) {
+      ValueKind kind = getKind(operand);
+      hasIndexOperand |= kind == ValueKind::Index;
+      hasVectorOperand |=
+          kind == ValueKind::Vector || kind == ValueKind::Reduction;
+      if (kind == ValueKind::Reduction && !getReduction(&op))
+        return false;
+    }
+
+    if (isa<AffineApplyOp>(op)) {
+      if (hasVectorOperand)
+        return false;
+      if (hasIndexOperand)
+        kinds[op.getResult(0)] = ValueKind::Index;
+      continue;
+    }
+    if (hasIndexOperand)
+      return false;
+    if (getReduction(&op)) {
+      if (!addVectorType(op.getResult(0).getType()))
+        return false;
+      continue;
+    }
+    if (!isSideEffectFree(&op))
+      return false;
+    if (!hasVectorOperand)
+      continue;
+    if (!isVectorizableOp(&op))
+      return false;
+    for (Value result : op.getResults()) {
+      if (!addVectorType(result.getType()))
+        return false;
+      kinds[result] = ValueKind::Vector;
+    }
+  }
+
+  if (!analyzeDependences() || maxBitWidth == 0)
+    return false;
+  vectorLength = registerWidth / maxBitWidth;
+  if (vectorLength < 2)
+    return false;
+  Optional<uint64_t> tripCount = getConstantTripCount(loop);
+  return !tripCount || *tripCount >= (uint64_t)vectorLength;
+}
+
+Value LoopVectorizer::getVector(OpBuilder &builder, Value value) {
+  auto vector = vectorMapping.find(value);
+  if (vector != vectorMapping.end())
+    return vector->second;
+  // Broadcast uniform values, before the vector loop if possible.
+  OpBuilder::InsertionGuard guard(builder);
+  Value scalar = scalarMapping.lookupOrDefault(value);
+  if (loop.isDefinedOutsideOfLoop(value))
+    builder.setInsertionPoint(vectorLoop);
+  Value broadcast = builder.create<vector::BroadcastOp>(
+      value.getLoc(), VectorType::get({vectorLength}, value.getType()), scalar);
+  vectorMapping[value] = broadcast;
+  return broadcast;
+}
+
+void LoopVectorizer::vectorize() {
+  Location loc = loop.getLoc();
+  OpBuilder builder(loop);
+
+  // Upper bound of the vector loop: lb + (ub - lb) floordiv VL * VL.
+  AffineMap lbMap = loop.getLowerBoundMap();
+  AffineMap ubMap = loop.getUpperBoundMap();
+  auto lbOperands = loop.getLowerBoundOperands();
+  auto ubOperands = loop.getUpperBoundOperands();
+  unsigned numLbDims = lbMap.getNumDims(), numLbSymbols = lbMap.getNumSymbols();
+  unsigned numUbDims = ubMap.getNumDims(), numUbSymbols = ubMap.getNumSymbols();
+  SmallVector<AffineExpr, 4> dimReplacements, symbolReplacements;
+  for (unsigned i = 0; i < numUbDims; ++i)
+    dimReplacements.emplace_back(builder.getAffineDimExpr(numLbDims + i));
+  for (unsigned i = 0; i < numUbSymbols; ++i)
+    symbolReplacements.emplace_back(
+        builder.getAffineSymbolExpr(numLbSymbols + i));
+  AffineExpr lb = lbMap.getResult(0);
+  AffineExpr ub = ubMap.getResult(0).replaceDimsAndSymbols(
+      dimReplacements, symbolReplacements);
+  AffineMap vectorUbMap =
+      AffineMap::get(numLbDims + numUbDims, numLbSymbols + numUbSymbols,
+          lb + (ub - lb).floorDiv(vectorLength) * vectorLength);
+  SmallVector<Value, 8> vectorUbOperands;
+  vectorUbOperands.append(lbOperands.begin(), lbOperands.begin() + numLbDims);
+  vectorUbOperands.append(ubOperands.begin(), ubOperands.begin() + numUbDims);
+  vectorUbOperands.append(lbOperands.begin() + numLbDims, lbOperands.end());
+  vectorUbOperands.append(ubOperands.begin() + numUbDims, ubOperands.end());
+  canonicalizeMapAndOperands(&vectorUbMap, &vectorUbOperands);
+
+  // The partial results of the reductions are carried by the vector loop,
+  // starting from the identity of the combiner.
+  SmallVector<Value, 2> inits;
+  for (Reduction &reduction : reductions) {
+    Type elementType = reduction.combiner->getResult(0).getType();
+    auto vectorType = VectorType::get({vectorLength}, elementType);
+    double identity = isa<AddFOp>(reduction.combiner) ? 0.0 : 1.0;
+    inits.emplace_back(builder.create<ConstantOp>(loc, vectorType,
+        DenseElementsAttr::get(
+            vectorType, builder.getFloatAttr(elementType, identity))));
+  }
+
+  vectorLoop = builder.create<AffineForOp>(loc, lbOperands, lbMap,
+      vectorUbOperands, vectorUbMap, vectorLength, inits);
+  scalarMapping.map(loop.getInductionVar(), vectorLoop.getInductionVar());
+  for (auto reduction : llvm::zip(reductions, vectorLoop.getRegionIterArgs()))
+    std::get<0>(reduction).partialResults = std::get<1>(reduction);
+  // The body of a loop carrying values is created without its terminator.
+  Block *body = vectorLoop.getBody();
+  OpBuilder bodyBuilder = inits.empty() ? OpBuilder::atBlockTerminator(body)
+                                        : OpBuilder::atBlockEnd(body);
+  for (Operation &op : loop.getBody()->without_terminator()) {
+    auto reduction = llvm::find_if(reductions,
+        [&](Reduction &reduction) { return reduction.combiner == &op; });
+    if (reduction != reductions.end()) {
+      Value value = op.getOperand(0) == reduction->loadOp.getResult()
+                        ? op.getOperand(1)
+                        : op.getOperand(0);
+      OperationState state(op.getLoc(), op.getName());
+      state.addOperands(
+          {reduction->partialResults, getVector(bodyBuilder, value)});
+      state.addTypes(reduction->partialResults.getType());
+      state.addAttributes(op.getAttrs());
+      reduction->partialResults =
+          bodyBuilder.createOperation(state)->getResult(0);
+      continue;
+    }
+    if (llvm::any_of(reductions, [&](Reduction &reduction) {
+          return reduction.loadOp.getOperation() == &op ||
+                 reduction.storeOp.getOperation() == &op;
+        }))
+      continue;
+
+    if (auto loadOp = dyn_cast<AffineLoadOp>(op)) {
+      if (accessPatterns[&op] == AccessPattern::Contiguous) {
+        SmallVector<Value, 4> indices;
+        for (Value operand : loadOp.getMapOperands())
+          indices.emplace_back(scalarMapping.lookupOrDefault(operand));
+        vectorMapping[loadOp.getResult()] =
+            bodyBuilder.create<AffineVectorLoadOp>(loadOp.getLoc(),
+                VectorType::get({vectorLength}, loadOp.getType()),
+                loadOp.getMemRef(), loadOp.getAffineMap(), indices);
+        continue;
+      }
+    } else if (auto storeOp = dyn_cast<AffineStoreOp>(op)) {
+      SmallVector<Value, 4> indices;
+      for (Value operand : storeOp.getMapOperands())
+        indices.emplace_back(scalarMapping.lookupOrDefault(operand));
+      bodyBuilder.create<AffineVectorStoreOp>(storeOp.getLoc(),
+          getVector(bodyBuilder, storeOp.getValueToStore()),
+          storeOp.getMemRef(), storeOp.getAffineMap(), indices);
+      continue;
+    }
+
+    if (op.getNumResults() == 0 ||
+        getKind(op.getResult(0)) != ValueKind::Vector) {
+      bodyBuilder.clone(op, scalarMapping);
+      continue;
+    }
+    OperationState state(op.getLoc(), op.getName());
+    for (Value operand : op.getOperands())
+      state.addOperands(getVector(bodyBuilder, operand));
+    for (Type type : op.getResultTypes())
+      state.addTypes(VectorType::get({vectorLength}, type));
+    state.addAttributes(op.getAttrs());
+    Operation *vectorOp = bodyBuilder.createOperation(state);
+    for (auto results : llvm::zip(op.getResults(), vectorOp->getResults()))
+      vectorMapping[std::get<0>(results)] = std::get<1>(results);
+  }
+  if (!inits.empty()) {
+    SmallVector<Value, 2> yielded;
+    for (Reduction &reduction : reductions)
+      yielded.emplace_back(reduction.partialResults);
+    bodyBuilder.create<AffineYieldOp>(loc, yielded);
+  }
+
+  // Reduce the partial results into the reduced elements.
+  for (auto reductionAndResult :
+      llvm::zip(reductions, vectorLoop.getResults())) {
+    Reduction &reduction = std::get<0>(reductionAndResult);
+    Type elementType = reduction.combiner->getResult(0).getType();
+    Value partialResults = std::get<1>(reductionAndResult);
+    Value reduced = builder.create<vector::ReductionOp>(loc, elementType,
+        builder.getStringAttr(isa<AddFOp>(reduction.combiner) ? "add" : "mul"),
+        partialResults, ValueRange());
+    Value element = builder.create<AffineLoadOp>(loc, reduction.access.memref,
+        reduction.access.map, reduction.access.operands);
+    OperationState state(loc, reduction.combiner->getName());
+    state.addOperands({element, reduced});
+    state.addTypes(elementType);
+    Value result = builder.createOperation(state)->getResult(0);
+    builder.create<AffineStoreOp>(loc, result, reduction.access.memref,
+        reduction.access.map, reduction.access.operands);
+  }
+
+  // The loop now runs over the remaining iterations.
+  if (vectorUbMap.isSingleConstant() && ubMap.isSingleConstant() &&
+      vectorUbMap.getSingleConstantResult() ==
+          ubMap.getSingleConstantResult()) {
+    loop.erase();
+    return;
+  }
+  loop.setLowerBound(vectorUbOperands, vectorUbMap);
+}
+
+/*!
+ *  Function pass that vectorizes the innermost loops.
+ */
+class VectorizeInnermostLoopsPass
+    : public PassWrapper<VectorizeInnermostLoopsPass, FunctionPass> {
+public:
+  VectorizeInnermostLoopsPass() = default;
+  VectorizeInnermostLoopsPass(const VectorizeInnermostLoopsPass &pass)
+      : PassWrapper<VectorizeInnermostLoopsPass, FunctionPass>() {
+    mcpu = pass.mcpu.getValue();
+    reductions = pass.reductions.getValue();
+  }
+  VectorizeInnermostLoopsPass(std::string targetCpu, bool vectorizeReductions) {
+    mcpu = targetCpu;
+    reductions = vectorizeReductions;
+  }
+
+  void getDependentDialects(DialectRegistry &registry) const override {
+    registry.insert<vector::VectorDialect>();
+  }
+
+  void runOnFunction() override {
+    int64_t registerWidth = getVectorRegisterWidth(mcpu);
+
+    SmallVector<AffineForOp, 16> loops;
+    getFunction().walk([&](AffineForOp loop) {
+      if (loop.getBody()->getOps<AffineForOp>().empty())
+        loops.emplace_back(loop);
+    });
+    for (AffineForOp loop : loops) {
+      LoopVectorizer vectorizer(loop, registerWidth, reductions);
+      if (vectorizer.analyze())
+        vectorizer.vectorize();
+    }
+  }
+
+  Option<std::string> mcpu{*this, "mcpu",
+      llvm::cl::desc("Target cpu, used to select the vector length."),
+      llvm::cl::init("")};
+  Option<bool> reductions{*this, "reductions",
+      llvm::cl::desc("Also vectorize addf and mulf reductions, which "
+                     "reassociates them and may change the float results."),
+      llvm::cl::init(false)};
+};
+} // namespace
+
+std::unique_ptr<Pass> mlir::createVectorizeInnermostLoopsPass(
+    std::string mcpu, bool vectorizeReductions) {
+  return std::make_unique<VectorizeInnermostLoopsPass>(
+      mcpu, vectorizeReductions);
+}
@@ -52,12 +52,18 @@ int main(int argc, char *argv[]) {
   llvm::cl::ParseCommandLineOptions(
       argc, argv, "ONNX MLIR modular optimizer driver\n");
 
-  mlir::OwningModuleRef module;
-  processInputFile(inputFilename, emissionTarget, context, module);
-
   // Input file base name, replace path if required.
   if (outputBaseName == "")
     outputBaseName = inputFilename.substr(0, inputFilename.find_last_of("."));
 
-  return compileModule(module, context, outputBaseName, emissionTarget);
+  if (loadFromCompileCache(inputFilename, outputBaseName, emissionTarget))
+    return 0;
+
+  mlir::OwningModuleRef module;
+  processInputFile(inputFilename, emissionTarget, context, module);
+
+  int rc = compileModule(module, context, outputBaseName, emissionTarget);
+  if (rc == 0)
+    storeInCompileCache(inputFilename, outputBaseName, emissionTarget);
+  return rc;
 }
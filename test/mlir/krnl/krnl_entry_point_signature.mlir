@@ -0,0 +1,16 @@
+// RUN: onnx-mlir-opt --convert-krnl-to-affine --convert-krnl-to-llvm %s -split-input-file | FileCheck %s
+
+func @main_graph(%arg0: memref<10xf32>) -> memref<10xf32> {
+  return %arg0 : memref<10xf32>
+}
+"krnl.entry_point"() {func = @main_graph, numInputs = 1 : i32, numOutputs = 1 : i32, input_signature = "[{\22dims\22:[10],\22name\22:\22x\22,\22type\22:\22f32\22}]", output_signature = "[{\22dims\22:[10],\22name\22:\22y\22,\22type\22:\22f32\22}]"} : () -> ()
+
+// CHECK-DAG: llvm.mlir.global internal constant @_input_signature_main_graph("[{\22dims\22:[10],\22name\22:\22x\22,\22type\22:\22f32\22}]\00")
+// CHECK-DAG: llvm.mlir.global internal constant @_output_signature_main_graph("[{\22dims\22:[10],\22name\22:\22y\22,\22type\22:\22f32\22}]\00")
+
+// CHECK-LABEL: llvm.func @input_signature_main_graph() -> !llvm.ptr<i8>
+// CHECK: [[ADDR:%.+]] = llvm.mlir.addressof @_input_signature_main_graph : !llvm.ptr<array<40 x i8>>
+// CHECK: [[PTR:%.+]] = llvm.bitcast [[ADDR]] : !llvm.ptr<array<40 x i8>> to !llvm.ptr<i8>
+// CHECK: llvm.return [[PTR]] : !llvm.ptr<i8>
+
+// CHECK-LABEL: llvm.func @output_signature_main_graph() -> !llvm.ptr<i8>
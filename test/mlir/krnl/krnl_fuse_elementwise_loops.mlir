@@ -0,0 +1,153 @@
+// RUN: onnx-mlir-opt --fuse-elementwise-loops %s -split-input-file | FileCheck %s
+
+/// A chain of two element-wise operations.
+func @test_fuse_elementwise_chain(%arg0: memref<10x10xf32>) -> memref<10x10xf32> {
+  %0 = alloc() : memref<10x10xf32>
+  %1 = alloc() : memref<10x10xf32>
+  %2:2 = krnl.define_loops 2
+  krnl.parallel %2#0 : !krnl.loop
+  krnl.iterate(%2#0, %2#1) with (%2#0 -> %arg1 = 0 to 10, %2#1 -> %arg2 = 0 to 10) {
+    %4 = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+    %5 = exp %4 : f32
+    krnl.store %5, %1[%arg1, %arg2] : memref<10x10xf32>
+  }
+  %3:2 = krnl.define_loops 2
+  krnl.parallel %3#0 : !krnl.loop
+  krnl.iterate(%3#0, %3#1) with (%3#0 -> %arg1 = 0 to 10, %3#1 -> %arg2 = 0 to 10) {
+    %4 = krnl.load %1[%arg1, %arg2] : memref<10x10xf32>
+    %5 = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+    %6 = addf %4, %5 : f32
+    krnl.store %6, %0[%arg1, %arg2] : memref<10x10xf32>
+  }
+  dealloc %1 : memref<10x10xf32>
+  return %0 : memref<10x10xf32>
+
+  // CHECK-LABEL: test_fuse_elementwise_chain
+  // CHECK: [[RES:%.+]] = alloc() : memref<10x10xf32>
+  // CHECK-NOT: alloc
+  // CHECK: [[LOOPS:%.+]]:2 = krnl.define_loops 2
+  // CHECK: krnl.parallel [[LOOPS]]#0 : !krnl.loop
+  // CHECK: krnl.iterate([[LOOPS]]#0, [[LOOPS]]#1) with ([[LOOPS]]#0 -> %arg1 = 0 to 10, [[LOOPS]]#1 -> %arg2 = 0 to 10) {
+  // CHECK:   [[LOAD1:%.+]] = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+  // CHECK:   [[EXP:%.+]] = exp [[LOAD1]] : f32
+  // CHECK:   [[LOAD2:%.+]] = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+  // CHECK:   [[ADD:%.+]] = addf [[EXP]], [[LOAD2]] : f32
+  // CHECK:   krnl.store [[ADD]], [[RES]][%arg1, %arg2] : memref<10x10xf32>
+  // CHECK: }
+  // CHECK-NOT: dealloc
+  // CHECK: return [[RES]] : memref<10x10xf32>
+}
+
+// -----
+
+/// The result of the producer is broadcast by the consumer.
+func @test_fuse_elementwise_broadcast(%arg0: memref<10xf32>, %arg1: memref<5x10xf32>) -> memref<5x10xf32> {
+  %0 = alloc() : memref<5x10xf32>
+  %1 = alloc() : memref<10xf32>
+  %2 = krnl.define_loops 1
+  krnl.iterate(%2) with (%2 -> %arg2 = 0 to 10) {
+    %4 = krnl.load %arg0[%arg2] : memref<10xf32>
+    %5 = exp %4 : f32
+    krnl.store %5, %1[%arg2] : memref<10xf32>
+  }
+  %3:2 = krnl.define_loops 2
+  krnl.iterate(%3#0, %3#1) with (%3#0 -> %arg2 = 0 to 5, %3#1 -> %arg3 = 0 to 10) {
+    %4 = krnl.load %arg1[%arg2, %arg3] : memref<5x10xf32>
+    %5 = krnl.load %1[%arg3] : memref<10xf32>
+    %6 = mulf %4, %5 : f32
+    krnl.store %6, %0[%arg2, %arg3] : memref<5x10xf32>
+  }
+  dealloc %1 : memref<10xf32>
+  return %0 : memref<5x10xf32>
+
+  // CHECK-LABEL: test_fuse_elementwise_broadcast
+  // CHECK: [[RES:%.+]] = alloc() : memref<5x10xf32>
+  // CHECK-NOT: alloc
+  // CHECK: [[LOOPS:%.+]]:2 = krnl.define_loops 2
+  // CHECK: krnl.iterate([[LOOPS]]#0, [[LOOPS]]#1) with ([[LOOPS]]#0 -> %arg2 = 0 to 5, [[LOOPS]]#1 -> %arg3 = 0 to 10) {
+  // CHECK:   [[LOAD1:%.+]] = krnl.load %arg1[%arg2, %arg3] : memref<5x10xf32>
+  // CHECK:   [[LOAD2:%.+]] = krnl.load %arg0[%arg3] : memref<10xf32>
+  // CHECK:   [[EXP:%.+]] = exp [[LOAD2]] : f32
+  // CHECK:   [[MUL:%.+]] = mulf [[LOAD1]], [[EXP]] : f32
+  // CHECK:   krnl.store [[MUL]], [[RES]][%arg2, %arg3] : memref<5x10xf32>
+  // CHECK: }
+  // CHECK-NOT: dealloc
+  // CHECK: return [[RES]] : memref<5x10xf32>
+}
+
+// -----
+
+/// The result of the producer is used twice, it is not recomputed.
+func @test_fuse_elementwise_multiple_uses(%arg0: memref<10xf32>) -> memref<10xf32> {
+  %0 = alloc() : memref<10xf32>
+  %1 = alloc() : memref<10xf32>
+  %2 = krnl.define_loops 1
+  krnl.iterate(%2) with (%2 -> %arg1 = 0 to 10) {
+    %4 = krnl.load %arg0[%arg1] : memref<10xf32>
+    %5 = exp %4 : f32
+    krnl.store %5, %1[%arg1] : memref<10xf32>
+  }
+  %3 = krnl.define_loops 1
+  krnl.iterate(%3) with (%3 -> %arg1 = 0 to 10) {
+    %4 = krnl.load %1[%arg1] : memref<10xf32>
+    %5 = krnl.load %1[%arg1] : memref<10xf32>
+    %6 = mulf %4, %5 : f32
+    krnl.store %6, %0[%arg1] : memref<10xf32>
+  }
+  dealloc %1 : memref<10xf32>
+  return %0 : memref<10xf32>
+
+  // CHECK-LABEL: test_fuse_elementwise_multiple_uses
+  // CHECK: [[RES:%.+]] = alloc() : memref<10xf32>
+  // CHECK: [[EXP_RES:%.+]] = alloc() : memref<10xf32>
+  // CHECK: krnl.iterate
+  // CHECK:   krnl.store {{.*}}, [[EXP_RES]][%arg1] : memref<10xf32>
+  // CHECK: krnl.iterate
+  // CHECK:   krnl.store {{.*}}, [[RES]][%arg1] : memref<10xf32>
+  // CHECK: dealloc [[EXP_RES]] : memref<10xf32>
+}
+
+// -----
+
+/// The input of the producer is overwritten before the consumer.
+func @test_fuse_elementwise_overwritten_input(%arg0: memref<10xf32>) -> memref<10xf32> {
+  %0 = alloc() : memref<10xf32>
+  %1 = alloc() : memref<10xf32>
+  %2 = alloc() : memref<10xf32>
+  %3 = krnl.define_loops 1
+  krnl.iterate(%3) with (%3 -> %arg1 = 0 to 10) {
+    %6 = krnl.load %arg0[%arg1] : memref<10xf32>
+    krnl.store %6, %2[%arg1] : memref<10xf32>
+  }
+  %4 = krnl.define_loops 1
+  krnl.iterate(%4) with (%4 -> %arg1 = 0 to 10) {
+    %6 = krnl.load %2[%arg1] : memref<10xf32>
+    %7 = exp %6 : f32
+    krnl.store %7, %1[%arg1] : memref<10xf32>
+  }
+  %cst = constant 0.0 : f32
+  %c0 = constant 0 : index
+  krnl.store %cst, %2[%c0] : memref<10xf32>
+  %5 = krnl.define_loops 1
+  krnl.iterate(%5) with (%5 -> %arg1 = 0 to 10) {
+    %6 = krnl.load %1[%arg1] : memref<10xf32>
+    %7 = krnl.load %2[%arg1] : memref<10xf32>
+    %8 = addf %6, %7 : f32
+    krnl.store %8, %0[%arg1] : memref<10xf32>
+  }
+  dealloc %1 : memref<10xf32>
+  dealloc %2 : memref<10xf32>
+  return %0 : memref<10xf32>
+
+  // CHECK-LABEL: test_fuse_elementwise_overwritten_input
+  // CHECK: [[RES:%.+]] = alloc() : memref<10xf32>
+  // CHECK: [[EXP_RES:%.+]] = alloc() : memref<10xf32>
+  // CHECK: [[COPY_RES:%.+]] = alloc() : memref<10xf32>
+  // CHECK: krnl.iterate
+  // CHECK:   krnl.store {{.*}}, [[COPY_RES]][%arg1] : memref<10xf32>
+  // CHECK: krnl.iterate
+  // CHECK:   krnl.store {{.*}}, [[EXP_RES]][%arg1] : memref<10xf32>
+  // CHECK: krnl.store {{.*}}, [[COPY_RES]]
+  // CHECK: krnl.iterate
+  // CHECK:   krnl.store {{.*}}, [[RES]][%arg1] : memref<10xf32>
+}
@@ -609,3 +609,117 @@ func @unknown_op_reuse(%arg0: memref<10x10xf32>, %arg1: memref<10x10xf32>) -> me
   // CHECK: "krnl.getref"([[MEMPOOL]], [[C400]]) : (memref<1200xi8>, i64) -> memref<10x10xf32>
   // CHECK: "krnl.getref"([[MEMPOOL]], [[C0]]) : (memref<1200xi8>, i64) -> memref<10x10xf32>
 }
+
+// -----
+
+/// 7. Test for MemRefs of different sizes which can share memory. The live range of %2 does
+/// not intersect with the live range of %4 so the two are placed at the same offset even though
+/// they do not have the same size, which reduces the memory usage from 640 to 440 bytes.
+func @different_sized_memrefs(%arg0: memref<10x10xf32>) -> memref<5x10xf32> {
+  %c0_i64 = constant 0 : i64
+  %c200_i64 = constant 200 : i64
+  %c240_i64 = constant 240 : i64
+  %0 = alloc() : memref<5x10xf32>
+  %1 = alloc() : memref<640xi8>
+  %2 = "krnl.getref"(%1, %c240_i64) : (memref<640xi8>, i64) -> memref<10x10xf32>
+  %3 = "krnl.getref"(%1, %c200_i64) : (memref<640xi8>, i64) -> memref<10xf32>
+  %4 = "krnl.getref"(%1, %c0_i64) : (memref<640xi8>, i64) -> memref<5x10xf32>
+  %5:2 = krnl.define_loops 2
+  krnl.iterate(%5#0, %5#1) with (%5#0 -> %arg1 = 0 to 10, %5#1 -> %arg2 = 0 to 10) {
+    %9 = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+    %10 = exp %9 : f32
+    krnl.store %10, %2[%arg1, %arg2] : memref<10x10xf32>
+  }
+  %6 = krnl.define_loops 1
+  krnl.iterate(%6) with (%6 -> %arg1 = 0 to 10) {
+    %9 = krnl.load %2[%arg1, %arg1] : memref<10x10xf32>
+    krnl.store %9, %3[%arg1] : memref<10xf32>
+  }
+  %7:2 = krnl.define_loops 2
+  krnl.iterate(%7#0, %7#1) with (%7#0 -> %arg1 = 0 to 5, %7#1 -> %arg2 = 0 to 10) {
+    %9 = krnl.load %3[%arg2] : memref<10xf32>
+    krnl.store %9, %4[%arg1, %arg2] : memref<5x10xf32>
+  }
+  %8:2 = krnl.define_loops 2
+  krnl.iterate(%8#0, %8#1) with (%8#0 -> %arg1 = 0 to 5, %8#1 -> %arg2 = 0 to 10) {
+    %9 = krnl.load %4[%arg1, %arg2] : memref<5x10xf32>
+    %10 = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+    %11 = addf %9, %10 : f32
+    krnl.store %11, %0[%arg1, %arg2] : memref<5x10xf32>
+  }
+  dealloc %1 : memref<640xi8>
+  return %0 : memref<5x10xf32>
+
+  // CHECK-LABEL: different_sized_memrefs
+  // CHECK: [[C0:%.+]] = constant 0 : i64
+  // CHECK: [[C400:%.+]] = constant 400 : i64
+  // CHECK: [[MEMPOOL:%.+]] = alloc() : memref<440xi8>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[C0]]) : (memref<440xi8>, i64) -> memref<10x10xf32>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[C400]]) : (memref<440xi8>, i64) -> memref<10xf32>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[C0]]) : (memref<440xi8>, i64) -> memref<5x10xf32>
+}
+
+// -----
+
+/// 8. Test for a dynamic memory pool. The sizes of %11 and %13 are computed in the same way and
+/// their live ranges do not intersect so they share the same slot. The size of the memory pool
+/// is re-emitted for two slots instead of three.
+func @dynamic_slot_reuse(%arg0: memref<?x10xf32>) -> memref<?x10xf32> {
+  %c0 = constant 0 : index
+  %c40 = constant 40 : index
+  %c0_i64 = constant 0 : i64
+  %0 = dim %arg0, %c0 : memref<?x10xf32>
+  %1 = muli %0, %c40 : index
+  %2 = dim %arg0, %c0 : memref<?x10xf32>
+  %3 = muli %2, %c40 : index
+  %4 = addi %1, %3 : index
+  %5 = index_cast %1 : index to i64
+  %6 = dim %arg0, %c0 : memref<?x10xf32>
+  %7 = muli %6, %c40 : index
+  %8 = addi %4, %7 : index
+  %9 = index_cast %4 : index to i64
+  %10 = alloc(%8) : memref<?xi8>
+  %11 = "krnl.getref"(%10, %c0_i64, %0) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+  %12 = "krnl.getref"(%10, %5, %2) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+  %13 = "krnl.getref"(%10, %9, %6) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+  %14 = alloc(%0) : memref<?x10xf32>
+  %15:2 = krnl.define_loops 2
+  krnl.iterate(%15#0, %15#1) with (%15#0 -> %arg1 = 0 to %0, %15#1 -> %arg2 = 0 to 10) {
+    %19 = krnl.load %arg0[%arg1, %arg2] : memref<?x10xf32>
+    %20 = exp %19 : f32
+    krnl.store %20, %11[%arg1, %arg2] : memref<?x10xf32>
+  }
+  %16:2 = krnl.define_loops 2
+  krnl.iterate(%16#0, %16#1) with (%16#0 -> %arg1 = 0 to %0, %16#1 -> %arg2 = 0 to 10) {
+    %19 = krnl.load %11[%arg1, %arg2] : memref<?x10xf32>
+    %20 = krnl.load %arg0[%arg1, %arg2] : memref<?x10xf32>
+    %21 = addf %19, %20 : f32
+    krnl.store %21, %12[%arg1, %arg2] : memref<?x10xf32>
+  }
+  %17:2 = krnl.define_loops 2
+  krnl.iterate(%17#0, %17#1) with (%17#0 -> %arg1 = 0 to %0, %17#1 -> %arg2 = 0 to 10) {
+    %19 = krnl.load %12[%arg1, %arg2] : memref<?x10xf32>
+    %20 = krnl.load %arg0[%arg1, %arg2] : memref<?x10xf32>
+    %21 = mulf %19, %20 : f32
+    krnl.store %21, %13[%arg1, %arg2] : memref<?x10xf32>
+  }
+  %18:2 = krnl.define_loops 2
+  krnl.iterate(%18#0, %18#1) with (%18#0 -> %arg1 = 0 to %0, %18#1 -> %arg2 = 0 to 10) {
+    %19 = krnl.load %13[%arg1, %arg2] : memref<?x10xf32>
+    %20 = krnl.load %arg0[%arg1, %arg2] : memref<?x10xf32>
+    %21 = addf %19, %20 : f32
+    krnl.store %21, %14[%arg1, %arg2] : memref<?x10xf32>
+  }
+  dealloc %10 : memref<?xi8>
+  return %14 : memref<?x10xf32>
+
+  // CHECK-LABEL: dynamic_slot_reuse
+  // CHECK: [[C0_I64:%.+]] = constant 0 : i64
+  // CHECK: [[OFFSET:%.+]] = index_cast [[SLOT_SIZE:%.+]] : index to i64
+  // CHECK: [[SIZE:%.+]] = addi [[SLOT_SIZE]], {{.*}} : index
+  // CHECK-NOT: addi
+  // CHECK: [[MEMPOOL:%.+]] = alloc([[SIZE]]) : memref<?xi8>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[C0_I64]], {{.*}}) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[OFFSET]], {{.*}}) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+  // CHECK: "krnl.getref"([[MEMPOOL]], [[C0_I64]], {{.*}}) : (memref<?xi8>, i64, index) -> memref<?x10xf32>
+}
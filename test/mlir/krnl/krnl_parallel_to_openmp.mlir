@@ -0,0 +1,36 @@
+// RUN: onnx-mlir-opt --lower-affine --convert-parallel-loops-to-openmp %s -split-input-file | FileCheck %s
+
+func @parallel_loop(%arg0 : memref<10x20xf32>) {
+  affine.parallel (%i) = (0) to (10) {
+    affine.for %j = 0 to 20 {
+      %cst = constant 1.0 : f32
+      affine.store %cst, %arg0[%i, %j] : memref<10x20xf32>
+    }
+  }
+  return
+
+  // CHECK-LABEL: func @parallel_loop
+  // CHECK-DAG: [[LB:%.+]] = constant 0 : index
+  // CHECK-DAG: [[UB:%.+]] = constant 10 : index
+  // CHECK-DAG: [[STEP:%.+]] = constant 1 : index
+  // CHECK-DAG: [[ZERO:%.+]] = constant 0 : i32
+  // CHECK: [[SETTING:%.+]] = call @omGetNumThreads() : () -> i32
+  // CHECK: [[DEFAULT:%.+]] = call @omp_get_max_threads() : () -> i32
+  // CHECK: [[IS_SET:%.+]] = cmpi "sgt", [[SETTING]], [[ZERO]] : i32
+  // CHECK: [[NUM_THREADS:%.+]] = select [[IS_SET]], [[SETTING]], [[DEFAULT]] : i32
+  // CHECK: omp.parallel num_threads([[NUM_THREADS]] : i32) {
+  // CHECK:   [[TID_I32:%.+]] = call @omp_get_thread_num() : () -> i32
+  // CHECK:   [[TID:%.+]] = index_cast [[TID_I32]] : i32 to index
+  // CHECK:   [[NTH_I32:%.+]] = call @omp_get_num_threads() : () -> i32
+  // CHECK:   [[NTH:%.+]] = index_cast [[NTH_I32]] : i32 to index
+  // CHECK:   [[BEGIN:%.+]] = addi [[LB]], {{.*}} : index
+  // CHECK:   [[END:%.+]] = select {{.*}}, [[UB]], {{.*}} : index
+  // CHECK:   scf.parallel ([[I:%.+]]) = ([[BEGIN]]) to ([[END]]) step ([[STEP]]) {
+  // CHECK:     scf.for [[J:%.+]] = {{.*}} {
+  // CHECK:       store {{.*}}, %arg0{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>
+  // CHECK:   omp.terminator
+  // CHECK: func private @omGetNumThreads() -> i32
+  // CHECK: func private @omp_get_max_threads() -> i32
+  // CHECK: func private @omp_get_thread_num() -> i32
+  // CHECK: func private @omp_get_num_threads() -> i32
+}
@@ -0,0 +1,67 @@
+// RUN: onnx-mlir-opt --session-memory-pools %s -split-input-file | FileCheck %s
+// RUN: onnx-mlir-opt --session-memory-pools --convert-krnl-to-affine --convert-krnl-to-llvm %s -split-input-file | FileCheck %s --check-prefix=LLVM
+
+func @test_session_memory_pool(%arg0: memref<10x10xf32>) -> memref<10x10xf32> {
+  %c0_i64 = constant 0 : i64
+  %0 = alloc() : memref<10x10xf32>
+  %1 = alloc() {alignment = 4096 : i64} : memref<400xi8>
+  %2 = "krnl.getref"(%1, %c0_i64) : (memref<400xi8>, i64) -> memref<10x10xf32>
+  %3:2 = krnl.define_loops 2
+  krnl.iterate(%3#0, %3#1) with (%3#0 -> %arg1 = 0 to 10, %3#1 -> %arg2 = 0 to 10) {
+    %4 = krnl.load %arg0[%arg1, %arg2] : memref<10x10xf32>
+    %5 = addf %4, %4 : f32
+    krnl.store %5, %2[%arg1, %arg2] : memref<10x10xf32>
+    %6 = krnl.load %2[%arg1, %arg2] : memref<10x10xf32>
+    krnl.store %6, %0[%arg1, %arg2] : memref<10x10xf32>
+  }
+  dealloc %1 : memref<400xi8>
+  return %0 : memref<10x10xf32>
+
+  // CHECK-LABEL: test_session_memory_pool
+  // CHECK: [[RES:%.+]] = alloc() : memref<10x10xf32>
+  // CHECK: [[MEMPOOL:%.+]] = alloc() {alignment = 4096 : i64, krnl.session_pool} : memref<400xi8>
+  // CHECK: dealloc [[MEMPOOL]] : memref<400xi8>
+  // CHECK: return [[RES]] : memref<10x10xf32>
+
+  // LLVM-LABEL: test_session_memory_pool
+  // LLVM: llvm.call @malloc
+  // LLVM: [[SIZE:%.+]] = llvm.mlir.constant(400 : index) : i64
+  // LLVM: [[ALIGNMENT:%.+]] = llvm.mlir.constant(4096 : index) : i64
+  // LLVM: [[MEMPOOL:%.+]] = llvm.call @omMemoryPoolAcquire([[SIZE]], [[ALIGNMENT]]) : (i64, i64) -> !llvm.ptr<i8>
+  // LLVM: [[POOL:%.+]] = llvm.extractvalue {{.*}}[0] : !llvm.struct<(ptr<i8>, ptr<i8>, i64, array<1 x i64>, array<1 x i64>)>
+  // LLVM: [[POOL_SIZE:%.+]] = llvm.extractvalue {{.*}}[3, 0] : !llvm.struct<(ptr<i8>, ptr<i8>, i64, array<1 x i64>, array<1 x i64>)>
+  // LLVM: llvm.call @omMemoryPoolRelease([[POOL]], [[POOL_SIZE]]) : (!llvm.ptr<i8>, i64) -> ()
+  // LLVM-NOT: llvm.call @free
+}
+
+// -----
+
+func @test_session_memory_pool_dynamic(%arg0: memref<?xf32>) -> memref<?xf32> {
+  %c0 = constant 0 : index
+  %c0_i64 = constant 0 : i64
+  %c4 = constant 4 : index
+  %d0 = dim %arg0, %c0 : memref<?xf32>
+  %size = muli %d0, %c4 : index
+  %0 = alloc(%d0) : memref<?xf32>
+  %1 = alloc(%size) : memref<?xi8>
+  %2 = "krnl.getref"(%1, %c0_i64, %d0) : (memref<?xi8>, i64, index) -> memref<?xf32>
+  %3 = krnl.define_loops 1
+  krnl.iterate(%3) with (%3 -> %arg1 = 0 to %d0) {
+    %4 = krnl.load %arg0[%arg1] : memref<?xf32>
+    krnl.store %4, %2[%arg1] : memref<?xf32>
+    %5 = krnl.load %2[%arg1] : memref<?xf32>
+    krnl.store %5, %0[%arg1] : memref<?xf32>
+  }
+  dealloc %1 : memref<?xi8>
+  return %0 : memref<?xf32>
+
+  // CHECK-LABEL: test_session_memory_pool_dynamic
+  // CHECK: [[RES:%.+]] = alloc({{.*}}) : memref<?xf32>
+  // CHECK: [[MEMPOOL:%.+]] = alloc({{.*}}) {krnl.session_pool} : memref<?xi8>
+  // CHECK: dealloc [[MEMPOOL]] : memref<?xi8>
+
+  // LLVM-LABEL: test_session_memory_pool_dynamic
+  // LLVM: [[ALIGNMENT:%.+]] = llvm.mlir.constant(16 : index) : i64
+  // LLVM: llvm.call @omMemoryPoolAcquire({{.*}}, [[ALIGNMENT]]) : (i64, i64) -> !llvm.ptr<i8>
+  // LLVM: llvm.call @omMemoryPoolRelease
+}
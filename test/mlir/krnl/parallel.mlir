@@ -0,0 +1,39 @@
+// RUN: onnx-mlir-opt --convert-krnl-to-affine %s -split-input-file | FileCheck %s
+
+func @simple_parallel(%arg0 : memref<10x20xf32>) {
+  %ii, %jj = krnl.define_loops 2
+  krnl.parallel %ii : !krnl.loop
+  krnl.iterate(%ii, %jj) with (%ii -> %i = 0 to 10, %jj -> %j = 0 to 20) {
+    %cst = constant 1.0 : f32
+    krnl.store %cst, %arg0[%i, %j] : memref<10x20xf32>
+  }
+  return
+
+  // CHECK-LABEL: simple_parallel
+  // CHECK-NEXT: affine.parallel ([[I:%.+]]) = (0) to (10) {
+  // CHECK-NEXT:   affine.for [[J:%.+]] = 0 to 20 {
+  // CHECK-NEXT:     [[CST:%.+]] = constant 1.000000e+00 : f32
+  // CHECK-NEXT:     affine.store [[CST]], %arg0{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>
+  // CHECK-NEXT:   }
+  // CHECK-NEXT: }
+  // CHECK-NEXT: return
+}
+
+// -----
+
+// A blocked loop has a non-unit step and is kept sequential.
+func @blocked_parallel(%arg0 : memref<10xf32>) {
+  %ii = krnl.define_loops 1
+  %ib, %il = krnl.block %ii 2 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  krnl.parallel %ib : !krnl.loop
+  krnl.iterate(%ib, %il) with (%ii -> %i = 0 to 10) {
+    %cst = constant 1.0 : f32
+    krnl.store %cst, %arg0[%i] : memref<10xf32>
+  }
+  return
+
+  // CHECK-LABEL: blocked_parallel
+  // CHECK-NOT: affine.parallel
+  // CHECK: affine.for [[IB:%.+]] = 0 to 10 step 2 {
+  // CHECK-NEXT: affine.for [[IL:%.+]] = #map{{.*}}([[IB]]) to #map{{.*}}([[IB]]) {
+}
@@ -0,0 +1,125 @@
+// RUN: onnx-mlir-opt --convert-krnl-to-affine --vectorize-innermost-loops %s -split-input-file | FileCheck %s
+// RUN: onnx-mlir-opt --convert-krnl-to-affine --vectorize-innermost-loops=mcpu=skylake-avx512 %s -split-input-file | FileCheck %s --check-prefix=AVX512
+// RUN: onnx-mlir-opt --convert-krnl-to-affine --vectorize-innermost-loops=reductions=true %s -split-input-file | FileCheck %s --check-prefix=REDUCE
+
+func @test_vectorize_elementwise(%arg0 : memref<10x20xf32>, %arg1 : memref<10xf32>, %arg2 : memref<10x20xf32>) {
+  %ii, %jj = krnl.define_loops 2
+  krnl.iterate(%ii, %jj) with (%ii -> %i = 0 to 10, %jj -> %j = 0 to 20) {
+    %0 = krnl.load %arg0[%i, %j] : memref<10x20xf32>
+    %1 = krnl.load %arg1[%i] : memref<10xf32>
+    %2 = addf %0, %1 : f32
+    krnl.store %2, %arg2[%i, %j] : memref<10x20xf32>
+  }
+  return
+
+  // CHECK-LABEL: test_vectorize_elementwise
+  // CHECK-NEXT: affine.for [[I:%.+]] = 0 to 10 {
+  // CHECK-NEXT:   affine.for [[J:%.+]] = 0 to 20 step 4 {
+  // CHECK-NEXT:     [[LOAD0:%.+]] = affine.vector_load %arg0{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>, vector<4xf32>
+  // CHECK-NEXT:     [[LOAD1:%.+]] = affine.load %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // CHECK-NEXT:     [[BROADCAST:%.+]] = vector.broadcast [[LOAD1]] : f32 to vector<4xf32>
+  // CHECK-NEXT:     [[ADD:%.+]] = addf [[LOAD0]], [[BROADCAST]] : vector<4xf32>
+  // CHECK-NEXT:     affine.vector_store [[ADD]], %arg2{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>, vector<4xf32>
+  // CHECK-NEXT:   }
+  // CHECK-NEXT: }
+  // CHECK-NEXT: return
+
+  // AVX512-LABEL: test_vectorize_elementwise
+  // AVX512-NEXT: affine.for [[I:%.+]] = 0 to 10 {
+  // AVX512-NEXT:   affine.for [[J:%.+]] = 0 to 16 step 16 {
+  // AVX512:          affine.vector_store {{.*}} : memref<10x20xf32>, vector<16xf32>
+  // AVX512-NEXT:   }
+  // AVX512-NEXT:   affine.for [[J:%.+]] = 16 to 20 {
+  // AVX512:          affine.store {{.*}} : memref<10x20xf32>
+  // AVX512-NEXT:   }
+  // AVX512-NEXT: }
+  // AVX512-NEXT: return
+}
+
+// -----
+
+func @test_vectorize_remainder(%arg0 : memref<10xf32>, %arg1 : memref<10xf32>) {
+  %ii = krnl.define_loops 1
+  krnl.iterate(%ii) with (%ii -> %i = 0 to 10) {
+    %0 = krnl.load %arg0[%i] : memref<10xf32>
+    %1 = exp %0 : f32
+    krnl.store %1, %arg1[%i] : memref<10xf32>
+  }
+  return
+
+  // CHECK-LABEL: test_vectorize_remainder
+  // CHECK-NEXT: affine.for [[I:%.+]] = 0 to 8 step 4 {
+  // CHECK-NEXT:   [[LOAD:%.+]] = affine.vector_load %arg0{{\[}}[[I]]{{\]}} : memref<10xf32>, vector<4xf32>
+  // CHECK-NEXT:   [[EXP:%.+]] = exp [[LOAD]] : vector<4xf32>
+  // CHECK-NEXT:   affine.vector_store [[EXP]], %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>, vector<4xf32>
+  // CHECK-NEXT: }
+  // CHECK-NEXT: affine.for [[I:%.+]] = 8 to 10 {
+  // CHECK-NEXT:   [[LOAD:%.+]] = affine.load %arg0{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // CHECK-NEXT:   [[EXP:%.+]] = exp [[LOAD]] : f32
+  // CHECK-NEXT:   affine.store [[EXP]], %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // CHECK-NEXT: }
+  // CHECK-NEXT: return
+
+  // AVX512-LABEL: test_vectorize_remainder
+  // AVX512-NEXT: affine.for [[I:%.+]] = 0 to 10 {
+  // AVX512-NEXT:   [[LOAD:%.+]] = affine.load %arg0{{\[}}[[I]]{{\]}} : memref<10xf32>
+}
+
+// -----
+
+func @test_vectorize_reduction(%arg0 : memref<10x20xf32>, %arg1 : memref<10xf32>) {
+  %ii, %jj = krnl.define_loops 2
+  krnl.iterate(%ii, %jj) with (%ii -> %i = 0 to 10, %jj -> %j = 0 to 20) {
+    %0 = krnl.load %arg1[%i] : memref<10xf32>
+    %1 = krnl.load %arg0[%i, %j] : memref<10x20xf32>
+    %2 = addf %0, %1 : f32
+    krnl.store %2, %arg1[%i] : memref<10xf32>
+  }
+  return
+
+  // Reductions are only vectorized on request, since this reassociates them.
+  // CHECK-LABEL: test_vectorize_reduction
+  // CHECK-NEXT: affine.for [[I:%.+]] = 0 to 10 {
+  // CHECK-NEXT:   affine.for [[J:%.+]] = 0 to 20 {
+  // CHECK-NEXT:     [[RES:%.+]] = affine.load %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // CHECK-NEXT:     [[LOAD:%.+]] = affine.load %arg0{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>
+  // CHECK-NEXT:     [[SUM:%.+]] = addf [[RES]], [[LOAD]] : f32
+  // CHECK-NEXT:     affine.store [[SUM]], %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // CHECK-NEXT:   }
+  // CHECK-NEXT: }
+  // CHECK-NEXT: return
+
+  // REDUCE-LABEL: test_vectorize_reduction
+  // REDUCE-NEXT: affine.for [[I:%.+]] = 0 to 10 {
+  // REDUCE-NEXT:   [[ZERO:%.+]] = constant dense<0.000000e+00> : vector<4xf32>
+  // REDUCE-NEXT:   [[PARTIAL:%.+]] = affine.for [[J:%.+]] = 0 to 20 step 4 iter_args([[ACC:%.+]] = [[ZERO]]) -> (vector<4xf32>) {
+  // REDUCE-NEXT:     [[LOAD:%.+]] = affine.vector_load %arg0{{\[}}[[I]], [[J]]{{\]}} : memref<10x20xf32>, vector<4xf32>
+  // REDUCE-NEXT:     [[ADD:%.+]] = addf [[ACC]], [[LOAD]] : vector<4xf32>
+  // REDUCE-NEXT:     affine.yield [[ADD]] : vector<4xf32>
+  // REDUCE-NEXT:   }
+  // REDUCE-NEXT:   [[REDUCED:%.+]] = vector.reduction "add", [[PARTIAL]] : vector<4xf32> into f32
+  // REDUCE-NEXT:   [[RES:%.+]] = affine.load %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // REDUCE-NEXT:   [[SUM:%.+]] = addf [[RES]], [[REDUCED]] : f32
+  // REDUCE-NEXT:   affine.store [[SUM]], %arg1{{\[}}[[I]]{{\]}} : memref<10xf32>
+  // REDUCE-NEXT: }
+  // REDUCE-NEXT: return
+}
+
+// -----
+
+/// Iterations writing and reading different elements of the same array are
+/// not vectorized.
+func @test_vectorize_dependence(%arg0 : memref<11xf32>) {
+  %ii = krnl.define_loops 1
+  krnl.iterate(%ii) with (%ii -> %i = 0 to 10) {
+    %0 = krnl.load %arg0[%i] : memref<11xf32>
+    %c1 = constant 1 : index
+    %1 = addi %i, %c1 : index
+    krnl.store %0, %arg0[%1] : memref<11xf32>
+  }
+  return
+
+  // CHECK-LABEL: test_vectorize_dependence
+  // CHECK-NEXT: affine.for
+  // CHECK-NOT: vector
+}
@@ -1,4 +1,5 @@
 // RUN: onnx-mlir-opt --shape-inference --constprop-onnx %s -split-input-file | FileCheck %s
+// RUN: onnx-mlir-opt --shape-inference --constprop-onnx=max-matmul-size=4 %s -split-input-file | FileCheck %s --check-prefix=LIMIT
 
 
 //===----------------------------------------------------------------------===//
@@ -111,6 +112,30 @@ func @test_broadcast_3(%arg0 : tensor<3x2xi32>) -> tensor<3x2xi32> {
   // CHECK-NEXT: [[ADD1:%.+]] = "onnx.Add"(%arg0, [[CONST1]]) : (tensor<3x2xi32>, tensor<3x2xi32>) -> tensor<3x2xi32>
 }
 
+/// check broadcast of a row of floats
+// -----
+// CHECK-LABEL: @test_broadcast_4() -> tensor<2x3xf32>
+func @test_broadcast_4() -> tensor<2x3xf32> {
+  %0 = "onnx.Constant"() {value = dense<[[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]> : tensor<2x3xf32>} : () -> tensor<2x3xf32>
+  %1 = "onnx.Constant"() {value = dense<[10.0, 20.0, 30.0]> : tensor<3xf32>} : () -> tensor<3xf32>
+  %2 = "onnx.Mul"(%0, %1) : (tensor<2x3xf32> , tensor<3xf32>) -> tensor<2x3xf32>
+  "std.return"(%2) : (tensor<2x3xf32>) -> ()
+  // CHECK-NEXT: [[CONST1:%.+]] = "onnx.Constant"() {value = dense<{{.}}[1.000000e+01, 4.000000e+01, 9.000000e+01], [4.000000e+01, 1.000000e+02, 1.800000e+02]]> : tensor<2x3xf32>} : () -> tensor<2x3xf32>
+  // CHECK-NEXT: return [[CONST1]] : tensor<2x3xf32>
+}
+
+/// check broadcast of splats
+// -----
+// CHECK-LABEL: @test_broadcast_5() -> tensor<3x2xf32>
+func @test_broadcast_5() -> tensor<3x2xf32> {
+  %0 = "onnx.Constant"() {value = dense<1.5> : tensor<3x2xf32>} : () -> tensor<3x2xf32>
+  %1 = "onnx.Constant"() {value = dense<2.0> : tensor<1xf32>} : () -> tensor<1xf32>
+  %2 = "onnx.Mul"(%0, %1) : (tensor<3x2xf32> , tensor<1xf32>) -> tensor<3x2xf32>
+  "std.return"(%2) : (tensor<3x2xf32>) -> ()
+  // CHECK-NEXT: [[CONST1:%.+]] = "onnx.Constant"() {value = dense<3.000000e+00> : tensor<3x2xf32>} : () -> tensor<3x2xf32>
+  // CHECK-NEXT: return [[CONST1]] : tensor<3x2xf32>
+}
+
 
 //===----------------------------------------------------------------------===//  
 /// MUL tests (same as add, so have only two).
@@ -257,6 +282,30 @@ func @test_sqrt() -> tensor<1x2xf32> {
   // CHECK-NOT: {{.*}} = "onnx.Sqrt"{{.*}}
 }
 
+// -----
+
+// COM: The buffer of a result of a single element is a splat.
+
+// CHECK-LABEL: @test_sqrt_single_element() -> tensor<1xf32>
+func @test_sqrt_single_element() -> tensor<1xf32> {
+  %0 = "onnx.Constant"() {value = dense<[4.0]> : tensor<1xf32>} : () -> tensor<1xf32>
+  %1 = "onnx.Sqrt"(%0) : (tensor<1xf32>) -> tensor<1xf32>
+  "std.return"(%1) : (tensor<1xf32>) -> ()
+  // CHECK: {{.*}} = "onnx.Constant"() {value = dense<2.000000e+00> : tensor<1xf32>} : () -> tensor<1xf32>
+  // CHECK-NOT: {{.*}} = "onnx.Sqrt"{{.*}}
+}
+
+// -----
+
+// CHECK-LABEL: @test_sqrt_scalar() -> tensor<f32>
+func @test_sqrt_scalar() -> tensor<f32> {
+  %0 = "onnx.Constant"() {value = dense<16.0> : tensor<f32>} : () -> tensor<f32>
+  %1 = "onnx.Sqrt"(%0) : (tensor<f32>) -> tensor<f32>
+  "std.return"(%1) : (tensor<f32>) -> ()
+  // CHECK: {{.*}} = "onnx.Constant"() {value = dense<4.000000e+00> : tensor<f32>} : () -> tensor<f32>
+  // CHECK-NOT: {{.*}} = "onnx.Sqrt"{{.*}}
+}
+
 //===----------------------------------------------------------------------===//
 /// Unsqueeze tests
 
@@ -312,3 +361,196 @@ func @test_split_axis_2(%arg0 : tensor<2x10xf32>) -> (tensor<2x5xf32>, tensor<2x
   // CHECK: {{.*}} = "onnx.Split"(%arg0) {axis = 1 : si64, split = [5, 5]} : (tensor<2x10xf32>) -> (tensor<2x5xf32>, tensor<2x5xf32>)
 }
 
+// -----
+
+// COM: The results of the split of a splat are splats.
+
+// CHECK-LABEL: @test_split_splat() -> (tensor<2x2xf32>, tensor<2x4xf32>) {
+func @test_split_splat() -> (tensor<2x2xf32>, tensor<2x4xf32>) {
+  %0 = "onnx.Constant"() {value = dense<1.5> : tensor<2x6xf32>} : () -> tensor<2x6xf32>
+  %1, %2 = "onnx.Split"(%0) { axis = 1 : si64, split = [2, 4]} : (tensor<2x6xf32>) -> (tensor<2x2xf32>, tensor<2x4xf32>)
+  "std.return"(%1, %2) : (tensor<2x2xf32>, tensor<2x4xf32>) -> ()
+
+  // CHECK: {{.*}} = "onnx.Constant"() {value = dense<1.500000e+00> : tensor<2x2xf32>} : () -> tensor<2x2xf32>
+  // CHECK: {{.*}} = "onnx.Constant"() {value = dense<1.500000e+00> : tensor<2x4xf32>} : () -> tensor<2x4xf32>
+  // CHECK-NOT: {{.*}} = "onnx.Split"{{.*}}
+}
+
+//===----------------------------------------------------------------------===//
+/// Reshape, Cast, Slice, Concat, Gather, MatMul and Gemm tests
+
+// -----
+
+// CHECK-LABEL: @test_reshape() -> tensor<3x2xi64>
+func @test_reshape() -> tensor<3x2xi64> {
+  %0 = "onnx.Constant"() {value = dense<[[1, 2, 3], [4, 5, 6]]> : tensor<2x3xi64>} : () -> tensor<2x3xi64>
+  %1 = "onnx.Constant"() {value = dense<[3, 2]> : tensor<2xi64>} : () -> tensor<2xi64>
+  %2 = "onnx.Reshape"(%0, %1) : (tensor<2x3xi64>, tensor<2xi64>) -> tensor<3x2xi64>
+  "std.return"(%2) : (tensor<3x2xi64>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}[1, 2], [3, 4], [5, 6]]> : tensor<3x2xi64>} : () -> tensor<3x2xi64>
+  // CHECK-NOT: "onnx.Reshape"
+  // CHECK: return [[CONST]] : tensor<3x2xi64>
+}
+
+// -----
+
+// CHECK-LABEL: @test_cast() -> tensor<3xi32>
+func @test_cast() -> tensor<3xi32> {
+  %0 = "onnx.Constant"() {value = dense<[1.5, -2.0, 0.0]> : tensor<3xf32>} : () -> tensor<3xf32>
+  %1 = "onnx.Cast"(%0) {to = i32} : (tensor<3xf32>) -> tensor<3xi32>
+  "std.return"(%1) : (tensor<3xi32>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<[1, -2, 0]> : tensor<3xi32>} : () -> tensor<3xi32>
+  // CHECK-NOT: "onnx.Cast"
+  // CHECK: return [[CONST]] : tensor<3xi32>
+}
+
+// -----
+
+// COM: Casts of NaN, of negative values to unsigned integers and of values out
+// COM: of the range of the integer type are undefined, they are not folded.
+
+// CHECK-LABEL: @test_cast_undefined() -> (tensor<2xi32>, tensor<2xui32>, tensor<2xi8>)
+func @test_cast_undefined() -> (tensor<2xi32>, tensor<2xui32>, tensor<2xi8>) {
+  %0 = "onnx.Constant"() {value = dense<0x7FC00000> : tensor<2xf32>} : () -> tensor<2xf32>
+  %1 = "onnx.Cast"(%0) {to = i32} : (tensor<2xf32>) -> tensor<2xi32>
+  %2 = "onnx.Constant"() {value = dense<[1.0, -1.0]> : tensor<2xf32>} : () -> tensor<2xf32>
+  %3 = "onnx.Cast"(%2) {to = ui32} : (tensor<2xf32>) -> tensor<2xui32>
+  %4 = "onnx.Constant"() {value = dense<[1.0, 300.0]> : tensor<2xf32>} : () -> tensor<2xf32>
+  %5 = "onnx.Cast"(%4) {to = i8} : (tensor<2xf32>) -> tensor<2xi8>
+  "std.return"(%1, %3, %5) : (tensor<2xi32>, tensor<2xui32>, tensor<2xi8>) -> ()
+
+  // CHECK: {{.*}} = "onnx.Cast"({{.*}}) {to = i32} : (tensor<2xf32>) -> tensor<2xi32>
+  // CHECK: {{.*}} = "onnx.Cast"({{.*}}) {to = ui32} : (tensor<2xf32>) -> tensor<2xui32>
+  // CHECK: {{.*}} = "onnx.Cast"({{.*}}) {to = i8} : (tensor<2xf32>) -> tensor<2xi8>
+}
+
+// -----
+
+// COM: Casts to a narrower floating point type of values out of its range or
+// COM: infinite are not folded.
+
+// CHECK-LABEL: @test_cast_narrower_float() -> (tensor<2xf32>, tensor<2xf32>, tensor<2xf32>)
+func @test_cast_narrower_float() -> (tensor<2xf32>, tensor<2xf32>, tensor<2xf32>) {
+  %0 = "onnx.Constant"() {value = dense<[1.0, 1.0e300]> : tensor<2xf64>} : () -> tensor<2xf64>
+  %1 = "onnx.Cast"(%0) {to = f32} : (tensor<2xf64>) -> tensor<2xf32>
+  %2 = "onnx.Constant"() {value = dense<[1.0, 0x7FF0000000000000]> : tensor<2xf64>} : () -> tensor<2xf64>
+  %3 = "onnx.Cast"(%2) {to = f32} : (tensor<2xf64>) -> tensor<2xf32>
+  %4 = "onnx.Constant"() {value = dense<[0.5, -2.0]> : tensor<2xf64>} : () -> tensor<2xf64>
+  %5 = "onnx.Cast"(%4) {to = f32} : (tensor<2xf64>) -> tensor<2xf32>
+  "std.return"(%1, %3, %5) : (tensor<2xf32>, tensor<2xf32>, tensor<2xf32>) -> ()
+
+  // CHECK: {{.*}} = "onnx.Cast"({{.*}}) {to = f32} : (tensor<2xf64>) -> tensor<2xf32>
+  // CHECK: {{.*}} = "onnx.Cast"({{.*}}) {to = f32} : (tensor<2xf64>) -> tensor<2xf32>
+  // CHECK: {{.*}} = "onnx.Constant"() {value = dense<[5.000000e-01, -2.000000e+00]> : tensor<2xf32>} : () -> tensor<2xf32>
+  // CHECK-NOT: "onnx.Cast"
+}
+
+// -----
+
+// CHECK-LABEL: @test_slice() -> tensor<2x2xi64>
+func @test_slice() -> tensor<2x2xi64> {
+  %0 = "onnx.Constant"() {value = dense<[[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]]> : tensor<3x4xi64>} : () -> tensor<3x4xi64>
+  %starts = "onnx.Constant"() {value = dense<[0, 1]> : tensor<2xi64>} : () -> tensor<2xi64>
+  %ends = "onnx.Constant"() {value = dense<[3, 4]> : tensor<2xi64>} : () -> tensor<2xi64>
+  %axes = "onnx.Constant"() {value = dense<[0, 1]> : tensor<2xi64>} : () -> tensor<2xi64>
+  %steps = "onnx.Constant"() {value = dense<[2, 2]> : tensor<2xi64>} : () -> tensor<2xi64>
+  %1 = "onnx.Slice"(%0, %starts, %ends, %axes, %steps) : (tensor<3x4xi64>, tensor<2xi64>, tensor<2xi64>, tensor<2xi64>, tensor<2xi64>) -> tensor<2x2xi64>
+  "std.return"(%1) : (tensor<2x2xi64>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}[1, 3], [9, 11]]> : tensor<2x2xi64>} : () -> tensor<2x2xi64>
+  // CHECK-NOT: "onnx.Slice"
+  // CHECK: return [[CONST]] : tensor<2x2xi64>
+}
+
+// -----
+
+// CHECK-LABEL: @test_slice_single_element() -> tensor<1xi64>
+func @test_slice_single_element() -> tensor<1xi64> {
+  %0 = "onnx.Constant"() {value = dense<[0, 1, 2, 3]> : tensor<4xi64>} : () -> tensor<4xi64>
+  %starts = "onnx.Constant"() {value = dense<[2]> : tensor<1xi64>} : () -> tensor<1xi64>
+  %ends = "onnx.Constant"() {value = dense<[3]> : tensor<1xi64>} : () -> tensor<1xi64>
+  %none = constant unit
+  %1 = "onnx.Slice"(%0, %starts, %ends, %none, %none) : (tensor<4xi64>, tensor<1xi64>, tensor<1xi64>, none, none) -> tensor<1xi64>
+  "std.return"(%1) : (tensor<1xi64>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<2> : tensor<1xi64>} : () -> tensor<1xi64>
+  // CHECK-NOT: "onnx.Slice"
+  // CHECK: return [[CONST]] : tensor<1xi64>
+}
+
+// -----
+
+// CHECK-LABEL: @test_concat() -> tensor<2x3xi64>
+func @test_concat() -> tensor<2x3xi64> {
+  %0 = "onnx.Constant"() {value = dense<[[1], [2]]> : tensor<2x1xi64>} : () -> tensor<2x1xi64>
+  %1 = "onnx.Constant"() {value = dense<[[3, 4], [5, 6]]> : tensor<2x2xi64>} : () -> tensor<2x2xi64>
+  %2 = "onnx.Concat"(%0, %1) {axis = 1 : si64} : (tensor<2x1xi64>, tensor<2x2xi64>) -> tensor<2x3xi64>
+  "std.return"(%2) : (tensor<2x3xi64>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}[1, 3, 4], [2, 5, 6]]> : tensor<2x3xi64>} : () -> tensor<2x3xi64>
+  // CHECK-NOT: "onnx.Concat"
+  // CHECK: return [[CONST]] : tensor<2x3xi64>
+}
+
+// -----
+
+// CHECK-LABEL: @test_gather() -> tensor<1x2x2xf32>
+func @test_gather() -> tensor<1x2x2xf32> {
+  %0 = "onnx.Constant"() {value = dense<[[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]> : tensor<3x2xf32>} : () -> tensor<3x2xf32>
+  %1 = "onnx.Constant"() {value = dense<[[0, -1]]> : tensor<1x2xi64>} : () -> tensor<1x2xi64>
+  %2 = "onnx.Gather"(%0, %1) {axis = 0 : si64} : (tensor<3x2xf32>, tensor<1x2xi64>) -> tensor<1x2x2xf32>
+  "std.return"(%2) : (tensor<1x2x2xf32>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}{{\[}}[1.000000e+00, 2.000000e+00], [5.000000e+00, 6.000000e+00]]]> : tensor<1x2x2xf32>} : () -> tensor<1x2x2xf32>
+  // CHECK-NOT: "onnx.Gather"
+  // CHECK: return [[CONST]] : tensor<1x2x2xf32>
+}
+
+// -----
+
+// CHECK-LABEL: @test_gather_scalar() -> tensor<f32>
+func @test_gather_scalar() -> tensor<f32> {
+  %0 = "onnx.Constant"() {value = dense<[1.0, 2.0, 3.0]> : tensor<3xf32>} : () -> tensor<3xf32>
+  %1 = "onnx.Constant"() {value = dense<2> : tensor<i64>} : () -> tensor<i64>
+  %2 = "onnx.Gather"(%0, %1) {axis = 0 : si64} : (tensor<3xf32>, tensor<i64>) -> tensor<f32>
+  "std.return"(%2) : (tensor<f32>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<3.000000e+00> : tensor<f32>} : () -> tensor<f32>
+  // CHECK-NOT: "onnx.Gather"
+  // CHECK: return [[CONST]] : tensor<f32>
+}
+
+// -----
+
+// CHECK-LABEL: @test_matmul() -> tensor<2x2xf32>
+// LIMIT-LABEL: @test_matmul() -> tensor<2x2xf32>
+func @test_matmul() -> tensor<2x2xf32> {
+  %0 = "onnx.Constant"() {value = dense<[[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]> : tensor<2x3xf32>} : () -> tensor<2x3xf32>
+  %1 = "onnx.Constant"() {value = dense<[[7.0, 8.0], [9.0, 10.0], [11.0, 12.0]]> : tensor<3x2xf32>} : () -> tensor<3x2xf32>
+  %2 = "onnx.MatMul"(%0, %1) : (tensor<2x3xf32>, tensor<3x2xf32>) -> tensor<2x2xf32>
+  "std.return"(%2) : (tensor<2x2xf32>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}[5.800000e+01, 6.400000e+01], [1.390000e+02, 1.540000e+02]]> : tensor<2x2xf32>} : () -> tensor<2x2xf32>
+  // CHECK-NOT: "onnx.MatMul"
+  // CHECK: return [[CONST]] : tensor<2x2xf32>
+
+  /// The product has 12 multiply-adds, above the limit.
+  // LIMIT: "onnx.MatMul"
+}
+
+// -----
+
+// CHECK-LABEL: @test_gemm() -> tensor<2x2xf32>
+func @test_gemm() -> tensor<2x2xf32> {
+  %0 = "onnx.Constant"() {value = dense<[[1.0, 4.0], [2.0, 5.0], [3.0, 6.0]]> : tensor<3x2xf32>} : () -> tensor<3x2xf32>
+  %1 = "onnx.Constant"() {value = dense<[[7.0, 9.0, 11.0], [8.0, 10.0, 12.0]]> : tensor<2x3xf32>} : () -> tensor<2x3xf32>
+  %2 = "onnx.Constant"() {value = dense<[1.0, 2.0]> : tensor<2xf32>} : () -> tensor<2xf32>
+  %3 = "onnx.Gemm"(%0, %1, %2) {alpha = 2.0 : f32, beta = 1.0 : f32, transA = 1 : si64, transB = 1 : si64} : (tensor<3x2xf32>, tensor<2x3xf32>, tensor<2xf32>) -> tensor<2x2xf32>
+  "std.return"(%3) : (tensor<2x2xf32>) -> ()
+
+  // CHECK: [[CONST:%.+]] = "onnx.Constant"() {value = dense<{{\[}}[1.170000e+02, 1.300000e+02], [2.790000e+02, 3.100000e+02]]> : tensor<2x2xf32>} : () -> tensor<2x2xf32>
+  // CHECK-NOT: "onnx.Gemm"
+  // CHECK: return [[CONST]] : tensor<2x2xf32>
+}
@@ -103,9 +103,12 @@ func @test_enable_memory_pool_3(%arg0: tensor<?x?xf32>, %arg1: tensor<?x10xf32>,
   // CHECK: [[DATA3:%.+]] = alloc([[DIM1]]) : memref<?x10xf32>
   // CHECK: krnl.define_loops 2
   // CHECK: krnl.iterate
-  // CHECK: krnl.define_loops 1
-  // CHECK: krnl.iterate
   // CHECK: krnl.store {{.*}}, [[DATA3]][%arg3, %arg4] : memref<?x10xf32>
+  // CHECK: krnl.define_loops 3
+  // CHECK: krnl.block
+  // CHECK: krnl.permute
+  // CHECK: krnl.iterate
+  // CHECK: krnl.store {{.*}}, [[DATA3]]
   // CHECK: dealloc [[MEMPOOL2]] : memref<?xi8>
   // CHECK: dealloc [[MEMPOOL1]] : memref<?xi8>
   // CHECK: return [[DATA3]] : memref<?x10xf32>
@@ -74,6 +74,7 @@ func private @test_add(%arg0 : tensor<10x10xf32>, %arg1 : tensor<10x10xf32>) ->
   // CHECK-LABEL: test_add
   // CHECK: [[RES:%.+]] = alloc() : memref<10x10xf32>
   // CHECK: [[DEF_LOOPS:%.+]]:2 = krnl.define_loops 2
+  // CHECK: krnl.parallel [[DEF_LOOPS]]#0 : !krnl.loop
   // CHECK: krnl.iterate([[DEF_LOOPS]]#0, [[DEF_LOOPS]]#1) with ([[DEF_LOOPS]]#0 -> %arg2 = 0 to 10, [[DEF_LOOPS]]#1 -> %arg3 = 0 to 10) {
   // CHECK: [[LOAD1:%.+]] = krnl.load %arg0[%arg2, %arg3] : memref<10x10xf32>
   // CHECK: [[LOAD2:%.+]] = krnl.load %arg1[%arg2, %arg3] : memref<10x10xf32>
@@ -1146,6 +1147,41 @@ func private @test_matmul3(%arg0 : tensor<2x3x10x5xf32>, %arg1 : tensor<2x3x5x10
 
 // -----
 
+// N-D x N-D, large enough to be tiled.
+func private @test_matmul_tiled(%arg0 : tensor<2x64x128xf32>, %arg1 : tensor<2x128x256xf32>) -> tensor<*xf32> {
+  %0 ="onnx.MatMul"(%arg0, %arg1) : (tensor<2x64x128xf32>, tensor<2x128x256xf32>) -> tensor<*xf32>
+  "std.return"(%0) : (tensor<*xf32>) -> ()
+
+//CHECK-LABEL:  func private @test_matmul_tiled
+//CHECK-SAME:   ([[A_:%.+]]: memref<2x64x128xf32>, [[B_:%.+]]: memref<2x128x256xf32>) -> memref<2x64x256xf32> {
+//CHECK:           [[RES_:%.+]] = alloc() : memref<2x64x256xf32>
+//CHECK:           [[VAR_cst_:%.+]] = constant 0.000000e+00 : f32
+//CHECK:           [[LOOP_0_:%.+]]:3 = krnl.define_loops 3
+//CHECK:           krnl.iterate([[LOOP_0_]]#0, [[LOOP_0_]]#1, [[LOOP_0_]]#2) with ([[LOOP_0_]]#0 -> [[I_0_:%.+]] = 0 to 2, [[LOOP_0_]]#1 -> [[I_1_:%.+]] = 0 to 64, [[LOOP_0_]]#2 -> [[I_2_:%.+]] = 0 to 256) {
+//CHECK:             krnl.store [[VAR_cst_]], [[RES_]]{{.}}[[I_0_]], [[I_1_]], [[I_2_]]{{.}} : memref<2x64x256xf32>
+//CHECK:           }
+//CHECK:           [[LOOP_1_:%.+]]:4 = krnl.define_loops 4
+//CHECK:           [[BLOCK_TILE_N_:%.+]], [[BLOCK_IN_N_:%.+]] = krnl.block [[LOOP_1_]]#1 32 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+//CHECK:           [[BLOCK_TILE_M_:%.+]], [[BLOCK_IN_M_:%.+]] = krnl.block [[LOOP_1_]]#2 64 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+//CHECK:           [[BLOCK_TILE_K_:%.+]], [[BLOCK_IN_K_:%.+]] = krnl.block [[LOOP_1_]]#3 128 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+//CHECK:           [[BLOCK_OUT_U_:%.+]], [[BLOCK_IN_U_:%.+]] = krnl.block [[BLOCK_IN_M_]] 8 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+//CHECK:           krnl.permute([[BLOCK_TILE_N_]], [[BLOCK_IN_N_]], [[BLOCK_TILE_M_]], [[BLOCK_OUT_U_]], [[BLOCK_IN_U_]], [[BLOCK_TILE_K_]], [[BLOCK_IN_K_]]) [0, 3, 1, 5, 6, 2, 4] : !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop
+//CHECK:           krnl.unroll [[BLOCK_IN_U_]] : !krnl.loop
+//CHECK:           krnl.parallel [[LOOP_1_]]#0 : !krnl.loop
+//CHECK:           krnl.iterate([[LOOP_1_]]#0, [[BLOCK_TILE_N_]], [[BLOCK_IN_N_]], [[BLOCK_TILE_M_]], [[BLOCK_OUT_U_]], [[BLOCK_IN_U_]], [[BLOCK_TILE_K_]], [[BLOCK_IN_K_]]) with ([[LOOP_1_]]#0 -> [[I_3_:%.+]] = 0 to 2, [[LOOP_1_]]#1 -> [[I_4_:%.+]] = 0 to 64, [[LOOP_1_]]#2 -> [[I_5_:%.+]] = 0 to 256, [[LOOP_1_]]#3 -> [[I_6_:%.+]] = 0 to 128) {
+//CHECK:             [[LOAD_A_MEM_:%.+]] = krnl.load [[A_]]{{.}}[[I_3_]], [[I_4_]], [[I_6_]]{{.}} : memref<2x64x128xf32>
+//CHECK:             [[LOAD_B_MEM_:%.+]] = krnl.load [[B_]]{{.}}[[I_3_]], [[I_6_]], [[I_5_]]{{.}} : memref<2x128x256xf32>
+//CHECK:             [[LOAD_RES_MEM_:%.+]] = krnl.load [[RES_]]{{.}}[[I_3_]], [[I_4_]], [[I_5_]]{{.}} : memref<2x64x256xf32>
+//CHECK:             [[VAR_MUL_:%.+]] = mulf [[LOAD_A_MEM_]], [[LOAD_B_MEM_]] : f32
+//CHECK:             [[VAR_ADD_:%.+]] = addf [[LOAD_RES_MEM_]], [[VAR_MUL_]] : f32
+//CHECK:             krnl.store [[VAR_ADD_]], [[RES_]]{{.}}[[I_3_]], [[I_4_]], [[I_5_]]{{.}} : memref<2x64x256xf32>
+//CHECK:           }
+//CHECK:           return [[RES_]] : memref<2x64x256xf32>
+//CHECK:         }
+}
+
+// -----
+
 // 1-D x 2-D
 func private @test_matmul4(%arg0 : tensor<5xf32>, %arg1 : tensor<5x10xf32>) -> tensor<*xf32> {
   %0 ="onnx.MatMul"(%arg0, %arg1) : (tensor<5xf32>, tensor<5x10xf32>) -> tensor<*xf32>
@@ -1501,6 +1537,96 @@ func private @test_conv_bias_group_pad_stride_dilation(%arg0 : tensor<1x9x32x64x
 
 // -----
 
+func private @test_conv_im2col(%arg0 : tensor<1x16x8x8xf32>, %arg1 : tensor<16x16x2x2xf32>) -> tensor<*xf32> {
+  %cst = constant unit
+  %0 = "onnx.Conv"(%arg0, %arg1, %cst) {auto_pad = "NOTSET", group = 1 : si64} : (tensor<1x16x8x8xf32>, tensor<16x16x2x2xf32>, none) -> tensor<*xf32>
+  "std.return"(%0) : (tensor<*xf32>) -> ()
+
+  // CHECK-LABEL: test_conv_im2col
+  // CHECK-DAG: [[RES:%.+]] = alloc() : memref<1x16x7x7xf32>
+  // CHECK-DAG: [[COL:%.+]] = alloc() : memref<1x64x49xf32>
+  // CHECK-DAG: [[KERNEL:%.+]] = alloc() : memref<16x64xf32>
+  // CHECK-DAG: [[MATMUL:%.+]] = alloc() : memref<1x16x49xf32>
+
+  // CHECK: [[COL_LOOPS:%.+]]:6 = krnl.define_loops 6
+  // CHECK: krnl.iterate([[COL_LOOPS]]#0, [[COL_LOOPS]]#1, [[COL_LOOPS]]#2, [[COL_LOOPS]]#3, [[COL_LOOPS]]#4, [[COL_LOOPS]]#5) with ([[COL_LOOPS]]#0 -> %arg2 = 0 to 1, [[COL_LOOPS]]#1 -> %arg3 = 0 to 16, [[COL_LOOPS]]#2 -> %arg4 = 0 to 2, [[COL_LOOPS]]#3 -> %arg5 = 0 to 2, [[COL_LOOPS]]#4 -> %arg6 = 0 to 7, [[COL_LOOPS]]#5 -> %arg7 = 0 to 7) {
+  // CHECK:   [[DATA:%.+]] = krnl.load %arg0
+  // CHECK:   krnl.store [[DATA]], [[COL]]
+  // CHECK: }
+
+  // CHECK: [[KERNEL_LOOPS:%.+]]:4 = krnl.define_loops 4
+  // CHECK:   [[WEIGHT:%.+]] = krnl.load %arg1
+  // CHECK:   krnl.store [[WEIGHT]], [[KERNEL]]
+
+  // CHECK: [[INIT_LOOPS:%.+]]:3 = krnl.define_loops 3
+  // CHECK:   krnl.store {{.*}}, [[MATMUL]]
+
+  // CHECK: [[MATMUL_LOOPS:%.+]]:4 = krnl.define_loops 4
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#1 16 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#2 49 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#3 64 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.permute({{.*}}) [0, 3, 1, 5, 2, 4]
+  // CHECK: krnl.parallel [[MATMUL_LOOPS]]#0 : !krnl.loop
+  // CHECK: krnl.iterate
+  // CHECK:   [[LOAD_KERNEL:%.+]] = krnl.load [[KERNEL]]
+  // CHECK:   [[LOAD_COL:%.+]] = krnl.load [[COL]]
+  // CHECK:   [[LOAD_MATMUL:%.+]] = krnl.load [[MATMUL]]
+  // CHECK:   [[MUL:%.+]] = mulf [[LOAD_KERNEL]], [[LOAD_COL]] : f32
+  // CHECK:   [[ADD:%.+]] = addf [[LOAD_MATMUL]], [[MUL]] : f32
+  // CHECK:   krnl.store [[ADD]], [[MATMUL]]
+
+  // CHECK: [[OUTPUT_LOOPS:%.+]]:4 = krnl.define_loops 4
+  // CHECK:   [[RESULT:%.+]] = krnl.load [[MATMUL]]
+  // CHECK:   krnl.store [[RESULT]], [[RES]]{{.}}%arg2, %arg3, %arg4, %arg5{{.}} : memref<1x16x7x7xf32>
+  // CHECK: return [[RES]] : memref<1x16x7x7xf32>
+}
+
+// -----
+
+func private @test_conv_winograd(%arg0 : tensor<1x16x8x8xf32>, %arg1 : tensor<16x16x3x3xf32>, %arg2 : tensor<16xf32>) -> tensor<*xf32> {
+  %0 = "onnx.Conv"(%arg0, %arg1, %arg2) {auto_pad = "NOTSET", group = 1 : si64, pads = [1, 1, 1, 1]} : (tensor<1x16x8x8xf32>, tensor<16x16x3x3xf32>, tensor<16xf32>) -> tensor<*xf32>
+  "std.return"(%0) : (tensor<*xf32>) -> ()
+
+  // CHECK-LABEL: test_conv_winograd
+  // CHECK-DAG: [[RES:%.+]] = alloc() : memref<1x16x8x8xf32>
+  // CHECK-DAG: [[KERNEL_TRANSFORM:%.+]] = alloc() : memref<16x16x16xf32>
+  // CHECK-DAG: [[HALF:%.+]] = constant 5.000000e-01 : f32
+
+  // CHECK: [[KERNEL_LOOPS:%.+]]:2 = krnl.define_loops 2
+  // CHECK: krnl.iterate([[KERNEL_LOOPS]]#0, [[KERNEL_LOOPS]]#1) with ([[KERNEL_LOOPS]]#0 -> %arg3 = 0 to 16, [[KERNEL_LOOPS]]#1 -> %arg4 = 0 to 16) {
+  // CHECK-COUNT-9: krnl.load %arg1
+  // CHECK:   mulf [[HALF]]
+  // CHECK-COUNT-16: krnl.store {{.*}}, [[KERNEL_TRANSFORM]]
+  // CHECK: }
+
+  // CHECK: [[DATA_LOOPS:%.+]]:4 = krnl.define_loops 4
+  // CHECK: krnl.iterate([[DATA_LOOPS]]#0, [[DATA_LOOPS]]#1, [[DATA_LOOPS]]#2, [[DATA_LOOPS]]#3) with ([[DATA_LOOPS]]#0 -> %arg3 = 0 to 1, [[DATA_LOOPS]]#1 -> %arg4 = 0 to 16, [[DATA_LOOPS]]#2 -> %arg5 = 0 to 4, [[DATA_LOOPS]]#3 -> %arg6 = 0 to 4) {
+  // CHECK:   [[DATA:%.+]] = krnl.load %arg0
+  // CHECK:   select {{.*}}, [[DATA]]
+  // CHECK:   krnl.store {{.*}}, [[DATA_TRANSFORM:%.+]]{{.}}%arg3, {{.*}} : memref<1x16x16x16xf32>
+
+  // CHECK: [[MATMUL_LOOPS:%.+]]:5 = krnl.define_loops 5
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#2 16 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#3 16 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.block [[MATMUL_LOOPS]]#4 16 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+  // CHECK: krnl.permute({{.*}}) [0, 3, 1, 5, 6, 2, 4]
+  // CHECK: krnl.unroll
+  // CHECK: krnl.parallel [[MATMUL_LOOPS]]#0 : !krnl.loop
+  // CHECK: krnl.iterate
+  // CHECK:   [[LOAD_U:%.+]] = krnl.load [[KERNEL_TRANSFORM]]
+  // CHECK:   [[LOAD_V:%.+]] = krnl.load [[DATA_TRANSFORM]]
+  // CHECK:   mulf [[LOAD_U]], [[LOAD_V]] : f32
+
+  // CHECK: [[OUTPUT_LOOPS:%.+]]:4 = krnl.define_loops 4
+  // CHECK: krnl.iterate([[OUTPUT_LOOPS]]#0, [[OUTPUT_LOOPS]]#1, [[OUTPUT_LOOPS]]#2, [[OUTPUT_LOOPS]]#3) with ([[OUTPUT_LOOPS]]#0 -> %arg3 = 0 to 1, [[OUTPUT_LOOPS]]#1 -> %arg4 = 0 to 16, [[OUTPUT_LOOPS]]#2 -> %arg5 = 0 to 4, [[OUTPUT_LOOPS]]#3 -> %arg6 = 0 to 4) {
+  // CHECK:   [[BIAS:%.+]] = krnl.load %arg2[%arg4] : memref<16xf32>
+  // CHECK-NOT: scf.if
+  // CHECK-COUNT-4: krnl.store {{.*}}, [[RES]]
+  // CHECK: return [[RES]] : memref<1x16x8x8xf32>
+}
+
+// -----
+
 func private @test_batchnorm_testmode_Nd(%arg0: tensor<1x2x1x3xf32>, %arg1: tensor<2xf32>, %arg2: tensor<2xf32>, %arg3: tensor<2xf32>, %arg4: tensor<2xf32>) -> tensor<1x2x1x3xf32> {
   %0 = "onnx.BatchNormalizationTestMode"(%arg0, %arg1, %arg2, %arg3, %arg4) : (tensor<1x2x1x3xf32>, tensor<2xf32>, tensor<2xf32>, tensor<2xf32>, tensor<2xf32>) -> tensor<1x2x1x3xf32>
   return %0 : tensor<1x2x1x3xf32>
@@ -0,0 +1,9 @@
+// RUN: onnx-mlir-opt --convert-onnx-to-krnl %s -split-input-file | FileCheck %s
+
+func @main_graph(%arg0: tensor<?x10xf32>, %arg1: tensor<10xi64>) -> tensor<?x10xf32> attributes {input_names = ["x", "indices"], output_names = ["y"]} {
+  %0 = "onnx.Identity"(%arg0) : (tensor<?x10xf32>) -> tensor<?x10xf32>
+  return %0 : tensor<?x10xf32>
+}
+"onnx.EntryPoint"() {func = @main_graph, numInputs = 2 : i32, numOutputs = 1 : i32} : () -> ()
+
+// CHECK: "krnl.entry_point"() {func = @main_graph, input_signature = "[{\22dims\22:[-1,10],\22name\22:\22x\22,\22type\22:\22f32\22},{\22dims\22:[10],\22name\22:\22indices\22,\22type\22:\22i64\22}]", numInputs = 2 : i32, numOutputs = 1 : i32, output_signature = "[{\22dims\22:[-1,10],\22name\22:\22y\22,\22type\22:\22f32\22}]"} : () -> ()
@@ -383,7 +383,6 @@ func @test_gemm_all_dyn(%arg0 : tensor<?x?xf32>, %arg1 : tensor<?x?xf32>, %arg2:
 
 // CHECK-LABEL:  func @test_gemm_all_dyn
 // CHECK-SAME:   ([[PARAM_0_:%.+]]: memref<?x?xf32>, [[PARAM_1_:%.+]]: memref<?x?xf32>, [[PARAM_2_:%.+]]: memref<?xf32>) -> memref<?x?xf32> {
-// CHECK-DAG:       [[CST_1_dot_000000_:%.+]] = constant 1.000000e+00 : f32
 // CHECK-DAG:       [[CST_5_dot_000000_:%.+]] = constant 5.000000e+00 : f32
 // CHECK-DAG:       [[CST_0_dot_000000_:%.+]] = constant 0.000000e+00 : f32
 // CHECK-DAG:       [[CST_1_:%.+]] = constant 1 : index
@@ -397,26 +396,30 @@ func @test_gemm_all_dyn(%arg0 : tensor<?x?xf32>, %arg1 : tensor<?x?xf32>, %arg2:
 // CHECK-DAG:       [[RES_:%.+]] = alloc([[DIM_0_]], [[DIM_2_]]) : memref<?x?xf32>
 // CHECK-DAG:       [[LOOP_0_:%.+]]:2 = krnl.define_loops 2
 // CHECK:           krnl.iterate([[LOOP_0_]]#0, [[LOOP_0_]]#1) with ([[LOOP_0_]]#0 -> [[I_0_:%.+]] = 0 to [[DIM_0_]], [[LOOP_0_]]#1 -> [[I_1_:%.+]] = 0 to [[DIM_2_]]) {
-// CHECK:             [[REDUCTION_VAL:%.+]] = alloca() : memref<f32>
-// CHECK:             krnl.store [[CST_0_dot_000000_]], [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:             [[LOOP_1_:%.+]] = krnl.define_loops 1
-// CHECK:             krnl.iterate([[LOOP_1_]]) with ([[LOOP_1_]] -> [[I_2_:%.+]] = 0 to [[DIM_1_]]) {
-// CHECK-DAG:           [[LOAD_PARAM_0_MEM_:%.+]] = krnl.load [[PARAM_0_]]{{.}}[[I_2_]], [[I_0_]]{{.}} : memref<?x?xf32>
-// CHECK-DAG:           [[LOAD_PARAM_1_MEM_:%.+]] = krnl.load [[PARAM_1_]]{{.}}[[I_2_]], [[I_1_]]{{.}} : memref<?x?xf32>
-// CHECK-DAG:           [[LOAD_RES_MEM_:%.+]] = krnl.load [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:               [[VAR_17_:%.+]] = mulf [[LOAD_PARAM_0_MEM_]], [[LOAD_PARAM_1_MEM_]] : f32
-// CHECK:               [[VAR_18_:%.+]] = addf [[LOAD_RES_MEM_]], [[VAR_17_]] : f32
-// CHECK:               krnl.store [[VAR_18_]], [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:             }
-// CHECK:             [[LOAD_RES_MEM_1_:%.+]] = krnl.load [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:             [[VAR_7_:%.+]] = cmpi sgt, [[DIM_3_]], [[CST_1_]] : index
-// CHECK-DAG:         [[VAR_8_:%.+]] = select [[VAR_7_]], [[I_1_]], [[CST_0_]] : index
-// CHECK-NOT: separator of consecutive DAGs
-// CHECK-DAG:         [[VAR_10_:%.+]] = mulf [[CST_1_dot_000000_]], [[LOAD_RES_MEM_1_]] : f32
-// CHECK-DAG:         [[LOAD_PARAM_2_MEM_:%.+]] = krnl.load [[PARAM_2_]]{{.}}[[VAR_8_]]{{.}} : memref<?xf32>
-// CHECK:             [[VAR_12_:%.+]] = mulf [[CST_5_dot_000000_]], [[LOAD_PARAM_2_MEM_]] : f32
-// CHECK:             [[VAR_13_:%.+]] = addf [[VAR_10_]], [[VAR_12_]] : f32
-// CHECK:             krnl.store [[VAR_13_]], [[RES_]]{{.}}[[I_0_]], [[I_1_]]{{.}} : memref<?x?xf32>
+// CHECK:             krnl.store [[CST_0_dot_000000_]], [[RES_]]{{.}}[[I_0_]], [[I_1_]]{{.}} : memref<?x?xf32>
+// CHECK:           }
+// CHECK:           [[LOOP_1_:%.+]]:3 = krnl.define_loops 3
+// CHECK:           [[BLOCK_TILE_0_:%.+]], [[BLOCK_IN_0_:%.+]] = krnl.block [[LOOP_1_]]#0 32 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           [[BLOCK_TILE_1_:%.+]], [[BLOCK_IN_1_:%.+]] = krnl.block [[LOOP_1_]]#1 64 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           [[BLOCK_TILE_2_:%.+]], [[BLOCK_IN_2_:%.+]] = krnl.block [[LOOP_1_]]#2 256 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           krnl.permute([[BLOCK_TILE_0_]], [[BLOCK_IN_0_]], [[BLOCK_TILE_1_]], [[BLOCK_IN_1_]], [[BLOCK_TILE_2_]], [[BLOCK_IN_2_]]) [0, 3, 1, 5, 2, 4] : !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop
+// CHECK:           krnl.iterate([[BLOCK_TILE_0_]], [[BLOCK_IN_0_]], [[BLOCK_TILE_1_]], [[BLOCK_IN_1_]], [[BLOCK_TILE_2_]], [[BLOCK_IN_2_]]) with ([[LOOP_1_]]#0 -> [[I_2_:%.+]] = 0 to [[DIM_0_]], [[LOOP_1_]]#1 -> [[I_3_:%.+]] = 0 to [[DIM_2_]], [[LOOP_1_]]#2 -> [[I_4_:%.+]] = 0 to [[DIM_1_]]) {
+// CHECK-DAG:         [[LOAD_PARAM_0_MEM_:%.+]] = krnl.load [[PARAM_0_]]{{.}}[[I_4_]], [[I_2_]]{{.}} : memref<?x?xf32>
+// CHECK-DAG:         [[LOAD_PARAM_1_MEM_:%.+]] = krnl.load [[PARAM_1_]]{{.}}[[I_4_]], [[I_3_]]{{.}} : memref<?x?xf32>
+// CHECK-DAG:         [[LOAD_RES_MEM_:%.+]] = krnl.load [[RES_]]{{.}}[[I_2_]], [[I_3_]]{{.}} : memref<?x?xf32>
+// CHECK:             [[VAR_MUL_:%.+]] = mulf [[LOAD_PARAM_0_MEM_]], [[LOAD_PARAM_1_MEM_]] : f32
+// CHECK:             [[VAR_ADD_:%.+]] = addf [[LOAD_RES_MEM_]], [[VAR_MUL_]] : f32
+// CHECK:             krnl.store [[VAR_ADD_]], [[RES_]]{{.}}[[I_2_]], [[I_3_]]{{.}} : memref<?x?xf32>
+// CHECK:           }
+// CHECK:           [[LOOP_2_:%.+]]:2 = krnl.define_loops 2
+// CHECK:           krnl.iterate([[LOOP_2_]]#0, [[LOOP_2_]]#1) with ([[LOOP_2_]]#0 -> [[I_5_:%.+]] = 0 to [[DIM_0_]], [[LOOP_2_]]#1 -> [[I_6_:%.+]] = 0 to [[DIM_2_]]) {
+// CHECK-DAG:         [[LOAD_RES_MEM_1_:%.+]] = krnl.load [[RES_]]{{.}}[[I_5_]], [[I_6_]]{{.}} : memref<?x?xf32>
+// CHECK-DAG:         [[VAR_CMP_:%.+]] = cmpi sgt, [[DIM_3_]], [[CST_1_]] : index
+// CHECK:             [[VAR_SELECT_:%.+]] = select [[VAR_CMP_]], [[I_6_]], [[CST_0_]] : index
+// CHECK:             [[LOAD_PARAM_2_MEM_:%.+]] = krnl.load [[PARAM_2_]]{{.}}[[VAR_SELECT_]]{{.}} : memref<?xf32>
+// CHECK:             [[VAR_BETA_C_:%.+]] = mulf [[CST_5_dot_000000_]], [[LOAD_PARAM_2_MEM_]] : f32
+// CHECK:             [[VAR_Y_:%.+]] = addf [[LOAD_RES_MEM_1_]], [[VAR_BETA_C_]] : f32
+// CHECK:             krnl.store [[VAR_Y_]], [[RES_]]{{.}}[[I_5_]], [[I_6_]]{{.}} : memref<?x?xf32>
 // CHECK:           }
 // CHECK:           return [[RES_]] : memref<?x?xf32>
 // CHECK:         }
@@ -432,7 +435,6 @@ func @test_gemm_k_dyn(%arg0 : tensor<?x10xf32>, %arg1 : tensor<?x10xf32>, %arg2:
 // CHECK-LABEL:  func @test_gemm_k_dyn
 // CHECK-SAME:   ([[PARAM_0_:%.+]]: memref<?x10xf32>, [[PARAM_1_:%.+]]: memref<?x10xf32>, [[PARAM_2_:%.+]]: memref<10xf32>) -> memref<10x10xf32> {
 // CHECK-DAG:       [[CST_0_:%.+]] = constant 0 : index
-// CHECK-DAG:       [[CST_1_dot_000000_:%.+]] = constant 1.000000e+00 : f32
 // CHECK-DAG:       [[CST_5_dot_000000_:%.+]] = constant 5.000000e+00 : f32
 // CHECK-DAG:       [[CST_0_dot_000000_:%.+]] = constant 0.000000e+00 : f32
 // CHECK-DAG:       [[RES_:%.+]] = alloc() : memref<10x10xf32>
@@ -440,23 +442,28 @@ func @test_gemm_k_dyn(%arg0 : tensor<?x10xf32>, %arg1 : tensor<?x10xf32>, %arg2:
 // CHECK-DAG:       [[DIM_0_:%.+]] = dim [[PARAM_0_]], [[CST_0_]] : memref<?x10xf32>
 // CHECK-DAG:       [[LOOP_0_:%.+]]:2 = krnl.define_loops 2
 // CHECK:           krnl.iterate([[LOOP_0_]]#0, [[LOOP_0_]]#1) with ([[LOOP_0_]]#0 -> [[I_0_:%.+]] = 0 to 10, [[LOOP_0_]]#1 -> [[I_1_:%.+]] = 0 to 10) {
-// CHECK:             [[REDUCTION_VAL:%.+]] = alloca() : memref<f32>
-// CHECK:             krnl.store [[CST_0_dot_000000_]], [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:             [[LOOP_1_:%.+]] = krnl.define_loops 1
-// CHECK:             krnl.iterate([[LOOP_1_]]) with ([[LOOP_1_]] -> [[I_2_:%.+]] = 0 to [[DIM_0_]]) {
-// CHECK-DAG:           [[LOAD_PARAM_0_MEM_:%.+]] = krnl.load [[PARAM_0_]]{{.}}[[I_2_]], [[I_0_]]{{.}} : memref<?x10xf32>
-// CHECK-DAG:           [[LOAD_PARAM_1_MEM_:%.+]] = krnl.load [[PARAM_1_]]{{.}}[[I_2_]], [[I_1_]]{{.}} : memref<?x10xf32>
-// CHECK-DAG:           [[LOAD_RES_MEM_:%.+]] = krnl.load [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:               [[VAR_12_:%.+]] = mulf [[LOAD_PARAM_0_MEM_]], [[LOAD_PARAM_1_MEM_]] : f32
-// CHECK:               [[VAR_13_:%.+]] = addf [[LOAD_RES_MEM_]], [[VAR_12_]] : f32
-// CHECK:               krnl.store [[VAR_13_]], [[REDUCTION_VAL]][] : memref<f32>
-// CHECK:             }
-// CHECK:             [[LOAD_RES_MEM_1_:%.+]] = krnl.load [[REDUCTION_VAL]][] : memref<f32>
-// CHECK-DAG:         [[VAR_5_:%.+]] = mulf [[CST_1_dot_000000_]], [[LOAD_RES_MEM_1_]] : f32
-// CHECK-DAG:         [[LOAD_PARAM_2_MEM_:%.+]] = krnl.load [[PARAM_2_]]{{.}}[[I_1_]]{{.}} : memref<10xf32>
-// CHECK:             [[VAR_7_:%.+]] = mulf [[CST_5_dot_000000_]], [[LOAD_PARAM_2_MEM_]] : f32
-// CHECK:             [[VAR_8_:%.+]] = addf [[VAR_5_]], [[VAR_7_]] : f32
-// CHECK:             krnl.store [[VAR_8_]], [[RES_]]{{.}}[[I_0_]], [[I_1_]]{{.}} : memref<10x10xf32>
+// CHECK:             krnl.store [[CST_0_dot_000000_]], [[RES_]]{{.}}[[I_0_]], [[I_1_]]{{.}} : memref<10x10xf32>
+// CHECK:           }
+// CHECK:           [[LOOP_1_:%.+]]:3 = krnl.define_loops 3
+// CHECK:           [[BLOCK_TILE_0_:%.+]], [[BLOCK_IN_0_:%.+]] = krnl.block [[LOOP_1_]]#0 10 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           [[BLOCK_TILE_1_:%.+]], [[BLOCK_IN_1_:%.+]] = krnl.block [[LOOP_1_]]#1 10 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           [[BLOCK_TILE_2_:%.+]], [[BLOCK_IN_2_:%.+]] = krnl.block [[LOOP_1_]]#2 256 : (!krnl.loop) -> (!krnl.loop, !krnl.loop)
+// CHECK:           krnl.permute([[BLOCK_TILE_0_]], [[BLOCK_IN_0_]], [[BLOCK_TILE_1_]], [[BLOCK_IN_1_]], [[BLOCK_TILE_2_]], [[BLOCK_IN_2_]]) [0, 3, 1, 5, 2, 4] : !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop, !krnl.loop
+// CHECK:           krnl.iterate([[BLOCK_TILE_0_]], [[BLOCK_IN_0_]], [[BLOCK_TILE_1_]], [[BLOCK_IN_1_]], [[BLOCK_TILE_2_]], [[BLOCK_IN_2_]]) with ([[LOOP_1_]]#0 -> [[I_2_:%.+]] = 0 to 10, [[LOOP_1_]]#1 -> [[I_3_:%.+]] = 0 to 10, [[LOOP_1_]]#2 -> [[I_4_:%.+]] = 0 to [[DIM_0_]]) {
+// CHECK-DAG:         [[LOAD_PARAM_0_MEM_:%.+]] = krnl.load [[PARAM_0_]]{{.}}[[I_4_]], [[I_2_]]{{.}} : memref<?x10xf32>
+// CHECK-DAG:         [[LOAD_PARAM_1_MEM_:%.+]] = krnl.load [[PARAM_1_]]{{.}}[[I_4_]], [[I_3_]]{{.}} : memref<?x10xf32>
+// CHECK-DAG:         [[LOAD_RES_MEM_:%.+]] = krnl.load [[RES_]]{{.}}[[I_2_]], [[I_3_]]{{.}} : memref<10x10xf32>
+// CHECK:             [[VAR_MUL_:%.+]] = mulf [[LOAD_PARAM_0_MEM_]], [[LOAD_PARAM_1_MEM_]] : f32
+// CHECK:             [[VAR_ADD_:%.+]] = addf [[LOAD_RES_MEM_]], [[VAR_MUL_]] : f32
+// CHECK:             krnl.store [[VAR_ADD_]], [[RES_]]{{.}}[[I_2_]], [[I_3_]]{{.}} : memref<10x10xf32>
+// CHECK:           }
+// CHECK:           [[LOOP_2_:%.+]]:2 = krnl.define_loops 2
+// CHECK:           krnl.iterate([[LOOP_2_]]#0, [[LOOP_2_]]#1) with ([[LOOP_2_]]#0 -> [[I_5_:%.+]] = 0 to 10, [[LOOP_2_]]#1 -> [[I_6_:%.+]] = 0 to 10) {
+// CHECK-DAG:         [[LOAD_RES_MEM_1_:%.+]] = krnl.load [[RES_]]{{.}}[[I_5_]], [[I_6_]]{{.}} : memref<10x10xf32>
+// CHECK-DAG:         [[LOAD_PARAM_2_MEM_:%.+]] = krnl.load [[PARAM_2_]]{{.}}[[I_6_]]{{.}} : memref<10xf32>
+// CHECK:             [[VAR_BETA_C_:%.+]] = mulf [[CST_5_dot_000000_]], [[LOAD_PARAM_2_MEM_]] : f32
+// CHECK:             [[VAR_Y_:%.+]] = addf [[LOAD_RES_MEM_1_]], [[VAR_BETA_C_]] : f32
+// CHECK:             krnl.store [[VAR_Y_]], [[RES_]]{{.}}[[I_5_]], [[I_6_]]{{.}} : memref<10x10xf32>
 // CHECK:           }
 // CHECK:           return [[RES_]] : memref<10x10xf32>
 // CHECK:         }
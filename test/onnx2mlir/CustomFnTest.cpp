@@ -2,17 +2,22 @@
  * SPDX-License-Identifier: Apache-2.0
  */
 
+#include <fstream>
 #include <iostream>
 #include <string>
 #include <vector>
 
 #include "mlir/IR/BuiltinOps.h"
 #include "mlir/IR/MLIRContext.h"
+#include "llvm/ADT/SmallString.h"
+#include "llvm/Support/FileSystem.h"
+#include "llvm/Support/Path.h"
 
 #include "onnx/defs/function.h"
 #include "onnx/defs/schema.h"
 
 #include "src/Builder/FrontendDialectTransformer.hpp"
+#include "src/Dialect/ONNX/ONNXOps.hpp"
 
 using namespace std;
 using namespace ONNX_NAMESPACE;
@@ -223,10 +228,180 @@ void testOptionalParameter() {
   check(model_proto);
 }
 
+void testScalarRawDataInitializer() {
+  ModelProto model_proto;
+  model_proto.set_ir_version(7);
+  auto *opset_version = model_proto.add_opset_import();
+  opset_version->set_domain(ONNX_DOMAIN);
+  opset_version->set_version(ONNX_OPSET_VERSION);
+
+  auto *graph = model_proto.mutable_graph();
+
+  auto float_type = TensorProto_DataType::TensorProto_DataType_FLOAT;
+
+  auto *x = graph->add_input();
+  x->set_name("x");
+  auto *x_type = x->mutable_type()->mutable_tensor_type();
+  x_type->set_elem_type(float_type);
+  auto *x_shape = x_type->mutable_shape();
+  x_shape->add_dim()->set_dim_value(10);
+
+  auto *y = graph->add_output();
+  y->set_name("y");
+  auto *y_type = y->mutable_type()->mutable_tensor_type();
+  y_type->set_elem_type(float_type);
+  auto *y_shape = y_type->mutable_shape();
+  y_shape->add_dim()->set_dim_value(10);
+
+  // A scalar initializer whose value is stored as raw data, in little endian.
+  auto *c = graph->add_initializer();
+  c->set_name("c");
+  c->set_data_type(float_type);
+  const char two[] = {0x00, 0x00, 0x00, 0x40};
+  c->set_raw_data(std::string(two, sizeof(two)));
+
+  auto *node = graph->add_node();
+  node->add_input("x");
+  node->add_input("c");
+  node->add_output("y");
+  node->set_op_type("Mul");
+
+  check(model_proto);
+}
+
+// Check that the constants of the module hold the expected values, in order.
+bool checkConstants(mlir::ModuleOp module,
+    const std::vector<std::vector<float>> &expectedValues) {
+  std::vector<std::vector<float>> values;
+  module.walk([&](mlir::ONNXConstantOp constantOp) {
+    auto attr = constantOp.valueAttr().cast<mlir::DenseElementsAttr>();
+    auto elements = attr.getValues<float>();
+    values.emplace_back(elements.begin(), elements.end());
+  });
+  if (values == expectedValues)
+    return true;
+  std::cerr << "Unexpected external data values" << std::endl;
+  module.dump();
+  return false;
+}
+
+bool testExternalDataInitializers() {
+  llvm::SmallString<128> dir;
+  if (llvm::sys::fs::createUniqueDirectory("CustomFnTest", dir)) {
+    std::cerr << "Cannot create a temporary directory" << std::endl;
+    return false;
+  }
+
+  // Side file holding 4 bytes of padding, then the floats 1, 2 and 3 in
+  // little endian.
+  llvm::SmallString<128> dataPath(dir);
+  llvm::sys::path::append(dataPath, "weights.bin");
+  const char data[] = {0x0f, 0x0f, 0x0f, 0x0f, 0x00, 0x00, (char)0x80, 0x3f,
+      0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x40, 0x40};
+  std::ofstream(dataPath.str().str(), std::ios::binary)
+      .write(data, sizeof(data));
+
+  ModelProto model_proto;
+  model_proto.set_ir_version(7);
+  auto *opset_version = model_proto.add_opset_import();
+  opset_version->set_domain(ONNX_DOMAIN);
+  opset_version->set_version(ONNX_OPSET_VERSION);
+
+  auto *graph = model_proto.mutable_graph();
+
+  auto float_type = TensorProto_DataType::TensorProto_DataType_FLOAT;
+
+  auto addTensor = [&](ValueInfoProto *info, std::string name, int64_t dim) {
+    info->set_name(name);
+    auto *type = info->mutable_type()->mutable_tensor_type();
+    type->set_elem_type(float_type);
+    type->mutable_shape()->add_dim()->set_dim_value(dim);
+  };
+  addTensor(graph->add_input(), "x", 3);
+  addTensor(graph->add_input(), "w", 2);
+  addTensor(graph->add_output(), "y", 3);
+  addTensor(graph->add_output(), "z", 2);
+
+  auto addExternalData = [](TensorProto *tensor, std::string key,
+                             std::string value) {
+    auto *entry = tensor->add_external_data();
+    entry->set_key(key);
+    entry->set_value(value);
+  };
+
+  // Initializer read from an offset and a length of the side file.
+  auto *c = graph->add_initializer();
+  c->set_name("c");
+  c->set_data_type(float_type);
+  c->add_dims(3);
+  c->set_data_location(TensorProto::EXTERNAL);
+  addExternalData(c, "location", "weights.bin");
+  addExternalData(c, "offset", "4");
+  addExternalData(c, "length", "12");
+
+  // Initializer extending from an offset to the end of the side file.
+  auto *d = graph->add_initializer();
+  d->set_name("d");
+  d->set_data_type(float_type);
+  d->add_dims(2);
+  d->set_data_location(TensorProto::EXTERNAL);
+  addExternalData(d, "location", "weights.bin");
+  addExternalData(d, "offset", "8");
+
+  auto *node = graph->add_node();
+  node->add_input("x");
+  node->add_input("c");
+  node->add_output("y");
+  node->set_op_type("Add");
+
+  node = graph->add_node();
+  node->add_input("w");
+  node->add_input("d");
+  node->add_output("z");
+  node->set_op_type("Mul");
+
+  std::vector<std::vector<float>> expectedValues = {{1, 2, 3}, {2, 3}};
+  bool success = true;
+
+  // The locations are relative to the given directory.
+  {
+    mlir::MLIRContext context;
+    registerDialects(context);
+    mlir::OwningModuleRef module;
+    onnx_mlir::ImportOptions options;
+    options.externalDataDir = dir.str().str();
+    onnx_mlir::ImportFrontendModel(model_proto, context, module, options);
+    success &= checkConstants(*module, expectedValues);
+  }
+
+  // By default, the locations are relative to the directory of the model
+  // file.
+  {
+    llvm::SmallString<128> modelPath(dir);
+    llvm::sys::path::append(modelPath, "model.onnx");
+    {
+      std::ofstream modelFile(modelPath.str().str(), std::ios::binary);
+      model_proto.SerializeToOstream(&modelFile);
+    }
+    mlir::MLIRContext context;
+    registerDialects(context);
+    mlir::OwningModuleRef module;
+    onnx_mlir::ImportFrontendModelFile(
+        modelPath.str().str(), context, module, onnx_mlir::ImportOptions());
+    success &= checkConstants(*module, expectedValues);
+  }
+
+  llvm::sys::fs::remove_directories(dir);
+  return success;
+}
+
 int main(int argc, char *argv[]) {
   testCustomFunTranslation();
   testUseOfOnnxModelTypes();
   testOptionalParameter();
+  testScalarRawDataInitializer();
+  if (!testExternalDataInitializers())
+    return 1;
 
   return 0;
 }
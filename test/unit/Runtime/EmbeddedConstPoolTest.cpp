@@ -0,0 +1,52 @@
+/*
+ * SPDX-License-Identifier: Apache-2.0
+ */
+
+//===------ EmbeddedConstPoolTest.cpp - Embedded Constant Pack Unit Test --===//
+//
+// Copyright 2019-2020 The IBM Research Authors.
+//
+// =============================================================================
+//
+// This file tests the loading of a constant pack embedded in a section that
+// is not page aligned, as produced by GNU binutils older than 2.33. The pack
+// is then copied, with the size given by the section.
+//
+//===----------------------------------------------------------------------===//
+
+#include <assert.h>
+#include <stdint.h>
+#include <string.h>
+
+#include "GetEmbeddedConstPool.h"
+
+// The symbols of a model library embedding an 8-byte constant pack, placed one
+// byte after a page boundary.
+__asm__(".section .rodata\n"
+        ".balign 4096\n"
+        ".byte 0\n"
+        ".globl _binary_param_bin_start\n"
+        "_binary_param_bin_start:\n"
+        ".byte 1, 2, 3, 4, 5, 6, 7, 8\n"
+        ".globl _binary_param_bin_end\n"
+        "_binary_param_bin_end:\n"
+        ".previous\n");
+extern char _binary_param_bin_start;
+
+extern const char constPackIsLE = 1;
+extern const char constPackIsEmbedded = 1;
+char constPackFileName[] = "";
+int64_t constPackFileNameStrLen = 0;
+
+int main() {
+  const char expected[] = {1, 2, 3, 4, 5, 6, 7, 8};
+
+  // Sessions preload the pack without knowing its size.
+  char *constPool = (char *)getEmbeddedConstPool(0);
+  assert(constPool != &_binary_param_bin_start);
+  assert(memcmp(constPool, expected, sizeof(expected)) == 0);
+
+  // The model gets the same copy on every call.
+  assert(getEmbeddedConstPool(sizeof(expected)) == constPool);
+  return 0;
+}